@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fake_console.py - local stand-in for the 7D2D telnet console
+
+- password handshake ("Please enter password:" / "Logon successful.")
+- answers listplayers / version / help and acknowledges pm2, giveplus, say,
+  givexp, loglevel like the real server ("Executing command '...' by Telnet")
+- keeps a roster that follows the spawn / disconnect / PrismaCore level-up
+  lines it broadcasts, so listplayers matches what the clients were told
+- replays scenario lines to every logged-in client at a configurable speed
+- records every received command with its arrival time
+- giveplus / givexp / pm2 resolve their player argument (entity id, platform
+  id or name) against the roster and answer an unknown one with the server's
+  "Playername or entity/userid id not found."
+- frozen = True simulates a half-open session: commands are swallowed and
+  nothing is sent, but the TCP connection stays up
+- log_file: every log line (replayed lines, command echoes) is also appended
+  to this server log, as the real server writes server_<timestamp>.log; a
+  session that sent "loglevel ALL false" gets no log lines over telnet, only
+  command output
+
+Standalone:
+    python bench/fake_console.py --port 8081 --password bench --replay lines.txt --speed 10
+"""
+
+import argparse
+import re
+import shlex
+import socket
+import threading
+import time
+from datetime import datetime
+
+SPAWN_RE = re.compile(r"PlayerSpawnedInWorld.*?EntityID=(\d+).*?PltfmId='([^']*)'.*?PlayerName='([^']+)'")
+DISCONNECT_RE = re.compile(r"Player disconnected: EntityID=(\d+).*?PlayerName='([^']+)'")
+LEVEL_RE = re.compile(r"\[PrismaCore\]playerLeveled:\s*([^(]+)\s*\(([^)]+)\)\s*made level\s*(\d+)")
+KILLS_RE = re.compile(r"^#bench kills (\S+) (\d+)$")
+LINE_TS_RE = re.compile(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d ")
+
+ACK_COMMANDS = ("pm2", "pm", "giveplus", "give", "say", "givexp", "loglevel")
+# player argument position per command; an unknown player gets the server's error
+PLAYER_ARG = {"giveplus": 1, "givexp": 1, "pm2": 2}
+
+
+class FakeConsoleServer:
+    def __init__(self, host="127.0.0.1", port=0, password="bench", on_command=None, log_file=None):
+        self.password = password
+        self.on_command = on_command  # callable(ts, command) for latency tracking
+        self.log_file = log_file
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(16)
+        self.host, self.port = self.sock.getsockname()
+        self.lock = threading.Lock()
+        self.clients = []  # authenticated sockets
+        self.muted = set()  # sockets that turned log lines off (loglevel ALL false)
+        self.roster = {}  # name -> {"entity_id", "pltfmid", "level", "zombies"}
+        self.commands = []  # (ts, command)
+        self.lines_sent = 0
+        self.started = time.time()
+        self.running = False
+        self.frozen = False
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._accept_loop, name="fake-console", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        with self.lock:
+            for c in self.clients:
+                try:
+                    c.close()
+                except OSError:
+                    pass
+            self.clients = []
+
+    def wait_for_clients(self, n=1, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if len(self.clients) >= n:
+                    return True
+            time.sleep(0.05)
+        return False
+
+    # ---------- protocol ----------
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._client_loop, args=(conn,), name="fake-console-client", daemon=True).start()
+
+    @staticmethod
+    def _send(conn, text):
+        conn.sendall(text.encode("utf-8"))
+
+    def _client_loop(self, conn):
+        buf = b""
+        authed = False
+        try:
+            self._send(conn, "Please enter password:\r\n")
+            while self.running:
+                data = conn.recv(4096)
+                if not data:
+                    break
+                buf += data
+                while b"\n" in buf:
+                    raw, buf = buf.split(b"\n", 1)
+                    line = raw.decode("utf-8", errors="ignore").strip()
+                    if not authed:
+                        if line == self.password:
+                            authed = True
+                            self._send(conn, "Logon successful.\r\n\r\n*** Connected with 7DTD server.\r\n\r\n")
+                            with self.lock:
+                                self.clients.append(conn)
+                        else:
+                            self._send(conn, "Password incorrect, please enter password:\r\n")
+                        continue
+                    if line and not self.frozen:
+                        self._handle_command(conn, line)
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                if conn in self.clients:
+                    self.clients.remove(conn)
+                self.muted.discard(conn)
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _prefix(self):
+        uptime = time.time() - self.started
+        return "%s %.3f INF " % (datetime.now().strftime("%Y-%m-%dT%H:%M:%S"), uptime)
+
+    def _handle_command(self, conn, command):
+        ts = time.time()
+        with self.lock:
+            self.commands.append((ts, command))
+        if self.on_command:
+            self.on_command(ts, command)
+
+        verb = command.split(" ", 1)[0].lower()
+        echo = self._prefix() + "Executing command '%s' by Telnet from 127.0.0.1:0" % command
+        self._write_log(echo)
+        with self.lock:
+            out = [] if conn in self.muted else [echo]
+        if verb in ("lp", "listplayers"):
+            out.extend(self._listplayers())
+        elif verb == "version":
+            out.append("Game version: V 2.0 (b295) Compatibility Version: V 2.0")
+        elif verb == "help":
+            out.append("*** Generic Console Help ***")
+            out.append("help <command> - show help for a command")
+        elif verb not in ACK_COMMANDS:
+            out.append("*** ERROR: unknown command '%s'" % verb)
+        elif verb in PLAYER_ARG and self.command_player(command) is None:
+            out.append("Playername or entity/userid id not found.")
+        elif verb == "loglevel":
+            parts = command.split()
+            if len(parts) == 3 and parts[1].upper() == "ALL":
+                with self.lock:
+                    if parts[2].lower() == "false":
+                        self.muted.add(conn)
+                    else:
+                        self.muted.discard(conn)
+        try:
+            self._send(conn, "\r\n".join(out) + "\r\n")
+        except OSError:
+            pass
+
+    def resolve_player(self, target):
+        """Roster name for an entity id, platform id or name; None if unknown."""
+        with self.lock:
+            for name, p in self.roster.items():
+                if target in (name, p.get("entity_id"), p.get("pltfmid")):
+                    return name
+        return None
+
+    def command_player(self, command):
+        """Player a giveplus / givexp / pm2 command is addressed to, or None."""
+        try:
+            parts = shlex.split(command)
+        except ValueError:
+            parts = command.split()
+        pos = PLAYER_ARG.get(parts[0].lower() if parts else "")
+        if pos is None or len(parts) <= pos:
+            return None
+        return self.resolve_player(parts[pos])
+
+    def _listplayers(self):
+        with self.lock:
+            roster = list(self.roster.items())
+        rows = []
+        for i, (name, p) in enumerate(roster, 1):
+            rows.append(
+                "%d. id=%s, %s, pos=(0.0, 60.0, 0.0), rot=(0.0, 0.0, 0.0), remote=True, health=100, "
+                "deaths=0, zombies=%s, players=0, score=0, level=%s, pltfmid=%s, crossid=EOS_0, "
+                "ip=127.0.0.1, ping=20"
+                % (i, p["entity_id"], name, p["zombies"], p["level"], p["pltfmid"])
+            )
+        rows.append("Total of %d in the game" % len(roster))
+        return rows
+
+    # ---------- replay ----------
+
+    def _track_roster(self, line):
+        m = SPAWN_RE.search(line)
+        if m:
+            eid, pltfm, name = m.groups()
+            with self.lock:
+                p = self.roster.setdefault(name, {"level": 1, "zombies": 0})
+                p["entity_id"], p["pltfmid"] = eid, pltfm
+            return
+        m = DISCONNECT_RE.search(line)
+        if m:
+            with self.lock:
+                self.roster.pop(m.group(2), None)
+            return
+        m = LEVEL_RE.search(line)
+        if m:
+            with self.lock:
+                p = self.roster.get(m.group(1).strip())
+                if p:
+                    p["level"] = int(m.group(3))
+
+    def broadcast(self, line):
+        """Send one console line to every logged-in client. Lines starting with
+        "#bench" only change the fake's state (e.g. "#bench kills Bob 12")."""
+        m = KILLS_RE.match(line)
+        if m:
+            with self.lock:
+                p = self.roster.get(m.group(1))
+                if p:
+                    p["zombies"] = int(m.group(2))
+            return
+        self._track_roster(line)
+        if self.frozen:
+            return
+        if not LINE_TS_RE.match(line):
+            line = self._prefix() + line
+        self._write_log(line)
+        data = (line + "\r\n").encode("utf-8")
+        with self.lock:
+            clients = [c for c in self.clients if c not in self.muted]
+            self.lines_sent += 1
+        for c in clients:
+            try:
+                c.sendall(data)
+            except OSError:
+                pass
+
+    def _write_log(self, line):
+        if not self.log_file:
+            return
+        with self.lock:
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    def replay(self, events, speed=1.0, on_emit=None):
+        """events: iterable of (offset_seconds, line, expect). speed 0 sends as
+        fast as possible; on_emit(ts, line, expect) is called after each send."""
+        t0 = time.time()
+        for offset, line, expect in events:
+            if speed and speed > 0:
+                delay = t0 + offset / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            self.broadcast(line)
+            if on_emit:
+                on_emit(time.time(), line, expect)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake 7D2D telnet console")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--password", default="bench")
+    ap.add_argument("--replay", help="console log file to replay after the first client logs in")
+    ap.add_argument("--speed", type=float, default=1.0, help="replay speed factor (0 = as fast as possible)")
+    args = ap.parse_args()
+
+    from scenarios import from_console_log
+
+    srv = FakeConsoleServer(args.host, args.port, args.password).start()
+    print("Fake console on %s:%s (password %r)" % (srv.host, srv.port, args.password))
+    try:
+        if args.replay:
+            srv.wait_for_clients(1, timeout=3600)
+            srv.replay(from_console_log(args.replay), speed=args.speed)
+            print("Replay done: %s lines" % srv.lines_sent)
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        srv.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+run_bench.py - replay console traffic into IntegratedMonitor / VotingRewards
+
+Starts the fake console, the stub quest server and the stub vote API, runs
+the real service (imported from the repo, state/log files redirected to a
+temp dir) against them, replays a scenario and reports:
+
+- console lines/sec handled and handle_line() time percentiles (handled
+  lines include the console's command echoes, so they can exceed lines sent)
+- event -> effect latency percentiles (PrismaCore level-up -> quest update,
+  /vote -> first giveplus, /vote -> vote quest update)
+- console commands/sec received by the fake, by verb
+- CPU seconds and RSS of the process (fakes run in-process too, they are
+  small next to the service)
+
+Examples:
+    python bench/run_bench.py monitor --players 20 --levelups 300 --speed 0
+    python bench/run_bench.py voting --players 10 --speed 0
+    python bench/run_bench.py voting --service-log Logs/voting_rewards.log --speed 600
+    python bench/run_bench.py monitor --console-log server_2026-10-01.log --speed 20 --json out.json
+    python bench/run_bench.py voting --players 10 --speed 0 --log-tail
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from fake_console import FakeConsoleServer  # noqa: E402
+from stubs import StubQuestServer, StubVoteApi  # noqa: E402
+import scenarios  # noqa: E402
+
+PASSWORD = "bench"
+
+
+def percentiles(values, ps=(50, 90, 95, 99)):
+    if not values:
+        return {}
+    s = sorted(values)
+    out = {}
+    for p in ps:
+        k = max(0, min(len(s) - 1, int(round(p / 100.0 * len(s) + 0.5)) - 1))
+        out["p%d" % p] = round(s[k], 2)
+    out["max"] = round(s[-1], 2)
+    out["n"] = len(s)
+    return out
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+class LatencyTracker:
+    """Matches emitted events with the effect the service produced (FIFO per key)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = defaultdict(deque)  # (kind, name) -> deque[emit ts]
+        self.latencies = defaultdict(list)  # kind -> [ms]
+        self.expected = Counter()
+
+    def emitted(self, ts, line, expect):
+        with self.lock:
+            for key in expect or ():
+                self.open[key].append(ts)
+                self.expected[key[0]] += 1
+
+    def satisfied(self, kind, name, ts, count=1):
+        """count: events covered by one effect (a coalesced +3 levelgain)."""
+        with self.lock:
+            q = self.open.get((kind, name))
+            while q and count > 0:
+                self.latencies[kind].append((ts - q.popleft()) * 1000.0)
+                count -= 1
+
+    def pending(self):
+        with self.lock:
+            return sum(len(q) for q in self.open.values())
+
+
+def load_service(target, tmp, console, quest, vote):
+    """Import the service module with its files redirected into tmp."""
+    if target == "monitor":
+        sys.path.insert(0, os.path.join(REPO, "integrated-game-monitor"))
+        mod = importlib.import_module("integrated_game_monitor")
+        redirect = [
+            "LOG_FILE", "LOG_LEVELS_FILE", "LEVELS_FILE", "STATE_DB_FILE", "RETRY_QUEUE_FILE",
+            "MONITOR_STATE_FILE", "KILL_BASELINES_FILE", "PLAYTIME_STATE_FILE", "LOG_TAIL_CHECKPOINT_FILE",
+        ]
+        mod.READ_API_ENABLED = False
+        mod.QUEST_SERVER_URL = quest.url
+    else:
+        sys.path.insert(0, os.path.join(REPO, "voting"))
+        mod = importlib.import_module("voting_rewards")
+        redirect = ["LOG_FILE", "LOG_LEVELS_FILE", "STATE_DB_FILE", "LOG_TAIL_CHECKPOINT_FILE"]
+    for name in redirect:
+        if hasattr(mod, name):
+            setattr(mod, name, os.path.join(tmp, os.path.basename(getattr(mod, name))))
+    # --log-tail: events from the fake's server log, telnet only for commands
+    mod.LOG_TAIL_ENABLED = bool(console.log_file)
+    if console.log_file:
+        mod.SERVER_LOG_DIR = os.path.dirname(console.log_file)
+
+    import bohemia_state  # imported by the service via ../shared
+
+    for name in ("LEGACY_LEVELS_FILE", "LEGACY_RETRY_QUEUE_FILE", "LEGACY_PENDING_REWARDS_FILE",
+                 "LEGACY_PLAYERS_MAPPING_FILE"):
+        setattr(bohemia_state, name, os.path.join(tmp, "missing-" + name.lower()))
+
+    if target == "monitor":
+        service = mod.IntegratedMonitor(console.host, console.port, PASSWORD)
+    else:
+        service = mod.VotingRewards(console.host, console.port, PASSWORD, "benchkey", quest.url, api_base=vote.url)
+    return mod, service
+
+
+def run(args):
+    tmp = tempfile.mkdtemp(prefix="bohemia-bench-")
+    tracker = LatencyTracker()
+
+    def on_command(ts, command):
+        # giveplus addresses players by entity id / platform id / quoted name
+        if command.startswith("giveplus "):
+            name = console.command_player(command)
+            if name:
+                tracker.satisfied("reward", name, ts)
+
+    def on_update(ts, upd):
+        kind = upd.get("questType")
+        if kind == "levelgain":
+            tracker.satisfied(kind, upd.get("playerName"), ts, int(upd.get("increment") or 1))
+        elif kind == "vote":
+            tracker.satisfied(kind, upd.get("playerName"), ts)
+
+    log_file = None
+    if args.log_tail:
+        os.makedirs(os.path.join(tmp, "logs"))
+        log_file = os.path.join(tmp, "logs", "server_bench.log")
+        open(log_file, "w").close()
+    console = FakeConsoleServer(password=PASSWORD, on_command=on_command, log_file=log_file).start()
+    quest = StubQuestServer(latency_ms=args.quest_latency_ms, fail_rate=args.fail_rate, on_update=on_update).start()
+    vote = StubVoteApi(latency_ms=args.vote_latency_ms, initial_status=1).start()
+
+    if args.console_log:
+        events = scenarios.from_console_log(args.console_log)
+    elif args.service_log:
+        events = scenarios.from_service_log(args.service_log)
+    elif args.target == "monitor":
+        events = scenarios.synthetic_monitor(args.players, args.levelups, args.noise, args.interval)
+    else:
+        events = scenarios.synthetic_voting(args.players, args.noise, args.interval)
+    if args.limit:
+        events = events[: args.limit]
+
+    mod, service = load_service(args.target, tmp, console, quest, vote)
+    mod.setup_logging()
+    logging.getLogger().setLevel(args.log_level)
+    if not args.verbose and getattr(mod, "_log_listener", None):
+        # keep the rotating file, drop stderr
+        listener = mod._log_listener
+        listener.handlers = tuple(h for h in listener.handlers if type(h) is not logging.StreamHandler)
+
+    handled = []  # (ts, seconds spent in handle_line)
+    # the reader hands lines to an event queue whose thread calls handle_line
+    queue = getattr(service, "events", None)
+    orig_handle = queue.handler if queue else service.handle_line
+
+    def timed_handle(line):
+        t = time.perf_counter()
+        try:
+            return orig_handle(line)
+        finally:
+            handled.append((time.time(), time.perf_counter() - t))
+
+    if queue:
+        queue.handler = timed_handle
+    else:
+        service.handle_line = timed_handle
+
+    threading.Thread(target=service.run, name="service", daemon=True).start()
+    if not console.wait_for_clients(1, timeout=30):
+        raise SystemExit("service did not log in to the fake console")
+    time.sleep(args.warmup)
+
+    cmd_before = len(console.commands)
+    handled_before = len(handled)
+    cpu0 = time.process_time()
+    wall0 = time.time()
+
+    print("Replaying %d lines (speed %s) into %s ..." % (len(events), args.speed or "max", args.target))
+    console.replay(events, speed=args.speed, on_emit=tracker.emitted)
+    replay_done = time.time()
+
+    # wait until every line was handled and every expected effect seen; give up
+    # at the drain timeout or when nothing moved for idle_timeout (effects that
+    # never come, e.g. /vote from a player who already claimed today)
+    sent_lines = sum(1 for _, line, _ in events if not line.startswith("#bench"))
+    deadline = replay_done + args.drain_timeout
+    progress = None
+    last_progress = time.time()
+    while time.time() < deadline:
+        if len(handled) - handled_before >= sent_lines and tracker.pending() == 0:
+            break
+        now_progress = (len(handled), len(console.commands), len(quest.requests))
+        if now_progress != progress:
+            progress, last_progress = now_progress, time.time()
+        elif time.time() - last_progress > args.idle_timeout:
+            break
+        time.sleep(0.05)
+    wall1 = time.time()
+    cpu1 = time.process_time()
+
+    run_handled = handled[handled_before:]
+    last_handled = run_handled[-1][0] if run_handled else wall1
+    commands = console.commands[cmd_before:]
+    verbs = Counter(c.split(" ", 1)[0] for _, c in commands)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    report = {
+        "target": args.target,
+        "lines_sent": sent_lines,
+        "lines_handled": len(run_handled),
+        "replay_seconds": round(replay_done - wall0, 3),
+        "lines_per_sec": round(len(run_handled) / max(1e-6, last_handled - wall0), 1),
+        "handle_line_ms": percentiles([d * 1000.0 for _, d in run_handled]),
+        "latency_ms": {k: percentiles(v) for k, v in tracker.latencies.items()},
+        "effects_expected": dict(tracker.expected),
+        "effects_missing": tracker.pending(),
+        "commands": len(commands),
+        "commands_per_sec": round(len(commands) / max(1e-6, wall1 - wall0), 2),
+        "commands_by_verb": dict(verbs),
+        "quest_requests": len(quest.requests),
+        "quest_updates": quest.updates,
+        "quest_heartbeats": quest.heartbeats,
+        "quest_duplicates": quest.duplicates,
+        "vote_api_requests": len(vote.requests),
+        "cpu_seconds": round(cpu1 - cpu0, 3),
+        "cpu_percent": round(100.0 * (cpu1 - cpu0) / max(1e-6, wall1 - wall0), 1),
+        "rss_mb": round(rss_mb() or 0.0, 1),
+        "max_rss_mb": round(usage.ru_maxrss / 1024.0, 1),
+        "wall_seconds": round(wall1 - wall0, 3),
+        "tmp_dir": tmp,
+    }
+
+    console.stop()
+    quest.stop()
+    vote.stop()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark IntegratedMonitor / VotingRewards against local fakes")
+    ap.add_argument("target", choices=("monitor", "voting"))
+    src = ap.add_mutually_exclusive_group()
+    src.add_argument("--console-log", help="replay a captured server log / telnet transcript")
+    src.add_argument("--service-log", help="rebuild events from one of our service logs")
+    ap.add_argument("--players", type=int, default=20)
+    ap.add_argument("--levelups", type=int, default=200, help="synthetic monitor scenario")
+    ap.add_argument("--noise", type=int, default=10, help="noise lines per event (synthetic)")
+    ap.add_argument("--interval", type=float, default=0.05, help="seconds between synthetic lines at speed 1")
+    ap.add_argument("--limit", type=int, default=0, help="only replay the first N lines")
+    ap.add_argument("--speed", type=float, default=0.0, help="replay speed factor, 0 = as fast as possible")
+    ap.add_argument(
+        "--warmup", type=float, default=5.0,
+        help="seconds to wait after login before replaying (the monitor's startup reconcile runs in the background)",
+    )
+    ap.add_argument("--drain-timeout", type=float, default=120.0)
+    ap.add_argument("--idle-timeout", type=float, default=10.0)
+    ap.add_argument("--quest-latency-ms", type=int, default=0)
+    ap.add_argument("--vote-latency-ms", type=int, default=0)
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="share of quest requests the stub fails")
+    ap.add_argument(
+        "--log-tail", action="store_true",
+        help="read events from the fake's server log file (LOG_TAIL_ENABLED, telnet log lines muted)",
+    )
+    ap.add_argument("--log-level", default="WARNING")
+    ap.add_argument("--verbose", action="store_true", help="keep the service's stderr log output")
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
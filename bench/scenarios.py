@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+scenarios.py - console line sequences for the fake console
+
+Every loader returns a list of (offset_seconds, line, expect) tuples. expect
+is a list of (kind, playerName) keys the service under test should act on:
+
+    ("levelgain", name)  PrismaCore level-up -> quest update (monitor)
+    ("vote", name)       /vote -> vote quest update (voting)
+    ("reward", name)     /vote -> first giveplus on the console (voting)
+
+Sources:
+- synthetic_monitor() / synthetic_voting(): generated traffic
+- from_console_log(path): a captured 7D2D server log / telnet transcript
+- from_service_log(path): rebuilds console events from our own service logs
+  (Logs/voting_rewards.log, integrated_monitor.log), keeping their timing
+"""
+
+import random
+import re
+from datetime import datetime
+
+PLATFORM_BASE = 76561199000000000
+
+CONSOLE_TS_RE = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d) ")
+SERVICE_TS_RE = re.compile(r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)[,.](\d{3})")
+
+LEVEL_RE = re.compile(r"\[PrismaCore\]playerLeveled:\s*([^(]+)\s*\(")
+VOTE_CHAT_RE = re.compile(r"Chat \(from 'Steam_\d+'.*?\): '([^']+)':\s*/vote")
+
+NOISE = [
+    "Time: {m:.2f}m FPS: 38.41 Heap: 2315.2MB Max: 2480.1MB Chunks: 412 CGO: 31 Ply: {p} Zom: 57 Ent: 88 (131) Items: 4 CO: 2 RSS: 6120.4MB",
+    "Spawned [type=EntityZombie, name=zombieBoe, id={e}] at (10.5, 61.0, -33.2) Day=3 TotalInWave=0 CurrentWave=0",
+    "AIDirector: scout horde zombie '[type=EntityZombieCop, name=zombieFatCop, id={e}]' was spawned and is moving towards point of interest.",
+    "Entity zombieSteve {e} killed by player entity {k}",
+    "[EAC] FireEvent - ClientAuth",
+]
+
+
+def spawn_line(name, entity_id, steam_id):
+    return (
+        "PlayerSpawnedInWorld (reason: JoinMultiplayer, position: 100, 61, -200): EntityID=%s, "
+        "PltfmId='Steam_%s', CrossId='EOS_bench%s', OwnerID='Steam_%s', PlayerName='%s', ClientNumber='1'"
+        % (entity_id, steam_id, entity_id, steam_id, name)
+    )
+
+
+def disconnect_line(name, entity_id, steam_id):
+    return (
+        "Player disconnected: EntityID=%s, PltfmId='Steam_%s', CrossId='EOS_bench%s', OwnerID='Steam_%s', "
+        "PlayerName='%s', ClientNumber='1'" % (entity_id, steam_id, entity_id, steam_id, name)
+    )
+
+
+def level_line(name, steam_id, new_level):
+    return "[PrismaCore]playerLeveled: %s (Steam_%s) made level %s (was %s)" % (name, steam_id, new_level, new_level - 1)
+
+
+def vote_line(name, entity_id, steam_id):
+    return "Chat (from 'Steam_%s', entity id '%s', to 'Global'): '%s': /vote" % (steam_id, entity_id, name)
+
+
+def expect_for(line):
+    m = LEVEL_RE.search(line)
+    if m:
+        return [("levelgain", m.group(1).strip())]
+    if "Chat handled by mod" not in line:
+        m = VOTE_CHAT_RE.search(line)
+        if m:
+            return [("vote", m.group(1)), ("reward", m.group(1))]
+    return []
+
+
+def _players(n):
+    return [("Bench%02d" % i, str(1000 + i), str(PLATFORM_BASE + i)) for i in range(n)]
+
+
+def _noise(rng, t, players):
+    tpl = rng.choice(NOISE)
+    return tpl.format(m=t / 60.0, p=players, e=rng.randint(2000, 90000), k=rng.randint(1000, 1100))
+
+
+def synthetic_monitor(players=20, levelups=200, noise_per_event=10, interval=0.05, seed=1):
+    """Spawns, then level-ups (and zombie counter bumps) interleaved with noise,
+    then disconnects. interval is the spacing between lines at speed 1."""
+    rng = random.Random(seed)
+    roster = _players(players)
+    levels = {name: 1 for name, _, _ in roster}
+    kills = {name: 0 for name, _, _ in roster}
+    lines = []
+    t = 0.0
+
+    def add(line):
+        nonlocal t
+        lines.append((t, line, expect_for(line)))
+        t += interval
+
+    for name, eid, sid in roster:
+        add(spawn_line(name, eid, sid))
+    for _ in range(levelups):
+        for _ in range(noise_per_event):
+            add(_noise(rng, t, players))
+        name, eid, sid = rng.choice(roster)
+        levels[name] += 1
+        add(level_line(name, sid, levels[name]))
+        kills[name] += rng.randint(1, 15)
+        add("#bench kills %s %s" % (name, kills[name]))
+    for name, eid, sid in roster:
+        add(disconnect_line(name, eid, sid))
+    return lines
+
+
+def synthetic_voting(players=10, noise_per_event=20, interval=0.05, seed=1):
+    """Each player spawns and types /vote once, with noise in between."""
+    rng = random.Random(seed)
+    roster = _players(players)
+    lines = []
+    t = 0.0
+
+    def add(line):
+        nonlocal t
+        lines.append((t, line, expect_for(line)))
+        t += interval
+
+    for name, eid, sid in roster:
+        add(spawn_line(name, eid, sid))
+    for name, eid, sid in roster:
+        for _ in range(noise_per_event):
+            add(_noise(rng, t, players))
+        add(vote_line(name, eid, sid))
+    return lines
+
+
+def from_console_log(path):
+    """Replay a captured server log / telnet transcript with its own timing."""
+    lines = []
+    t0 = None
+    offset = 0.0
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            if not line:
+                continue
+            m = CONSOLE_TS_RE.match(line)
+            if m:
+                ts = datetime.strptime(m.group(1), "%Y-%m-%dT%H:%M:%S").timestamp()
+                t0 = ts if t0 is None else t0
+                offset = ts - t0
+                # the fake console stamps lines with the replay time
+                line = line[m.end():]
+                line = re.sub(r"^\d+\.\d+ [A-Z]{3} ", "", line)
+            lines.append((offset, line, expect_for(line)))
+    return lines
+
+
+# service log message -> console event
+_SERVICE_PATTERNS = [
+    (re.compile(r"Player (.+?) spawned, warming up connection"), "spawn"),
+    (re.compile(r"Player spawned: (.+?) \(entity (\d+)\)"), "spawn"),
+    (re.compile(r"Player disconnected: (.+)$"), "disconnect"),
+    (re.compile(r"Vote command detected from (.+?) \(Steam ID: (\d+)\)"), "vote"),
+    (re.compile(r"PrismaCore level-up detected: (.+) (\d+)->(\d+)"), "level"),
+]
+
+
+def from_service_log(path):
+    """Rebuild spawn / disconnect / level-up / vote console lines from the
+    events our services logged (their timestamps give the replay timing)."""
+    events = []
+    steam_ids = {}
+    entity_ids = {}
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for raw in f:
+            m = SERVICE_TS_RE.match(raw)
+            if not m:
+                continue
+            ts = datetime.strptime(m.group(1), "%Y-%m-%d %H:%M:%S").timestamp() + int(m.group(2)) / 1000.0
+            for rx, kind in _SERVICE_PATTERNS:
+                mm = rx.search(raw)
+                if mm:
+                    events.append((ts, kind, mm.groups()))
+                    if kind == "vote":
+                        steam_ids.setdefault(mm.group(1), mm.group(2))
+                    break
+
+    def ids(name):
+        if name not in steam_ids:
+            steam_ids[name] = str(PLATFORM_BASE + 500 + len(steam_ids))
+        if name not in entity_ids:
+            entity_ids[name] = str(2000 + len(entity_ids))
+        return entity_ids[name], steam_ids[name]
+
+    lines = []
+    t0 = events[0][0] if events else 0.0
+    for ts, kind, groups in events:
+        name = groups[0].strip()
+        if kind == "spawn" and len(groups) > 1:
+            entity_ids.setdefault(name, groups[1])
+        eid, sid = ids(name)
+        if kind == "spawn":
+            line = spawn_line(name, eid, sid)
+        elif kind == "disconnect":
+            line = disconnect_line(name, eid, sid)
+        elif kind == "vote":
+            line = vote_line(name, eid, sid)
+        else:
+            line = level_line(name, sid, int(groups[2]))
+        lines.append((ts - t0, line, expect_for(line)))
+    return lines
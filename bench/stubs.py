@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+stubs.py - local stand-ins for the HTTP services the Python scripts call
+
+StubQuestServer   working_server.js: /health, /update-quest, /update-quests-batch (eventIds applied once),
+                  /external-heartbeat
+StubVoteApi       7daystodie-servers.com/api/: vote status, claim, vote history
+
+Both record every request with its arrival time and can add artificial
+latency (latency_ms) or fail a share of requests (fail_rate) to exercise the
+retry paths.
+
+Standalone:
+    python bench/stubs.py --quest-port 3000 --vote-port 8099
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _StubServer:
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, fail_rate=0.0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+        self.requests = []  # (ts, method, path, body)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                pass
+
+            def _reply(self, status, body, content_type="application/json"):
+                data = body if isinstance(body, bytes) else body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _dispatch(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else None
+                except ValueError:
+                    body = None
+                ts = time.time()
+                with stub.lock:
+                    stub.requests.append((ts, method, self.path, body))
+                if stub.latency_ms:
+                    time.sleep(stub.latency_ms / 1000.0)
+                status, reply, ctype = stub.handle(ts, method, urlparse(self.path), body)
+                self._reply(status, reply, ctype)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+
+    @property
+    def url(self):
+        return "http://%s:%s" % (self.host, self.port)
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _fail(self):
+        return self.fail_rate and random.random() < self.fail_rate
+
+    def handle(self, ts, method, url, body):
+        raise NotImplementedError
+
+
+class StubQuestServer(_StubServer):
+    """on_update(ts, update_dict) is called for every (batched) quest update."""
+
+    def __init__(self, *args, on_update=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_update = on_update
+        self.progress = {}  # (playerName, questType) -> progress
+        self.updates = 0
+        self.applied = set()  # eventIds, as working_server.js v15.11
+        self.duplicates = 0
+        self.heartbeats = 0
+
+    def _apply(self, ts, upd):
+        if self.on_update:
+            self.on_update(ts, upd)
+        key = (upd.get("playerName"), upd.get("questType"))
+        events = upd.get("events")
+        if not events and upd.get("eventId"):
+            events = [{"id": upd["eventId"], "increment": upd.get("increment")}]
+        with self.lock:
+            self.updates += 1
+            if events:
+                fresh = [e for e in events if e.get("id") not in self.applied]
+                if not fresh:
+                    self.duplicates += 1
+                    return {"success": True, "duplicate": True, "questData": None}
+                self.applied.update(e["id"] for e in fresh)
+                inc = sum(int(e.get("increment") or 1) for e in fresh)
+            else:
+                inc = int(upd.get("increment") or 1)
+            self.progress[key] = self.progress.get(key, 0) + inc
+            progress = self.progress[key]
+        return {"success": True, "questData": {"progress": progress, "target": 999999}}
+
+    def handle(self, ts, method, url, body):
+        if url.path == "/health":
+            return 200, json.dumps({"status": "ok", "authenticated": True}), "application/json"
+        if self._fail():
+            return 503, json.dumps({"success": False, "error": "stub failure"}), "application/json"
+        if url.path == "/update-quest" and method == "POST":
+            return 200, json.dumps(self._apply(ts, body or {})), "application/json"
+        if url.path == "/update-quests-batch" and method == "POST":
+            results = [self._apply(ts, u) for u in (body or {}).get("updates", [])]
+            return 200, json.dumps({"success": True, "results": results}), "application/json"
+        if url.path == "/external-heartbeat" and method == "POST":
+            with self.lock:
+                self.heartbeats += 1
+            return 200, json.dumps({"success": True}), "application/json"
+        return 404, json.dumps({"success": False, "error": "not found"}), "application/json"
+
+
+class StubVoteApi(_StubServer):
+    """
+    initial_status: what an unknown steam id reports - 0 (not voted) or
+    1 (voted, not claimed). Claiming switches the id to 2.
+    """
+
+    def __init__(self, *args, initial_status=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.initial_status = initial_status
+        self.status = {}  # steamid -> 0/1/2
+        self.vote_ts = {}  # steamid -> epoch
+
+    def set_status(self, steam_id, status):
+        with self.lock:
+            self.status[str(steam_id)] = status
+            if status:
+                self.vote_ts.setdefault(str(steam_id), int(time.time()))
+
+    @property
+    def url(self):
+        return "http://%s:%s/api/" % (self.host, self.port)
+
+    def handle(self, ts, method, url, body):
+        if self._fail():
+            return 500, "error", "text/plain"
+        qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+        steam_id = qs.get("steamid", "")
+        if qs.get("object") == "servers" and qs.get("element") == "votes":
+            with self.lock:
+                votes = [{"steamid": sid, "utc timestamp": t, "claimed": int(self.status.get(sid) == 2)}
+                         for sid, t in self.vote_ts.items()]
+            return 200, json.dumps({"votes": votes}), "application/json"
+        if qs.get("object") == "votes" and qs.get("element") == "claim":
+            with self.lock:
+                status = self.status.get(steam_id, self.initial_status)
+                if status:
+                    self.vote_ts.setdefault(steam_id, int(ts))
+                if qs.get("action") == "post":
+                    if status == 1:
+                        self.status[steam_id] = 2
+                        return 200, "1", "text/plain"
+                    return 200, "0", "text/plain"
+            return 200, str(status), "text/plain"
+        return 404, "0", "text/plain"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stub quest server + vote API")
+    ap.add_argument("--quest-port", type=int, default=3000)
+    ap.add_argument("--vote-port", type=int, default=8099)
+    ap.add_argument("--latency-ms", type=int, default=0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    quest = StubQuestServer(port=args.quest_port, latency_ms=args.latency_ms, fail_rate=args.fail_rate).start()
+    vote = StubVoteApi(port=args.vote_port, latency_ms=args.latency_ms, fail_rate=args.fail_rate).start()
+    print("Stub quest server: %s" % quest.url)
+    print("Stub vote API:     %s" % vote.url)
+    try:
+        while True:
+            time.sleep(10)
+            print("quest updates=%s vote requests=%s" % (quest.updates, len(vote.requests)))
+    except KeyboardInterrupt:
+        quest.stop()
+        vote.stop()
+
+
+if __name__ == "__main__":
+    main()
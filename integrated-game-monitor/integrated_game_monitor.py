@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-integrated_game_monitor.py - v18
+integrated_game_monitor.py - v43
 
 Features:
 - Stable telnet connection with single-flight listplayers (no concurrent runs)
@@ -12,6 +12,315 @@ Features:
 - Handles PrismaCore "[PrismaCore]playerLeveled" directly (reliable)
 - ALSO keeps listplayers diff as a fallback, but now with DEDUPLICATION so levelgain won't double increment
 
+v43 changes (from v42):
+- The questTracker_external_kills_at / _time_at heartbeats are refreshed
+  every QUEST_HEARTBEAT_INTERVAL_SECONDS while the telnet session is up
+  (POST /external-heartbeat, working_server.js v15.12), not only by batches
+  that carried zombiekills / timespent. A quiet stretch without kills no
+  longer made questTrackerKills.js fall back to its event scan and count the
+  kills the monitor pushed a second time.
+
+v42 changes (from v41):
+- pm2 and givexp address the player by entity id (online roster), else by
+  platform id (Steam_/XBL_/EOS_), else by the quoted display name
+  (../shared/bohemia_addressing.py). Names with spaces or quotes used to be
+  sent unquoted and the command silently went nowhere.
+- The console output is checked: a "... not found" / "*** ERROR" line after
+  the command's echo means rejected, and the next way to address the player
+  is tried. A /catchup whose givexp was rejected every time says so instead
+  of "Catchup applied!". Outcomes: bohemia_command_outcomes_total{server,
+  verb,result}.
+- Entity ids come from spawn lines and listplayers and are forgotten when
+  the telnet session ends.
+- With LOG_TAIL_ENABLED and LOG_TAIL_MUTE_TELNET_LOGS the echo never comes
+  over telnet, so nothing is checked or waited for: the first way to address
+  the player is used and the outcome counts as "sent".
+
+v41 changes (from v40):
+- Per-player /catchup admission (../shared/bohemia_admission.py): a token
+  bucket per Steam id (CATCHUP_ADMISSION_BURST, then one per
+  CATCHUP_ADMISSION_REFILL_SECONDS). A rejected /catchup skips the level
+  scan and sends at most one PM per rejection streak: the refusal the last
+  admitted one got, or CATCHUP_RATE_LIMITED_MESSAGE.
+  Counted in bohemia_chat_commands_shed_total{server,command,reply}; /health
+  includes the admission stats ("admission").
+
+v40 changes (from v39):
+- PrismaCore level-ups of one player are coalesced for
+  LEVELGAIN_COALESCE_SECONDS from the first one and sent as one levelgain
+  update (10->11->12->13 is one +3 update instead of three). The level cache
+  is still raised at once, so listplayers never sees them again.
+  Merged transitions: bohemia_levelups_coalesced_total.
+- PrismaCore level-ups no longer nudge listplayers (PrismaCore is
+  authoritative); "XP gained during the last level" lines only do where
+  PrismaCore has not reported a level recently.
+- /catchup no longer sleeps on the handler thread.
+
+v39 changes (from v38):
+- Every quest update carries an eventId ("<server>:<questType>:<player
+  id>:<detail>": level range for level gains, kill counter range for kill
+  deltas, flush time for playtime). The quest server (working_server.js
+  v15.11) applies each id once and answers a repeat with duplicate: true.
+- A network error or 5xx is retried once right away with the same eventId
+  (QUEST_UPDATE_ATTEMPTS) before the update goes to the outbox.
+- Outbox entries merged for one player/quest keep the ids of the updates
+  they absorbed ("events": [{id, increment}]), so a retry of a merged entry
+  skips the parts that already got through.
+- Failed items of a playtime batch go to the outbox like other updates
+  instead of being added back to the unsent playtime.
+
+v38 changes (from v37):
+- Bounded, prioritized event queue between the telnet reader and
+  handle_line() (../shared/bohemia_events.py). The reader only splits and
+  classifies lines (classify_line, substring checks); a "<id>:events" thread
+  handles /catchup, PrismaCore level-ups, spawns and disconnects first, then
+  other chat and XP messages, then the rest. Under a log storm low-value
+  lines are sampled and then shed; high-value ones never are.
+  EVENT_QUEUE_CAPACITY / EVENT_QUEUE_SAMPLE_EVERY.
+- Lines found in listplayers output and the LogTailer go through the same
+  queue.
+- Metrics: bohemia_events_shed_total{category,reason},
+  bohemia_event_queue_depth{priority}, bohemia_event_queue_wait_seconds;
+  /health on the read API includes the queue stats ("events").
+
+v37 changes (from v36):
+- Cold start no longer loads everything before the telnet connect: the state
+  store, levels, identities, monitor state, kill baselines, playtime and the
+  outbox load in the background ("<id>:state-load") while the port is probed
+  and the login runs. The reader waits for it (state_ready) only if it is not
+  done by then.
+- After the login, the quest server check ("<id>:quest-check") and the
+  warm-up + roster sync ("<id>:warmup") run side by side; the 10s /health
+  timeout no longer delays the first listplayers.
+- requests is imported on the first quest server call (the largest part of
+  the module's import time), off the start-up path.
+- Start-up phase timings (imports, state, login, reader, quest_health,
+  roster) are logged once, exported as bohemia_startup_phase_seconds and
+  returned as "startup" (plus "ready") by /health on the read API.
+
+v36 changes (from v35):
+- Quest server health is passive: every live request feeds QuestHealth (EWMA
+  of success rate and latency, failures in a row). /health is only probed
+  while degraded ("<id>:quest-health" job, QUEST_HEALTH_PROBE_INTERVAL_SECONDS).
+- Quest updates are never dropped while the quest server is degraded or a
+  send fails: level-ups from PrismaCore and listplayers, kill deltas and the
+  reconcile batch all go to the outbox (the retry queue). Queued updates for
+  the same player and quest are merged into one increment.
+- The outbox is drained in batches (OUTBOX_BATCH_SIZE per request) as soon
+  as the server recovers, and every RETRY_FLUSH_INTERVAL_SECONDS otherwise.
+  "<id>:outbox" and "<id>:quest-health" run for the process lifetime, not
+  per telnet session, so the quest backlog drains while the game server is
+  down too.
+- Metrics: bohemia_quest_server_healthy,
+  bohemia_quest_server_latency_ewma_seconds, bohemia_quest_server_success_rate,
+  bohemia_quest_server_health_changes_total, bohemia_quest_outbox_total{reason}.
+
+v35 changes (from v34):
+- Periodic work runs as named jobs on one JobScheduler per process
+  (../shared/bohemia_jobs.py: a timer heap on one thread plus a small worker
+  pool) instead of a "while self.tn: sleep()" daemon thread per task. Those
+  threads never exited, so every reconnect started another set of listplayers
+  / quest health / retry flush / playtime flush loops.
+- Jobs per server: "<id>:listplayers" (AdaptivePoller interval; a nudge moves
+  it up by LISTPLAYERS_NUDGE_SETTLE_SECONDS), "<id>:quest-health"
+  (QUEST_HEALTH_CHECK_INTERVAL_SECONDS), "<id>:retry-flush",
+  "<id>:playtime-flush" and the one-shot "<id>:warmup". They belong to the
+  telnet session and are cancelled when it ends; fixed intervals get
+  +/- JOB_JITTER so servers don't fire together.
+- Per-job run time and results: bohemia_job_seconds / bohemia_job_runs_total
+  and GET /jobs on the read API.
+
+v34 changes (from v33):
+- Player levels, identities, legacy steam ids and the levelgain dedupe cache
+  live in one PlayerState: readers get an immutable versioned snapshot without
+  locking, writers are serialized and publish a new version (copy-on-write).
+  save_player_levels, the monitor state file and the read API serialize a
+  snapshot, so a concurrent level-up can no longer break json.dump or be lost.
+  The read API reports the snapshot as "stateVersion".
+- Levelgain dedupe is check-and-mark in one step (PlayerState.claim_levelgain),
+  so the reader and the updates thread can't both credit the same transition.
+- listplayers_lock now only covers the console read and applying it; quest
+  updates and kill delta batches are sent after it is released (reconnect
+  reconcile too).
+- Reconcile: a single deferred PrismaCore level-up no longer dedupes its own
+  batch entry away (transition keys are marked after the batch claims).
+
+v33 changes (from v32):
+- Several game servers in one process: SERVERS (or the JSON list in
+  MONITOR_SERVERS_FILE) defines id/host/port/password plus optional Takaro
+  game_server_id and log_dir per server; MonitorHub runs one IntegratedMonitor
+  pipeline (telnet session, command scheduler, watchdog, reconnect) per server.
+- Shared across servers: one quest server requests.Session (connection pool),
+  the profiler and the read API / metrics endpoint.
+- State is namespaced per server: the server with id DEFAULT_SERVER_ID keeps
+  the legacy files, others use "<file>.<id>.<ext>" (state DB, levels, retry
+  queue, monitor state, kill baselines, playtime, log tail checkpoint); only
+  the default server imports the legacy JSON files into its DB.
+- Quest updates of a server with game_server_id carry "gameServerId"
+  (working_server.js v15.10 routes them to that Takaro game server).
+- Read API: GET /servers lists the servers; /servers/<id>/players,
+  /servers/<id>/changes, /servers/<id>/health address one server, the old
+  paths serve the default one. Per-connection metrics have a "server" label
+  and with more than one server every log line is prefixed with "[<id>]".
+
+v32 changes (from v31):
+- Fast reconnect (../shared/bohemia_reconnect.py): instead of doubling a sleep
+  from 30s up to 480s, run() probes the telnet port with a plain TCP connect
+  at short jittered intervals (RECONNECT_BASE_DELAY_SECONDS ..
+  RECONNECT_MAX_DELAY_SECONDS) and logs in as soon as it accepts, so a routine
+  game-server restart costs seconds of monitoring instead of minutes.
+  Downtime per reconnect is exported as bohemia_telnet_downtime_seconds.
+- connect() returns right after "Logon successful" (no fixed sleeps); the
+  version warm-up, quest server health check and reconnect reconcile run in
+  the background, so the reader resumes immediately. Level-ups seen before the
+  reconcile finishes are deferred into it as before.
+- Console lines that arrive while listplayers output is being read (the
+  listplayers read consumes them from the socket) are passed on to
+  handle_line() instead of being dropped with the response.
+
+v31 changes (from v30):
+- Dead telnet sessions are detected within a bounded time
+  (../shared/bohemia_watchdog.py): TCP keepalive + TCP_USER_TIMEOUT on the
+  socket, and a StallWatchdog that tracks the time since the last byte and
+  since the last unanswered command. After WATCHDOG_QUIET_SECONDS without a
+  byte it sends a "version" probe; a command without any reply for
+  WATCHDOG_RESPONSE_TIMEOUT_SECONDS, or a failed write, shuts the socket down
+  and stops the reader via session_stop, so run() reconnects at once.
+  Previously only an exception containing "connection closed" ended a
+  session, and a half-open connection could go unnoticed for a long time.
+
+v30 changes (from v29):
+- On-demand profiling without a restart (../shared/bohemia_profiler.py):
+  kill -USR1 <pid> writes a thread stack dump, a sampling CPU profile
+  (per-thread CPU seconds, top functions, collapsed stacks for flamegraphs)
+  and a tracemalloc diff over PROFILE_SECONDS into PROFILE_DIR; kill -USR2
+  writes the stack dump only. GET /debug/profile?kind=all|cpu|mem|stacks&seconds=N
+  on the read API does the same.
+
+v29 changes (from v28):
+- Prometheus-style metrics (../shared/bohemia_metrics.py), served as
+  GET /metrics on the read API: lines read and handle_line() time, console
+  commands by verb/priority/result with queue wait and write time, tn_lock /
+  reconcile_lock wait time, quest server request latency and status codes,
+  update_player_levels duration, listplayers outcomes, level-ups by source,
+  telnet connects/disconnects, retry queue / command queue / log queue depth,
+  dropped log records and process CPU / RSS / threads.
+
+v28 changes (from v27):
+- Quest server URL is configurable (QUEST_SERVER_URL / env
+  MONITOR_QUEST_SERVER_URL) so the monitor can run against the local stubs in
+  bench/ (fake console, stub quest server, replay + benchmarks).
+
+v27 changes (from v26):
+- Local read-only HTTP API (READ_API_HOST:READ_API_PORT, optionally also a Unix
+  socket READ_API_SOCKET) serving the cached live player state, so consumers
+  no longer need their own listplayers / Takaro round-trips:
+    GET /players             roster, levels, identities, entity ids, last seen
+    GET /players/<name>      one player
+    GET /changes?since=V&timeout=S   long-poll change feed (names changed since V)
+    GET /health
+  Every change (roster, level, identity) bumps a version; responses carry
+  ETag "<version>" and If-None-Match returns 304.
+
+v26 changes (from v25):
+- Levels, player identities (+ entity id / last seen) and the quest retry queue
+  live in the shared SQLite store (../shared/bohemia_state.py, WAL mode,
+  STATE_DB_FILE) instead of players_levels.json / quest_retry_queue.json.
+  Writes are incremental: only changed levels, one row per retry item.
+- The JSON files are imported once on first start; with USE_STATE_DB = False or
+  when the store cannot be opened the old JSON files are used as before.
+
+v25 changes (from v24):
+- Local playtime tracking (PlaytimeTracker): online intervals are opened/closed
+  from spawn/disconnect lines, corrected by listplayers, closed when the telnet
+  session is lost, and checkpointed to PLAYTIME_STATE_FILE so a monitor restart
+  does not lose unsent time.
+- Accrued playtime is sent every PLAYTIME_FLUSH_INTERVAL_SECONDS as ONE
+  /update-quests-batch of whole minutes (questType timespent, increment in ms,
+  notify=complete). The sub-minute remainder stays local; failed items go back
+  into the pending pool. Time is split at the Prague day boundary so it is
+  never credited to the wrong daily quest.
+- The quest server records a heartbeat for timespent batches; while it is fresh
+  questTrackerTime.js and the playerDisconnect hook leave timespent progress to
+  the monitor (unkillable is still tracked there).
+
+v24 changes (from v23):
+- Zombie kills are now pushed from listplayers: the cumulative "zombies=" counter
+  of every row is compared with a persisted per-player baseline
+  (KILL_BASELINES_FILE) and the deltas are sent as ONE /update-quests-batch per
+  poll (questType zombiekills, createIfMissing=false so inactive quests are not
+  created, notify=complete so players only get a PM on completion).
+- Baselines older than KILL_BASELINE_MAX_AGE_SECONDS, counter decreases and
+  implausible jumps (> KILL_DELTA_MAX) re-baseline instead of crediting.
+- The quest server records a heartbeat for these batches; questTrackerKills.js
+  then skips zombiekills and stops paging entity-killed events for players with
+  no other open kill quest (it remains the fallback when the monitor is down).
+- update_quest()/retry queue carry extra payload fields (createIfMissing, notify).
+
+v23 changes (from v22):
+- Logging no longer writes synchronously from the hot threads. Records are put
+  on a bounded queue (NonBlockingQueueHandler, never blocks, drops + counts when
+  full) and a QueueListener thread formats them and writes to a size-rotated
+  file (LOG_MAX_BYTES x LOG_BACKUP_COUNT) and stderr.
+- High-volume categories have their own loggers (monitor.telnet,
+  monitor.listplayers, monitor.commands) and are rate-limited by SamplingFilter
+  (LOG_SAMPLE_LIMITS); suppressed counts are reported with the next record.
+- Default level is INFO (was DEBUG). Levels can be changed at runtime through
+  LOG_LEVELS_FILE (re-read every LOG_LEVELS_POLL_SECONDS, or at once on SIGHUP).
+- Logging is configured in main() (setup_logging) instead of at import time.
+
+v22 changes (from v21):
+- Reconnect reconciliation: connect() now runs reconcile_after_reconnect()
+  instead of a plain forced update_player_levels(). It compares the persisted
+  last-known state (players_levels, online set, last processed event time in
+  MONITOR_STATE_FILE) with a fresh listplayers snapshot plus the PrismaCore
+  level-ups the log tail delivered while we were disconnected, and sends
+  exactly the missing increments as ONE /update-quests-batch request.
+- While a reconcile is pending, PrismaCore level-ups are deferred into that
+  batch instead of being sent one by one.
+- The levelgain dedupe cache is persisted, and PrismaCore level-ups at or below
+  the cached (already credited) level are skipped, so replayed log lines and
+  multi-level listplayers diffs can no longer be counted twice.
+
+v21 changes (from v20):
+- Optional log-file ingestion (LOG_TAIL_ENABLED): LogTailer follows the dedicated
+  server log (/home/steam/logs/server_*.log) with inotify, keeps a byte-offset
+  checkpoint (path + inode + offset) and handles rotation to a new server log and
+  truncation. It feeds the same handle_line() the telnet reader uses, so no
+  chat / PrismaCore / spawn events are lost across telnet reconnects, and after a
+  restart it replays from the last checkpoint.
+- In log-tail mode telnet is only used for commands: its output is drained but
+  not parsed, and (LOG_TAIL_MUTE_TELNET_LOGS) "loglevel ALL false" stops the
+  server from streaming its log over the telnet session at all.
+- Per-line processing moved out of monitor_chat() into handle_line().
+
+v20 changes (from v19):
+- listplayers polling is now adaptive (AdaptivePoller) instead of a fixed 60s:
+  rare when the server is empty, relaxed when PrismaCore already gave fresh
+  level data for every online player, frequent only around join/leave bursts.
+- Online players are tracked from PlayerSpawnedInWorld / "Player disconnected"
+  lines; listplayers only reconciles that roster.
+- XP-message and PrismaCore refreshes no longer call update_player_levels on the
+  reader thread (and no longer sleep there); they nudge the poller instead, and
+  the nudge is ignored while every online player's level is already fresh.
+- PrismaCore level-ups now update players_levels directly, so a later
+  listplayers diff can't re-credit the same levels under a different key.
+- The listplayers read window ends as soon as the "Total of N in the game"
+  footer arrives instead of always waiting the full 2.2s, and an empty server
+  ("Total of 0") is recognised instead of being treated as a useless response.
+
+v19 changes (from v18):
+- All console writes (pm2, givexp, listplayers, version warm-up) now go through a
+  single CommandScheduler instead of being written directly by whichever thread
+  called send_command. Commands are served by priority class
+  (interactive > reward > poll > broadcast) and paced by a token bucket
+  (COMMAND_RATE_PER_SECOND / COMMAND_BURST), so reward bursts can no longer
+  flood the console or delay /catchup replies.
+- Duplicate pending listplayers requests are coalesced into one write.
+- Per-class queue wait times are logged every COMMAND_STATS_LOG_INTERVAL_SECONDS.
+- send_command no longer sleeps + read_very_eager() after each write; that
+  discarded chat lines arriving in the same window. Pacing is the bucket's job now.
+
 v18 changes (from v17):
 - Skip listplayers rows where player_name is empty or the literal placeholder
   "EntityPlayer" (a transient server-internal name used before the real player
@@ -33,27 +342,105 @@ v15 changes (from v14):
 - Add levelgain dedupe cache so PrismaCore + listplayers won't double-count the same level-up.
 """
 
-import telnetlib
 import time
+
+_PROCESS_START = time.monotonic()  # start-up phases are timed from here
+
+import telnetlib
 import threading
 import re
 import os
+import sys
 import json
 import logging
-import requests
-from collections import deque
+import socket
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+from datetime import datetime
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+# shared SQLite state store lives in <repo>/shared
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+try:
+    from bohemia_state import StateStore
+except ImportError:
+    StateStore = None
+import bohemia_logging
+import bohemia_metrics as metrics
+from bohemia_addressing import CommandOutcomes, player_targets, send_to_player
+from bohemia_admission import CommandAdmission
+from bohemia_commands import (
+    CMD_PRIORITY_INTERACTIVE,
+    CMD_PRIORITY_POLL,
+    CMD_PRIORITY_REWARD,
+    CommandScheduler,
+)
+from bohemia_events import HIGH, LOW, NORMAL, EventQueue
+from bohemia_jobs import JobScheduler
+from bohemia_logtail import LogTailer
+from bohemia_profiler import Profiler
+from bohemia_reconnect import ReconnectManager
+from bohemia_watchdog import StallWatchdog, enable_keepalive
+
+_IMPORT_SECONDS = time.monotonic() - _PROCESS_START
 
 # --------------------- logging ---------------------
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("/home/steam/7D2DBohemia/integrated-game-monitor/integrated_monitor.log"),
-        logging.StreamHandler(),
-    ],
-)
-logger = logging.getLogger(__name__)
+LOG_FILE = "/home/steam/7D2DBohemia/integrated-game-monitor/integrated_monitor.log"
+LOG_LEVEL = os.environ.get("MONITOR_LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = 20 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000
+
+# runtime level overrides, e.g. {"monitor": "DEBUG", "monitor.telnet": "WARNING"}
+LOG_LEVELS_FILE = "/home/steam/7D2DBohemia/integrated-game-monitor/log_levels.json"
+LOG_LEVELS_POLL_SECONDS = 30
+
+# high-volume categories: logger name -> (max records, per seconds)
+LOG_SAMPLE_LIMITS = {
+    "monitor.telnet": (30, 60),
+    "monitor.listplayers": (10, 60),
+    "monitor.commands": (30, 60),
+}
+
+logger = logging.getLogger("monitor")
+telnet_log = logging.getLogger("monitor.telnet")
+listplayers_log = logging.getLogger("monitor.listplayers")
+commands_log = logging.getLogger("monitor.commands")
+
+
+_log_listener = None
+
+
+def setup_logging(server_tags=False):
+    """Queue-based logging (../shared/bohemia_logging.py) with this service's
+    file, sampling and level settings. server_tags prefixes every message
+    with the server id (more than one server configured)."""
+    global _log_listener
+    if _log_listener is not None:
+        return
+    queue_handler, _log_listener = bohemia_logging.setup_logging(
+        LOG_FILE,
+        LOG_LEVEL,
+        LOG_MAX_BYTES,
+        LOG_BACKUP_COUNT,
+        LOG_QUEUE_SIZE,
+        LOG_SAMPLE_LIMITS,
+        LOG_LEVELS_FILE,
+        LOG_LEVELS_POLL_SECONDS,
+        server_tags=server_tags,
+    )
+    M_LOG_DROPPED.set_function(lambda: queue_handler.dropped)
+    M_LOG_QUEUE_DEPTH.set_function(queue_handler.queue.qsize)
+
 
 # --------------------- config ---------------------
 
@@ -61,13 +448,42 @@ HOST = "91.99.236.133"
 PORT = 8081
 PASSWORD = "ferPa932"
 
+QUEST_SERVER_URL = os.environ.get("MONITOR_QUEST_SERVER_URL", "http://localhost:3000")
+
+# Every 7D2D server this process monitors; each gets its own telnet pipeline.
+# "id" namespaces state files, metrics, log lines and read API routes
+# (/servers/<id>/...); the server with id DEFAULT_SERVER_ID keeps the legacy
+# state file names and the un-prefixed routes. Optional keys:
+#   game_server_id  Takaro gameServerId sent to the quest server (None = its default)
+#   log_dir         SERVER_LOG_DIR of this server (log tailing)
+# MONITOR_SERVERS_FILE (a JSON list of the same dicts) replaces this list.
+DEFAULT_SERVER_ID = "main"
+SERVERS = [
+    {"id": DEFAULT_SERVER_ID, "host": HOST, "port": PORT, "password": PASSWORD, "game_server_id": None},
+]
+SERVERS_FILE = os.environ.get("MONITOR_SERVERS_FILE")
+SERVER_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,32}$")
+
 # Private message channel name required by pm2 syntax: pm2 <channel> <player> <text>
 PM_CHANNEL = "Brewer"
 
 LEVELS_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/players_levels.json"
 
-# listplayers polling interval
-LISTPLAYERS_POLL_SECONDS = 60
+# levels / identities / retry queue in the shared SQLite store (JSON files above
+# and RETRY_QUEUE_FILE are only used as fallback and for the one-time import)
+USE_STATE_DB = True
+STATE_DB_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/bohemia_state.db"
+
+# adaptive listplayers polling (see AdaptivePoller)
+LISTPLAYERS_POLL_SECONDS = 60  # players online, some level data stale
+LISTPLAYERS_IDLE_POLL_SECONDS = 900  # nobody online
+LISTPLAYERS_QUIET_POLL_SECONDS = 300  # every online player has fresh PrismaCore level data
+LISTPLAYERS_BURST_POLL_SECONDS = 15  # right after joins/leaves
+LISTPLAYERS_BURST_WINDOW_SECONDS = 120
+PRISMACORE_LEVEL_FRESH_SECONDS = 600
+
+# delay between a nudge (XP message etc.) and the listplayers it triggers
+LISTPLAYERS_NUDGE_SETTLE_SECONDS = 0.4
 
 # prevent XP-triggered refresh from racing with periodic poll / startup scan
 LISTPLAYERS_COOLDOWN_SECONDS = 8.0
@@ -82,12 +498,324 @@ LISTPLAYERS_MIN_USEFUL_CHARS = 120
 # dedupe window for levelgain updates (PrismaCore handler + listplayers diff)
 LEVELGAIN_DEDUPE_TTL_SECONDS = 180
 
+# PrismaCore level-ups of one player within this window (from the first one)
+# are sent as one levelgain update (10->11->12 becomes 10->12, +2)
+LEVELGAIN_COALESCE_SECONDS = 5.0
+
+# --- scheduled jobs (one JobScheduler per process, ../shared/bohemia_jobs.py) ---
+# interval jobs are spread by +/- this fraction of their interval
+JOB_JITTER = 0.1
+# worker threads per server (job bodies; the timer itself is one thread)
+JOB_WORKERS_PER_SERVER = 3
+
+# --- reader -> handler event queue (../shared/bohemia_events.py) ---
+# lines waiting for handle_line(); commands, level-ups and spawns are never shed
+EVENT_QUEUE_CAPACITY = 2000
+# above half the capacity only every Nth low-value line is handled
+EVENT_QUEUE_SAMPLE_EVERY = 10
+
+# --- per-player /catchup admission (../shared/bohemia_admission.py) ---
+# a burst of CATCHUP_ADMISSION_BURST, then one per refill interval per Steam
+# id; over the limit the last reply is sent again (once per streak)
+CATCHUP_ADMISSION_BURST = 2
+CATCHUP_ADMISSION_REFILL_SECONDS = 30.0
+CATCHUP_RATE_LIMITED_MESSAGE = "Please wait a moment before typing /catchup again."
+
+# --- quest server health (passive, from live request outcomes) ---
+# EWMA weight of the newest request for success rate and latency
+QUEST_HEALTH_EWMA_ALPHA = 0.2
+# degraded after this many failures in a row, or below this success rate
+QUEST_HEALTH_DEGRADE_FAILURES = 2
+QUEST_HEALTH_MIN_SUCCESS_RATE = 0.5
+# /health is only probed while degraded, this often
+QUEST_HEALTH_PROBE_INTERVAL_SECONDS = 10
+# outbox items sent per /update-quests-batch while draining
+OUTBOX_BATCH_SIZE = 50
+
 # --- optional retry queue for quest updates ---
 ENABLE_RETRY_QUEUE = True
 RETRY_QUEUE_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/quest_retry_queue.json"
 RETRY_FLUSH_INTERVAL_SECONDS = 60
 RETRY_MAX_ITEMS = 500
 RETRY_MAX_AGE_SECONDS = 6 * 60 * 60  # 6h
+# quest updates carry an eventId (working_server.js v15.11 applies each id
+# once), so a timed-out update can be sent again at once without risking a
+# double increment
+QUEST_UPDATE_ATTEMPTS = 2
+QUEST_UPDATE_RETRY_DELAY_SECONDS = 0.5
+# while the telnet session is up, tell the quest server every this often that
+# zombiekills / timespent are pushed by the monitor (the cronjobs treat the
+# heartbeat as stale after 10 / 5 minutes)
+QUEST_HEARTBEAT_INTERVAL_SECONDS = 120
+# EXTERNAL_KILLS_FRESH_MS in takaro_modules/quest-system/cronjobs/questTrackerKills.js
+# (and ZombieAchievements/cronjobs/zombie_kills_tracker.js); keep in sync
+QUEST_KILLS_HEARTBEAT_FRESH_SECONDS = 10 * 60
+# payload fields mapped to update_quest() arguments; anything else is passed as extra
+RETRY_BASE_FIELDS = ("playerName", "questType", "increment", "steamId", "platform", "platformId", "ts", "_id")
+
+# --- optional: read events from the server log file instead of telnet ---
+LOG_TAIL_ENABLED = False
+SERVER_LOG_DIR = "/home/steam/logs"
+SERVER_LOG_PATTERN = "server_*.log"
+LOG_TAIL_CHECKPOINT_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/monitor_log_tail_checkpoint.json"
+LOG_TAIL_CHECKPOINT_SECONDS = 5
+LOG_TAIL_POLL_SECONDS = 1.0
+# ask the server to stop streaming its log over our telnet session
+LOG_TAIL_MUTE_TELNET_LOGS = True
+
+# --- zombie kill deltas from the listplayers "zombies=" counter ---
+ENABLE_KILL_TRACKING = True
+KILL_BASELINES_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/players_kill_baselines.json"
+# a baseline older than this is re-taken instead of credited (we were not
+# watching, the kills may belong to a previous quest day). Must stay below the
+# cronjobs' freshness window: once our last heartbeat is older than that they
+# count the kills from entity-killed events, and crediting the same interval
+# here would count them twice. The last heartbeat can be up to one interval
+# older than the last baseline.
+KILL_BASELINE_MAX_AGE_SECONDS = QUEST_KILLS_HEARTBEAT_FRESH_SECONDS - QUEST_HEARTBEAT_INTERVAL_SECONDS
+# bigger jumps between two polls are treated as a bogus row / counter change
+KILL_DELTA_MAX = 1000
+
+# --- playtime (timespent quest) from spawn/disconnect intervals ---
+ENABLE_PLAYTIME_TRACKING = True
+PLAYTIME_STATE_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/monitor_playtime.json"
+PLAYTIME_FLUSH_INTERVAL_SECONDS = 60
+# only whole minutes are sent, the remainder is carried over
+PLAYTIME_FLUSH_UNIT_MS = 60 * 1000
+# open sessions from a checkpoint are resumed only if the monitor was down for
+# less than this (otherwise listplayers re-opens them from "now")
+PLAYTIME_RESUME_MAX_GAP_SECONDS = 180
+# daily quests roll over at midnight in this timezone (same as the quest server)
+QUEST_TIME_ZONE = "Europe/Prague"
+
+# --- local read API (cached roster / levels / identities) ---
+READ_API_ENABLED = True
+READ_API_HOST = "127.0.0.1"
+READ_API_PORT = 8095
+# optional Unix socket (e.g. "/home/steam/7D2DBohemia/runtime-state-backups/monitor.sock")
+READ_API_SOCKET = None
+READ_API_LONGPOLL_MAX_SECONDS = 55
+# how many change records /changes can replay before a client must resync
+READ_API_CHANGELOG_SIZE = 2000
+
+# dead session detection: probe ("version") after this long without a byte,
+# reconnect when a written command gets no reply within the response timeout
+WATCHDOG_QUIET_SECONDS = 45
+WATCHDOG_RESPONSE_TIMEOUT_SECONDS = 15
+
+# reconnect: probe the telnet port every RECONNECT_BASE_DELAY..RECONNECT_MAX_DELAY
+# seconds (jittered) while the server is down, log in as soon as it accepts
+RECONNECT_BASE_DELAY_SECONDS = 1.0
+RECONNECT_MAX_DELAY_SECONDS = 15.0
+# wait this long for "Logon successful" after sending the password
+LOGIN_TIMEOUT_SECONDS = 5
+
+# on-demand profiling: kill -USR1 <pid> (cpu + mem + stacks), kill -USR2 (stacks),
+# or GET /debug/profile?kind=all|cpu|mem|stacks&seconds=N on the read API
+PROFILE_DIR = "/home/steam/7D2DBohemia/integrated-game-monitor/profiles"
+PROFILE_SECONDS = 30
+
+# persisted monitor state used for reconnect reconciliation
+# (online set, last processed event time, levelgain dedupe keys)
+MONITOR_STATE_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/monitor_state.json"
+
+# --- console command scheduler ---
+# Token bucket shared by every console write from this process.
+COMMAND_RATE_PER_SECOND = 3.0
+COMMAND_BURST = 5
+COMMAND_WAIT_TIMEOUT_SECONDS = 30
+COMMAND_STATS_LOG_INTERVAL_SECONDS = 300
+
+def load_servers():
+    """SERVERS, or the JSON list in SERVERS_FILE. Raises ValueError on a bad
+    definition (missing host/port, invalid or duplicate id)."""
+    servers = SERVERS
+    if SERVERS_FILE:
+        with open(SERVERS_FILE, "r", encoding="utf-8") as f:
+            servers = json.load(f)
+    if not isinstance(servers, list) or not servers:
+        raise ValueError("server list must be a non-empty list")
+    out = []
+    seen = set()
+    for srv in servers:
+        sid = str(srv.get("id") or "")
+        if not SERVER_ID_RE.match(sid):
+            raise ValueError("invalid server id %r" % sid)
+        if sid in seen:
+            raise ValueError("duplicate server id %r" % sid)
+        if not srv.get("host") or not srv.get("port"):
+            raise ValueError("server %r needs host and port" % sid)
+        seen.add(sid)
+        out.append(dict(srv, id=sid, port=int(srv["port"])))
+    return out
+
+
+def server_state_path(path, server_id):
+    """Per-server variant of a state file: DEFAULT_SERVER_ID keeps the legacy
+    name, other servers get "<stem>.<server_id><ext>" next to it."""
+    if server_id == DEFAULT_SERVER_ID:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{server_id}{ext}"
+
+
+# ===================== METRICS =====================
+# Prometheus text format at GET /metrics on the read API (READ_API_PORT).
+# Updates are a dict lookup + a short lock; depths are read at scrape time.
+# Per-connection series carry a "server" label (server id, see SERVERS).
+
+M_LINES_READ = metrics.counter("bohemia_lines_read_total", "Console lines read, by source", ("server", "source"))
+M_HANDLE_LINE = metrics.histogram(
+    "bohemia_handle_line_seconds", "Time spent parsing/handling one line", buckets=metrics.FAST_BUCKETS
+)
+M_EVENT_QUEUE_DEPTH = metrics.gauge(
+    "bohemia_event_queue_depth", "Console lines waiting for the handler", ("server", "priority")
+)
+M_EVENT_WAIT = metrics.histogram(
+    "bohemia_event_queue_wait_seconds",
+    "Time a console line waited between reader and handler",
+    ("server", "category"),
+)
+M_EVENTS_SHED = metrics.counter(
+    "bohemia_events_shed_total", "Console lines dropped under load, by category", ("server", "category", "reason")
+)
+M_COMMAND_OUTCOMES = metrics.counter(
+    "bohemia_command_outcomes_total",
+    "Player-addressed console commands by outcome seen in the console output",
+    ("server", "verb", "result"),
+)
+M_COMMANDS_SHED = metrics.counter(
+    "bohemia_chat_commands_shed_total",
+    "Chat commands rejected by per-player admission",
+    ("server", "command", "reply"),
+)
+M_COMMANDS = metrics.counter(
+    "bohemia_console_commands_total", "Console commands by verb, priority and result", ("verb", "priority", "result")
+)
+M_COMMANDS_COALESCED = metrics.counter(
+    "bohemia_console_commands_coalesced_total", "Commands merged into a pending duplicate", ("priority",)
+)
+M_COMMAND_WAIT = metrics.histogram(
+    "bohemia_command_queue_wait_seconds", "Time from submit to write, incl. rate limit", ("priority",)
+)
+M_COMMAND_WRITE = metrics.histogram(
+    "bohemia_command_write_seconds", "Socket write time incl. tn_lock wait", ("verb",), buckets=metrics.FAST_BUCKETS
+)
+M_COMMAND_QUEUE_DEPTH = metrics.gauge("bohemia_command_queue_depth", "Commands waiting in the scheduler", ("scheduler",))
+M_LOCK_WAIT = metrics.histogram(
+    "bohemia_lock_wait_seconds", "Time spent waiting for a lock", ("lock",), buckets=metrics.FAST_BUCKETS
+)
+M_HTTP = metrics.histogram("bohemia_http_request_seconds", "Outgoing HTTP request latency", ("target", "endpoint"))
+M_HTTP_RESULTS = metrics.counter(
+    "bohemia_http_requests_total", "Outgoing HTTP requests by status code (or error)", ("target", "endpoint", "result")
+)
+M_CONNECTS = metrics.counter("bohemia_telnet_connects_total", "Telnet connect attempts", ("server", "result"))
+M_DISCONNECTS = metrics.counter("bohemia_telnet_disconnects_total", "Telnet sessions lost", ("server",))
+M_CONNECTED = metrics.gauge("bohemia_telnet_connected", "1 while a telnet session is open", ("server",))
+M_STALLS = metrics.counter(
+    "bohemia_telnet_stalls_total", "Dead sessions detected by the watchdog", ("server", "reason")
+)
+M_DOWNTIME = metrics.histogram(
+    "bohemia_telnet_downtime_seconds",
+    "Time from losing a telnet session to the next successful login",
+    ("server",),
+    buckets=(1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600),
+)
+M_STARTUP = metrics.gauge(
+    "bohemia_startup_phase_seconds", "Cold start: seconds from module load to the end of each phase", ("server", "phase")
+)
+M_TELNET_IDLE = metrics.gauge("bohemia_telnet_idle_seconds", "Seconds since the last byte from the console", ("server",))
+M_UPDATE_LEVELS = metrics.histogram("bohemia_update_player_levels_seconds", "Duration of one update_player_levels run")
+M_LISTPLAYERS = metrics.counter("bohemia_listplayers_total", "listplayers runs by outcome", ("server", "result"))
+M_LEVELUPS = metrics.counter("bohemia_levelups_total", "Level-ups detected, by source", ("server", "source"))
+M_LEVELUPS_COALESCED = metrics.counter(
+    "bohemia_levelups_coalesced_total", "PrismaCore level-ups merged into a previous update of the same player", ("server",)
+)
+M_RETRY_QUEUE_DEPTH = metrics.gauge(
+    "bohemia_retry_queue_depth", "Quest updates waiting in the retry queue", ("server",)
+)
+M_PLAYERS_ONLINE = metrics.gauge("bohemia_players_online", "Players in the tracked online roster", ("server",))
+M_QUEST_HEALTHY = metrics.gauge("bohemia_quest_server_healthy", "1 while the quest server counts as healthy", ("server",))
+M_QUEST_LATENCY = metrics.gauge(
+    "bohemia_quest_server_latency_ewma_seconds", "Smoothed quest server request latency", ("server",)
+)
+M_QUEST_SUCCESS_RATE = metrics.gauge(
+    "bohemia_quest_server_success_rate", "Smoothed share of successful quest server requests", ("server",)
+)
+M_QUEST_HEALTH_CHANGES = metrics.counter(
+    "bohemia_quest_server_health_changes_total", "Quest server health transitions", ("server", "state")
+)
+M_OUTBOX = metrics.counter(
+    "bohemia_quest_outbox_total", "Quest updates put into the outbox, by reason", ("server", "reason")
+)
+M_JOB_SECONDS = metrics.histogram("bohemia_job_seconds", "Run time of scheduled jobs", ("job",))
+M_JOB_RUNS = metrics.counter("bohemia_job_runs_total", "Scheduled job runs by result", ("job", "result"))
+M_LOG_DROPPED = metrics.counter("bohemia_log_records_dropped_total", "Log records dropped (log queue full)")
+M_LOG_QUEUE_DEPTH = metrics.gauge("bohemia_log_queue_depth", "Log records waiting for the listener thread")
+
+
+def _observe_job(name, seconds, ok):
+    M_JOB_SECONDS.labels(name).observe(seconds)
+    M_JOB_RUNS.labels(name, "ok" if ok else "failed").inc()
+
+
+def _observe_command_write(verb, priority, result, seconds):
+    M_COMMANDS.labels(verb, priority, result).inc()
+    M_COMMAND_WRITE.labels(verb).observe(seconds)
+
+
+def _observe_http(target, endpoint, start, result):
+    M_HTTP.labels(target, endpoint).observe(time.perf_counter() - start)
+    M_HTTP_RESULTS.labels(target, endpoint, result).inc()
+
+
+def _requests():
+    """requests (with urllib3) is most of this module's import time; it is
+    imported on the first quest server call, which runs in the background
+    after the login."""
+    import requests
+
+    return requests
+
+
+def new_quest_session(pool_maxsize=10):
+    requests = _requests()
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+LISTPLAYERS_TOTAL_RE = re.compile(r"Total of (\d+) in the game")
+LISTPLAYERS_ROW_RE = re.compile(r"id=(\d+),\s*([^,]+),")
+LISTPLAYERS_FIELD_RE = re.compile(r"(\w+)=([^,]*)")
+
+# spawn / disconnect lines used to track the online roster
+SPAWN_RE = re.compile(r"PlayerSpawnedInWorld.*?EntityID=(\d+).*?PltfmId='([^']*)'.*?PlayerName='([^']+)'")
+DISCONNECT_RE = re.compile(r"Player disconnected: EntityID=(\d+).*?PlayerName='([^']+)'")
+
+
+def classify_line(line):
+    """(category, priority) of a console line for the event queue. Substring
+    checks only: the reader runs this for every line."""
+    if "playerLeveled" in line:
+        return "levelup", HIGH
+    if "Chat (from" in line:
+        if "/catchup" in line:
+            return "command", HIGH
+        return "chat", NORMAL
+    if "PlayerSpawnedInWorld" in line:
+        return "spawn", HIGH
+    if "Player disconnected" in line:
+        return "disconnect", HIGH
+    if "XP gained" in line:
+        return "xp", NORMAL
+    return "other", LOW
+
+
+# "2026-08-11T16:22:56 58620.426 INF ..." prefix of every console/log line
+LINE_TS_RE = re.compile(r"^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d) ")
 
 CATCHUP_MATRIX = [
     {"min": 100, "max": 150, "target": 60},
@@ -100,19 +828,728 @@ CATCHUP_MATRIX = [
 ]
 
 
+# ===================== ADAPTIVE LISTPLAYERS POLLING =====================
+
+
+class AdaptivePoller:
+    """
+    Decides when the next listplayers is worth running.
+
+    The online roster is maintained from spawn/disconnect console lines, and
+    listplayers is only a reconciliation check on top of it:
+    - nobody online                        -> LISTPLAYERS_IDLE_POLL_SECONDS
+    - join/leave within the burst window   -> LISTPLAYERS_BURST_POLL_SECONDS
+    - all online levels fresh (PrismaCore) -> LISTPLAYERS_QUIET_POLL_SECONDS
+    - otherwise                            -> LISTPLAYERS_POLL_SECONDS
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.online = {}  # playerName -> entity id (str) or None
+        self.roster_known = False
+        self.level_seen_ts = {}  # playerName -> ts of last PrismaCore level info
+        self.last_roster_change_ts = 0.0
+        self.on_nudge = None  # set by the monitor: moves the listplayers job up
+
+    def player_joined(self, player_name, entity_id=None):
+        with self.lock:
+            if player_name not in self.online:
+                self.last_roster_change_ts = time.time()
+                self.online[player_name] = entity_id
+            elif entity_id is not None:
+                self.online[player_name] = entity_id
+
+    def player_left(self, player_name):
+        with self.lock:
+            if self.online.pop(player_name, None) is not None or player_name in self.level_seen_ts:
+                self.last_roster_change_ts = time.time()
+            self.level_seen_ts.pop(player_name, None)
+
+    def level_seen(self, player_name):
+        with self.lock:
+            self.level_seen_ts[player_name] = time.time()
+
+    def prismacore_active(self):
+        """True if PrismaCore reported a level within PRISMACORE_LEVEL_FRESH_SECONDS;
+        XP messages then tell listplayers nothing PrismaCore hasn't."""
+        now = time.time()
+        with self.lock:
+            return any((now - ts) <= PRISMACORE_LEVEL_FRESH_SECONDS for ts in self.level_seen_ts.values())
+
+    def reconcile(self, online_names, entity_ids=None):
+        """Replace the roster with what listplayers reported (entity_ids:
+        playerName -> entity id from the same listplayers)."""
+        online_names = set(online_names)
+        entity_ids = entity_ids or {}
+        with self.lock:
+            known = set(self.online)
+            if self.roster_known and known != online_names:
+                logger.info(
+                    "Roster reconciled by listplayers: joined=%s left=%s",
+                    sorted(online_names - known),
+                    sorted(known - online_names),
+                )
+                self.last_roster_change_ts = time.time()
+            for name in known - online_names:
+                self.online.pop(name, None)
+                self.level_seen_ts.pop(name, None)
+            for name in online_names:
+                if name not in known or name in entity_ids:
+                    self.online[name] = entity_ids.get(name)
+            self.roster_known = True
+
+    def entity_id(self, player_name):
+        with self.lock:
+            return self.online.get(player_name)
+
+    def forget_entity_ids(self):
+        """Session lost: the server may restart and hand out the ids again."""
+        with self.lock:
+            for name in self.online:
+                self.online[name] = None
+
+    def online_names(self):
+        with self.lock:
+            return set(self.online)
+
+    def _all_levels_fresh(self, now):
+        if not self.online:
+            return False
+        for name in self.online:
+            ts = self.level_seen_ts.get(name)
+            if ts is None or (now - ts) > PRISMACORE_LEVEL_FRESH_SECONDS:
+                return False
+        return True
+
+    def next_interval(self):
+        """Return (seconds, reason) until the next scheduled listplayers."""
+        now = time.time()
+        with self.lock:
+            if not self.roster_known:
+                return LISTPLAYERS_POLL_SECONDS, "roster unknown"
+            if (now - self.last_roster_change_ts) < LISTPLAYERS_BURST_WINDOW_SECONDS:
+                return LISTPLAYERS_BURST_POLL_SECONDS, "join/leave burst"
+            if not self.online:
+                return LISTPLAYERS_IDLE_POLL_SECONDS, "server empty"
+            if self._all_levels_fresh(now):
+                return LISTPLAYERS_QUIET_POLL_SECONDS, "levels fresh from PrismaCore"
+            return LISTPLAYERS_POLL_SECONDS, "players online"
+
+    def nudge(self, reason):
+        """Ask for an early listplayers unless it would tell us nothing new."""
+        with self.lock:
+            if self.roster_known and self._all_levels_fresh(time.time()):
+                logger.debug("Ignoring listplayers nudge (%s): all online levels fresh", reason)
+                return
+        logger.debug("listplayers nudge: %s", reason)
+        if self.on_nudge:
+            self.on_nudge()
+
+
+# ===================== PLAYTIME TRACKING =====================
+
+
+def _quest_tz():
+    if ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(QUEST_TIME_ZONE)
+    except Exception:
+        return None
+
+
+def quest_day_start(ts):
+    """Epoch seconds of the quest-day midnight (QUEST_TIME_ZONE) that contains ts."""
+    tz = _quest_tz()
+    dt = datetime.fromtimestamp(ts, tz) if tz else datetime.fromtimestamp(ts)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+class PlaytimeTracker:
+    """
+    Per-player online time, measured locally.
+
+    sessions: playerName -> epoch seconds up to which the open interval has
+    already been accrued. pending: playerName -> accrued but unsent ms of the
+    current quest day. Everything is checkpointed to state_file.
+    """
+
+    def __init__(self, state_file):
+        self.state_file = state_file
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.pending = {}
+        self.day_start = quest_day_start(time.time())
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+        except Exception as e:
+            logger.error("Error loading playtime state: %s", e)
+            return
+
+        now = time.time()
+        if float(data.get("day_start", 0) or 0) != self.day_start:
+            logger.info("Playtime checkpoint is from another quest day, starting fresh")
+            return
+        self.pending = {k: int(v) for k, v in (data.get("pending") or {}).items() if int(v) > 0}
+        saved_at = float(data.get("ts", 0) or 0)
+        if (now - saved_at) <= PLAYTIME_RESUME_MAX_GAP_SECONDS:
+            self.sessions = {k: float(v) for k, v in (data.get("sessions") or {}).items()}
+        logger.info(
+            "Loaded playtime state: %s pending, %s open sessions resumed", len(self.pending), len(self.sessions)
+        )
+
+    def checkpoint(self):
+        with self.lock:
+            data = {
+                "ts": time.time(),
+                "day_start": self.day_start,
+                "sessions": dict(self.sessions),
+                "pending": dict(self.pending),
+            }
+        try:
+            tmp = self.state_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.state_file)
+        except Exception as e:
+            logger.error("Error saving playtime state: %s", e)
+
+    def _rollover(self, now):
+        """Drop what belongs to the previous quest day (caller holds lock)."""
+        day_start = quest_day_start(now)
+        if day_start == self.day_start:
+            return
+        if self.pending:
+            logger.info("Quest day rolled over, dropping %s unsent playtime entries", len(self.pending))
+        self.pending = {}
+        for name, since in self.sessions.items():
+            self.sessions[name] = max(since, day_start)
+        self.day_start = day_start
+
+    def _accrue(self, name, now):
+        since = self.sessions.get(name)
+        if since is None:
+            return
+        if now > since:
+            self.pending[name] = self.pending.get(name, 0) + int((now - since) * 1000)
+        self.sessions[name] = now
+
+    def start(self, name, now=None):
+        now = now or time.time()
+        with self.lock:
+            self._rollover(now)
+            if name not in self.sessions:
+                self.sessions[name] = now
+                logger.debug("Playtime session opened for %s", name)
+
+    def stop(self, name, now=None):
+        now = now or time.time()
+        with self.lock:
+            self._rollover(now)
+            self._accrue(name, now)
+            if self.sessions.pop(name, None) is not None:
+                logger.debug("Playtime session closed for %s", name)
+
+    def reconcile(self, online_names):
+        """Open/close sessions to match the listplayers roster."""
+        now = time.time()
+        online_names = set(online_names)
+        with self.lock:
+            self._rollover(now)
+            for name in list(self.sessions):
+                if name not in online_names:
+                    self._accrue(name, now)
+                    self.sessions.pop(name, None)
+            for name in online_names:
+                self.sessions.setdefault(name, now)
+
+    def stop_all(self):
+        now = time.time()
+        with self.lock:
+            self._rollover(now)
+            for name in list(self.sessions):
+                self._accrue(name, now)
+            self.sessions = {}
+
+    def take_pending(self):
+        """Accrue open sessions and hand out whole PLAYTIME_FLUSH_UNIT_MS chunks."""
+        now = time.time()
+        out = {}
+        with self.lock:
+            self._rollover(now)
+            for name in list(self.sessions):
+                self._accrue(name, now)
+            for name, ms in list(self.pending.items()):
+                whole = (ms // PLAYTIME_FLUSH_UNIT_MS) * PLAYTIME_FLUSH_UNIT_MS
+                if whole <= 0:
+                    continue
+                out[name] = whole
+                self.pending[name] = ms - whole
+                if not self.pending[name]:
+                    self.pending.pop(name)
+        return out
+
+    def give_back(self, name, ms):
+        with self.lock:
+            self.pending[name] = self.pending.get(name, 0) + int(ms)
+
+
+# ===================== PLAYER STATE =====================
+
+
+PlayerSnapshot = namedtuple("PlayerSnapshot", "version levels identity steam_ids dedupe")
+
+
+class PlayerStateEdit:
+    """Working copy handed out by PlayerState.edit(). A table is copied on
+    first access, so an edit that only touches levels does not copy the rest."""
+
+    TABLES = ("levels", "identity", "steam_ids", "dedupe")
+
+    def __init__(self, base):
+        self.base = base
+        self.copies = {}
+
+    def _table(self, name):
+        table = self.copies.get(name)
+        if table is None:
+            table = self.copies[name] = dict(getattr(self.base, name))
+        return table
+
+    levels = property(lambda self: self._table("levels"))
+    identity = property(lambda self: self._table("identity"))
+    steam_ids = property(lambda self: self._table("steam_ids"))
+    dedupe = property(lambda self: self._table("dedupe"))
+
+    def publish(self):
+        if not self.copies:
+            return self.base
+        tables = {n: self.copies.get(n) for n in self.TABLES}
+        return PlayerSnapshot(
+            self.base.version + 1,
+            *(MappingProxyType(t) if t is not None else getattr(self.base, n) for n, t in tables.items()),
+        )
+
+
+class PlayerState:
+    """
+    Versioned copy-on-write player state: levels, identities, legacy steam ids
+    and the levelgain dedupe cache.
+
+    Readers call snapshot() (or the table properties) and get an immutable,
+    internally consistent view without taking a lock; it never changes under
+    them, so json.dump or iteration from any thread is safe. Writers go
+    through edit(), which serializes them, copies the touched tables and
+    publishes the result as the next version with one reference swap.
+    """
+
+    def __init__(self, levels=None, identity=None, steam_ids=None, dedupe=None):
+        self.write_lock = metrics.TimedLock(M_LOCK_WAIT.labels("player_state"))
+        self._snap = PlayerSnapshot(
+            0,
+            MappingProxyType(dict(levels or {})),
+            MappingProxyType(dict(identity or {})),
+            MappingProxyType(dict(steam_ids or {})),
+            MappingProxyType(dict(dedupe or {})),
+        )
+
+    def snapshot(self):
+        return self._snap
+
+    @property
+    def version(self):
+        return self._snap.version
+
+    @property
+    def levels(self):
+        return self._snap.levels
+
+    @property
+    def identity(self):
+        return self._snap.identity
+
+    @property
+    def steam_ids(self):
+        return self._snap.steam_ids
+
+    @property
+    def dedupe(self):
+        return self._snap.dedupe
+
+    @contextmanager
+    def edit(self):
+        """with state.edit() as tx: tx.levels[name] = 5 - published on exit,
+        discarded if the block raises."""
+        with self.write_lock:
+            tx = PlayerStateEdit(self._snap)
+            yield tx
+            self._snap = tx.publish()
+
+    # ---------- common single-step writes ----------
+
+    def raise_level(self, name, level):
+        """Store level if it is above the cached one. Returns the old level."""
+        with self.edit() as tx:
+            old = int(tx.base.levels.get(name, 0) or 0)
+            if level > old:
+                tx.levels[name] = level
+        return old
+
+    def set_level(self, name, level):
+        """Store level unconditionally. Returns the old level."""
+        with self.edit() as tx:
+            old = int(tx.base.levels.get(name, 0) or 0)
+            if tx.base.levels.get(name) != level:
+                tx.levels[name] = level
+        return old
+
+    def set_identity(self, name, identity, steam_id=None):
+        """Returns True if the identity changed."""
+        with self.edit() as tx:
+            changed = tx.base.identity.get(name) != identity
+            if changed:
+                tx.identity[name] = identity
+            if steam_id and tx.base.steam_ids.get(name) != steam_id:
+                tx.steam_ids[name] = steam_id
+        return changed
+
+    def claim_levelgain(self, key, ttl, now=None):
+        """Atomically check and mark a levelgain dedupe key. Returns False if
+        the key was marked within ttl seconds (somebody else credits it)."""
+        now = time.time() if now is None else now
+        with self.edit() as tx:
+            ts = tx.base.dedupe.get(key)
+            if ts is not None and (now - ts) <= ttl:
+                return False
+            dedupe = tx.dedupe
+            for k, t in list(dedupe.items()):
+                if (now - t) > ttl:
+                    del dedupe[k]
+            dedupe[key] = now
+        return True
+
+    def purge_dedupe(self, ttl, now=None):
+        now = time.time() if now is None else now
+        if not any((now - t) > ttl for t in self._snap.dedupe.values()):
+            return
+        with self.edit() as tx:
+            dedupe = tx.dedupe
+            for k, t in list(dedupe.items()):
+                if (now - t) > ttl:
+                    del dedupe[k]
+
+
+# ===================== LOCAL READ API =====================
+
+
+class ChangeFeed:
+    """Version counter + bounded log of changed player names (for long-poll)."""
+
+    def __init__(self, size=READ_API_CHANGELOG_SIZE):
+        self.cond = threading.Condition()
+        self.version = 0
+        self.log = deque(maxlen=size)  # (version, playerName)
+
+    def bump(self, names):
+        names = [n for n in names if n]
+        if not names:
+            return
+        with self.cond:
+            for name in names:
+                self.version += 1
+                self.log.append((self.version, name))
+            self.cond.notify_all()
+
+    def changes_since(self, since, timeout):
+        """Wait up to timeout for changes after `since`.
+        Returns (version, names) - names is None when `since` is older than the
+        log (the client must re-read /players)."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version > since, timeout=timeout)
+            if self.version <= since:
+                return self.version, []
+            if not self.log or self.log[0][0] > since + 1:
+                return self.version, None
+            return self.version, sorted({n for v, n in self.log if v > since})
+
+
+class ReadApiHandler(BaseHTTPRequestHandler):
+    hub = None  # MonitorHub, set by start_read_api()
+    server_version = "BohemiaMonitor/1"
+
+    def address_string(self):
+        # Unix socket clients have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, fmt, *args):
+        logger.debug("read api %s - %s", self.address_string(), fmt % args)
+
+    def _send_json(self, status, obj, etag=None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _not_modified(self, etag):
+        if self.headers.get("If-None-Match") != etag:
+            return False
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+
+    def _route(self, path):
+        """(monitor, path within it): /servers/<id>/... selects a server, the
+        un-prefixed paths serve the default server. monitor is None for an
+        unknown id."""
+        if path.startswith("/servers/"):
+            sid, _, rest = path[len("/servers/"):].partition("/")
+            return self.hub.monitors.get(sid), "/" + rest
+        return self.hub.default, path
+
+    def do_GET(self):
+        hub = self.hub
+        url = urlparse(self.path)
+        path = url.path.rstrip("/") or "/"
+        try:
+            if path == "/servers":
+                servers = {
+                    sid: {"host": m.host, "port": m.port, "connected": bool(m.tn), "version": m.changes.version}
+                    for sid, m in hub.monitors.items()
+                }
+                self._send_json(200, {"default": hub.default.server_id, "servers": servers})
+                return
+
+            if path == "/jobs":
+                self._send_json(200, {"jobs": hub.jobs.stats()})
+                return
+
+            if path == "/debug/profile":
+                status, obj = hub.profiler.handle_http(url.query)
+                self._send_json(status, obj)
+                return
+
+            if path == "/metrics":
+                body = metrics.REGISTRY.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", metrics.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            mon, path = self._route(path)
+            if mon is None:
+                self._send_json(404, {"error": "unknown server"})
+                return
+
+            if path == "/health":
+                self._send_json(
+                    200,
+                    {
+                        "ok": True,
+                        "server": mon.server_id,
+                        "connected": bool(mon.tn),
+                        "ready": mon.state_ready.is_set(),
+                        "version": mon.changes.version,
+                        "startup": mon.startup.report(),
+                        "events": mon.events.stats(),
+                        "admission": mon.admission.stats(),
+                    },
+                )
+                return
+
+            if path == "/changes":
+                qs = parse_qs(url.query)
+                since = int((qs.get("since") or ["0"])[0])
+                timeout = min(float((qs.get("timeout") or ["30"])[0]), READ_API_LONGPOLL_MAX_SECONDS)
+                version, names = mon.changes.changes_since(since, max(0.0, timeout))
+                self._send_json(200, {"version": version, "changed": names, "resync": names is None})
+                return
+
+            etag = '"%d"' % mon.changes.version
+            if path == "/players":
+                if not self._not_modified(etag):
+                    self._send_json(200, mon.read_api_snapshot(), etag)
+                return
+
+            if path.startswith("/players/"):
+                name = unquote(path[len("/players/"):])
+                player = mon.read_api_snapshot().get("players", {}).get(name)
+                if player is None:
+                    self._send_json(404, {"error": "unknown player", "name": name})
+                elif not self._not_modified(etag):
+                    self._send_json(200, dict(player, name=name), etag)
+                return
+
+            self._send_json(404, {"error": "not found"})
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        except Exception as e:
+            logger.error("Read API error on %s: %s", self.path, e)
+            self._send_json(500, {"error": "internal error"})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        # BaseHTTPRequestHandler expects these
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def start_read_api(hub):
+    """Serve the read API for every server of the hub in background threads.
+    Returns the started servers."""
+    handler = type("BoundReadApiHandler", (ReadApiHandler,), {"hub": hub})
+    servers = []
+    try:
+        tcp = ThreadingHTTPServer((READ_API_HOST, READ_API_PORT), handler)
+        tcp.daemon_threads = True
+        servers.append(tcp)
+        logger.info("Read API listening on http://%s:%s", READ_API_HOST, READ_API_PORT)
+    except OSError as e:
+        logger.error("Read API could not bind %s:%s: %s", READ_API_HOST, READ_API_PORT, e)
+    if READ_API_SOCKET:
+        try:
+            servers.append(_UnixHTTPServer(READ_API_SOCKET, handler))
+            logger.info("Read API listening on unix:%s", READ_API_SOCKET)
+        except OSError as e:
+            logger.error("Read API could not bind unix:%s: %s", READ_API_SOCKET, e)
+    for srv in servers:
+        threading.Thread(target=srv.serve_forever, name="read-api", daemon=True).start()
+    return servers
+
+
 # ===================== TAKARO QUEST INTEGRATION =====================
 
 
+class QuestHealth:
+    """
+    Quest server health from the outcome of every live request: an EWMA of the
+    success rate and of the latency, plus the failures in a row. A network
+    error, timeout or 5xx is a failure; any other reply counts as reachable.
+
+    Degraded after QUEST_HEALTH_DEGRADE_FAILURES failures in a row or when the
+    success rate drops below QUEST_HEALTH_MIN_SUCCESS_RATE; the first success
+    afterwards (live or a /health probe) makes it healthy again and calls
+    on_recover. Starts degraded until the first outcome is known.
+    """
+
+    def __init__(self, name="quest"):
+        self.name = name
+        self.lock = threading.Lock()
+        self.healthy = False
+        self.success_rate = 1.0
+        self.latency_ewma = 0.0
+        self.failures_in_row = 0
+        self.requests = 0
+        self.on_recover = None
+        self.on_degrade = None
+
+    def record(self, ok, seconds=None, reason=None):
+        alpha = QUEST_HEALTH_EWMA_ALPHA
+        changed = None
+        with self.lock:
+            self.requests += 1
+            self.success_rate += alpha * ((1.0 if ok else 0.0) - self.success_rate)
+            if seconds is not None:
+                self.latency_ewma = seconds if self.requests == 1 else self.latency_ewma + alpha * (seconds - self.latency_ewma)
+            if ok:
+                self.failures_in_row = 0
+                if not self.healthy:
+                    self.healthy = changed = True
+                    # a recovered server starts with a clean slate
+                    self.success_rate = max(self.success_rate, QUEST_HEALTH_MIN_SUCCESS_RATE)
+            else:
+                self.failures_in_row += 1
+                if self.healthy and (
+                    self.failures_in_row >= QUEST_HEALTH_DEGRADE_FAILURES or self.success_rate < QUEST_HEALTH_MIN_SUCCESS_RATE
+                ):
+                    self.healthy = False
+                    changed = False
+        if changed is True:
+            logger.info("%s: quest server healthy again (latency ~%.0fms)", self.name, self.latency_ewma * 1000.0)
+            if self.on_recover:
+                self.on_recover()
+        elif changed is False:
+            logger.warning(
+                "%s: quest server degraded (%s failures in a row, success rate %.2f%s) - updates go to the outbox",
+                self.name,
+                self.failures_in_row,
+                self.success_rate,
+                ", %s" % reason if reason else "",
+            )
+            if self.on_degrade:
+                self.on_degrade()
+
+
 class TakaroQuestIntegration:
     """Handles communication with the Node.js Takaro quest server"""
 
-    def __init__(self, quest_server_url="http://localhost:3000"):
+    def __init__(self, quest_server_url="http://localhost:3000", session=None, game_server_id=None, health=None):
+        """session: requests.Session shared by all server pipelines (one pool),
+        or a callable returning it - created on first use, so requests is not
+        imported before the login; game_server_id: Takaro gameServerId sent
+        with every update, None = the quest server's default; health:
+        QuestHealth fed by every request."""
         self.quest_server_url = quest_server_url
-        self.session = requests.Session()
+        self._session = session
+        self._session_lock = threading.Lock()
+        self.game_server_id = game_server_id
+        self.health = health or QuestHealth()
+
+    @property
+    def session(self):
+        session = self._session
+        if session is None or callable(session):
+            with self._session_lock:
+                if self._session is None:
+                    self._session = new_quest_session()
+                elif callable(self._session):
+                    self._session = self._session()
+                session = self._session
+        return session
+
+    def _request(self, method, path, record=True, **kwargs):
+        """session.request() against the quest server, with latency/result
+        metrics; the outcome feeds self.health unless record is False."""
+        start = time.perf_counter()
+        result = "error"
+        reachable = False
+        try:
+            response = self.session.request(method, f"{self.quest_server_url}{path}", **kwargs)
+            result = str(response.status_code)
+            reachable = response.status_code < 500
+            return response
+        finally:
+            _observe_http("quest", path, start, result)
+            if record:
+                self.health.record(reachable, time.perf_counter() - start, reason="%s %s" % (path, result))
 
     def check_server_health(self):
+        """Probe /health; healthy means reachable AND authenticated with Takaro."""
+        start = time.perf_counter()
         try:
-            response = self.session.get(f"{self.quest_server_url}/health", timeout=10)
+            response = self._request("GET", "/health", record=False, timeout=10)
+            ok = False
             if response.status_code == 200:
                 data = response.json()
                 logger.info(
@@ -120,10 +1557,12 @@ class TakaroQuestIntegration:
                     data.get("status"),
                     data.get("authenticated"),
                 )
-                return bool(data.get("authenticated", False))
-            return False
+                ok = bool(data.get("authenticated", False))
+            self.health.record(ok, time.perf_counter() - start, reason="/health probe")
+            return ok
         except Exception as e:
             logger.error("Quest server health check failed: %s", e)
+            self.health.record(False, reason="/health probe: %s" % e)
             return False
 
     def update_quest(
@@ -134,31 +1573,52 @@ class TakaroQuestIntegration:
         steam_id=None,
         platform=None,
         platform_id=None,
+        extra=None,
+        event_id=None,
     ):
         """
         Backwards compatible:
         - Steam players: provide steam_id
         - Non-steam players: provide platform in {"xbl","eos"} and platform_id
+        - extra: additional payload fields (e.g. createIfMissing, notify)
+        - event_id: idempotency key; with it a network error or 5xx is retried
+          (QUEST_UPDATE_ATTEMPTS) while the server still counts as healthy
         """
-        try:
-            payload = {
-                "playerName": player_name,
-                "questType": quest_type,
-                "increment": int(increment),
-            }
-
-            if steam_id:
-                payload["steamId"] = str(steam_id)
-            elif platform and platform_id:
-                payload["platform"] = str(platform)
-                payload["platformId"] = str(platform_id)
+        payload = {
+            "playerName": player_name,
+            "questType": quest_type,
+            "increment": int(increment),
+        }
+
+        if steam_id:
+            payload["steamId"] = str(steam_id)
+        elif platform and platform_id:
+            payload["platform"] = str(platform)
+            payload["platformId"] = str(platform_id)
+
+        if extra:
+            payload.update(extra)
+        if event_id:
+            payload["eventId"] = event_id
+        if self.game_server_id:
+            payload["gameServerId"] = self.game_server_id
+
+        attempts = QUEST_UPDATE_ATTEMPTS if event_id else 1
+        for attempt in range(1, attempts + 1):
+            ok, retryable = self._post_update(payload)
+            if ok or not retryable or attempt == attempts or not self.health.healthy:
+                return ok
+            logger.info("Retrying quest update %s (attempt %s/%s)", event_id, attempt + 1, attempts)
+            time.sleep(QUEST_UPDATE_RETRY_DELAY_SECONDS)
+        return False
 
+    def _post_update(self, payload):
+        """One /update-quest request. Returns (ok, retryable): retryable is
+        True when the outcome is unknown (network error, timeout, 5xx)."""
+        player_name = payload["playerName"]
+        try:
             logger.debug("Sending quest update: %s", payload)
-            response = self.session.post(
-                f"{self.quest_server_url}/update-quest",
-                json=payload,
-                timeout=12,
-            )
+            response = self._request("POST", "/update-quest", json=payload, timeout=12)
 
             if response.status_code == 200:
                 data = response.json()
@@ -166,88 +1626,493 @@ class TakaroQuestIntegration:
                     quest_data = data.get("questData", {}) or {}
                     progress = quest_data.get("progress", 0)
                     target = quest_data.get("target", 0)
-                    logger.info("Quest update success for %s: %s/%s", player_name, progress, target)
-                    return True
+                    if data.get("duplicate"):
+                        logger.info("Quest update for %s already applied (%s)", player_name, payload.get("eventId"))
+                    else:
+                        logger.info("Quest update success for %s: %s/%s", player_name, progress, target)
+                    return True, False
                 logger.error("Quest update failed: %s", data.get("error", "Unknown error"))
-                return False
+                return False, False
 
             try:
                 data = response.json()
                 logger.error("Quest update failed: status=%s body=%s", response.status_code, data)
             except Exception:
                 logger.error("Quest server returned status %s", response.status_code)
-            return False
+            return False, response.status_code >= 500
 
-        except requests.exceptions.RequestException as e:
+        except _requests().exceptions.RequestException as e:
             logger.error("Network error updating quest: %s", e)
-            return False
+            return False, True
         except Exception as e:
             logger.error("Unexpected error updating quest: %s", e)
-            return False
+            return False, False
+
+    def update_quests_batch(self, updates):
+        """
+        Send several quest updates in one /update-quests-batch request.
+        Returns a list of booleans (one per update, same order).
+        """
+        if not updates:
+            return []
+        try:
+            logger.debug("Sending quest update batch (%s items)", len(updates))
+            body = {"updates": updates}
+            if self.game_server_id:
+                body["gameServerId"] = self.game_server_id
+            response = self._request("POST", "/update-quests-batch", json=body, timeout=30)
+            if response.status_code != 200:
+                logger.error("Quest batch update failed: status=%s", response.status_code)
+                return [False] * len(updates)
+
+            data = response.json()
+            results = data.get("results") or []
+            oks = []
+            for i, upd in enumerate(updates):
+                r = results[i] if i < len(results) else None
+                ok = bool(r and r.get("success"))
+                if ok and r.get("duplicate"):
+                    logger.info(
+                        "Quest update for %s (%s) already applied (%s)",
+                        upd.get("playerName"),
+                        upd.get("questType"),
+                        upd.get("eventId") or "merged",
+                    )
+                elif ok:
+                    quest_data = r.get("questData") or {}
+                    logger.info(
+                        "Quest update success for %s (%s): %s/%s",
+                        upd.get("playerName"),
+                        upd.get("questType"),
+                        quest_data.get("progress", 0),
+                        quest_data.get("target", 0),
+                    )
+                else:
+                    logger.error(
+                        "Quest batch item failed for %s: %s", upd.get("playerName"), (r or {}).get("error", "no result")
+                    )
+                oks.append(ok)
+            return oks
+
+        except _requests().exceptions.RequestException as e:
+            logger.error("Network error sending quest batch: %s", e)
+            return [False] * len(updates)
+        except Exception as e:
+            logger.error("Unexpected error sending quest batch: %s", e)
+            return [False] * len(updates)
+
+    def send_heartbeat(self, quest_types):
+        """Refresh the external heartbeat of quest_types (the cronjobs leave
+        them to the monitor while it is fresh). Returns True on success."""
+        if not quest_types:
+            return True
+        body = {"questTypes": list(quest_types)}
+        if self.game_server_id:
+            body["gameServerId"] = self.game_server_id
+        try:
+            response = self._request("POST", "/external-heartbeat", json=body, timeout=10)
+            if response.status_code == 200 and response.json().get("success"):
+                return True
+            logger.warning("Quest heartbeat failed: status=%s", response.status_code)
+        except Exception as e:
+            logger.warning("Quest heartbeat failed: %s", e)
+        return False
 
 
 # ===================== MAIN MONITOR =====================
 
 
+class StartupTimings:
+    """
+    Cold start of one server pipeline: when each phase ended, in seconds since
+    this module started loading (process start under pm2), and how long the
+    background ones took. Only the first occurrence counts (a reconnect is not
+    a cold start). Logged once when all PHASES are done; served as "startup"
+    by /health.
+
+    imports      module imports (requests is deferred, see _requests())
+    state        state store, levels, identities, outbox (background)
+    login        telnet port reachable, password accepted
+    reader       monitor_chat starts reading console lines
+    quest_health first /health answer (background)
+    roster       first listplayers + reconnect reconcile (background)
+    """
+
+    PHASES = ("imports", "state", "login", "reader", "quest_health", "roster")
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.ended = {}  # phase -> seconds since process start
+        self.took = {}  # phase -> seconds spent in it (background phases)
+        self.reported = False
+        self.finish("imports", took=_IMPORT_SECONDS)
+
+    def finish(self, phase, took=None):
+        at = time.monotonic() - _PROCESS_START
+        with self.lock:
+            if phase in self.ended:
+                return
+            self.ended[phase] = at
+            if took is not None:
+                self.took[phase] = took
+            complete = not self.reported and all(p in self.ended for p in self.PHASES)
+            if complete:
+                self.reported = True
+        M_STARTUP.labels(self.name, phase).set(at)
+        if complete:
+            logger.info(
+                "Start-up finished after %.2fs: %s",
+                max(self.ended.values()),
+                ", ".join(
+                    "%s %.2fs%s" % (p, self.ended[p], " (took %.2fs)" % self.took[p] if p in self.took else "")
+                    for p in self.PHASES
+                ),
+            )
+
+    @contextmanager
+    def phase(self, phase):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.finish(phase, took=time.monotonic() - start)
+
+    def report(self):
+        with self.lock:
+            return {
+                p: {"at": round(at, 3), "took": round(self.took[p], 3) if p in self.took else None}
+                for p, at in self.ended.items()
+            }
+
+
 class IntegratedMonitor:
-    def __init__(self, host, port, password):
+    """One telnet pipeline for one 7D2D server. MonitorHub runs several of
+    them in one process and passes in what they share (quest server HTTP
+    session, profiler); state files are namespaced by server_id."""
+
+    def __init__(
+        self,
+        host,
+        port,
+        password,
+        server_id=DEFAULT_SERVER_ID,
+        game_server_id=None,
+        server_log_dir=None,
+        session=None,
+        profiler=None,
+        jobs=None,
+    ):
         self.host = host
         self.port = port
         self.password = password
+        self.server_id = server_id
         self.tn = None
 
-        # Telnet access lock (prevents concurrent write/read)
-        self.tn_lock = threading.Lock()
+        # per-server state files (module constants are read here, not at import,
+        # so they can be redirected before construction)
+        self.levels_file = server_state_path(LEVELS_FILE, server_id)
+        self.state_db_file = server_state_path(STATE_DB_FILE, server_id)
+        self.retry_queue_file = server_state_path(RETRY_QUEUE_FILE, server_id)
+        self.monitor_state_file = server_state_path(MONITOR_STATE_FILE, server_id)
+        self.kill_baselines_file = server_state_path(KILL_BASELINES_FILE, server_id)
+        self.playtime_state_file = server_state_path(PLAYTIME_STATE_FILE, server_id)
+        self.log_tail_checkpoint_file = server_state_path(LOG_TAIL_CHECKPOINT_FILE, server_id)
+
+        # Telnet access lock (prevents concurrent write/read); waits are measured
+        self.tn_lock = metrics.TimedLock(M_LOCK_WAIT.labels("tn_lock"))
 
         # Additional lock so update_player_levels() cannot run concurrently
         self.listplayers_lock = threading.Lock()
 
-        self.reconnect_delay = 30
-        self.max_reconnect_delay = 480
-        self.command_delay = 0.4
-
-        self.players_levels = self.load_player_levels()
+        # Dead-session detection; the reader stops on session_stop (a closed
+        # telnetlib object raises AttributeError, not "connection closed")
+        self.session_stop = threading.Event()
+        self.watchdog = StallWatchdog(
+            f"{server_id}:monitor",
+            self._watchdog_probe,
+            self._on_stall,
+            quiet_seconds=WATCHDOG_QUIET_SECONDS,
+            response_timeout=WATCHDOG_RESPONSE_TIMEOUT_SECONDS,
+        )
+
+        self.reconnect = ReconnectManager(
+            f"{server_id}:monitor",
+            host,
+            port,
+            base_delay=RECONNECT_BASE_DELAY_SECONDS,
+            max_delay=RECONNECT_MAX_DELAY_SECONDS,
+        )
+
+        # All console writes go through one prioritized, rate-limited writer
+        self.commands = CommandScheduler(
+            self._write_command,
+            name="console" if server_id == DEFAULT_SERVER_ID else f"console-{server_id}",
+            thread_name=f"{server_id}:console-scheduler",
+            rate=COMMAND_RATE_PER_SECOND,
+            burst=COMMAND_BURST,
+            wait_timeout=COMMAND_WAIT_TIMEOUT_SECONDS,
+            stats_interval=COMMAND_STATS_LOG_INTERVAL_SECONDS,
+            on_wait=lambda priority, wait: M_COMMAND_WAIT.labels(priority).observe(wait),
+            on_write=_observe_command_write,
+            on_coalesced=lambda priority: M_COMMANDS_COALESCED.labels(priority).inc(),
+        )
+        M_COMMAND_QUEUE_DEPTH.labels(self.commands.name).set_function(self.commands.queue_depth)
+        self.commands.start()
+
+        # the state store and everything loaded from it are filled in by
+        # _load_state() in the background (state_ready), see run()
+        self.startup = StartupTimings(server_id)
+        self.state_ready = threading.Event()
+        self.state = None
+
+        # health is tracked from live request outcomes; while degraded every
+        # quest update goes to the outbox (retry queue), drained on recovery
+        self.quest_health = QuestHealth(server_id)
+        self.quest_health.on_recover = self._quest_recovered
+        self.quest_integration = TakaroQuestIntegration(
+            QUEST_SERVER_URL, session=session, game_server_id=game_server_id, health=self.quest_health
+        )
+
+        # levels, identities ({"kind": "steam"|"xbl"|"eos", "value": "..."}),
+        # legacy playerName -> steamId64 and the levelgain dedupe cache, as
+        # immutable versioned snapshots (see PlayerState)
+        self.players = PlayerState()
+        self._levels_saved = {}
+        self._levels_saved_version = 0
+        # persistence serializes a snapshot; this only orders the file writers
+        self.persist_lock = threading.Lock()
 
-        self.quest_integration = TakaroQuestIntegration()
-        self.quest_server_healthy = False
+        self.last_listplayers_ts = 0.0
+        self.poller = AdaptivePoller()
+
+        # periodic work runs as named jobs on the process-wide scheduler; the
+        # per-session ones are cancelled when the telnet session ends
+        if jobs is None:
+            jobs = JobScheduler("monitor", workers=JOB_WORKERS_PER_SERVER, on_run=_observe_job)
+            jobs.start()
+        self.jobs = jobs
+        self.session_jobs = f"{server_id}:session"
+        self.poller.on_nudge = lambda: self.jobs.run_soon(f"{server_id}:listplayers", LISTPLAYERS_NUDGE_SETTLE_SECONDS)
+
+        # read API: change feed + playerName -> {"ts": last seen, "entityId": ...}
+        self.changes = ChangeFeed()
+        self.player_seen = {}
+
+        # Dedupe cache for levelgain increments (key -> ts, in self.players)
+        self.levelgain_dedupe_ttl = LEVELGAIN_DEDUPE_TTL_SECONDS
 
-        # legacy: playerName -> steamId64
-        self.player_steam_ids = {}
+        # Reconnect reconciliation: until reconcile_after_reconnect() ran,
+        # PrismaCore level-ups are collected here and credited in one batch
+        self.reconcile_lock = metrics.TimedLock(M_LOCK_WAIT.labels("reconcile_lock"))
+        self.reconcile_pending = True
+        self.missed_levelups = {}  # playerName -> [(old, new), ...]
+        # PrismaCore level-ups waiting out LEVELGAIN_COALESCE_SECONDS
+        self.levelup_lock = metrics.TimedLock(M_LOCK_WAIT.labels("levelup_lock"))
+        self.levelup_bursts = {}  # playerName -> [old, new, transitions]
+        self.last_event_ts = 0.0
+        self.last_event_stamp = None
+        self.persisted_online = set()
+
+        # the reader (or the LogTailer) only queues lines; handle_line() runs
+        # on the queue's thread, high-value events first
+        self.events = EventQueue(
+            f"{server_id}:events",
+            self.handle_line,
+            classify_line,
+            capacity=EVENT_QUEUE_CAPACITY,
+            sample_every=EVENT_QUEUE_SAMPLE_EVERY,
+            on_shed=lambda category, reason: M_EVENTS_SHED.labels(server_id, category, reason).inc(),
+            on_handled=lambda category, wait: M_EVENT_WAIT.labels(server_id, category).observe(wait),
+            thread_name=f"{server_id}:events",
+        )
+        self.events.start()
+
+        # console echo / error lines of player-addressed commands (fed by the
+        # reader); a muted telnet session carries no echoes, see bohemia_addressing
+        self.outcomes = CommandOutcomes(
+            server_id,
+            on_outcome=lambda verb, result: M_COMMAND_OUTCOMES.labels(server_id, verb, result).inc(),
+            check=not (LOG_TAIL_ENABLED and LOG_TAIL_MUTE_TELNET_LOGS),
+        )
+
+        # per-player /catchup limit; rejected commands get a cached reply
+        self.admission = CommandAdmission(
+            server_id,
+            {"catchup": (CATCHUP_ADMISSION_BURST, CATCHUP_ADMISSION_REFILL_SECONDS)},
+            fallback_replies={"catchup": CATCHUP_RATE_LIMITED_MESSAGE},
+            on_shed=lambda command, reply: M_COMMANDS_SHED.labels(server_id, command, reply).inc(),
+        )
+        # steam ids whose /catchup is being handled on a job worker
+        self.catchups_in_flight = set()
+        self.catchups_in_flight_lock = threading.Lock()
+
+        # optional log-file event source (telnet is then only used for commands)
+        self.log_tailer = None
+        if LOG_TAIL_ENABLED:
+            self.log_tailer = LogTailer(
+                server_log_dir or SERVER_LOG_DIR,
+                SERVER_LOG_PATTERN,
+                self.log_tail_checkpoint_file,
+                self.events.put,
+                name=f"{server_id}:log-tailer",
+                poll_seconds=LOG_TAIL_POLL_SECONDS,
+                checkpoint_seconds=LOG_TAIL_CHECKPOINT_SECONDS,
+            )
 
-        # playerName -> identity dict: {"kind": "steam"|"xbl"|"eos", "value": "..."}
-        self.player_identity = {}
+        # zombie kill baselines (listplayers "zombies=") and not yet sent deltas
+        self.kill_baselines = {}
+        self.pending_kill_deltas = {}  # playerName -> [kills, zombies= counter before, counter after]
+        self.kill_lock = threading.Lock()  # pending_kill_deltas (flushed outside listplayers_lock)
 
-        self.last_listplayers_ts = 0.0
+        # local online-time tracking for the timespent quest
+        self.playtime = None
 
-        # Dedupe cache for levelgain increments
-        self.levelgain_dedupe = {}  # key -> ts
-        self.levelgain_dedupe_ttl = LEVELGAIN_DEDUPE_TTL_SECONDS
-
-        # retry queue
+        # retry queue = quest update outbox (appended by the reader, the jobs
+        # and reconcile; drained by the "<id>:outbox" job)
         self.retry_queue = deque()
-        if ENABLE_RETRY_QUEUE:
-            self._load_retry_queue()
+        self.retry_lock = threading.RLock()
+        self.jobs.every(
+            f"{server_id}:quest-health",
+            QUEST_HEALTH_PROBE_INTERVAL_SECONDS,
+            self.probe_quest_health,
+            first_delay=QUEST_HEALTH_PROBE_INTERVAL_SECONDS,
+        )
+
+        self.profiler = profiler or Profiler(PROFILE_DIR, "monitor", PROFILE_SECONDS)
+
+        sid = self.server_id
+        M_CONNECTED.labels(sid).set_function(lambda: 1 if self.tn else 0)
+        M_TELNET_IDLE.labels(sid).set_function(self.watchdog.idle_seconds)
+        M_RETRY_QUEUE_DEPTH.labels(sid).set_function(lambda: len(self.retry_queue))
+        M_QUEST_HEALTHY.labels(sid).set_function(lambda: 1 if self.quest_health.healthy else 0)
+        M_QUEST_LATENCY.labels(sid).set_function(lambda: self.quest_health.latency_ewma)
+        M_QUEST_SUCCESS_RATE.labels(sid).set_function(lambda: self.quest_health.success_rate)
+        self.quest_health.on_degrade = lambda: M_QUEST_HEALTH_CHANGES.labels(sid, "degraded").inc()
+        M_PLAYERS_ONLINE.labels(sid).set_function(lambda: len(self.poller.online))
+        for prio, prio_name in ((HIGH, "high"), (NORMAL, "normal"), (LOW, "low")):
+            M_EVENT_QUEUE_DEPTH.labels(sid, prio_name).set_function(lambda p=prio: self.events.depth(p))
+        if self.log_tailer:
+            M_LINES_READ.labels(sid, "logtail").set_function(lambda: self.log_tailer.lines_read)
+
+        # cold start: load the state while the telnet port is probed and the
+        # login runs; the reader waits for state_ready before the first line
+        self.jobs.once(f"{sid}:state-load", self._load_state)
+
+    def _load_state(self):
+        """Open the state store and load levels, identities, the monitor state
+        (online roster, levelgain dedupe), kill baselines, playtime and the
+        outbox. Sets state_ready when done, also after an error (the pipeline
+        then runs with what was loaded)."""
+        try:
+            with self.startup.phase("state"):
+                self.state = self._open_state_store()
+                identity = self.state.identities() if self.state else {}
+                self.players = PlayerState(
+                    levels=self.load_player_levels(),
+                    identity=identity,
+                    steam_ids={
+                        n: i["value"] for n, i in identity.items() if i["kind"] == "steam" and i["value"].isdigit()
+                    },
+                )
+                self.load_monitor_state()
+                if ENABLE_KILL_TRACKING:
+                    self.kill_baselines = self.load_kill_baselines()
+                if ENABLE_PLAYTIME_TRACKING:
+                    self.playtime = PlaytimeTracker(self.playtime_state_file)
+                if ENABLE_RETRY_QUEUE:
+                    self._load_retry_queue()
+        except Exception as e:
+            logger.error("State load error: %s", e)
+        finally:
+            # also after a failed load: updates that fail from now on are
+            # queued in memory and still have to be drained
+            if ENABLE_RETRY_QUEUE:
+                self.jobs.every(
+                    f"{self.server_id}:outbox", RETRY_FLUSH_INTERVAL_SECONDS, self.drain_outbox, jitter=JOB_JITTER
+                )
+            self.state_ready.set()
+
+    @property
+    def quest_server_healthy(self):
+        return self.quest_health.healthy
+
+    def _quest_recovered(self):
+        M_QUEST_HEALTH_CHANGES.labels(self.server_id, "healthy").inc()
+        self.jobs.run_soon(f"{self.server_id}:outbox", 0)
+
+    def _open_state_store(self):
+        if not USE_STATE_DB:
+            return None
+        if StateStore is None:
+            logger.error("bohemia_state module not found, falling back to JSON state files")
+            return None
+        try:
+            # the legacy JSON files belong to the default server only
+            store = StateStore(self.state_db_file, migrate=self.server_id == DEFAULT_SERVER_ID)
+            logger.info("Using state store %s", self.state_db_file)
+            return store
+        except Exception as e:
+            logger.error("Cannot open state store %s (%s), falling back to JSON state files", self.state_db_file, e)
+            return None
+
+    # ---------- Read API state ----------
+
+    def _player_changed(self, *names):
+        self.changes.bump(names)
+
+    def _touch_seen(self, player_name, entity_id=None):
+        seen = self.player_seen.setdefault(player_name, {"ts": 0.0, "entityId": None})
+        seen["ts"] = time.time()
+        if entity_id is not None:
+            seen["entityId"] = str(entity_id)
+
+    def read_api_snapshot(self):
+        snap = self.players.snapshot()
+        levels = snap.levels
+        identities = snap.identity
+        seen = {n: dict(v) for n, v in list(self.player_seen.items())}
+        online = self.poller.online_names()
+        players = {}
+        for name in set(levels) | set(identities) | set(seen) | online:
+            s = seen.get(name) or {}
+            players[name] = {
+                "online": name in online,
+                "level": levels.get(name),
+                "identity": identities.get(name),
+                "entityId": s.get("entityId"),
+                "lastSeen": s.get("ts") or None,
+            }
+        return {
+            "server": self.server_id,
+            "version": self.changes.version,
+            "stateVersion": snap.version,
+            "generatedAt": time.time(),
+            "rosterKnown": self.poller.roster_known,
+            "online": sorted(online),
+            "players": players,
+        }
 
     # ---------- Dedupe helpers ----------
 
     def _dedupe_key_levelgain(self, player_name, old_level, new_level):
         return f"{player_name}|{old_level}->{new_level}"
 
-    def _dedupe_purge(self):
-        now = time.time()
-        for k, ts in list(self.levelgain_dedupe.items()):
-            if (now - ts) > self.levelgain_dedupe_ttl:
-                self.levelgain_dedupe.pop(k, None)
-
-    def _dedupe_seen_recently(self, key):
-        self._dedupe_purge()
-        ts = self.levelgain_dedupe.get(key)
-        if ts is None:
+    def _quest_event_id(self, quest_type, player_name, fields, detail):
+        """Stable idempotency key of a quest event: server, quest type, the
+        player's platform id (name if unknown) and what happened, e.g.
+        "main:levelgain:76561198000000000:11->12". The same event detected
+        twice (PrismaCore and listplayers, a retried request) gets the same id."""
+        ident = fields.get("steamId") or fields.get("platformId") or player_name
+        return f"{self.server_id}:{quest_type}:{ident}:{detail}"
+
+    def _dedupe_claim(self, key):
+        """Check and mark in one step, so the reader and the updates thread
+        can't both credit the same transition. False if already claimed."""
+        if not self.players.claim_levelgain(key, self.levelgain_dedupe_ttl):
             return False
-        return (time.time() - ts) <= self.levelgain_dedupe_ttl
-
-    def _dedupe_mark(self, key):
-        self.levelgain_dedupe[key] = time.time()
+        self.save_monitor_state()
+        return True
 
     # ---------- Identity helpers ----------
 
@@ -274,11 +2139,20 @@ class IntegratedMonitor:
         if not value:
             return
 
-        self.player_identity[player_name] = {"kind": kind, "value": value}
-
+        identity = {"kind": kind, "value": value}
         # keep legacy steam map too
-        if kind == "steam" and value.isdigit():
-            self.player_steam_ids[player_name] = value
+        steam_id = value if kind == "steam" and value.isdigit() else None
+        if self.players.identity.get(player_name) == identity and (
+            steam_id is None or self.players.steam_ids.get(player_name) == steam_id
+        ):
+            return
+        if self.players.set_identity(player_name, identity, steam_id=steam_id):
+            if self.state:
+                try:
+                    self.state.set_identity(player_name, kind, value)
+                except Exception as e:
+                    logger.error("Failed to store identity for %s: %s", player_name, e)
+            self._player_changed(player_name)
 
     def remember_steam_id(self, player_name, steam_id):
         if not player_name or not steam_id:
@@ -286,22 +2160,32 @@ class IntegratedMonitor:
         sid = str(steam_id).strip()
         if not sid.isdigit():
             return
-        self.player_steam_ids[player_name] = sid
-        self.player_identity[player_name] = {"kind": "steam", "value": sid}
+        self.remember_identity(player_name, "steam", sid)
 
     def get_identity(self, player_name):
-        return self.player_identity.get(player_name)
+        return self.players.identity.get(player_name)
 
     def get_steam_id(self, player_name):
-        return self.player_steam_ids.get(player_name)
+        return self.players.steam_ids.get(player_name)
 
     # ---------- Retry queue ----------
 
     def _load_retry_queue(self):
+        if self.state:
+            try:
+                self.state.retry_prune(RETRY_MAX_ITEMS, RETRY_MAX_AGE_SECONDS)
+                for rid, item, ts in self.state.retry_items():
+                    item["ts"] = ts
+                    item["_id"] = rid
+                    self.retry_queue.append(item)
+                logger.info("Loaded retry queue items: %s", len(self.retry_queue))
+            except Exception as e:
+                logger.error("Failed to load retry queue: %s", e)
+            return
         try:
-            if not os.path.exists(RETRY_QUEUE_FILE):
+            if not os.path.exists(self.retry_queue_file):
                 return
-            with open(RETRY_QUEUE_FILE, "r", encoding="utf-8") as f:
+            with open(self.retry_queue_file, "r", encoding="utf-8") as f:
                 items = json.load(f)
             now = time.time()
             kept = 0
@@ -314,72 +2198,179 @@ class IntegratedMonitor:
             logger.error("Failed to load retry queue: %s", e)
 
     def _save_retry_queue(self):
+        if self.state:
+            return  # rows are written/deleted one by one
         try:
             if not ENABLE_RETRY_QUEUE:
                 return
-            items = list(self.retry_queue)[-RETRY_MAX_ITEMS:]
-            with open(RETRY_QUEUE_FILE, "w", encoding="utf-8") as f:
+            with self.retry_lock:
+                items = list(self.retry_queue)[-RETRY_MAX_ITEMS:]
+            with open(self.retry_queue_file, "w", encoding="utf-8") as f:
                 json.dump(items, f, indent=2)
         except Exception as e:
             logger.error("Failed to save retry queue: %s", e)
 
-    def _enqueue_retry(self, payload):
+    @staticmethod
+    def _outbox_key(payload):
+        """Items with the same key differ only in their increment and event
+        ids, and are merged."""
+        return tuple(
+            sorted((k, str(v)) for k, v in payload.items() if k not in ("increment", "eventId", "events", "ts", "_id"))
+        )
+
+    @staticmethod
+    def _payload_events(payload):
+        """[{"id", "increment"}] of an update, None if it has no event id."""
+        if payload.get("events"):
+            return list(payload["events"])
+        if payload.get("eventId"):
+            return [{"id": payload["eventId"], "increment": int(payload.get("increment", 1))}]
+        return None
+
+    def _merge_outbox_item(self, item, payload):
+        """Add payload to a queued item with the same key. The merged item
+        lists every event id with its increment ("events"), so the quest
+        server can skip the ones a timed-out request already applied. Returns
+        False if all of payload's events were queued already."""
+        queued = self._payload_events(item)
+        incoming = self._payload_events(payload)
+        if queued is not None and incoming is not None:
+            known = {e["id"] for e in queued}
+            new = [e for e in incoming if e["id"] not in known]
+            if not new:
+                return False
+            item.pop("eventId", None)
+            item["events"] = queued + new
+            item["increment"] = sum(int(e["increment"]) for e in item["events"])
+            return True
+        # one side has no id: the merged update can't be deduplicated
+        item.pop("eventId", None)
+        item.pop("events", None)
+        item["increment"] = int(item.get("increment", 1)) + int(payload.get("increment", 1))
+        return True
+
+    def _enqueue_retry(self, payload, reason="failed"):
+        """Put a quest update into the outbox. An update for the same player,
+        quest type and options as a queued one is merged into it (increment
+        and event ids), so an outage costs one item per player and quest, not
+        one per event."""
         if not ENABLE_RETRY_QUEUE:
             return
         payload = dict(payload)
         payload["ts"] = time.time()
-
-        if len(self.retry_queue) >= RETRY_MAX_ITEMS:
-            self.retry_queue.popleft()
-        self.retry_queue.append(payload)
+        M_OUTBOX.labels(self.server_id, reason).inc()
+        key = self._outbox_key(payload)
+
+        with self.retry_lock:
+            for item in self.retry_queue:
+                if self._outbox_key(item) == key:
+                    if not self._merge_outbox_item(item, payload):
+                        logger.info("Outbox: %s already queued", payload.get("eventId"))
+                        break
+                    if self.state and item.get("_id"):
+                        try:
+                            self.state.retry_update(item["_id"], {k: v for k, v in item.items() if k not in ("ts", "_id")})
+                        except Exception as e:
+                            logger.error("Failed to store retry item: %s", e)
+                    logger.info(
+                        "Outbox: merged %s %s +%s (now +%s)",
+                        payload.get("playerName"),
+                        payload.get("questType"),
+                        payload.get("increment"),
+                        item["increment"],
+                    )
+                    break
+            else:
+                if len(self.retry_queue) >= RETRY_MAX_ITEMS:
+                    dropped = self.retry_queue.popleft()
+                    logger.error("Outbox full (%s items), dropping oldest: %s", RETRY_MAX_ITEMS, dropped)
+                    self._retry_forget([dropped])
+                if self.state:
+                    try:
+                        payload["_id"] = self.state.retry_push(
+                            {k: v for k, v in payload.items() if k != "ts"}, ts=payload["ts"]
+                        )
+                    except Exception as e:
+                        logger.error("Failed to store retry item: %s", e)
+                self.retry_queue.append(payload)
+                logger.warning("Queued quest update for retry (%s): %s", reason, payload)
         self._save_retry_queue()
-        logger.warning("Queued quest update for retry: %s", payload)
 
-    def _flush_retry_queue_once(self):
-        if not ENABLE_RETRY_QUEUE or not self.retry_queue:
+    def _retry_forget(self, items):
+        if not self.state:
             return
-        if not self.quest_server_healthy:
+        try:
+            self.state.retry_delete([it["_id"] for it in items if it.get("_id")])
+        except Exception as e:
+            logger.error("Failed to delete retry items: %s", e)
+
+    def drain_outbox(self):
+        """Send queued quest updates in batches of OUTBOX_BATCH_SIZE while the
+        quest server is healthy. Items that fail go to the back, so one bad
+        item cannot block the rest; a chunk that fails completely stops the
+        run (the server is probably down again)."""
+        if not ENABLE_RETRY_QUEUE or not self.quest_server_healthy:
             return
+        with self.retry_lock:
+            budget = len(self.retry_queue)
+        sent = failed = expired = 0
+
+        while budget > 0 and self.quest_server_healthy:
+            with self.retry_lock:
+                n = min(OUTBOX_BATCH_SIZE, budget, len(self.retry_queue))
+                chunk = [self.retry_queue.popleft() for _ in range(n)]
+            if not chunk:
+                break
+            budget -= len(chunk)
 
-        max_to_try = 10
-        tried = 0
-        now = time.time()
-
-        new_q = deque()
-
-        while self.retry_queue and tried < max_to_try:
-            item = self.retry_queue.popleft()
-            tried += 1
-
-            if (now - float(item.get("ts", 0))) > RETRY_MAX_AGE_SECONDS:
-                logger.warning("Dropping expired retry item: %s", item)
-                continue
-
-            ok = self.quest_integration.update_quest(
-                item["playerName"],
-                item["questType"],
-                item.get("increment", 1),
-                steam_id=item.get("steamId"),
-                platform=item.get("platform"),
-                platform_id=item.get("platformId"),
+            now = time.time()
+            live = []
+            done = []
+            for item in chunk:
+                if (now - float(item.get("ts", 0))) > RETRY_MAX_AGE_SECONDS:
+                    logger.warning("Dropping expired retry item: %s", item)
+                    done.append(item)
+                    expired += 1
+                else:
+                    live.append(item)
+
+            results = self.quest_integration.update_quests_batch(
+                [{k: v for k, v in item.items() if k not in ("ts", "_id")} for item in live]
             )
-            if not ok:
-                new_q.append(item)
-
-        while self.retry_queue:
-            new_q.append(self.retry_queue.popleft())
+            back = []
+            for item, ok in zip(live, results):
+                (done if ok else back).append(item)
+            sent += len(live) - len(back)
+            failed += len(back)
+            with self.retry_lock:
+                self.retry_queue.extend(back)
+            self._retry_forget(done)
+            if live and len(back) == len(live):
+                break
 
-        self.retry_queue = new_q
         self._save_retry_queue()
-        if tried:
-            logger.info("Retry flush attempted: %s, remaining queued: %s", tried, len(self.retry_queue))
+        if sent or failed or expired:
+            logger.info(
+                "Outbox drained: sent=%s failed=%s expired=%s remaining=%s", sent, failed, expired, len(self.retry_queue)
+            )
 
     # ---------- Levels file ----------
 
     def load_player_levels(self):
-        if os.path.exists(LEVELS_FILE):
+        self._levels_saved = {}
+        self._levels_saved_version = 0  # PlayerState version last persisted
+        if self.state:
             try:
-                with open(LEVELS_FILE, "r", encoding="utf-8") as f:
+                data = self.state.all_levels()
+                self._levels_saved = dict(data)
+                logger.info("Loaded %s player levels from state store", len(data))
+                return data
+            except Exception as e:
+                logger.error("Error loading levels from state store: %s", e)
+                return {}
+        if os.path.exists(self.levels_file):
+            try:
+                with open(self.levels_file, "r", encoding="utf-8") as f:
                     data = json.load(f)
                 logger.info("Loaded %s player levels from file", len(data))
                 return data
@@ -388,61 +2379,483 @@ class IntegratedMonitor:
         return {}
 
     def save_player_levels(self):
+        snap = self.players.snapshot()
+        with self.persist_lock:
+            if snap.version <= self._levels_saved_version:
+                return
+            if self.state:
+                changed = {n: lvl for n, lvl in snap.levels.items() if self._levels_saved.get(n) != lvl}
+                if not changed:
+                    self._levels_saved_version = snap.version
+                    return
+                try:
+                    self.state.set_levels(changed)
+                    self._levels_saved.update(changed)
+                    self._levels_saved_version = snap.version
+                    logger.debug("Saved %s changed player levels", len(changed))
+                except Exception as e:
+                    logger.error("Error saving levels to state store: %s", e)
+                return
+            try:
+                tmp = self.levels_file + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(dict(snap.levels), f, indent=2, ensure_ascii=False)
+                os.replace(tmp, self.levels_file)
+                self._levels_saved_version = snap.version
+                logger.debug("Saved %s player levels to file", len(snap.levels))
+            except Exception as e:
+                logger.error("Error saving levels file: %s", e)
+
+    # ---------- Kill deltas ----------
+
+    def load_kill_baselines(self):
+        if not os.path.exists(self.kill_baselines_file):
+            return {}
+        try:
+            with open(self.kill_baselines_file, "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+            logger.info("Loaded %s kill baselines from file", len(data))
+            return data
+        except Exception as e:
+            logger.error("Error loading kill baselines: %s", e)
+            return {}
+
+    def save_kill_baselines(self):
+        try:
+            with open(self.kill_baselines_file, "w", encoding="utf-8") as f:
+                json.dump(self.kill_baselines, f, ensure_ascii=False)
+        except Exception as e:
+            logger.error("Error saving kill baselines: %s", e)
+
+    def _collect_kill_deltas(self, rows):
+        """Compare each row's cumulative zombies= counter with its baseline and
+        accumulate the increase in pending_kill_deltas."""
+        if not ENABLE_KILL_TRACKING or not rows:
+            return
+        now = time.time()
+        deltas = {}
+        for row in rows:
+            raw = (row["fields"].get("zombies") or "").strip()
+            if not raw.isdigit():
+                continue
+            name = row["name"]
+            count = int(raw)
+            base = self.kill_baselines.get(name)
+            self.kill_baselines[name] = {"zombies": count, "ts": now}
+            if not base:
+                continue
+
+            delta = count - int(base.get("zombies", 0) or 0)
+            if delta == 0:
+                continue
+            if delta < 0:
+                logger.info("Kill counter for %s went down (%s -> %s), re-baselining", name, base.get("zombies"), count)
+                continue
+            if (now - float(base.get("ts", 0) or 0)) > KILL_BASELINE_MAX_AGE_SECONDS:
+                logger.info("Kill baseline for %s is stale, re-baselining without crediting %s kills", name, delta)
+                continue
+            if delta > KILL_DELTA_MAX:
+                logger.warning("Implausible kill jump for %s (+%s), re-baselining", name, delta)
+                continue
+            deltas[name] = (delta, count - delta, count)
+        if deltas:
+            with self.kill_lock:
+                for name, (delta, before, after) in deltas.items():
+                    pending = self.pending_kill_deltas.get(name)
+                    if pending:
+                        pending[0] += delta
+                        pending[2] = after
+                    else:
+                        self.pending_kill_deltas[name] = [delta, before, after]
+        self.save_kill_baselines()
+
+    def flush_kill_deltas(self):
+        """Send accumulated zombie kill deltas as one batch."""
+        with self.kill_lock:
+            if not self.pending_kill_deltas:
+                return
+            pending = self.pending_kill_deltas
+            self.pending_kill_deltas = {}
+
+        updates = []
+        for name, (kills, before, after) in sorted(pending.items()):
+            fields = self._quest_identity_fields(name)
+            if not fields:
+                logger.error("Cannot send %s zombie kills for %s: no identity known", kills, name)
+                continue
+            upd = {
+                "playerName": name,
+                "questType": "zombiekills",
+                "increment": kills,
+                # only count towards an active quest, PM only on completion
+                "createIfMissing": False,
+                "notify": "complete",
+                # the listplayers zombies= counter range these kills cover
+                "eventId": self._quest_event_id("zombiekills", name, fields, f"{before}-{after}"),
+            }
+            upd.update(fields)
+            updates.append(upd)
+        if not updates:
+            return
+
+        logger.info("Sending zombie kill deltas for %s players (%s kills)", len(updates), sum(u["increment"] for u in updates))
+        if not self.quest_server_healthy:
+            for upd in updates:
+                self._enqueue_retry(upd, reason="unhealthy")
+            return
+        results = self.quest_integration.update_quests_batch(updates)
+        for upd, ok in zip(updates, results):
+            if not ok:
+                self._enqueue_retry(upd)
+
+    def send_quest_heartbeat(self):
+        """Quest types the monitor pushes itself; their heartbeat keeps the
+        cronjobs from counting them too."""
+        quest_types = []
+        if ENABLE_KILL_TRACKING:
+            quest_types.append("zombiekills")
+        if self.playtime:
+            quest_types.append("timespent")
+        self.quest_integration.send_heartbeat(quest_types)
+
+    # ---------- Playtime ----------
+
+    def flush_playtime(self):
+        """Send accrued playtime minutes as one batch."""
+        if not self.playtime:
+            return
+        pending = self.playtime.take_pending()
+        if not pending:
+            self.playtime.checkpoint()
+            return
+
+        flushed_at = int(time.time())
+        updates = []
+        for name, ms in sorted(pending.items()):
+            fields = self._quest_identity_fields(name)
+            if not fields:
+                logger.error("Cannot send %s ms playtime for %s: no identity known", ms, name)
+                continue
+            upd = {
+                "playerName": name,
+                "questType": "timespent",
+                "increment": ms,
+                "notify": "complete",
+                "eventId": self._quest_event_id("timespent", name, fields, flushed_at),
+            }
+            upd.update(fields)
+            updates.append(upd)
+
+        if updates and self.quest_server_healthy:
+            logger.info("Sending playtime for %s players", len(updates))
+            results = self.quest_integration.update_quests_batch(updates)
+            # a failed batch may still have been applied: retry it under the
+            # same event ids instead of merging it into the next flush
+            for upd, ok in zip(updates, results):
+                if not ok:
+                    self._enqueue_retry(upd)
+        else:
+            for upd in updates:
+                self.playtime.give_back(upd["playerName"], upd["increment"])
+        self.playtime.checkpoint()
+
+    # ---------- Monitor state (reconciliation) ----------
+
+    def load_monitor_state(self):
+        if not os.path.exists(self.monitor_state_file):
+            return
         try:
-            with open(LEVELS_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.players_levels, f, indent=2, ensure_ascii=False)
-            logger.debug("Saved %s player levels to file", len(self.players_levels))
+            with open(self.monitor_state_file, "r", encoding="utf-8") as f:
+                data = json.load(f) or {}
+            self.persisted_online = set(data.get("online") or [])
+            self.last_event_ts = float(data.get("last_event_ts") or 0.0)
+            now = time.time()
+            with self.players.edit() as tx:
+                for k, ts in (data.get("levelgain_dedupe") or {}).items():
+                    if (now - float(ts)) <= self.levelgain_dedupe_ttl:
+                        tx.dedupe[k] = float(ts)
+            logger.info(
+                "Loaded monitor state: %s online at last save, last event %s",
+                len(self.persisted_online),
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.last_event_ts)) if self.last_event_ts else "never",
+            )
         except Exception as e:
-            logger.error("Error saving levels file: %s", e)
+            logger.error("Failed to load monitor state: %s", e)
+
+    def save_monitor_state(self):
+        try:
+            self.players.purge_dedupe(self.levelgain_dedupe_ttl)
+            online = sorted(self.poller.online_names()) if self.poller.roster_known else sorted(self.persisted_online)
+            data = {
+                "online": online,
+                "last_event_ts": self.last_event_ts,
+                "levelgain_dedupe": dict(self.players.dedupe),
+                "saved_at": time.time(),
+            }
+            with self.persist_lock:
+                tmp = self.monitor_state_file + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp, self.monitor_state_file)
+            self.persisted_online = set(online)
+        except Exception as e:
+            logger.error("Failed to save monitor state: %s", e)
+
+    def _quest_identity_fields(self, player_name):
+        """Identity fields for a quest update payload, or None if unknown."""
+        ident = self.get_identity(player_name) or {}
+        kind = ident.get("kind")
+        val = ident.get("value")
+        if kind == "steam" and val and str(val).isdigit():
+            return {"steamId": val}
+        if kind in ("xbl", "eos") and val:
+            return {"platform": kind, "platformId": val}
+        return None
+
+    def reconcile_after_reconnect(self):
+        """
+        Credit exactly the level-ups missed while disconnected, as one batch.
+
+        Baseline is the persisted last-known level per player; the observed level
+        is the max of the fresh listplayers snapshot and any PrismaCore level-up
+        the log tail delivered meanwhile (also covers players who logged off
+        during the outage). Dedupe keys are marked for the batch transition and
+        for every deferred PrismaCore transition, so replays can't double count.
+        """
+        if not self.listplayers_lock.acquire(timeout=30):
+            logger.warning("Reconcile skipped: listplayers busy")
+            with self.reconcile_lock:
+                self.reconcile_pending = False
+            return
+
+        # the lock only covers the console read and the state changes; the
+        # quest server batch below runs without it
+        try:
+            updates = self._reconcile_collect()
+        except Exception as e:
+            logger.error("Reconcile error: %s", e)
+            return
+        finally:
+            self.listplayers_lock.release()
+
+        try:
+            self.save_player_levels()
+            self.save_monitor_state()
+            self.flush_kill_deltas()
+
+            if not updates:
+                logger.info("Reconcile: nothing missed")
+                return
+
+            if not self.quest_server_healthy:
+                logger.warning("Reconcile: quest server unavailable, queueing %s updates", len(updates))
+                for upd in updates:
+                    self._enqueue_retry(upd, reason="unhealthy")
+                return
+
+            results = self.quest_integration.update_quests_batch(updates)
+            for upd, ok in zip(updates, results):
+                if not ok:
+                    self._enqueue_retry(upd)
+            logger.info("Reconcile: sent %s missed levelgain updates in one batch", len(updates))
+
+        except Exception as e:
+            logger.error("Reconcile error: %s", e)
+
+    def _reconcile_collect(self):
+        """Read listplayers, apply it and work out the missed levelgain
+        updates. Caller holds listplayers_lock."""
+        if self.last_event_ts:
+            logger.info("Reconciling after reconnect (last processed event %.0fs ago)", time.time() - self.last_event_ts)
+        else:
+            logger.info("Reconciling after reconnect")
+
+        rows, total = self._fetch_listplayers()
+
+        with self.reconcile_lock:
+            missed = self.missed_levelups
+            self.missed_levelups = {}
+            self.reconcile_pending = False
+
+        names = set(missed)
+        if rows:
+            names.update(r["name"] for r in rows)
+
+        levels = self.players.levels
+        baseline = {}
+        observed = {}
+        for name in names:
+            if name in levels:
+                baseline[name] = int(levels.get(name, 0) or 0)
+            elif name in missed:
+                baseline[name] = min(old for old, _new in missed[name])
+            else:
+                baseline[name] = 0
+        for name, transitions in missed.items():
+            observed[name] = max(new for _old, new in transitions)
+
+        if rows is not None:
+            self._apply_listplayers_rows(rows, total)
+            self._collect_kill_deltas(rows)
+            for r in rows:
+                observed[r["name"]] = max(observed.get(r["name"], 0), r["level"])
+            went_offline = self.persisted_online - self.poller.online_names()
+            if went_offline:
+                logger.info("Went offline while we were disconnected: %s", sorted(went_offline))
+        else:
+            logger.warning("Reconcile: listplayers snapshot unavailable, using buffered log events only")
+
+        now = time.time()
+        updates = []
+        for name in sorted(observed):
+            old_level = baseline.get(name, 0)
+            new_level = observed[name]
+            if new_level <= old_level:
+                continue
+            fields = self._quest_identity_fields(name)
+            if not fields:
+                logger.error("Reconcile: no identity known for %s (%s->%s)", name, old_level, new_level)
+                continue
+            key = self._dedupe_key_levelgain(name, old_level, new_level)
+            if not self.players.claim_levelgain(key, self.levelgain_dedupe_ttl, now):
+                logger.info("Reconcile: skipping duplicate levelgain for %s %s->%s", name, old_level, new_level)
+                continue
+            self.players.raise_level(name, new_level)
+            upd = {
+                "playerName": name,
+                "questType": "levelgain",
+                "increment": new_level - old_level,
+                "eventId": self._quest_event_id("levelgain", name, fields, f"{old_level}->{new_level}"),
+            }
+            upd.update(fields)
+            updates.append(upd)
+            logger.info("Reconcile: %s %s->%s (+%s)", name, old_level, new_level, new_level - old_level)
+
+        # after the claims: a single deferred transition has the same key as
+        # its batch entry and must not block it
+        with self.players.edit() as tx:
+            for name, transitions in missed.items():
+                for t_old, t_new in transitions:
+                    tx.dedupe[self._dedupe_key_levelgain(name, t_old, t_new)] = now
+        return updates
 
     # ---------- Telnet connect/send ----------
 
     def connect(self):
+        """Open the telnet session and log in. Returns as soon as the login is
+        confirmed so the reader starts at once; warm-up + reconcile
+        (_warm_up) and the quest server health check (_check_quest_server) run
+        in the background, side by side."""
         try:
+            self._close_session()
             logger.info("Connecting to %s:%s", self.host, self.port)
             self.tn = telnetlib.Telnet(self.host, self.port, timeout=10)
+            enable_keepalive(self.tn.sock)
+            self.session_stop.clear()
 
             with self.tn_lock:
                 self.tn.read_until(b"Please enter password:", timeout=5)
                 self.tn.write(self.password.encode("utf-8") + b"\n")
-            time.sleep(0.7)
-
-            with self.tn_lock:
-                self.tn.read_very_eager()
-                logger.debug("Warming up telnet connection...")
-                self.tn.write(b"version\n")
-            time.sleep(0.4)
-            with self.tn_lock:
-                self.tn.read_very_eager()
+                reply = self.tn.read_until(b"Logon successful", timeout=LOGIN_TIMEOUT_SECONDS)
+            if b"incorrect" in reply.lower():
+                raise ConnectionError("telnet password rejected")
+            if b"Logon successful" not in reply:
+                logger.warning("No login confirmation within %ss, continuing", LOGIN_TIMEOUT_SECONDS)
 
+            self.watchdog.start()
             logger.info("Connected to telnet OK")
-            self.reconnect_delay = 30
-
-            logger.info("Checking Takaro quest server...")
-            self.quest_server_healthy = self.quest_integration.check_server_health()
-            if self.quest_server_healthy:
-                logger.info("Quest server is healthy and authenticated")
-            else:
-                logger.warning("Quest server is NOT healthy/authenticated (quest updates will be skipped)")
-
-            self.update_player_levels(force=True)
+            M_CONNECTS.labels(self.server_id, "ok").inc()
+            self.startup.finish("login")
+            self.jobs.once(f"{self.server_id}:warmup", self._warm_up, group=self.session_jobs)
+            self.jobs.once(f"{self.server_id}:quest-check", self._check_quest_server, group=self.session_jobs)
             return True
 
         except Exception as e:
+            M_CONNECTS.labels(self.server_id, "failed").inc()
+            self.watchdog.stop()
+            self._close_session()
             logger.error("Connection failed: %s", e)
             return False
 
-    def send_command(self, command):
+    def _warm_up(self):
+        """Post-login work that used to gate the reader: version warm-up,
+        telnet log mute, reconnect reconcile (the roster sync). Level-ups
+        seen meanwhile are deferred into missed_levelups."""
         try:
-            with self.tn_lock:
-                logger.debug("Sending command: %s", command)
-                self.tn.write(f"{command}\n".encode("utf-8"))
-                time.sleep(self.command_delay)
-                self.tn.read_very_eager()
-            return True
+            logger.debug("Warming up telnet connection...")
+            self.send_command("version", priority=CMD_PRIORITY_POLL, wait=False)
+            if self.log_tailer and LOG_TAIL_MUTE_TELNET_LOGS:
+                self.send_command("loglevel ALL false", priority=CMD_PRIORITY_POLL, wait=False)
+
+            self.state_ready.wait()
+            if not self.session_stop.is_set():
+                with self.startup.phase("roster"):
+                    self.reconcile_after_reconnect()
         except Exception as e:
-            logger.error("Error sending command: %s", e)
-            return False
+            logger.error("Warm-up error: %s", e)
+
+    def _check_quest_server(self):
+        """Post-login quest server check; until it answers, quest updates go
+        to the outbox (QuestHealth starts degraded)."""
+        logger.info("Checking Takaro quest server...")
+        with self.startup.phase("quest_health"):
+            healthy = self.quest_integration.check_server_health()
+        if healthy:
+            logger.info("Quest server is healthy and authenticated")
+        else:
+            logger.warning("Quest server is NOT healthy/authenticated (quest updates go to the outbox)")
+
+    def _close_session(self):
+        """Close the telnet object when the reader stops or a connect fails (a
+        stalled session is only shut down, not closed, by the watchdog).
+        self.tn is None whenever there is no live session: the connected
+        gauge, /servers and the command writer check it."""
+        with self.tn_lock:
+            tn, self.tn = self.tn, None
+        if tn is None:
+            return
+        try:
+            tn.close()
+        except Exception:
+            pass
+
+    def _watchdog_probe(self):
+        self.send_command("version", priority=CMD_PRIORITY_POLL, wait=False, coalesce_key="watchdog-probe")
+
+    def _on_stall(self, reason):
+        """Watchdog callback: stop the reader and wake up its blocked read."""
+        M_STALLS.labels(self.server_id, reason).inc()
+        self.session_stop.set()
+        sock = getattr(self.tn, "sock", None)
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _write_command(self, command):
+        """Raw socket write; only ever called from the CommandScheduler thread."""
+        tn = self.tn
+        if not tn or self.session_stop.is_set():
+            raise ConnectionError("not connected")
+        try:
+            with self.tn_lock:
+                commands_log.debug("Sending command: %s", command)
+                tn.write(f"{command}\n".encode("utf-8"))
+        except (OSError, AttributeError) as e:
+            self.watchdog.write_failed(e)
+            raise
+        self.watchdog.command_sent()
+
+    def send_command(self, command, priority=CMD_PRIORITY_INTERACTIVE, wait=True, coalesce_key=None):
+        """Queue a console command. With wait=True blocks until it was written
+        and returns True/False (None: timed out while being written, see
+        CommandScheduler.wait_or_cancel); with wait=False returns the
+        CommandTicket."""
+        ticket = self.commands.submit(command, priority=priority, coalesce_key=coalesce_key)
+        if not wait:
+            return ticket
+        return self.commands.wait_or_cancel(ticket)
 
     @staticmethod
     def _quote_if_needed(text):
@@ -457,6 +2870,31 @@ class IntegratedMonitor:
             return f'"{escaped}"'
         return text
 
+    def _player_targets(self, player_name):
+        """Entity id, platform id, quoted name - see player_targets()."""
+        ident = self.get_identity(player_name) or {}
+        platform_id = None
+        if ident.get("kind") in ("steam", "xbl", "eos") and ident.get("value"):
+            platform_id = "%s_%s" % ({"steam": "Steam", "xbl": "XBL", "eos": "EOS"}[ident["kind"]], ident["value"])
+        return player_targets(player_name, self.poller.entity_id(player_name), platform_id)
+
+    def send_addressed(self, player_name, build, priority=CMD_PRIORITY_INTERACTIVE):
+        """Send build(target) addressed by entity id, else platform id, else
+        quoted name, until the console output shows no error. Returns False
+        if every form was rejected (or could not be written)."""
+        verb = build("").split(" ", 1)[0]
+        target = send_to_player(
+            lambda command: self.send_command(command, priority=priority),
+            self.outcomes,
+            build,
+            self._player_targets(player_name),
+            verb=verb,
+        )
+        if target is None:
+            logger.error("%s for %s failed for every way to address the player", verb, player_name)
+            return False
+        return True
+
     def send_pm(self, player_name, message):
         """Send a private message using the pm2 syntax:
         pm2 <channel> <player_or_id> <text>
@@ -464,11 +2902,7 @@ class IntegratedMonitor:
         pm2 Brewer 171 "test delsi vety kde jsou mezery"
         """
         quoted_message = self._quote_if_needed(message)
-        for _ in range(2):
-            if self.send_command(f"pm2 {PM_CHANNEL} {player_name} {quoted_message}"):
-                return True
-            time.sleep(0.7)
-        return False
+        return self.send_addressed(player_name, lambda target: f"pm2 {PM_CHANNEL} {target} {quoted_message}")
 
     # ---------- listplayers helpers ----------
 
@@ -477,12 +2911,148 @@ class IntegratedMonitor:
         end = time.time() + LISTPLAYERS_READ_WINDOW_SECONDS
         while time.time() < end:
             with self.tn_lock:
-                data = self.tn.read_very_eager()
+                tn = self.tn
+                data = tn.read_very_eager() if tn else b""
+            if not tn:
+                break
             if data:
+                self.watchdog.data_received()
                 chunks.append(data.decode("utf-8", errors="ignore"))
+                # listplayers always ends with "Total of N in the game"
+                if LISTPLAYERS_TOTAL_RE.search(chunks[-1]) or LISTPLAYERS_TOTAL_RE.search("".join(chunks[-2:])):
+                    break
             time.sleep(LISTPLAYERS_READ_SLEEP_SECONDS)
         return "".join(chunks)
 
+    def _fetch_listplayers(self):
+        """Run listplayers once. Returns (rows, total); rows is None when the
+        output was unusable, total is the "Total of N in the game" count or None."""
+        if not self.send_command("listplayers", priority=CMD_PRIORITY_POLL, coalesce_key="listplayers"):
+            logger.warning("listplayers could not be sent")
+            return None, None
+
+        response = self._read_listplayers_output()
+        listplayers_log.debug("Listplayers response length: %s", len(response))
+        response = self._redispatch_foreign_lines(response)
+
+        total_match = LISTPLAYERS_TOTAL_RE.search(response)
+        total = int(total_match.group(1)) if total_match else None
+        if total == 0:
+            return [], 0
+
+        if not response.strip() or len(response) < LISTPLAYERS_MIN_USEFUL_CHARS:
+            return None, None
+
+        return self._parse_listplayers(response), total
+
+    def _redispatch_foreign_lines(self, response):
+        """listplayers output is read straight off the socket, so console lines
+        that arrived meanwhile (chat, PrismaCore level-ups) end up in it. Queue
+        them as the reader would; return the listplayers part."""
+        kept = []
+        for raw in response.splitlines():
+            line = raw.strip()
+            if not line:
+                continue
+            if LISTPLAYERS_ROW_RE.search(line) or LISTPLAYERS_TOTAL_RE.search(line):
+                kept.append(line)
+                continue
+            M_LINES_READ.labels(self.server_id, "telnet").inc()
+            self.outcomes.feed(line)
+            if not self.log_tailer:
+                self.events.put(line)
+        return "\n".join(kept)
+
+    def _parse_listplayers(self, response):
+        """One dict per listplayers row: entity_id, name, level, pltfmid, fields."""
+        rows = []
+        for raw in response.splitlines():
+            m = LISTPLAYERS_ROW_RE.search(raw)
+            if not m:
+                continue
+            eid = m.group(1)
+            player_name = m.group(2).strip()
+            if not player_name or player_name == "EntityPlayer":
+                listplayers_log.debug("Skipping listplayers row with empty or placeholder name 'EntityPlayer' (entity id=%s)", eid)
+                continue
+            fields = dict(LISTPLAYERS_FIELD_RE.findall(raw))
+            lvl = fields.get("level", "")
+            if not lvl.isdigit():
+                continue
+            rows.append(
+                {
+                    "entity_id": eid,
+                    "name": player_name,
+                    "level": int(lvl),
+                    "pltfmid": fields.get("pltfmid", "").strip(),
+                    "fields": fields,
+                }
+            )
+        return rows
+
+    def _apply_listplayers_rows(self, rows, total):
+        """Learn identities, reconcile the roster (only when all `total` rows
+        were read) and update cached levels.
+        Returns [(player_name, old_level, new_level)] for players that went up."""
+        leveled_up = []
+        seen_names = set()
+        changed = set()
+        online_before = self.poller.online_names()
+
+        for row in rows:
+            player_name = row["name"]
+            if player_name in seen_names:
+                continue
+            seen_names.add(player_name)
+            self._touch_seen(player_name, row["entity_id"])
+
+            pltfm = row["pltfmid"]
+            if pltfm.startswith("Steam_"):
+                self.remember_identity(player_name, "steam", pltfm)
+            elif pltfm.startswith("XBL_"):
+                self.remember_identity(player_name, "xbl", pltfm)
+            elif pltfm.startswith("EOS_"):
+                self.remember_identity(player_name, "eos", pltfm)
+
+            level = row["level"]
+            old_level = self.players.set_level(player_name, level)
+
+            if old_level != level:
+                logger.info("Updated %s level: %s -> %s", player_name, old_level, level)
+                changed.add(player_name)
+            if level > old_level:
+                leveled_up.append((player_name, old_level, level))
+
+        if total is not None and len(seen_names) == total:
+            self.poller.reconcile(seen_names, {r["name"]: r["entity_id"] for r in rows})
+            if self.playtime:
+                self.playtime.reconcile(seen_names)
+        else:
+            # rows missing (the chat reader took some of the reply, or no
+            # "Total of N" line): nobody is dropped from the roster or has
+            # their playtime session closed on an incomplete listing
+            if total is not None:
+                logger.info("listplayers: %s of %s rows read, roster not reconciled", len(seen_names), total)
+            for row in rows:
+                self.poller.player_joined(row["name"], row["entity_id"])
+                if self.playtime:
+                    self.playtime.start(row["name"])
+        changed |= online_before ^ self.poller.online_names()
+        self._player_changed(*sorted(changed))
+        if self.state and seen_names:
+            try:
+                self.state.mark_seen(seen_names, {r["name"]: r["entity_id"] for r in rows})
+            except Exception as e:
+                logger.error("Failed to store last seen: %s", e)
+        if total == 0:
+            logger.info("listplayers: nobody online")
+
+        self.save_player_levels()
+        self.last_listplayers_ts = time.time()
+        self.save_monitor_state()
+        logger.info("Player levels updated. Total players tracked: %s", len(self.players.levels))
+        return leveled_up
+
     # ---------- Level polling + quest trigger ----------
 
     def update_player_levels(self, force=False):
@@ -490,6 +3060,10 @@ class IntegratedMonitor:
             logger.debug("Skipping update_player_levels (already running)")
             return
 
+        # the lock covers the console read and applying it; kill deltas and
+        # quest updates are sent after it is released
+        run_start = None
+        fetched = False
         try:
             now = time.time()
             if (not force) and (now - self.last_listplayers_ts) < LISTPLAYERS_COOLDOWN_SECONDS:
@@ -497,150 +3071,19 @@ class IntegratedMonitor:
                 return
 
             logger.info("Updating player levels...")
+            run_start = time.perf_counter()
 
-            with self.tn_lock:
-                self.tn.read_very_eager()
-                self.tn.write(b"listplayers\n")
-
-            response = self._read_listplayers_output()
-            logger.debug("Listplayers response length: %s", len(response))
-
-            if not response.strip() or len(response) < LISTPLAYERS_MIN_USEFUL_CHARS:
-                return
-
-            leveled_up = []
-            seen_names = set()
-
-            pattern_b = r"id=(\d+),\s*([^,]+),.*?level=(\d+).*?pltfmid=Steam_(\d+)"
-            matches_b = re.findall(pattern_b, response)
-
-            for _eid, player_name, lvl, sid in matches_b:
-                player_name = player_name.strip()
-                if not player_name or player_name == "EntityPlayer":
-                    logger.debug(
-                        "Skipping listplayers row with empty or placeholder name 'EntityPlayer' (entity id=%s)", _eid
-                    )
-                    continue
-                level = int(lvl)
-                seen_names.add(player_name)
-
-                self.remember_identity(player_name, "steam", sid)
-
-                old_level = int(self.players_levels.get(player_name, 0) or 0)
-                self.players_levels[player_name] = level
-
-                if old_level != level:
-                    logger.info("Updated %s level: %s -> %s", player_name, old_level, level)
-                if level > old_level:
-                    leveled_up.append((player_name, old_level, level))
-
-            pattern_a = r"id=(\d+),\s*([^,]+),.*?level=(\d+)"
-            matches_a = re.findall(pattern_a, response)
-            for _eid, player_name, lvl in matches_a:
-                player_name = player_name.strip()
-                if not player_name or player_name == "EntityPlayer":
-                    logger.debug(
-                        "Skipping listplayers row with empty or placeholder name 'EntityPlayer' (entity id=%s)", _eid
-                    )
-                    continue
-                if player_name in seen_names:
-                    continue
-                level = int(lvl)
-
-                old_level = int(self.players_levels.get(player_name, 0) or 0)
-                self.players_levels[player_name] = level
-
-                if old_level != level:
-                    logger.info("Updated %s level: %s -> %s", player_name, old_level, level)
-                if level > old_level:
-                    leveled_up.append((player_name, old_level, level))
-
-            self.save_player_levels()
-            self.last_listplayers_ts = time.time()
-            logger.info("Player levels updated. Total players tracked: %s", len(self.players_levels))
-
-            if not leveled_up:
+            rows, total = self._fetch_listplayers()
+            if rows is None:
+                M_LISTPLAYERS.labels(self.server_id, "unusable").inc()
                 return
+            M_LISTPLAYERS.labels(self.server_id, "empty" if total == 0 else "ok").inc()
 
-            if not self.quest_server_healthy:
-                logger.warning("Quest server not available for level updates right now")
-                return
-
-            for player_name, old_level, new_level in leveled_up:
-                inc = max(1, new_level - old_level)
-                dedupe_key = self._dedupe_key_levelgain(player_name, old_level, new_level)
-                if self._dedupe_seen_recently(dedupe_key):
-                    logger.info(
-                        "Skipping duplicate levelgain (listplayers) for %s %s->%s",
-                        player_name,
-                        old_level,
-                        new_level,
-                    )
-                    continue
-
-                ident = self.get_identity(player_name) or {}
-                kind = ident.get("kind")
-                val = ident.get("value")
-
-                if kind == "steam" and val and str(val).isdigit():
-                    logger.info(
-                        "Level up detected via listplayers: %s %s->%s (+%s); updating levelgain quest (steam)",
-                        player_name,
-                        old_level,
-                        new_level,
-                        inc,
-                    )
-                    self._dedupe_mark(dedupe_key)
-                    ok = self.quest_integration.update_quest(
-                        player_name,
-                        "levelgain",
-                        inc,
-                        steam_id=val,
-                    )
-                    if not ok:
-                        logger.error("Failed to update levelgain quest for %s", player_name)
-                        self._enqueue_retry(
-                            {"playerName": player_name, "steamId": val, "questType": "levelgain", "increment": inc}
-                        )
-                    continue
-
-                if kind in ("xbl", "eos") and val:
-                    logger.info(
-                        "Level up detected via listplayers: %s %s->%s (+%s); updating levelgain quest (%s)",
-                        player_name,
-                        old_level,
-                        new_level,
-                        inc,
-                        kind,
-                    )
-                    self._dedupe_mark(dedupe_key)
-                    ok = self.quest_integration.update_quest(
-                        player_name,
-                        "levelgain",
-                        inc,
-                        platform=kind,
-                        platform_id=val,
-                    )
-                    if not ok:
-                        logger.error("Failed to update levelgain quest for %s (%s)", player_name, kind)
-                        self._enqueue_retry(
-                            {
-                                "playerName": player_name,
-                                "platform": kind,
-                                "platformId": val,
-                                "questType": "levelgain",
-                                "increment": inc,
-                            }
-                        )
-                    continue
-
-                logger.error(
-                    "Cannot update levelgain for %s (%s->%s): no identity known (steam/xbl/eos)",
-                    player_name,
-                    old_level,
-                    new_level,
-                )
+            leveled_up = self._apply_listplayers_rows(rows, total)
+            M_LEVELUPS.labels(self.server_id, "listplayers").inc(len(leveled_up or ()))
 
+            self._collect_kill_deltas(rows)
+            fetched = True
         except Exception as e:
             logger.error("Error updating player levels: %s", e)
         finally:
@@ -648,13 +3091,98 @@ class IntegratedMonitor:
                 self.listplayers_lock.release()
             except Exception:
                 pass
+            if run_start is not None and not fetched:
+                M_UPDATE_LEVELS.observe(time.perf_counter() - run_start)
+
+        if not fetched:
+            return
+        try:
+            self.flush_kill_deltas()
+            if leveled_up:
+                self._send_listplayers_levelups(leveled_up)
+        except Exception as e:
+            logger.error("Error updating player levels: %s", e)
+        finally:
+            M_UPDATE_LEVELS.observe(time.perf_counter() - run_start)
+
+    def _coalesce_levelup(self, player_name, old_level, new_level):
+        """Collect a PrismaCore level-up; the first one of a burst schedules
+        the flush LEVELGAIN_COALESCE_SECONDS later, the rest extend the range."""
+        with self.levelup_lock:
+            burst = self.levelup_bursts.get(player_name)
+            if burst is not None:
+                burst[0] = min(burst[0], old_level)
+                burst[1] = max(burst[1], new_level)
+                burst[2] += 1
+                return
+            self.levelup_bursts[player_name] = [old_level, new_level, 1]
+        self.jobs.once(
+            f"{self.server_id}:levelgain:{player_name}",
+            lambda: self._flush_levelup(player_name),
+            delay=LEVELGAIN_COALESCE_SECONDS,
+        )
+
+    def _flush_levelup(self, player_name):
+        with self.levelup_lock:
+            burst = self.levelup_bursts.pop(player_name, None)
+        if burst is None:
+            return
+        old_level, new_level, transitions = burst
+        if transitions > 1:
+            M_LEVELUPS_COALESCED.labels(self.server_id).inc(transitions - 1)
+            logger.info("Coalesced %s PrismaCore level-ups of %s into %s->%s", transitions, player_name, old_level, new_level)
+        self._credit_levelgain(player_name, old_level, new_level, "PrismaCore")
+
+    def _send_listplayers_levelups(self, leveled_up):
+        for player_name, old_level, new_level in leveled_up:
+            self._credit_levelgain(player_name, old_level, new_level, "listplayers")
+
+    def _credit_levelgain(self, player_name, old_level, new_level, source):
+        """Claim the transition's dedupe key and send the increment; while the
+        quest server is degraded, or when the send fails, it goes to the
+        outbox instead. Nothing is dropped except for players without a known
+        identity (the quest server could not resolve them)."""
+        inc = max(1, new_level - old_level)
+        fields = self._quest_identity_fields(player_name)
+        if not fields:
+            logger.error(
+                "Cannot update levelgain for %s (%s->%s): no identity known (steam/xbl/eos)",
+                player_name,
+                old_level,
+                new_level,
+            )
+            return
+        if not self._dedupe_claim(self._dedupe_key_levelgain(player_name, old_level, new_level)):
+            logger.info("Skipping duplicate levelgain (%s) for %s %s->%s", source, player_name, old_level, new_level)
+            return
+
+        logger.info("%s level-up detected: %s %s->%s (+%s)", source, player_name, old_level, new_level, inc)
+        event_id = self._quest_event_id("levelgain", player_name, fields, f"{old_level}->{new_level}")
+        payload = {"playerName": player_name, "questType": "levelgain", "increment": inc, "eventId": event_id}
+        payload.update(fields)
+        if not self.quest_server_healthy:
+            self._enqueue_retry(payload, reason="unhealthy")
+            return
+        ok = self.quest_integration.update_quest(
+            player_name,
+            "levelgain",
+            inc,
+            steam_id=fields.get("steamId"),
+            platform=fields.get("platform"),
+            platform_id=fields.get("platformId"),
+            event_id=event_id,
+        )
+        if not ok:
+            logger.error("Failed to update levelgain quest for %s", player_name)
+            self._enqueue_retry(payload)
 
     # ---------- Catchup ----------
 
     def get_highest_level(self):
-        if not self.players_levels:
+        levels = self.players.levels
+        if not levels:
             return 1
-        return max(int(v or 0) for v in self.players_levels.values())
+        return max(int(v or 0) for v in levels.values())
 
     def xp_for_level(self, level):
         if level <= 60:
@@ -667,223 +3195,382 @@ class IntegratedMonitor:
                 return entry["target"]
         return None
 
+    def _dispatch_catchup_command(self, player_name, steam_id):
+        """Hand /catchup to a job worker: it waits for the givexp outcome,
+        which would hold up every line behind it on the handler thread. One
+        /catchup per player at a time."""
+        with self.catchups_in_flight_lock:
+            if steam_id in self.catchups_in_flight:
+                logger.info("/catchup from %s is already being handled", player_name)
+                return
+            self.catchups_in_flight.add(steam_id)
+
+        def run():
+            try:
+                self.admission.remember("catchup", steam_id, self.handle_catchup_command(player_name, steam_id))
+            finally:
+                with self.catchups_in_flight_lock:
+                    self.catchups_in_flight.discard(steam_id)
+
+        self.jobs.once(f"{self.server_id}:catchup:{steam_id}", run)
+
     def handle_catchup_command(self, player_name, steam_id=None):
-        player_level = int(self.players_levels.get(player_name, 1) or 1)
+        """Returns the refusal sent to the player, None once catchup was applied."""
+        player_level = int(self.players.levels.get(player_name, 1) or 1)
         if player_level > 1:
-            self.send_pm(player_name, "You cannot use /catchup because you are above level 1.")
-            return
+            reply = "You cannot use /catchup because you are above level 1."
+            self.send_pm(player_name, reply)
+            return reply
 
         highest = self.get_highest_level()
         target_level = self.target_level_from_highest(highest)
         if not target_level:
-            self.send_pm(player_name, "Catchup not available yet. Server highest level too low.")
-            return
+            reply = "Catchup not available yet. Server highest level too low."
+            self.send_pm(player_name, reply)
+            return reply
 
         xp = self.xp_for_level(target_level)
-        self.send_command(f"givexp {player_name} {xp}")
+        if not self.send_addressed(player_name, lambda target: f"givexp {target} {xp}", priority=CMD_PRIORITY_REWARD):
+            reply = "Catchup could not be applied right now. Please try again later."
+            self.send_pm(player_name, reply)
+            return reply
         self.send_pm(player_name, f"Catchup applied! You are now level {target_level}.")
-        self.players_levels[player_name] = target_level
+        self.players.set_level(player_name, target_level)
         self.save_player_levels()
 
-    # ---------- Threads ----------
+    # ---------- Scheduled jobs ----------
 
-    def periodic_updates(self):
-        while self.tn:
-            try:
-                self.update_player_levels(force=False)
-                time.sleep(LISTPLAYERS_POLL_SECONDS)
-            except Exception as e:
-                logger.error("Periodic update error: %s", e)
-                time.sleep(10)
+    def _start_session_jobs(self):
+        sid = self.server_id
+        group = self.session_jobs
+        # first listplayers right away, then as often as the poller says
+        self.jobs.every(f"{sid}:listplayers", self._next_listplayers_interval, self.update_player_levels, first_delay=0, group=group)
+        if self.playtime:
+            self.jobs.every(
+                f"{sid}:playtime-flush", PLAYTIME_FLUSH_INTERVAL_SECONDS, self.flush_playtime, jitter=JOB_JITTER, group=group
+            )
+        # the cronjobs fall back to their own counting once this goes stale,
+        # so it runs for the whole session, kills / playtime or not
+        self.jobs.every(
+            f"{sid}:quest-heartbeat", QUEST_HEARTBEAT_INTERVAL_SECONDS, self.send_quest_heartbeat, first_delay=0, group=group
+        )
+
+    def _next_listplayers_interval(self):
+        interval, reason = self.poller.next_interval()
+        logger.debug("Next listplayers in %ss (%s)", interval, reason)
+        return interval
+
+    def probe_quest_health(self):
+        """Probe /health only while degraded; live requests keep the health
+        current otherwise (a success here drains the outbox)."""
+        if self.quest_health.healthy:
+            return
+        logger.debug("Quest server degraded, probing /health")
+        self.quest_integration.check_server_health()
 
-    def periodic_quest_health_check(self):
-        while self.tn:
-            try:
-                time.sleep(300)
-                old = self.quest_server_healthy
-                self.quest_server_healthy = self.quest_integration.check_server_health()
-                if old != self.quest_server_healthy:
-                    logger.info("Quest server health changed: %s -> %s", old, self.quest_server_healthy)
-            except Exception as e:
-                logger.error("Health check error: %s", e)
+    # ---------- Main loop ----------
 
-    def periodic_retry_flush(self):
-        if not ENABLE_RETRY_QUEUE:
-            return
-        while self.tn:
+    def handle_line(self, line_str):
+        """Process one console/log line. Runs on the event queue's thread; the
+        lines come from the telnet reader or, in log-tail mode, the LogTailer
+        (never both)."""
+        if not self.state_ready.is_set():
+            self.state_ready.wait()  # cold start, the LogTailer may be first
+        start = time.perf_counter()
+        try:
+            self._handle_line(line_str)
+        finally:
+            M_HANDLE_LINE.observe(time.perf_counter() - start)
+
+    def _handle_line(self, line_str):
+        ts_match = LINE_TS_RE.match(line_str)
+        if ts_match and ts_match.group(1) != self.last_event_stamp:
+            self.last_event_stamp = ts_match.group(1)
             try:
-                time.sleep(RETRY_FLUSH_INTERVAL_SECONDS)
-                self._flush_retry_queue_once()
-            except Exception as e:
-                logger.error("Retry flush error: %s", e)
+                self.last_event_ts = time.mktime(time.strptime(self.last_event_stamp, "%Y-%m-%dT%H:%M:%S"))
+            except ValueError:
+                pass
 
-    # ---------- Main loop ----------
+        if any(
+            k in line_str
+            for k in [
+                "Chat",
+                "catchup",
+                "vote",
+                "XP gained",
+                "playerLeveled",
+                "listplayers",
+                "voting reward",
+                "[PrismaCore]playerLeveled",
+            ]
+        ):
+            telnet_log.debug("Received: %s", line_str)
+
+        # Learn platform identity from any chat line (Steam/XBL/EOS)
+        chat_any = re.search(r"Chat \(from '([^']+)',.*?\): '(.+?)':", line_str)
+        if chat_any:
+            from_id = chat_any.group(1)
+            pname = chat_any.group(2)
+
+            if from_id.startswith("Steam_"):
+                sid = from_id.replace("Steam_", "").strip()
+                self.remember_identity(pname, "steam", sid)
+            elif from_id.startswith("XBL_"):
+                xid = from_id.replace("XBL_", "").strip()
+                self.remember_identity(pname, "xbl", xid)
+            elif from_id.startswith("EOS_"):
+                eid = from_id.replace("EOS_", "").strip()
+                self.remember_identity(pname, "eos", eid)
+
+        # Online roster: spawn / disconnect
+        spawn_match = SPAWN_RE.search(line_str)
+        if spawn_match:
+            eid, pltfm, pname = spawn_match.groups()
+            if pltfm.startswith("Steam_"):
+                self.remember_identity(pname, "steam", pltfm)
+            elif pltfm.startswith("XBL_"):
+                self.remember_identity(pname, "xbl", pltfm)
+            elif pltfm.startswith("EOS_"):
+                self.remember_identity(pname, "eos", pltfm)
+            self.poller.player_joined(pname, eid)
+            if self.playtime:
+                self.playtime.start(pname)
+            self._touch_seen(pname, eid)
+            self._player_changed(pname)
+            logger.info("Player spawned: %s (entity %s)", pname, eid)
+
+        disconnect_match = DISCONNECT_RE.search(line_str)
+        if disconnect_match:
+            pname = disconnect_match.group(2)
+            self.poller.player_left(pname)
+            if self.playtime:
+                self.playtime.stop(pname)
+            self._touch_seen(pname)
+            self._player_changed(pname)
+            logger.info("Player disconnected: %s", pname)
+
+        # /catchup (steam-only)
+        catchup_match = re.search(
+            r"Chat \(from 'Steam_(\d+)', entity id '(\d+)', to 'Global'\): '(.+?)':/catchup",
+            line_str,
+        )
+        if catchup_match:
+            sid = catchup_match.group(1)
+            pname = catchup_match.group(3)
+            self.remember_identity(pname, "steam", sid)
+            logger.info("Detected /catchup from %s", pname)
+            admitted, reply = self.admission.admit("catchup", sid)
+            if admitted:
+                self._dispatch_catchup_command(pname, sid)
+            else:
+                logger.info("Too many /catchup from %s, %s", pname, "cached reply" if reply else "ignored")
+                if reply:
+                    self.send_pm(pname, reply)
+
+        # PrismaCore level-up line (reliable for Steam + XBL)
+        lvl_match = re.search(
+            r"\[PrismaCore\]playerLeveled:\s*([^(]+)\s*\(([^)]+)\)\s*made level\s*(\d+)\s*\(was\s*(\d+)\)",
+            line_str,
+        )
+        if lvl_match:
+            pname = lvl_match.group(1).strip()
+            plat_raw = lvl_match.group(2).strip()  # Steam_... / XBL_... / EOS_...
+            new_level = int(lvl_match.group(3))
+            old_level = int(lvl_match.group(4))
+            M_LEVELUPS.labels(self.server_id, "prismacore").inc()
+
+            # Learn identity from this line too
+            if plat_raw.startswith("Steam_"):
+                self.remember_identity(pname, "steam", plat_raw.replace("Steam_", "").strip())
+            elif plat_raw.startswith("XBL_"):
+                self.remember_identity(pname, "xbl", plat_raw.replace("XBL_", "").strip())
+            elif plat_raw.startswith("EOS_"):
+                self.remember_identity(pname, "eos", plat_raw.replace("EOS_", "").strip())
+
+            cached_level = self.players.levels.get(pname)
+
+            with self.reconcile_lock:
+                deferred = self.reconcile_pending
+                if deferred:
+                    self.missed_levelups.setdefault(pname, []).append((old_level, new_level))
+            if deferred:
+                logger.info("PrismaCore level-up while reconnecting: %s %s->%s (deferred to reconcile)", pname, old_level, new_level)
+            elif cached_level is not None and new_level <= int(cached_level or 0):
+                logger.info(
+                    "Skipping levelgain (PrismaCore) for %s %s->%s: already credited up to %s",
+                    pname,
+                    old_level,
+                    new_level,
+                    cached_level,
+                )
+            else:
+                self._coalesce_levelup(pname, old_level, new_level)
+
+            # PrismaCore is authoritative: keep the cache in step so the next
+            # listplayers diff doesn't see this level-up again (deferred ones are
+            # applied by the reconcile batch)
+            if not deferred and self.players.raise_level(pname, new_level) < new_level:
+                self.save_player_levels()
+            self.poller.level_seen(pname)
+            self.poller.player_joined(pname)
+            self._touch_seen(pname)
+            self._player_changed(pname)
+
+        # XP message: only worth a listplayers where PrismaCore is silent
+        if "XP gained during the last level:" in line_str:
+            if self.poller.prismacore_active():
+                logger.debug("XP level message ignored: PrismaCore reports levels")
+            else:
+                logger.info("XP level message detected - requesting player level refresh")
+                self.poller.nudge("XP message")
 
     def monitor_chat(self):
         logger.info("Starting enhanced chat monitor with Takaro quest integration")
 
-        threading.Thread(target=self.periodic_updates, daemon=True).start()
-        threading.Thread(target=self.periodic_quest_health_check, daemon=True).start()
-        if ENABLE_RETRY_QUEUE:
-            threading.Thread(target=self.periodic_retry_flush, daemon=True).start()
+        if not self.state_ready.is_set():
+            # normally loaded while the port was probed and the login ran
+            logger.info("Waiting for the state load to finish")
+            self.state_ready.wait()
+        self.startup.finish("reader")
+        self._start_session_jobs()
 
-        while self.tn:
+        while self.tn and not self.session_stop.is_set():
             try:
                 with self.tn_lock:
                     line = self.tn.read_until(b"\n", timeout=1)
 
                 if not line:
                     continue
+                self.watchdog.data_received()
 
                 line_str = line.decode("utf-8", errors="ignore").strip()
                 if not line_str:
                     continue
+                M_LINES_READ.labels(self.server_id, "telnet").inc()
+                self.outcomes.feed(line_str)
 
-                if any(
-                    k in line_str
-                    for k in [
-                        "Chat",
-                        "catchup",
-                        "vote",
-                        "XP gained",
-                        "playerLeveled",
-                        "listplayers",
-                        "voting reward",
-                        "[PrismaCore]playerLeveled",
-                    ]
-                ):
-                    logger.debug("Received: %s", line_str)
-
-                # Learn platform identity from any chat line (Steam/XBL/EOS)
-                chat_any = re.search(r"Chat \(from '([^']+)',.*?\): '(.+?)':", line_str)
-                if chat_any:
-                    from_id = chat_any.group(1)
-                    pname = chat_any.group(2)
-
-                    if from_id.startswith("Steam_"):
-                        sid = from_id.replace("Steam_", "").strip()
-                        self.remember_identity(pname, "steam", sid)
-                    elif from_id.startswith("XBL_"):
-                        xid = from_id.replace("XBL_", "").strip()
-                        self.remember_identity(pname, "xbl", xid)
-                    elif from_id.startswith("EOS_"):
-                        eid = from_id.replace("EOS_", "").strip()
-                        self.remember_identity(pname, "eos", eid)
-
-                # /catchup (steam-only)
-                catchup_match = re.search(
-                    r"Chat \(from 'Steam_(\d+)', entity id '(\d+)', to 'Global'\): '(.+?)':/catchup",
-                    line_str,
-                )
-                if catchup_match:
-                    sid = catchup_match.group(1)
-                    pname = catchup_match.group(3)
-                    self.remember_identity(pname, "steam", sid)
-                    logger.info("Detected /catchup from %s", pname)
-                    time.sleep(0.2)
-                    self.handle_catchup_command(pname, sid)
-
-                # PrismaCore level-up line (reliable for Steam + XBL)
-                lvl_match = re.search(
-                    r"\[PrismaCore\]playerLeveled:\s*([^(]+)\s*\(([^)]+)\)\s*made level\s*(\d+)\s*\(was\s*(\d+)\)",
-                    line_str,
-                )
-                if lvl_match:
-                    pname = lvl_match.group(1).strip()
-                    plat_raw = lvl_match.group(2).strip()  # Steam_... / XBL_... / EOS_...
-                    new_level = int(lvl_match.group(3))
-                    old_level = int(lvl_match.group(4))
-                    inc = max(1, new_level - old_level)
-
-                    dedupe_key = self._dedupe_key_levelgain(pname, old_level, new_level)
-
-                    # Learn identity from this line too
-                    if plat_raw.startswith("Steam_"):
-                        self.remember_identity(pname, "steam", plat_raw.replace("Steam_", "").strip())
-                    elif plat_raw.startswith("XBL_"):
-                        self.remember_identity(pname, "xbl", plat_raw.replace("XBL_", "").strip())
-                    elif plat_raw.startswith("EOS_"):
-                        self.remember_identity(pname, "eos", plat_raw.replace("EOS_", "").strip())
-
-                    if self._dedupe_seen_recently(dedupe_key):
-                        logger.info(
-                            "Skipping duplicate levelgain (PrismaCore) for %s %s->%s",
-                            pname,
-                            old_level,
-                            new_level,
-                        )
-                    else:
-                        if self.quest_server_healthy:
-                            ident = self.get_identity(pname) or {}
-                            kind = ident.get("kind")
-                            val = ident.get("value")
-
-                            logger.info("PrismaCore level-up detected: %s %s->%s (+%s)", pname, old_level, new_level, inc)
-
-                            ok = False
-                            self._dedupe_mark(dedupe_key)
-
-                            if kind == "steam" and val:
-                                ok = self.quest_integration.update_quest(pname, "levelgain", inc, steam_id=val)
-                            elif kind in ("xbl", "eos") and val:
-                                ok = self.quest_integration.update_quest(pname, "levelgain", inc, platform=kind, platform_id=val)
-                            else:
-                                logger.error("Level-up for %s but no identity known (steam/xbl/eos)", pname)
-
-                            if not ok:
-                                payload = {"playerName": pname, "questType": "levelgain", "increment": inc}
-                                if kind == "steam" and val:
-                                    payload["steamId"] = val
-                                elif kind in ("xbl", "eos") and val:
-                                    payload["platform"] = kind
-                                    payload["platformId"] = val
-                                self._enqueue_retry(payload)
-                        else:
-                            logger.warning("Quest server not available for level updates right now")
-
-                    # Refresh listplayers to keep local cache accurate
-                    time.sleep(0.4)
-                    self.update_player_levels(force=False)
-
-                # XP message: trigger refresh but guarded by lock + cooldown
-                if "XP gained during the last level:" in line_str:
-                    logger.info("XP level message detected - refreshing player levels...")
-                    time.sleep(0.4)
-                    self.update_player_levels(force=False)
+                if self.log_tailer:
+                    # events come from the server log file; telnet output is
+                    # only drained here (command responses)
+                    continue
+
+                self.events.put(line_str)
 
             except Exception as e:
-                if "connection closed" in str(e).lower():
+                if "connection closed" in str(e).lower() or self.session_stop.is_set():
                     logger.warning("Connection lost")
+                    M_DISCONNECTS.labels(self.server_id).inc()
                     break
                 logger.error("Monitor error: %s", e)
 
+        # every exit (connection closed, watchdog) ends the session: the
+        # writer and the warm-up check session_stop
+        self.session_stop.set()
+        self.watchdog.stop()
+        self._close_session()
+        self.jobs.cancel_group(self.session_jobs)
+        self.poller.forget_entity_ids()
+
+        # whatever happens until the next connect() is reconciled as one batch
+        with self.reconcile_lock:
+            self.reconcile_pending = True
+        self.save_monitor_state()
+        if self.playtime:
+            # we cannot see who stays online while disconnected; listplayers
+            # re-opens the sessions after the reconnect
+            self.playtime.stop_all()
+            self.playtime.checkpoint()
+
     def run(self):
+        """Connect / read / reconnect until interrupted (one thread per server,
+        see MonitorHub; the read API is started by the hub)."""
+        if self.log_tailer:
+            self.log_tailer.start()
         while True:
             try:
+                self.reconnect.wait_until_reachable()
                 if not self.connect():
-                    logger.info("Waiting %s seconds before retry...", self.reconnect_delay)
-                    time.sleep(self.reconnect_delay)
-                    self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
+                    self.reconnect.connect_failed()
                     continue
+                downtime = self.reconnect.connected()
+                if downtime is not None:
+                    M_DOWNTIME.labels(self.server_id).observe(downtime)
+                    logger.info("Reconnected after %.1fs", downtime)
 
                 self.monitor_chat()
+                self.reconnect.disconnected()
 
             except KeyboardInterrupt:
                 logger.info("Shutting down...")
                 break
             except Exception as e:
                 logger.error("Unexpected error: %s", e)
-                time.sleep(self.reconnect_delay)
+                self.reconnect.disconnected()
+                time.sleep(self.reconnect.next_delay())
+
+        self._close_session()
+
+
+class MonitorHub:
+    """Runs one IntegratedMonitor per configured server in this process. Owns
+    what the pipelines share: one quest server HTTP session (connection pool),
+    the profiler and the read API, which also serves /metrics for all of them."""
+
+    def __init__(self, servers):
+        self.session = None
+        self.session_lock = threading.Lock()
+        self.pool_maxsize = max(10, 4 * len(servers))
+        self.profiler = Profiler(PROFILE_DIR, "monitor", PROFILE_SECONDS)
+        self.jobs = JobScheduler("monitor", workers=JOB_WORKERS_PER_SERVER * len(servers), on_run=_observe_job)
+        self.jobs.start()
+        self.monitors = {}
+        for srv in servers:
+            self.monitors[srv["id"]] = IntegratedMonitor(
+                srv["host"],
+                srv["port"],
+                srv.get("password") or "",
+                server_id=srv["id"],
+                game_server_id=srv.get("game_server_id"),
+                server_log_dir=srv.get("log_dir"),
+                session=self.quest_session,
+                profiler=self.profiler,
+                jobs=self.jobs,
+            )
+        self.default = self.monitors.get(DEFAULT_SERVER_ID) or next(iter(self.monitors.values()))
 
-        if self.tn:
-            self.tn.close()
+    def quest_session(self):
+        """The shared quest server session, created by the first pipeline that
+        talks to the quest server."""
+        with self.session_lock:
+            if self.session is None:
+                self.session = new_quest_session(self.pool_maxsize)
+            return self.session
+
+    def run(self):
+        if READ_API_ENABLED:
+            start_read_api(self)
+        threads = []
+        for sid, monitor in self.monitors.items():
+            t = threading.Thread(target=monitor.run, name=f"{sid}:reader", daemon=True)
+            t.start()
+            threads.append(t)
+        try:
+            while any(t.is_alive() for t in threads):
+                for t in threads:
+                    t.join(timeout=1.0)
+        except KeyboardInterrupt:
+            logger.info("Shutting down...")
 
 
 def main():
+    servers = load_servers()
+    setup_logging(server_tags=len(servers) > 1)
     logger.info("Integrated Game Monitor Starting")
     logger.info("IMPORTANT: Make sure 'node working_server.js' is running for quest updates!")
-    monitor = IntegratedMonitor(HOST, PORT, PASSWORD)
-    monitor.run()
+    logger.info("Servers: %s", ", ".join("%s (%s:%s)" % (s["id"], s["host"], s["port"]) for s in servers))
+    hub = MonitorHub(servers)
+    hub.profiler.install_signal_handlers()
+    hub.run()
 
 
 if __name__ == "__main__":
@@ -1,7 +1,31 @@
 /**
- * Takaro Quest Integration Client - v15.6-patch4
+ * Takaro Quest Integration Client - v15.6-patch7
  *
- * Patch4 goals (on top of patch3):
+ * Patch7 goals (on top of patch6):
+ * 1) handleQuestUpdate() option counterKey: the increment is also added to a
+ *    per-player running total (addPlayerCounter), whether or not a quest is
+ *    active. zombiekills pushed by the game monitor keep
+ *    questTracker_external_zombiekills_total, which the ZombieAchievements
+ *    cronjob reads instead of paging entity-killed events.
+ *
+ * Patch6 goals (on top of patch5):
+ * 1) Several game servers per process: forGameServer(gameServerId) returns a
+ *    client bound to that gameServerId which shares the auth session (cookie /
+ *    strategy) with its parent; its player cache is separate. Requests with no
+ *    gameServerId keep using CONFIG.gameServerId.
+ * 2) One keep-alive agent per protocol for all requests (was a new Agent per
+ *    request, so no connection was ever reused).
+ *
+ * Patch5 goals (on top of patch4):
+ * 1) updateQuestProgress()/handleQuestUpdate() accept options:
+ *    - createIfMissing (default true): when false, a missing quest variable is
+ *      NOT created and the update returns { success: true, skipped: 'inactive' }.
+ *      Used for zombie kill deltas pushed by the game monitor for every player.
+ *    - notify: 'always' (default) | 'complete' | 'none' - which updates PM the player.
+ * 2) setModuleVariable(key, value): upsert of a module-level (non-player)
+ *    variable, used for the external kill tracker heartbeat.
+ *
+ * Patch4 goals (kept):
  * 1) Self-heal on 401: requestWithFallback() now detects expired/invalid
  *    sessions, forces re-authentication via initAuth(), and retries the
  *    request once. Previously `authenticated` was cached to `true` forever,
@@ -36,7 +60,7 @@
 import http from 'http';
 import https from 'https';
 
-const VERSION = 'v15.6-patch4';
+const VERSION = 'v15.6-patch7';
 
 const CONFIG = {
   baseUrl: process.env.TAKARO_BASE_URL || 'https://api.takaro.io',
@@ -112,6 +136,12 @@ function unpackArray(resp) {
  * - Keep ONLY '' so we never learn a wrong prefix.
  */
 const PATH_PREFIXES = [''];
+
+// shared by every client / game server view, so connections are reused
+const AGENTS = {
+  'http:': new http.Agent({ keepAlive: true }),
+  'https:': new https.Agent({ keepAlive: true })
+};
 const pathCache = new Map();     // cacheKey -> resolved full path (suffix)
 const badPathCache = new Set();  // full path (suffix) that returned 404
 
@@ -150,12 +180,31 @@ function normalizeEosId(x) {
 }
 
 class TakaroQuestClientV156 {
-  constructor() {
+  constructor({ gameServerId = null, session = null } = {}) {
     this.version = VERSION;
-    this.cookieJar = '';
-    this.authenticated = false;
+    this.gameServerId = gameServerId || CONFIG.gameServerId;
+    // auth state lives in `session` so game server views can share it
+    this.session = session || { cookieJar: '', authenticated: false, authStrategyChosen: null };
     this.playerCache = new Map();
-    this.authStrategyChosen = null;
+    this.serverViews = new Map();
+  }
+
+  get cookieJar() { return this.session.cookieJar; }
+  set cookieJar(v) { this.session.cookieJar = v; }
+  get authenticated() { return this.session.authenticated; }
+  set authenticated(v) { this.session.authenticated = v; }
+  get authStrategyChosen() { return this.session.authStrategyChosen; }
+  set authStrategyChosen(v) { this.session.authStrategyChosen = v; }
+
+  // Client for another game server, sharing this client's auth session.
+  forGameServer(gameServerId) {
+    if (!gameServerId || gameServerId === this.gameServerId) return this;
+    let view = this.serverViews.get(gameServerId);
+    if (!view) {
+      view = new TakaroQuestClientV156({ gameServerId, session: this.session });
+      this.serverViews.set(gameServerId, view);
+    }
+    return view;
   }
 
   log(...a) { console.log(`[TAKARO ${VERSION}]`, ...a); }
@@ -288,7 +337,7 @@ class TakaroQuestClientV156 {
         path: url.pathname + (url.search || ''),
         port: url.port || (isHttps ? 443 : 80),
         headers,
-        agent: new mod.Agent({ keepAlive: true })
+        agent: AGENTS[url.protocol]
       };
 
       const req = mod.request(options, (res) => {
@@ -401,7 +450,7 @@ class TakaroQuestClientV156 {
     }
 
     r = await this.requestWithFallback('POST', 'gameserver_player_search', '/gameserver/player/search', {
-      filters: { gameServerId: [CONFIG.gameServerId] },
+      filters: { gameServerId: [this.gameServerId] },
       search: { name: [name] },
       extend: ['player'],
       limit: 1
@@ -444,7 +493,7 @@ class TakaroQuestClientV156 {
     }
 
     r = await this.requestWithFallback('POST', 'gameserver_player_search_steam', '/gameserver/player/search', {
-      filters: { gameServerId: [CONFIG.gameServerId] },
+      filters: { gameServerId: [this.gameServerId] },
       extend: ['player'],
       limit: 500
     });
@@ -489,7 +538,7 @@ class TakaroQuestClientV156 {
     }
 
     r = await this.requestWithFallback('POST', 'gameserver_player_search_xbl', '/gameserver/player/search', {
-      filters: { gameServerId: [CONFIG.gameServerId] },
+      filters: { gameServerId: [this.gameServerId] },
       extend: ['player'],
       limit: 500
     });
@@ -534,7 +583,7 @@ class TakaroQuestClientV156 {
     }
 
     r = await this.requestWithFallback('POST', 'gameserver_player_search_eos', '/gameserver/player/search', {
-      filters: { gameServerId: [CONFIG.gameServerId] },
+      filters: { gameServerId: [this.gameServerId] },
       extend: ['player'],
       limit: 500
     });
@@ -598,7 +647,7 @@ class TakaroQuestClientV156 {
     const payload = {
       filters: {
         key: [key],
-        gameServerId: [CONFIG.gameServerId],
+        gameServerId: [this.gameServerId],
         playerId: [playerId],
         moduleId: [CONFIG.moduleId]
       },
@@ -626,7 +675,7 @@ class TakaroQuestClientV156 {
 
     const payload = {
       filters: {
-        gameServerId: [CONFIG.gameServerId],
+        gameServerId: [this.gameServerId],
         playerId: [playerId],
         moduleId: [CONFIG.moduleId]
       },
@@ -673,7 +722,7 @@ class TakaroQuestClientV156 {
     const payload = {
       filters: {
         key: [key],
-        gameServerId: [CONFIG.gameServerId],
+        gameServerId: [this.gameServerId],
         playerId: [playerId],
         moduleId: [CONFIG.moduleId]
       },
@@ -715,7 +764,7 @@ class TakaroQuestClientV156 {
     const payload = {
       filters: {
         key: [key],
-        gameServerId: [CONFIG.gameServerId],
+        gameServerId: [this.gameServerId],
         playerId: [playerId],
         moduleId: [CONFIG.moduleId]
       },
@@ -748,7 +797,7 @@ class TakaroQuestClientV156 {
     const createResp = await this.requestWithFallback('POST', 'variables_create_set', '/variables', {
       key,
       value: JSON.stringify(val),
-      gameServerId: CONFIG.gameServerId,
+      gameServerId: this.gameServerId,
       playerId,
       moduleId: CONFIG.moduleId
     });
@@ -760,7 +809,74 @@ class TakaroQuestClientV156 {
     return { ok: true, action: 'created', key, value: val };
   }
 
-  async updateQuestProgress(playerId, rawType, inc = 1) {
+  async setModuleVariable(key, value) {
+    if (!await this.initAuth()) return { ok: false, error: 'Auth failed' };
+
+    const searchResp = await this.requestWithFallback('POST', 'variables_search_module', '/variables/search', {
+      filters: {
+        key: [key],
+        gameServerId: [this.gameServerId],
+        moduleId: [CONFIG.moduleId]
+      },
+      limit: 5
+    });
+    const row = (unpackArray(searchResp) || []).find(v => v?.key === key && !v?.playerId);
+    const valueJson = typeof value === 'string' ? value : JSON.stringify(value);
+
+    if (row) {
+      const up = await this.putVariableById(row.id, valueJson, 'module_var_put');
+      if (up.status !== 200) return { ok: false, error: `PUT failed ${up.status}` };
+      return { ok: true, action: 'updated', key };
+    }
+
+    const createResp = await this.requestWithFallback('POST', 'variables_create_module', '/variables', {
+      key,
+      value: valueJson,
+      gameServerId: this.gameServerId,
+      moduleId: CONFIG.moduleId
+    });
+    if (![200, 201].includes(createResp.status)) {
+      return { ok: false, error: `Create failed ${createResp.status}` };
+    }
+    return { ok: true, action: 'created', key };
+  }
+
+  // Adds inc to the player's counter variable (created at inc). Returns the new total.
+  async addPlayerCounter(playerId, key, inc) {
+    if (!await this.initAuth()) return { ok: false, error: 'Auth failed' };
+
+    const searchResp = await this.requestWithFallback('POST', 'variables_search_counter', '/variables/search', {
+      filters: {
+        key: [key],
+        gameServerId: [this.gameServerId],
+        playerId: [playerId],
+        moduleId: [CONFIG.moduleId]
+      },
+      limit: 5
+    });
+    const row = (unpackArray(searchResp) || []).find(v => v?.key === key && v?.playerId === playerId);
+    const total = (row ? (Number(row.value) || 0) : 0) + Number(inc || 0);
+
+    if (row) {
+      const up = await this.putVariableById(row.id, String(total), 'counter_put');
+      if (up.status !== 200) return { ok: false, error: `PUT failed ${up.status}` };
+      return { ok: true, total };
+    }
+
+    const createResp = await this.requestWithFallback('POST', 'variables_create_counter', '/variables', {
+      key,
+      value: String(total),
+      gameServerId: this.gameServerId,
+      playerId,
+      moduleId: CONFIG.moduleId
+    });
+    if (![200, 201].includes(createResp.status)) {
+      return { ok: false, error: `Create failed ${createResp.status}` };
+    }
+    return { ok: true, total };
+  }
+
+  async updateQuestProgress(playerId, rawType, inc = 1, { createIfMissing = true } = {}) {
     if (!await this.initAuth()) return { success: false, error: 'Not authenticated' };
 
     const questType = mapQuestType(rawType);
@@ -770,7 +886,7 @@ class TakaroQuestClientV156 {
     const searchPayload = {
       filters: {
         key: [key],
-        gameServerId: [CONFIG.gameServerId],
+        gameServerId: [this.gameServerId],
         playerId: [playerId],
         moduleId: [CONFIG.moduleId]
       },
@@ -784,7 +900,7 @@ class TakaroQuestClientV156 {
     const questVar = results.find(v =>
       v?.key === key &&
       v?.playerId === playerId &&
-      v?.gameServerId === CONFIG.gameServerId &&
+      v?.gameServerId === this.gameServerId &&
       v?.moduleId === CONFIG.moduleId
     );
 
@@ -831,6 +947,10 @@ class TakaroQuestClientV156 {
       return { success: true, questData: data, isNewQuest: isNew, wasCompleted: nowCompleted && !wasCompletedBefore };
     }
 
+    if (!createIfMissing) {
+      return { success: true, skipped: 'inactive' };
+    }
+
     // Create if not found (plural only)
     data = {
       type: questType,
@@ -847,7 +967,7 @@ class TakaroQuestClientV156 {
     const createResp = await this.requestWithFallback('POST', 'variables_create', '/variables', {
       key,
       value: JSON.stringify(data),
-      gameServerId: CONFIG.gameServerId,
+      gameServerId: this.gameServerId,
       playerId,
       moduleId: CONFIG.moduleId
     });
@@ -867,21 +987,29 @@ class TakaroQuestClientV156 {
 
     const resp = await this.requestWithFallback(
       'POST',
-      'gameserver_command',
-      `/gameserver/${CONFIG.gameServerId}/command`,
+      `gameserver_command_${this.gameServerId}`,
+      `/gameserver/${this.gameServerId}/command`,
       { command: `pm "${safeName}" "${safeMsg}"` }
     );
 
     return resp.status >= 200 && resp.status < 300;
   }
 
-  async handleQuestUpdate(playerName, questType, inc = 1, identityHintOrLegacySteamId = null) {
+  async handleQuestUpdate(playerName, questType, inc = 1, identityHintOrLegacySteamId = null, opts = {}) {
     const resolved = await this.resolvePlayer(identityHintOrLegacySteamId, playerName);
     if (!resolved?.playerId) return { success: false, error: 'Player not found' };
 
-    const result = await this.updateQuestProgress(resolved.playerId, questType, inc);
+    const createIfMissing = opts.createIfMissing !== false;
+    const notify = opts.notify || 'always';
+
+    const result = await this.updateQuestProgress(resolved.playerId, questType, inc, { createIfMissing });
+
+    if (result.success && opts.counterKey) {
+      const c = await this.addPlayerCounter(resolved.playerId, opts.counterKey, inc);
+      if (!c.ok) this.log(`Counter ${opts.counterKey} update failed for ${resolved.playerName || playerName}:`, c.error);
+    }
 
-    if (result.success) {
+    if (result.success && !result.skipped && notify !== 'none' && (notify !== 'complete' || result.wasCompleted)) {
       const t = mapQuestType(questType);
       let msg = null;
 
@@ -1,4 +1,23 @@
-// working_server.js - v15.7 server (uses direct_takaro_client.mjs)
+// working_server.js - v15.13 server (uses direct_takaro_client.mjs)
+// v15.13: zombiekills updates also add to the player's
+//         questTracker_external_zombiekills_total, which the ZombieAchievements
+//         cronjob reads instead of paging entity-killed events while the game
+//         monitor owns kill counting.
+// v15.12: POST /external-heartbeat {questTypes, gameServerId} refreshes the heartbeats
+//         without quest updates. The game monitor sends it while its telnet session is
+//         up, so the cronjobs key their fallback on monitor liveness, not on whether
+//         the last batch happened to carry kills.
+// v15.11: idempotent updates. An update may carry eventId (or events: [{id, increment}]
+//         when the game monitor merged queued retries); ids already applied in the
+//         last APPLIED_EVENT_TTL_MS are skipped and answered with duplicate: true,
+//         so a retry after a lost response never counts twice.
+// v15.10: optional gameServerId on /update-quest, /update-quests-batch (per update
+//         or for the whole batch) and /send-message, so one game monitor can
+//         serve several 7D2D servers; without it CONFIG.gameServerId is used.
+// v15.9: timespent batches from the game monitor refresh questTracker_external_time_at.
+// v15.8: createIfMissing/notify per update; batches carrying zombiekills from the
+//        game monitor refresh the questTracker_external_kills_at heartbeat so the
+//        questTrackerKills cronjob can skip its event scan.
 // Adds support for non-Steam players by allowing identityHint:
 // - steamId (legacy)
 // - platform + platformId (new): platform in ["steam","xbl","eos"]
@@ -17,6 +36,12 @@ app.use((req, _res, next) => {
 
 const questClient = new TakaroQuestClient();
 
+// client bound to the request's game server (shares auth with questClient)
+function clientFor(gameServerId) {
+  if (!gameServerId || typeof questClient.forGameServer !== 'function') return questClient;
+  return questClient.forGameServer(String(gameServerId));
+}
+
 async function startupAuth() {
   try {
     // Keep compatibility with older/newer client versions
@@ -45,6 +70,7 @@ app.get('/health', (_req, res) => {
     status: 'running',
     authenticated: questClient.authenticated === true,
     version: questClient.version,
+    appliedEvents: appliedEvents.size,
     timestamp: new Date().toISOString()
   });
 });
@@ -53,7 +79,7 @@ app.get('/health', (_req, res) => {
 app.get('/debug/version', (_req, res) => {
   res.json({
     ok: true,
-    server: 'working_server.js v15.7',
+    server: 'working_server.js v15.13',
     clientVersion: questClient.version || null,
     authenticated: questClient.authenticated === true,
     timestamp: new Date().toISOString()
@@ -74,10 +100,113 @@ app.get('/test', async (_req, res) => {
   }
 });
 
+// ---------- idempotency ----------
+// eventId -> expiry (ms). Kept longer than the game monitor's outbox keeps a
+// failed update (RETRY_MAX_AGE_SECONDS, 6h), so every retry finds its id.
+const APPLIED_EVENT_TTL_MS = Number(process.env.APPLIED_EVENT_TTL_MS) || 7 * 60 * 60 * 1000;
+const appliedEvents = new Map();
+const inflightEvents = new Map(); // eventId -> promise of the update carrying it
+
+function purgeAppliedEvents(now = Date.now()) {
+  // insertion order == expiry order (fixed TTL), so stop at the first live entry
+  for (const [id, expires] of appliedEvents) {
+    if (expires > now) break;
+    appliedEvents.delete(id);
+  }
+}
+
+// [{id, increment}] of an update, or null when it carries no ids
+function updateEvents(u, inc) {
+  if (Array.isArray(u?.events) && u.events.length) {
+    return u.events
+      .filter((e) => e && e.id)
+      .map((e) => ({ id: String(e.id), increment: Number.isFinite(Number(e.increment)) ? Number(e.increment) : 1 }));
+  }
+  return u?.eventId ? [{ id: String(u.eventId), increment: inc }] : null;
+}
+
+// Runs run(increment) with the summed increment of the events not applied yet;
+// without events run(inc) is called as before.
+async function applyOnce(events, inc, run) {
+  if (!events) return run(inc);
+  // several retries may wait on one failed attempt: re-check after every
+  // wake-up, so only one of them runs and the rest see it applied
+  for (;;) {
+    const pending = events.map((e) => inflightEvents.get(e.id)).filter(Boolean);
+    if (!pending.length) break;
+    await Promise.allSettled(pending);
+  }
+
+  // no await from here until the new promise is registered
+  purgeAppliedEvents();
+  const seen = new Set();
+  const fresh = events.filter((e) => {
+    if (appliedEvents.has(e.id) || seen.has(e.id)) return false;
+    seen.add(e.id);
+    return true;
+  });
+  if (!fresh.length) {
+    console.log(`Already applied: ${events.map((e) => e.id).join(', ')}`);
+    return { success: true, duplicate: true, questData: null };
+  }
+
+  const promise = run(fresh.reduce((sum, e) => sum + e.increment, 0));
+  for (const e of fresh) inflightEvents.set(e.id, promise);
+  try {
+    const result = await promise;
+    if (result?.success) {
+      const expires = Date.now() + APPLIED_EVENT_TTL_MS;
+      for (const e of fresh) appliedEvents.set(e.id, expires);
+    }
+    return result;
+  } finally {
+    for (const e of fresh) {
+      if (inflightEvents.get(e.id) === promise) inflightEvents.delete(e.id);
+    }
+  }
+}
+
+// module variables read by the cronjobs: while fresh, the game monitor owns these quest types
+const EXTERNAL_HEARTBEAT_KEYS = {
+  zombiekills: 'questTracker_external_kills_at', // cronjobs/questTrackerKills.js
+  timespent: 'questTracker_external_time_at' // cronjobs/questTrackerTime.js, hooks/playerDisconnect.js
+};
+
+async function refreshHeartbeats(client, questTypes) {
+  if (typeof client.setModuleVariable !== 'function') return false;
+  let ok = true;
+  for (const t of questTypes) {
+    try {
+      // setModuleVariable reports failures as { ok: false, error }, it does not throw
+      const r = await client.setModuleVariable(EXTERNAL_HEARTBEAT_KEYS[t], { ts: new Date().toISOString() });
+      if (!r?.ok) {
+        ok = false;
+        console.log(`Heartbeat update failed (${t}):`, r?.error || 'unknown error');
+      }
+    } catch (e) {
+      ok = false;
+      console.log(`Heartbeat update failed (${t}):`, e?.message || String(e));
+    }
+  }
+  return ok;
+}
+
+// per-player running total of the monitor's zombiekills, read by
+// ZombieAchievements/cronjobs/zombie_kills_tracker.js while the kills heartbeat is fresh
+const EXTERNAL_KILLS_TOTAL_KEY = 'questTracker_external_zombiekills_total';
+
+function updateOptions(body) {
+  return {
+    createIfMissing: body?.createIfMissing !== false,
+    notify: ['always', 'complete', 'none'].includes(body?.notify) ? body.notify : 'always',
+    counterKey: body?.questType === 'zombiekills' ? EXTERNAL_KILLS_TOTAL_KEY : null
+  };
+}
+
 app.post('/update-quest', async (req, res) => {
   try {
-    const { playerName, steamId, questType, increment, platform, platformId } = req.body || {};
-    console.log('Payload:', { playerName, steamId, questType, increment, platform, platformId });
+    const { playerName, steamId, questType, increment, platform, platformId, gameServerId, eventId } = req.body || {};
+    console.log('Payload:', { playerName, steamId, questType, increment, platform, platformId, gameServerId, eventId });
 
     if (!playerName || !questType) {
       return res.status(400).json({ success: false, error: 'playerName and questType required' });
@@ -91,7 +220,10 @@ app.post('/update-quest', async (req, res) => {
       (platform && platformId ? { kind: String(platform).toLowerCase(), value: String(platformId) } : null) ||
       null;
 
-    const result = await questClient.handleQuestUpdate(playerName, questType, inc, identityHint);
+    const client = clientFor(gameServerId);
+    const result = await applyOnce(updateEvents(req.body, inc), inc, (n) =>
+      client.handleQuestUpdate(playerName, questType, n, identityHint, updateOptions(req.body))
+    );
 
     if (!result?.success) {
       return res.status(200).json({ success: false, error: result?.error || 'Quest update failed' });
@@ -101,7 +233,8 @@ app.post('/update-quest', async (req, res) => {
       success: true,
       questData: result.questData || null,
       wasCompleted: !!result.wasCompleted,
-      isNewQuest: !!result.isNewQuest
+      isNewQuest: !!result.isNewQuest,
+      duplicate: !!result.duplicate
     });
   } catch (e) {
     return res.status(500).json({ success: false, error: e?.message || String(e) });
@@ -110,12 +243,13 @@ app.post('/update-quest', async (req, res) => {
 
 app.post('/update-quests-batch', async (req, res) => {
   try {
-    const { updates } = req.body || {};
+    const { updates, gameServerId: batchServerId } = req.body || {};
     if (!Array.isArray(updates)) {
       return res.status(400).json({ success: false, error: 'updates must be an array' });
     }
 
     const results = [];
+    const heartbeatTypes = new Map(); // client -> Set(questType)
     for (const u of updates) {
       const playerName = u?.playerName;
       const questType = u?.questType;
@@ -135,27 +269,58 @@ app.post('/update-quests-batch', async (req, res) => {
         (platform && platformId ? { kind: String(platform).toLowerCase(), value: String(platformId) } : null) ||
         null;
 
+      const client = clientFor(u?.gameServerId || batchServerId);
+      if (EXTERNAL_HEARTBEAT_KEYS[questType]) {
+        if (!heartbeatTypes.has(client)) heartbeatTypes.set(client, new Set());
+        heartbeatTypes.get(client).add(questType);
+      }
+
       try {
-        const r = await questClient.handleQuestUpdate(playerName, questType, inc, identityHint);
+        const r = await applyOnce(updateEvents(u, inc), inc, (n) =>
+          client.handleQuestUpdate(playerName, questType, n, identityHint, updateOptions(u))
+        );
         results.push(r);
       } catch (e) {
         results.push({ success: false, error: e?.message || String(e), input: u });
       }
     }
 
+    // heartbeats are module variables of the game server the updates were for
+    for (const [client, types] of heartbeatTypes) {
+      await refreshHeartbeats(client, types);
+    }
+
     res.json({ success: true, results });
   } catch (e) {
     res.status(500).json({ success: false, error: e?.message || String(e) });
   }
 });
 
+// liveness of the game monitor: it owns the listed quest types while fresh
+app.post('/external-heartbeat', async (req, res) => {
+  try {
+    const { questTypes, gameServerId } = req.body || {};
+    if (!Array.isArray(questTypes)) {
+      return res.status(400).json({ success: false, error: 'questTypes must be an array' });
+    }
+    const unknown = questTypes.filter((t) => !EXTERNAL_HEARTBEAT_KEYS[t]);
+    if (unknown.length) {
+      return res.status(400).json({ success: false, error: `no heartbeat for: ${unknown.join(', ')}` });
+    }
+    const ok = await refreshHeartbeats(clientFor(gameServerId), questTypes);
+    res.json({ success: ok });
+  } catch (e) {
+    res.status(500).json({ success: false, error: e?.message || String(e) });
+  }
+});
+
 app.post('/send-message', async (req, res) => {
   try {
-    const { playerName, message } = req.body || {};
+    const { playerName, message, gameServerId } = req.body || {};
     if (!playerName || !message) {
       return res.status(400).json({ success: false, error: 'playerName and message required' });
     }
-    const ok = await questClient.sendPlayerMessage(playerName, message);
+    const ok = await clientFor(gameServerId).sendPlayerMessage(playerName, message);
     res.json({ success: ok });
   } catch (e) {
     res.status(500).json({ success: false, error: e?.message || String(e) });
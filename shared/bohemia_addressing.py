@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_addressing.py - v1
+
+Player addressing and command outcome checks for the console commands of the
+Python services (pm2 / givexp in integrated-game-monitor, pm2 / giveplus in
+voting).
+
+The commands used to name the player by display name, unquoted. Names with
+spaces or quotes ("Freut mich") split into several arguments, so the command
+went to nobody - or to the wrong player - and the result was never looked
+at. Now:
+
+- player_targets(name, entity_id, platform_id) lists the ways to address a
+  player, best first: entity id (online players), platform id
+  ("Steam_7656...", "EOS_..."), then the display name, quoted when needed
+- CommandOutcomes follows the console echo ("Executing command '...' by
+  Telnet from ...") and the lines after it: a command whose echo is followed
+  by an error line of command output (no log timestamp: "... not found",
+  "*** ERROR") failed; one followed by the next echo or by settle seconds of
+  quiet succeeded; one never echoed is unverified
+- send_to_player() tries the targets in order until one is not rejected
+
+The reader thread calls feed(line) for every telnet line, before any
+queueing or sampling, so the echo and error lines are never shed.
+
+The echo is a log line. A service reading events from the server log file
+with "loglevel ALL false" on its telnet session never sees it there, so it
+creates CommandOutcomes with check=False: nothing is waited for, every
+written command counts as "sent" and the first target is the one used.
+
+Usage:
+
+    outcomes = CommandOutcomes("voting", on_outcome=count)
+    ...
+    outcomes.feed(line)                    # telnet reader
+    ...
+    targets = player_targets(name, entity_id, "Steam_" + steam_id)
+    ok = send_to_player(send, outcomes, lambda t: f"giveplus {t} {item} 1", targets)
+"""
+
+import logging
+import re
+import threading
+from collections import deque
+
+logger = logging.getLogger("bohemia_addressing")
+
+# wait this long after write() for the command's echo
+ECHO_TIMEOUT_SECONDS = 5.0
+# an echoed command without an error line within this long succeeded
+SETTLE_SECONDS = 0.5
+# echoes waited for at most (older expectations are dropped as unverified)
+MAX_PENDING = 200
+
+ECHO_RE = re.compile(r"Executing command '(.*)' by (?:Telnet|Console)")
+# what the server and the PrismaCore/BCM commands print when the player
+# argument does not resolve
+ERROR_RE = re.compile(
+    r"(\*\*\* ERROR|not found|not online|unknown player|no such player|invalid (?:player|entity))", re.IGNORECASE
+)
+# log lines carry this prefix; command output lines don't
+LOG_PREFIX_RE = re.compile(r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d ")
+ENTITY_ID_RE = re.compile(r"^\d+$")
+PLATFORM_ID_RE = re.compile(r"^(Steam|XBL|EOS|PSN)_[A-Za-z0-9]+$")
+
+
+def quote_arg(text):
+    """Quote a console argument if it has whitespace or quotes (inner quotes
+    escaped); a plain word is returned unchanged."""
+    text = str(text)
+    if re.search(r"[\s\"']", text):
+        escaped = text.replace("\\", "\\\\").replace('"', '\\"')
+        return f'"{escaped}"'
+    return text
+
+
+def player_targets(player_name, entity_id=None, platform_id=None):
+    """Ways to address a player in a console command, best first."""
+    targets = []
+    if entity_id is not None and ENTITY_ID_RE.match(str(entity_id)):
+        targets.append(str(entity_id))
+    if platform_id and PLATFORM_ID_RE.match(str(platform_id)):
+        targets.append(str(platform_id))
+    if player_name:
+        targets.append(quote_arg(player_name))
+    return targets
+
+
+class Outcome:
+    """Outcome of one command: wait() -> True (ok), False (error line) or
+    None (no echo seen)."""
+
+    def __init__(self, command):
+        self.command = command
+        self.echoed = threading.Event()
+        self.closed = threading.Event()
+        self.ok = True
+        self.error = None
+
+    def wait(self, echo_timeout=ECHO_TIMEOUT_SECONDS, settle=SETTLE_SECONDS):
+        if not self.echoed.wait(echo_timeout):
+            return None
+        self.closed.wait(settle)
+        return self.ok
+
+
+class CommandOutcomes:
+    """Matches console echoes and error lines to expected commands. expect()
+    before sending, feed() from the reader thread. Thread-safe."""
+
+    def __init__(self, name, on_outcome=None, check=True):
+        self.name = name
+        self.on_outcome = on_outcome
+        self.check = check
+        self.lock = threading.Lock()
+        self.pending = deque()  # Outcome, in send order
+        self.current = None  # Outcome whose echo came last, until the next echo
+
+    def expect(self, command):
+        outcome = Outcome(command.split("\n", 1)[0].strip())
+        if not self.check:
+            return outcome
+        with self.lock:
+            self.pending.append(outcome)
+            while len(self.pending) > MAX_PENDING:
+                self.pending.popleft()
+        return outcome
+
+    def forget(self, outcome):
+        with self.lock:
+            try:
+                self.pending.remove(outcome)
+            except ValueError:
+                pass
+
+    def feed(self, line):
+        if not self.check:
+            return
+        if "Executing command" in line:
+            match = ECHO_RE.search(line)
+            if match:
+                self._echo(match.group(1).strip())
+            return
+        if self.current is not None and not LOG_PREFIX_RE.match(line) and ERROR_RE.search(line):
+            with self.lock:
+                outcome, self.current = self.current, None
+            if outcome is not None:
+                outcome.ok = False
+                outcome.error = line
+                outcome.closed.set()
+
+    def _echo(self, command):
+        current = None
+        with self.lock:
+            previous = self.current
+            for outcome in self.pending:
+                if outcome.command == command:
+                    self.pending.remove(outcome)
+                    current = outcome
+                    break
+            self.current = current
+        if previous is not None:
+            previous.closed.set()
+        if current is not None:
+            current.echoed.set()
+
+    def verify(self, outcome, verb):
+        """Wait for outcome and report it; returns True / False / None
+        (True at once without checks)."""
+        if not self.check:
+            if self.on_outcome:
+                self.on_outcome(verb, "sent")
+            return True
+        result = outcome.wait()
+        if result is None:
+            self.forget(outcome)
+        if self.on_outcome:
+            self.on_outcome(verb, {True: "ok", False: "failed", None: "unverified"}[result])
+        if result is False:
+            logger.warning("%s: command failed: %s -> %s", self.name, outcome.command, outcome.error)
+        return result
+
+
+def send_to_player(send, outcomes, build, targets, verb=None):
+    """Send build(target) for each target in turn until the server does not
+    reject it. send(command) -> True (written), False (never written) or None
+    (unknown, e.g. the wait timed out mid-write). Returns the target that
+    worked, or None. Only an explicit rejection or a command that was never
+    written moves on to the next target; an unverified one (no echo) is not
+    repeated: it may have gone through."""
+    for target in targets:
+        command = build(target)
+        outcome = outcomes.expect(command)
+        if send(command) is False:
+            outcomes.forget(outcome)
+            continue
+        result = outcomes.verify(outcome, verb or command.split(" ", 1)[0])
+        if result is not False:
+            return target
+    return None
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_admission.py - v1
+
+Per-player admission control for chat commands of the Python services
+(/vote in voting, /catchup in integrated-game-monitor).
+
+Every admitted /vote costs a vote-site request (sometimes the full vote list)
+and a few console PMs, every /catchup a level scan and console writes. A
+player repeating the command, or a macro, used to pass all of that straight
+through. CommandAdmission keeps one token bucket per (command, player id):
+
+- burst commands pass at once, then one more every refill_seconds
+- a rejected command gets the reply of the last admitted one again (the
+  service records it with remember()), or the fallback reply - but only once
+  per rejection streak, so a spammer costs at most one PM per admitted
+  command; further rejections are silent
+- buckets that have been full for idle_seconds are dropped
+- on_shed(command, replied) hook and stats() per command for metrics
+
+Usage:
+
+    admission = CommandAdmission("voting", {"vote": (3, 20.0)}, on_shed=count)
+    admitted, reply = admission.admit("vote", steam_id)
+    if admitted:
+        admission.remember("vote", steam_id, handle_vote(...))
+    elif reply:
+        send_pm(player, reply)
+"""
+
+import threading
+import time
+
+# a bucket full for this long is forgotten
+IDLE_SECONDS = 3600.0
+# look for idle buckets at most this often
+PRUNE_INTERVAL_SECONDS = 300.0
+
+
+class _Bucket:
+    __slots__ = ("tokens", "last", "reply", "replied")
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.last = now
+        self.reply = None  # reply of the last admitted command
+        self.replied = False  # the current rejection streak got its reply
+
+
+class CommandAdmission:
+    """limits: {command: (burst, refill_seconds)}; commands not listed are
+    always admitted. Thread-safe."""
+
+    def __init__(self, name, limits, fallback_replies=None, on_shed=None, idle_seconds=IDLE_SECONDS):
+        self.name = name
+        self.limits = dict(limits)
+        self.fallback_replies = dict(fallback_replies or {})
+        self.on_shed = on_shed
+        self.idle_seconds = idle_seconds
+        self.lock = threading.Lock()
+        self.buckets = {}  # (command, key) -> _Bucket
+        self.admitted = {}  # command -> count
+        self.shed = {}  # (command, "replied" | "silent") -> count
+        self.last_prune = time.monotonic()
+
+    def _refill(self, bucket, burst, refill_seconds, now):
+        if refill_seconds > 0:
+            bucket.tokens = min(float(burst), bucket.tokens + (now - bucket.last) / refill_seconds)
+        else:
+            bucket.tokens = float(burst)
+        bucket.last = now
+
+    def admit(self, command, key):
+        """Take a token for key's command. Returns (admitted, reply): reply
+        is the text to send instead when rejected, or None to stay silent."""
+        limit = self.limits.get(command)
+        if limit is None or key is None:
+            return True, None
+        burst, refill_seconds = limit
+        now = time.monotonic()
+        with self.lock:
+            self._prune(now)
+            bucket = self.buckets.get((command, key))
+            if bucket is None:
+                bucket = self.buckets[(command, key)] = _Bucket(burst, now)
+            else:
+                self._refill(bucket, burst, refill_seconds, now)
+            if bucket.tokens >= 1.0:
+                bucket.tokens -= 1.0
+                bucket.replied = False
+                self.admitted[command] = self.admitted.get(command, 0) + 1
+                return True, None
+            reply = None
+            if not bucket.replied:
+                bucket.replied = True
+                reply = bucket.reply or self.fallback_replies.get(command)
+            reason = "replied" if reply else "silent"
+            self.shed[(command, reason)] = self.shed.get((command, reason), 0) + 1
+        if self.on_shed:
+            self.on_shed(command, reason)
+        return False, reply
+
+    def remember(self, command, key, reply):
+        """Record the reply an admitted command produced (None keeps the
+        fallback)."""
+        if key is None:
+            return
+        with self.lock:
+            bucket = self.buckets.get((command, key))
+            if bucket is not None:
+                bucket.reply = reply
+
+    def _prune(self, now):
+        """Drop buckets that refilled long ago (lock held)."""
+        if now - self.last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self.last_prune = now
+        for (command, key), bucket in list(self.buckets.items()):
+            burst, refill_seconds = self.limits[command]
+            if now - bucket.last >= self.idle_seconds + burst * refill_seconds:
+                del self.buckets[(command, key)]
+
+    def stats(self):
+        with self.lock:
+            return {
+                command: {
+                    "burst": burst,
+                    "refillSeconds": refill_seconds,
+                    "admitted": self.admitted.get(command, 0),
+                    "shedReplied": self.shed.get((command, "replied"), 0),
+                    "shedSilent": self.shed.get((command, "silent"), 0),
+                    "players": sum(1 for c, _k in self.buckets if c == command),
+                }
+                for command, (burst, refill_seconds) in sorted(self.limits.items())
+            }
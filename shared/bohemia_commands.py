@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_commands.py - v1
+
+One console command writer per telnet session for the Python services
+(integrated-game-monitor and voting).
+
+Every thread used to write to the socket on its own, so a burst of reward
+grants could flood the console and a PM reply waited behind all of them.
+CommandScheduler is the only writer:
+
+- commands are served strictly by priority class (CMD_PRIORITY_*), FIFO
+  within a class
+- a token bucket limits commands per second (burst allowed)
+- submitting a command with a coalesce_key that is already pending returns
+  the pending ticket instead of queueing a duplicate (listplayers)
+- wait_or_cancel(ticket): a caller that stops waiting withdraws a ticket that
+  is still queued, so it is never written after the caller gave up (and
+  maybe sent the command another way)
+- per-class queue wait is logged every stats_interval seconds, and
+  on_wait(priority, seconds) / on_write(verb, priority, result, seconds) /
+  on_coalesced(priority) hooks feed metrics
+
+Rate, burst and timeouts are the service's own settings and passed in.
+
+Usage:
+
+    commands = CommandScheduler(write, rate=3.0, burst=5, on_write=observe)
+    commands.start()
+    ticket = commands.submit("listplayers", CMD_PRIORITY_POLL, coalesce_key="listplayers")
+    ok = ticket.wait()
+    written = commands.wait_or_cancel(grant_ticket)  # True / False / None
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger("bohemia_commands")
+
+RATE_PER_SECOND = 3.0
+BURST = 5
+WAIT_TIMEOUT_SECONDS = 30
+STATS_LOG_INTERVAL_SECONDS = 300
+
+# Priority classes (lower value is served first)
+CMD_PRIORITY_INTERACTIVE = 0  # PMs / replies to chat commands (/vote, /catchup)
+CMD_PRIORITY_REWARD = 1  # givexp / giveplus grants
+CMD_PRIORITY_POLL = 2  # periodic listplayers, connection warm-ups
+CMD_PRIORITY_BROADCAST = 3  # say / global announcements
+
+CMD_PRIORITY_NAMES = {
+    CMD_PRIORITY_INTERACTIVE: "interactive",
+    CMD_PRIORITY_REWARD: "reward",
+    CMD_PRIORITY_POLL: "poll",
+    CMD_PRIORITY_BROADCAST: "broadcast",
+}
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` stored."""
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def acquire(self, cost=1):
+        """Block until `cost` tokens are available. Returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= cost:
+                    self.tokens -= cost
+                    return waited
+                need = (cost - self.tokens) / self.rate
+            time.sleep(need)
+            waited += need
+
+
+class CommandTicket:
+    """Handle for a queued console command; wait() returns True once written."""
+
+    def __init__(self, command, priority, coalesce_key=None, cost=1, wait_timeout=WAIT_TIMEOUT_SECONDS):
+        self.command = command
+        self.priority = priority
+        self.coalesce_key = coalesce_key
+        self.cost = cost
+        self.wait_timeout = wait_timeout
+        self.enqueued_ts = time.monotonic()
+        self.ok = False
+        self.taken = False  # picked up by the writer, can no longer be cancelled
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        if not self.done.wait(self.wait_timeout if timeout is None else timeout):
+            return False
+        return self.ok
+
+
+class CommandScheduler:
+    """
+    Single writer for all console commands of one telnet session.
+
+    `writer(command)` does the actual socket write and raises on failure.
+    """
+
+    def __init__(
+        self,
+        writer,
+        rate=RATE_PER_SECOND,
+        burst=BURST,
+        name="console",
+        thread_name=None,
+        wait_timeout=WAIT_TIMEOUT_SECONDS,
+        stats_interval=STATS_LOG_INTERVAL_SECONDS,
+        on_wait=None,
+        on_write=None,
+        on_coalesced=None,
+    ):
+        self.writer = writer
+        self.name = name
+        self.thread_name = thread_name or f"{name}-scheduler"
+        self.wait_timeout = wait_timeout
+        self.stats_interval = stats_interval
+        self.on_wait = on_wait
+        self.on_write = on_write
+        self.on_coalesced = on_coalesced
+        self.bucket = TokenBucket(rate, burst)
+        self.cond = threading.Condition()
+        self.heap = []
+        self.seq = itertools.count()
+        self.pending_by_key = {}
+        self.stats = {
+            p: {"sent": 0, "failed": 0, "coalesced": 0, "wait_total": 0.0, "wait_max": 0.0}
+            for p in CMD_PRIORITY_NAMES
+        }
+        self.last_stats_log = time.monotonic()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self.thread.start()
+
+    def submit(self, command, priority=CMD_PRIORITY_INTERACTIVE, coalesce_key=None, cost=1):
+        with self.cond:
+            if coalesce_key is not None:
+                pending = self.pending_by_key.get(coalesce_key)
+                if pending is not None:
+                    self.stats[pending.priority]["coalesced"] += 1
+                    if self.on_coalesced:
+                        self.on_coalesced(CMD_PRIORITY_NAMES[pending.priority])
+                    return pending
+
+            ticket = CommandTicket(
+                command, priority, coalesce_key=coalesce_key, cost=cost, wait_timeout=self.wait_timeout
+            )
+            if coalesce_key is not None:
+                self.pending_by_key[coalesce_key] = ticket
+            heapq.heappush(self.heap, (priority, next(self.seq), ticket))
+            self.cond.notify()
+            return ticket
+
+    def cancel(self, ticket):
+        """Withdraw a ticket that is still queued. Returns False if the writer
+        already took it (it is being or has been written)."""
+        with self.cond:
+            if ticket.taken:
+                return False
+            self.heap = [entry for entry in self.heap if entry[2] is not ticket]
+            heapq.heapify(self.heap)
+            if ticket.coalesce_key is not None and self.pending_by_key.get(ticket.coalesce_key) is ticket:
+                self.pending_by_key.pop(ticket.coalesce_key, None)
+            ticket.taken = True
+        ticket.done.set()
+        return True
+
+    def wait_or_cancel(self, ticket, timeout=None):
+        """ticket.wait(), withdrawing the ticket if it times out while still
+        queued. Returns True (written), False (write failed or withdrawn: it
+        was never written) or None (timed out while being written: it may
+        still go through, do not resend blindly)."""
+        if ticket.wait(timeout):
+            return True
+        if ticket.done.is_set() or self.cancel(ticket):
+            return ticket.ok
+        return None
+
+    def queue_depth(self):
+        with self.cond:
+            return len(self.heap)
+
+    def _next_ticket(self):
+        with self.cond:
+            while not self.heap:
+                self.cond.wait(timeout=5)
+                self._maybe_log_stats()
+            _prio, _seq, ticket = heapq.heappop(self.heap)
+            ticket.taken = True
+            if ticket.coalesce_key is not None:
+                self.pending_by_key.pop(ticket.coalesce_key, None)
+            return ticket
+
+    def _run(self):
+        while True:
+            ticket = self._next_ticket()
+            self.bucket.acquire(ticket.cost)
+
+            waited = time.monotonic() - ticket.enqueued_ts
+            st = self.stats[ticket.priority]
+            st["wait_total"] += waited
+            st["wait_max"] = max(st["wait_max"], waited)
+            prio_name = CMD_PRIORITY_NAMES[ticket.priority]
+            verb = ticket.command.split(None, 1)[0] if ticket.command.strip() else "?"
+            if self.on_wait:
+                self.on_wait(prio_name, waited)
+
+            result = "failed"
+            start = time.perf_counter()
+            try:
+                self.writer(ticket.command)
+                ticket.ok = True
+                st["sent"] += 1
+                result = "sent"
+            except Exception as e:
+                st["failed"] += 1
+                logger.error("Error sending command %r: %s", ticket.command, e)
+            finally:
+                if self.on_write:
+                    self.on_write(verb, prio_name, result, time.perf_counter() - start)
+                ticket.done.set()
+
+            with self.cond:
+                self._maybe_log_stats()
+
+    def _maybe_log_stats(self):
+        now = time.monotonic()
+        if (now - self.last_stats_log) < self.stats_interval:
+            return
+        self.last_stats_log = now
+        parts = []
+        for prio, st in self.stats.items():
+            handled = st["sent"] + st["failed"]
+            if not handled and not st["coalesced"]:
+                continue
+            avg_ms = (st["wait_total"] / handled * 1000.0) if handled else 0.0
+            parts.append(
+                "%s sent=%s failed=%s coalesced=%s wait_avg=%.0fms wait_max=%.0fms"
+                % (
+                    CMD_PRIORITY_NAMES[prio],
+                    st["sent"],
+                    st["failed"],
+                    st["coalesced"],
+                    avg_ms,
+                    st["wait_max"] * 1000.0,
+                )
+            )
+            st["wait_max"] = 0.0
+        if parts:
+            logger.info("%s: command queue stats (depth=%s): %s", self.name, len(self.heap), "; ".join(parts))
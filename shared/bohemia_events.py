@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_events.py - v1
+
+Bounded, prioritized hand-off between the telnet reader and the line
+handlers of the Python services (integrated-game-monitor and voting).
+
+The readers used to run every console line through all handler regexes (and
+their logging) before reading the next one. During a log storm (blood moon,
+mass spawns, server warnings) the socket buffer backed up behind noise and a
+/vote or /catchup waited for all of it. Now the reader only splits lines and
+classifies each with a few substring checks; one handler thread per queue
+takes them by priority:
+
+- HIGH (commands, level-ups, spawns, disconnects): always accepted, never
+  shed; when the queue is full a queued LOW (else NORMAL) line makes room
+- NORMAL (other chat, XP messages): accepted while there is room, else a
+  queued LOW line makes room, else shed ("full")
+- LOW (everything else): above pressure * capacity only every sample_every-th
+  line is kept ("sampled"); at capacity they are shed ("full")
+
+FIFO within a priority. Every shed line is counted per category and reason
+("full", "sampled", "evicted"); on_shed(category, reason) and
+on_handled(category, wait_seconds) hooks feed metrics.
+
+Usage:
+
+    events = EventQueue("monitor", handle_line, classify_line, on_shed=count)
+    events.start()
+    events.put(line)        # reader thread, never blocks
+    events.stats()
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("bohemia_events")
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+PRIORITY_NAMES = ("high", "normal", "low")
+
+CAPACITY = 2000
+# share of the capacity above which LOW lines are sampled
+PRESSURE = 0.5
+SAMPLE_EVERY = 10
+# log a shedding summary at most this often
+LOG_INTERVAL_SECONDS = 30.0
+
+
+class EventQueue:
+    """classify(line) -> (category, priority); handler(line) runs on the
+    queue's own thread, one line at a time."""
+
+    def __init__(
+        self,
+        name,
+        handler,
+        classify,
+        capacity=CAPACITY,
+        pressure=PRESSURE,
+        sample_every=SAMPLE_EVERY,
+        on_shed=None,
+        on_handled=None,
+        thread_name=None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.classify = classify
+        self.capacity = capacity
+        self.pressure_depth = int(capacity * pressure)
+        self.sample_every = max(1, sample_every)
+        self.on_shed = on_shed
+        self.on_handled = on_handled
+        self.thread_name = thread_name or f"{name}-events"
+        self.cond = threading.Condition()
+        self.queues = (deque(), deque(), deque())  # (queued_at, category, line) per priority
+        self.size = 0
+        self.max_size = 0
+        self.low_seen = 0
+        self.handled = 0
+        self.shed = {}  # (category, reason) -> count
+        self.shed_since_log = 0
+        self.last_log = 0.0
+        self.thread = None
+
+    def start(self):
+        with self.cond:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self.thread.start()
+
+    # ---------- producer ----------
+
+    def put(self, line):
+        """Queue one line (reader thread). Returns False if it was shed."""
+        category, priority = self.classify(line)
+        dropped = None
+        with self.cond:
+            if priority == LOW:
+                if self.size >= self.capacity:
+                    dropped = (category, "full")
+                elif self.size >= self.pressure_depth:
+                    self.low_seen += 1
+                    if self.low_seen % self.sample_every:
+                        dropped = (category, "sampled")
+            elif self.size >= self.capacity:
+                victim = self._evict(LOW if priority == NORMAL else NORMAL)
+                if victim is not None:
+                    dropped = (victim, "evicted")
+                elif priority == NORMAL:
+                    dropped = (category, "full")
+            accepted = dropped is None or dropped[1] == "evicted"
+            if accepted:
+                self.queues[priority].append((time.monotonic(), category, line))
+                self.size += 1
+                if self.size > self.max_size:
+                    self.max_size = self.size
+                self.cond.notify()
+            if dropped is not None:
+                self._count_shed(*dropped)
+        if dropped is not None and self.on_shed:
+            self.on_shed(*dropped)
+        return accepted
+
+    def _evict(self, upto):
+        """Drop the oldest queued line of the lowest priority down to upto;
+        returns its category or None (cond held)."""
+        for prio in range(LOW, upto - 1, -1):
+            if self.queues[prio]:
+                _queued_at, category, _line = self.queues[prio].popleft()
+                self.size -= 1
+                return category
+        return None
+
+    def _count_shed(self, category, reason):
+        key = (category, reason)
+        self.shed[key] = self.shed.get(key, 0) + 1
+        self.shed_since_log += 1
+        now = time.monotonic()
+        if now - self.last_log >= LOG_INTERVAL_SECONDS:
+            logger.warning(
+                "%s: console flood, shed %s lines (queue %s/%s)",
+                self.name, self.shed_since_log, self.size, self.capacity,
+            )
+            self.shed_since_log = 0
+            self.last_log = now
+
+    # ---------- consumer ----------
+
+    def _take(self):
+        with self.cond:
+            while not self.size:
+                self.cond.wait()
+            for q in self.queues:
+                if q:
+                    self.size -= 1
+                    return q.popleft()
+
+    def _run(self):
+        while True:
+            queued_at, category, line = self._take()
+            try:
+                self.handler(line)
+            except Exception as e:
+                logger.error("%s: handler failed on %r: %s", self.name, line[:200], e)
+            self.handled += 1
+            if self.on_handled:
+                self.on_handled(category, time.monotonic() - queued_at)
+
+    # ---------- introspection ----------
+
+    def depth(self, priority=None):
+        if priority is None:
+            return self.size
+        return len(self.queues[priority])
+
+    def stats(self):
+        with self.cond:
+            return {
+                "depth": {PRIORITY_NAMES[p]: len(q) for p, q in enumerate(self.queues)},
+                "maxDepth": self.max_size,
+                "capacity": self.capacity,
+                "handled": self.handled,
+                "shed": {"%s/%s" % k: n for k, n in sorted(self.shed.items())},
+            }
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_jobs.py - v1
+
+One job scheduler per process for the Python services (integrated-game-monitor
+and voting), replacing the "while self.tn: time.sleep(N)" daemon threads.
+
+Those loops had no way to stop: every reconnect started another set, and
+their sleeps could not be shortened or moved. JobScheduler keeps all timers in
+one heap driven by one thread and hands due jobs to a small worker pool:
+
+- named jobs: every(name, interval, fn) - interval may be a callable that
+  returns the next delay after each run (adaptive polling) - and
+  daily(name, hour, minute, fn, tz) at an exact wall-clock time
+- jitter: interval jobs are spread by +/- jitter * interval
+- groups: cancel_group("main:session") drops every job of a telnet session
+- run_soon(name, delay): move a job earlier (never later), e.g. on a nudge;
+  asked while the job runs, the next run follows within delay
+- a job never overlaps itself: its next run is timed from the end of the
+  current one (a slow run delays, never stacks)
+- per-job stats (runs, failures, last / max / total run time) and an
+  optional on_run(name, seconds, ok) hook for metrics
+
+Usage:
+
+    jobs = JobScheduler("monitor", on_run=observe)
+    jobs.start()
+    jobs.every("main:listplayers", poller_interval, update_levels, jitter=0.1, group="main:session")
+    jobs.daily("daily-reset", 6, 0, reset, tz=prague)
+    jobs.run_soon("main:listplayers", 3.0)
+    jobs.cancel_group("main:session")
+"""
+
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("bohemia_jobs")
+
+WORKERS = 4
+# the timer thread wakes at least this often, so wall-clock jobs notice clock
+# changes (NTP steps, DST) without a full-length sleep
+MAX_WAIT_SECONDS = 30.0
+
+
+def next_wall_time(hour, minute, tz=None, now=None):
+    """The next hour:minute after now in tz (aware datetime; pytz or zoneinfo)."""
+    now = now or datetime.now(tz)
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target = target + timedelta(days=1)
+    if tz is not None and hasattr(tz, "localize"):
+        # pytz: re-resolve the UTC offset for the target day (DST switch)
+        target = tz.localize(target.replace(tzinfo=None))
+    return target
+
+
+class Job:
+    def __init__(self, name, fn, interval=None, jitter=0.0, wall=None, group=None, once=False):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = jitter
+        self.wall = wall  # (hour, minute, tz) for daily jobs
+        self.group = group
+        self.once = once
+        self.gen = 0  # bumped on every (re)schedule; stale heap entries are dropped
+        self.due = 0.0  # monotonic
+        self.wall_due = None  # epoch seconds, daily jobs only
+        self.cancelled = False
+        self.running = False
+        self.soon = None  # run_soon() delay requested while running
+        self.runs = 0
+        self.failures = 0
+        self.last_start = None
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def next_delay(self):
+        interval = self.interval() if callable(self.interval) else self.interval
+        interval = max(0.0, float(interval))
+        if self.jitter:
+            interval += random.uniform(-self.jitter, self.jitter) * interval
+        return max(0.0, interval)
+
+    def stats(self, now):
+        return {
+            "group": self.group,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "lastStart": self.last_start,
+            "lastSeconds": round(self.last_seconds, 4),
+            "maxSeconds": round(self.max_seconds, 4),
+            "totalSeconds": round(self.total_seconds, 4),
+            "nextIn": None if self.cancelled else round(max(0.0, self.due - now), 1),
+        }
+
+
+class JobScheduler:
+    """Heap of timers, one timer thread, a worker pool for the job bodies."""
+
+    def __init__(self, name="jobs", workers=WORKERS, on_run=None):
+        self.name = name
+        self.on_run = on_run
+        self.cond = threading.Condition()
+        self.heap = []  # (due, seq, gen, job)
+        self.seq = itertools.count()
+        self.jobs = {}
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-job")
+        self.thread = None
+        self.stopped = False
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        with self.cond:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name=f"{self.name}-timers", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.pool.shutdown(wait=False)
+
+    # ---------- registration ----------
+
+    def every(self, name, interval, fn, jitter=0.0, first_delay=None, group=None):
+        """Run fn every interval seconds (number or callable). The first run is
+        after first_delay (default: one interval)."""
+        job = Job(name, fn, interval=interval, jitter=jitter, group=group)
+        with self.cond:
+            self._replace(job)
+            self._push(job, job.next_delay() if first_delay is None else first_delay)
+        return job
+
+    def daily(self, name, hour, minute, fn, tz=None, group=None):
+        """Run fn every day at hour:minute wall-clock time in tz."""
+        job = Job(name, fn, wall=(hour, minute, tz), group=group)
+        with self.cond:
+            self._replace(job)
+            self._push_wall(job)
+        return job
+
+    def once(self, name, fn, delay=0.0, group=None):
+        """Run fn once after delay seconds (replaces a pending job of that name)."""
+        job = Job(name, fn, group=group, once=True)
+        with self.cond:
+            self._replace(job)
+            self._push(job, delay)
+        return job
+
+    def run_soon(self, name, delay=0.0):
+        """Move a scheduled job to run within delay seconds. No-op if unknown,
+        cancelled or already due sooner."""
+        with self.cond:
+            job = self.jobs.get(name)
+            if job is None or job.cancelled:
+                return False
+            if job.running:
+                job.soon = delay if job.soon is None else min(job.soon, delay)
+                return True
+            if job.due <= time.monotonic() + delay:
+                return False
+            self._push(job, delay)
+            return True
+
+    def cancel(self, name):
+        with self.cond:
+            job = self.jobs.pop(name, None)
+            if job is not None:
+                job.cancelled = True
+                self.cond.notify_all()
+            return job is not None
+
+    def cancel_group(self, group):
+        with self.cond:
+            names = [n for n, j in self.jobs.items() if j.group == group]
+            for n in names:
+                self.jobs.pop(n).cancelled = True
+            if names:
+                self.cond.notify_all()
+        if names:
+            logger.debug("%s: cancelled %s", self.name, ", ".join(sorted(names)))
+        return names
+
+    def stats(self):
+        now = time.monotonic()
+        with self.cond:
+            return {n: j.stats(now) for n, j in sorted(self.jobs.items())}
+
+    # ---------- internals (cond held) ----------
+
+    def _replace(self, job):
+        old = self.jobs.get(job.name)
+        if old is not None:
+            old.cancelled = True
+        self.jobs[job.name] = job
+
+    def _push(self, job, delay):
+        job.gen += 1
+        job.due = time.monotonic() + max(0.0, delay)
+        heapq.heappush(self.heap, (job.due, next(self.seq), job.gen, job))
+        self.cond.notify_all()
+
+    def _push_wall(self, job):
+        hour, minute, tz = job.wall
+        target = next_wall_time(hour, minute, tz)
+        job.wall_due = target.timestamp()
+        self._push(job, job.wall_due - time.time())
+
+    def _reschedule(self, job):
+        if job.cancelled or job.once or self.jobs.get(job.name) is not job:
+            return
+        if job.wall is not None:
+            self._push_wall(job)
+            return
+        delay = job.next_delay()
+        if job.soon is not None:
+            delay, job.soon = min(delay, job.soon), None
+        self._push(job, delay)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if self.stopped:
+                    return
+                if not self.heap:
+                    self.cond.wait(MAX_WAIT_SECONDS)
+                    continue
+                due, _seq, gen, job = self.heap[0]
+                if job.cancelled or gen != job.gen:
+                    heapq.heappop(self.heap)
+                    continue
+                now = time.monotonic()
+                if job.wall_due is not None and due - now > 1.0:
+                    # re-anchor on the wall clock in case it moved
+                    drift = (job.wall_due - time.time()) - (due - now)
+                    if abs(drift) > 1.0:
+                        heapq.heappop(self.heap)
+                        self._push(job, job.wall_due - time.time())
+                        continue
+                if due > now:
+                    self.cond.wait(min(due - now, MAX_WAIT_SECONDS))
+                    continue
+                heapq.heappop(self.heap)
+                job.running = True
+            try:
+                self.pool.submit(self._execute, job)
+            except RuntimeError:
+                return  # pool shut down
+
+    def _execute(self, job):
+        start = time.perf_counter()
+        job.last_start = time.time()
+        ok = True
+        try:
+            job.fn()
+        except Exception as e:
+            ok = False
+            logger.error("%s: job %s failed: %s", self.name, job.name, e)
+        elapsed = time.perf_counter() - start
+        with self.cond:
+            job.running = False
+            job.runs += 1
+            if not ok:
+                job.failures += 1
+            job.last_seconds = elapsed
+            job.max_seconds = max(job.max_seconds, elapsed)
+            job.total_seconds += elapsed
+            if job.once and self.jobs.get(job.name) is job:
+                self.jobs.pop(job.name)
+            self._reschedule(job)
+        if self.on_run:
+            try:
+                self.on_run(job.name, elapsed, ok)
+            except Exception:
+                pass
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_logging.py - v1
+
+Queue-based logging for the Python services (integrated-game-monitor and
+voting).
+
+Every thread used to format and write its own log records, so a telnet log
+storm made the reader thread wait on the log file. setup_logging() installs:
+
+- NonBlockingQueueHandler on the root logger: callers only enqueue; a full
+  queue drops the record and counts it (handler.dropped), it never blocks
+- a QueueListener thread that formats and writes to a size-rotated file and
+  stderr
+- SamplingFilter: at most N records per window for high-volume loggers, the
+  suppressed count goes with the next record
+- ServerTagFilter (server_tags=True): "[<server id>]" in front of every
+  message, taken from the "<server_id>:<role>" thread names
+- per-logger levels from a JSON file ({"monitor.telnet": "WARNING"}),
+  re-read every levels_poll_seconds or at once on SIGHUP
+
+File names, sizes and the sampled loggers are the service's own settings and
+passed in.
+
+Usage:
+
+    queue_handler, listener = setup_logging(
+        LOG_FILE, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE,
+        LOG_SAMPLE_LIMITS, LOG_LEVELS_FILE, LOG_LEVELS_POLL_SECONDS,
+    )
+    dropped_gauge.set_function(lambda: queue_handler.dropped)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import signal
+import threading
+import time
+
+logger = logging.getLogger("bohemia_logging")
+
+_levels_mtimes = {}  # levels file -> mtime last applied
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limits high-volume logger categories: at most `limit` records per
+    `window` seconds per logger name. Suppressed records are only counted; the
+    first record of the next window carries the suppressed count.
+    """
+
+    def __init__(self, limits):
+        super().__init__()
+        self.limits = dict(limits)
+        self.state = {}  # name -> [window_start, emitted, suppressed]
+        self.lock = threading.Lock()
+        self.total_suppressed = {}
+
+    def filter(self, record):
+        limit = self.limits.get(record.name)
+        if not limit:
+            return True
+        max_records, window = limit
+        now = time.monotonic()
+        with self.lock:
+            st = self.state.get(record.name)
+            if st is None or (now - st[0]) >= window:
+                suppressed = st[2] if st else 0
+                self.state[record.name] = [now, 1, 0]
+                if suppressed:
+                    record.msg = "%s [%s similar messages suppressed in last %ss]" % (record.msg, suppressed, window)
+                return True
+            if st[1] < max_records:
+                st[1] += 1
+                return True
+            st[2] += 1
+            self.total_suppressed[record.name] = self.total_suppressed.get(record.name, 0) + 1
+            return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks or formats on the calling thread.
+    Formatting and file I/O happen on the QueueListener thread; if the queue is
+    full the record is dropped and counted."""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # same process: hand the record over as-is, the listener formats it
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ServerTagFilter(logging.Filter):
+    """Sets record.server from the thread name: per-server threads are named
+    "<server_id>:<role>", anything else logs as "-"."""
+
+    def filter(self, record):
+        name = record.threadName or ""
+        record.server = name.split(":", 1)[0] if ":" in name else "-"
+        return True
+
+
+def apply_log_levels(levels_file, force=False):
+    """(Re)apply per-logger levels from levels_file, e.g.
+    {"monitor": "DEBUG", "monitor.telnet": "WARNING", "urllib3": "WARNING"}"""
+    try:
+        mtime = os.path.getmtime(levels_file)
+    except OSError:
+        return
+    if not force and mtime == _levels_mtimes.get(levels_file):
+        return
+    _levels_mtimes[levels_file] = mtime
+    try:
+        with open(levels_file, "r", encoding="utf-8") as f:
+            levels = json.load(f) or {}
+        for name, level in levels.items():
+            logging.getLogger(name).setLevel(str(level).upper())
+        logger.info("Applied log levels from %s: %s", levels_file, levels)
+    except Exception as e:
+        logger.error("Invalid log levels file %s: %s", levels_file, e)
+
+
+def _watch_log_levels(levels_file, poll_seconds):
+    while True:
+        time.sleep(poll_seconds)
+        apply_log_levels(levels_file)
+
+
+def setup_logging(
+    log_file,
+    level,
+    max_bytes,
+    backup_count,
+    queue_size,
+    sample_limits,
+    levels_file,
+    levels_poll_seconds,
+    server_tags=False,
+):
+    """Route the root logger through a bounded queue to a rotating file and
+    stderr. server_tags prefixes every message with the server id. Returns
+    (queue_handler, listener); call once per process."""
+    if server_tags:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - [%(server)s] %(message)s")
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    q = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(q)
+    queue_handler.addFilter(SamplingFilter(sample_limits))
+    if server_tags:
+        queue_handler.addFilter(ServerTagFilter())
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+    listener = logging.handlers.QueueListener(q, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    apply_log_levels(levels_file, force=True)
+    threading.Thread(
+        target=_watch_log_levels, args=(levels_file, levels_poll_seconds), name="log-levels", daemon=True
+    ).start()
+    if hasattr(signal, "SIGHUP"):
+        try:
+            signal.signal(signal.SIGHUP, lambda _sig, _frm: apply_log_levels(levels_file, force=True))
+        except ValueError:
+            pass  # not in main thread
+    return queue_handler, listener
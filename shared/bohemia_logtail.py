@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_logtail.py - v1
+
+Server log file tailing for the Python services (integrated-game-monitor and
+voting), as an alternative event source to the telnet log stream.
+
+With LOG_TAIL_ENABLED a service reads game events from the dedicated server's
+log file (server_<timestamp>.log) and uses telnet only for commands. A
+restart resumes at the first line not yet queued (handed to on_line), instead
+of losing whatever the server logged while the service was down. The
+checkpoint does not track the handler: lines still waiting in the service's
+event queue at a crash are not replayed, and lines read after the last
+checkpoint (at most checkpoint_seconds) are read again.
+
+Usage:
+
+    tailer = LogTailer("/home/steam/logs", "server_*.log", checkpoint_file, events.put)
+    tailer.start()
+    ...
+    tailer.stop()
+"""
+
+import glob
+import json
+import logging
+import os
+import select
+import threading
+import time
+
+logger = logging.getLogger("bohemia_logtail")
+
+# save the read offset at most this often (and on rotation / stop)
+CHECKPOINT_SECONDS = 5
+# wait between reads when inotify is not available
+POLL_SECONDS = 1.0
+
+
+class LogTailer:
+    """
+    Follows the dedicated server's log file and hands every complete line to
+    `on_line(line_str)`, exactly like the telnet reader would.
+
+    - inotify (libc via ctypes) wakes the tailer on writes; polling fallback
+    - byte-offset checkpoint {path, inode, offset} so a restart resumes at the
+      first line not yet queued (passed to on_line); the checkpoint is saved
+      at most every checkpoint_seconds and knows nothing about the handler
+    - rotation: when a newer file appears in the log dir (the server starts a
+      new server_<timestamp>.log on every start) or the inode behind the path
+      changes, the old file is read to its end before switching
+    - truncation: a file shorter than our offset is re-read from 0
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+
+    READ_CHUNK = 64 * 1024
+
+    def __init__(
+        self,
+        log_dir,
+        pattern,
+        checkpoint_file,
+        on_line,
+        log_file=None,
+        start_at_end=True,
+        name="log-tailer",
+        poll_seconds=POLL_SECONDS,
+        checkpoint_seconds=CHECKPOINT_SECONDS,
+    ):
+        self.name = name
+        self.poll_seconds = poll_seconds
+        self.checkpoint_seconds = checkpoint_seconds
+        self.log_dir = log_dir
+        self.pattern = pattern
+        self.log_file = log_file
+        self.checkpoint_file = checkpoint_file
+        self.on_line = on_line
+        self.start_at_end = start_at_end
+
+        self.fh = None
+        self.path = None
+        self.inode = None
+        self.partial = b""
+        self.lines_read = 0
+        self.last_checkpoint_ts = 0.0
+        self.inotify_fd = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    # ---------- inotify ----------
+
+    def _init_inotify(self):
+        try:
+            import ctypes
+            import ctypes.util
+
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+            wd = libc.inotify_add_watch(fd, os.fsencode(self.log_dir), mask)
+            if wd < 0:
+                err = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(err, "inotify_add_watch failed for %s" % self.log_dir)
+            self.inotify_fd = fd
+            logger.info("Log tail: watching %s with inotify", self.log_dir)
+        except Exception as e:
+            self.inotify_fd = None
+            logger.warning("Log tail: inotify unavailable (%s), polling every %ss", e, self.poll_seconds)
+
+    def _wait_for_change(self, timeout):
+        if self.inotify_fd is None:
+            self.stop_event.wait(timeout)
+            return
+        readable, _, _ = select.select([self.inotify_fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.inotify_fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    # ---------- file handling ----------
+
+    def _newest_path(self):
+        if self.log_file:
+            return self.log_file if os.path.exists(self.log_file) else None
+        candidates = glob.glob(os.path.join(self.log_dir, self.pattern))
+        if not candidates:
+            return None
+        return max(candidates, key=lambda p: (os.path.getmtime(p), p))
+
+    def _open(self, path, offset):
+        if self.fh:
+            self.fh.close()
+        self.fh = open(path, "rb")
+        st = os.fstat(self.fh.fileno())
+        offset = max(0, min(int(offset), st.st_size))
+        self.fh.seek(offset)
+        self.path = path
+        self.inode = st.st_ino
+        self.partial = b""
+        logger.info("Log tail: following %s from offset %s", path, offset)
+
+    def _offset(self):
+        """Offset of the first line not yet passed to on_line."""
+        return self.fh.tell() - len(self.partial)
+
+    def _resume(self):
+        cp = {}
+        try:
+            if os.path.exists(self.checkpoint_file):
+                with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                    cp = json.load(f) or {}
+        except Exception as e:
+            logger.error("Log tail: failed to load checkpoint: %s", e)
+
+        cp_path = cp.get("path")
+        if cp_path and os.path.exists(cp_path):
+            try:
+                if os.stat(cp_path).st_ino == cp.get("inode"):
+                    self._open(cp_path, cp.get("offset", 0))
+                    return
+            except OSError:
+                pass
+
+        newest = self._newest_path()
+        if not newest:
+            return
+        # With a checkpoint we were running before: everything in a file we never
+        # saw is new. Without one, don't replay old history on first start.
+        offset = os.path.getsize(newest) if (self.start_at_end and not cp) else 0
+        self._open(newest, offset)
+
+    def _read_available(self):
+        while True:
+            data = self.fh.read(self.READ_CHUNK)
+            if not data:
+                return
+            buf = self.partial + data
+            lines = buf.split(b"\n")
+            self.partial = lines.pop()
+            for raw in lines:
+                self._emit(raw)
+
+    def _emit(self, raw):
+        line = raw.decode("utf-8", errors="ignore").strip()
+        if not line:
+            return
+        self.lines_read += 1
+        try:
+            self.on_line(line)
+        except Exception as e:
+            logger.error("Log tail: handler error: %s", e)
+
+    def _pump(self):
+        if self.fh is None:
+            self._resume()
+            if self.fh is None:
+                return
+
+        self._read_available()
+
+        st = os.fstat(self.fh.fileno())
+        if st.st_size < self._offset():
+            logger.warning("Log tail: %s was truncated, restarting from 0", self.path)
+            self.fh.seek(0)
+            self.partial = b""
+            self._read_available()
+
+        newest = self._newest_path()
+        if not newest:
+            return
+        try:
+            newest_inode = os.stat(newest).st_ino
+        except OSError:
+            return
+        if newest != self.path or newest_inode != self.inode:
+            # drain what is left of the old file first
+            self._read_available()
+            if self.partial:
+                self._emit(self.partial)
+                self.partial = b""
+            logger.info("Log tail: rotated %s -> %s", self.path, newest)
+            self._open(newest, 0)
+            self._save_checkpoint(force=True)
+            self._read_available()
+
+    def _save_checkpoint(self, force=False):
+        if self.fh is None:
+            return
+        now = time.time()
+        if not force and (now - self.last_checkpoint_ts) < self.checkpoint_seconds:
+            return
+        self.last_checkpoint_ts = now
+        cp = {"path": self.path, "inode": self.inode, "offset": self._offset(), "ts": now}
+        try:
+            tmp = self.checkpoint_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(cp, f)
+            os.replace(tmp, self.checkpoint_file)
+        except Exception as e:
+            logger.error("Log tail: failed to save checkpoint: %s", e)
+
+    def _run(self):
+        self._init_inotify()
+        while not self.stop_event.is_set():
+            try:
+                self._pump()
+                self._save_checkpoint()
+            except Exception as e:
+                logger.error("Log tail error: %s", e)
+                if self.fh:
+                    self.fh.close()
+                self.fh = None
+                self.stop_event.wait(1)
+            self._wait_for_change(self.poll_seconds)
+        self._save_checkpoint(force=True)
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_metrics.py - v1
+
+Small, dependency-free Prometheus-style metrics for the Python services
+(integrated-game-monitor and voting): counters, gauges and latency histograms,
+rendered in the Prometheus text exposition format (0.0.4).
+
+Usage (both services put this directory on sys.path):
+
+    import bohemia_metrics as metrics
+
+    LINES = metrics.counter("bohemia_lines_read_total", "Lines read", ("source",))
+    HTTP = metrics.histogram("bohemia_http_request_seconds", "HTTP latency", ("target", "endpoint"))
+
+    LINES.labels(source="telnet").inc()
+    with HTTP.labels(target="quest", endpoint="/update-quest").time():
+        ...
+
+    metrics.start_metrics_server("127.0.0.1", 8096)   # GET /metrics
+
+Notes:
+- Cheap enough to leave on: an update is one dict lookup (labels) plus a short
+  per-child lock; histograms use fixed buckets and bisect. Nothing is computed
+  until /metrics is scraped.
+- Gauges can be backed by a function (set_function) that is read at scrape
+  time, e.g. queue depths, so the hot paths do not have to update them.
+- Registering the same name twice returns the existing metric (modules that
+  are imported more than once, or re-created service objects, are fine).
+- TimedLock is a drop-in threading.Lock that records how long acquirers waited.
+- Process metrics (CPU, RSS, threads, open fds, start time) are collected at
+  scrape time from /proc and resource.
+"""
+
+import bisect
+import json
+import logging
+import os
+import resource
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("bohemia_metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; covers sub-millisecond parsing up to slow HTTP calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# for per-line parsing and lock waits
+FAST_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _label_str(names, values, extra=None):
+    pairs = ['%s="%s"' % (n, _escape(v)) for n, v in zip(names, values)]
+    if extra:
+        pairs.append('%s="%s"' % extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+# ---------- metric children (one per label set) ----------
+
+
+class _CounterChild:
+    __slots__ = ("_lock", "value", "_fn")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self._fn = None
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set_function(self, fn):
+        """Read the (monotonic) total from fn() at scrape time, e.g. a counter
+        some other object already keeps."""
+        self._fn = fn
+
+    def get(self):
+        fn = self._fn
+        if fn is None:
+            return self.value
+        try:
+            return float(fn())
+        except Exception:
+            return float("nan")
+
+
+class _GaugeChild:
+    __slots__ = ("_lock", "value", "_fn")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self._fn = None
+
+    def set(self, value):
+        self.value = float(value)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, fn):
+        """Read the value from fn() at scrape time (None unbinds)."""
+        self._fn = fn
+
+    def get(self):
+        fn = self._fn
+        if fn is None:
+            return self.value
+        try:
+            return float(fn())
+        except Exception:
+            return float("nan")
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ("_lock", "bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        """Context manager observing the elapsed seconds of its block."""
+        return _Timer(self)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+# ---------- metrics ----------
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            key = tuple(str(kwargs[n]) for n in self.labelnames)
+        else:
+            key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError("%s expects labels %s" % (self.name, self.labelnames))
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _items(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self, out):
+        out.append("# HELP %s %s" % (self.name, self.documentation.replace("\n", " ")))
+        out.append("# TYPE %s %s" % (self.name, self.kind))
+        for key, child in self._items():
+            out.append("%s%s %s" % (self.name, _label_str(self.labelnames, key), _format_value(child.get())))
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def set_function(self, fn):
+        self._default.set_function(fn)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set_function(self, fn):
+        self._default.set_function(fn)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def render(self, out):
+        out.append("# HELP %s %s" % (self.name, self.documentation.replace("\n", " ")))
+        out.append("# TYPE %s histogram" % self.name)
+        for key, child in self._items():
+            counts, total, count = child.snapshot()
+            cumulative = 0
+            for bound, n in zip(self.bounds + (float("inf"),), counts):
+                cumulative += n
+                labels = _label_str(self.labelnames, key, ("le", _format_value(bound)))
+                out.append("%s_bucket%s %s" % (self.name, labels, cumulative))
+            labels = _label_str(self.labelnames, key)
+            out.append("%s_sum%s %s" % (self.name, labels, _format_value(total)))
+            out.append("%s_count%s %s" % (self.name, labels, count))
+
+
+# ---------- registry ----------
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, cls, name, documentation, labelnames=(), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, labelnames, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError("metric %s already registered with a different type/labels" % name)
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        out = []
+        for metric in metrics:
+            try:
+                metric.render(out)
+            except Exception as e:
+                logger.error("Cannot render metric %s: %s", metric.name, e)
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=(), registry=REGISTRY):
+    return registry.register(Counter, name, documentation, labelnames)
+
+
+def gauge(name, documentation, labelnames=(), registry=REGISTRY):
+    return registry.register(Gauge, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+    return registry.register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+# ---------- instrumented lock ----------
+
+
+class TimedLock:
+    """threading.Lock that observes the seconds each acquire() waited on
+    `wait_histogram` (a histogram child). Uncontended acquires record 0, so
+    the count/bucket split shows how often the lock was contended."""
+
+    def __init__(self, wait_histogram):
+        self._lock = threading.Lock()
+        self._wait = wait_histogram
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self._wait.observe(0.0)
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        ok = self._lock.acquire(True, timeout)
+        self._wait.observe(time.perf_counter() - start)
+        return ok
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+
+# ---------- process metrics ----------
+
+_START_TIME = time.time()
+_PAGE_SIZE = resource.getpagesize()
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _open_fds():
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return float("nan")
+
+
+def _process_start_time():
+    # /proc/self/stat field 22 is the start time in clock ticks since boot
+    try:
+        with open("/proc/self/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/stat", "r") as f:
+            btime = next(int(line.split()[1]) for line in f if line.startswith("btime "))
+        return btime + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError, StopIteration):
+        return _START_TIME
+
+
+def register_process_metrics(registry=REGISTRY):
+    def cpu():
+        ru = resource.getrusage(resource.RUSAGE_SELF)
+        return ru.ru_utime + ru.ru_stime
+
+    start = _process_start_time()
+    registry.register(Counter, "process_cpu_seconds_total", "User + system CPU time").set_function(cpu)
+    registry.register(Gauge, "process_resident_memory_bytes", "Resident set size").set_function(_rss_bytes)
+    registry.register(Gauge, "process_open_fds", "Open file descriptors").set_function(_open_fds)
+    registry.register(Gauge, "process_threads", "Live Python threads").set_function(threading.active_count)
+    registry.register(Gauge, "process_start_time_seconds", "Process start (unix time)").set(start)
+
+
+register_process_metrics()
+
+
+# ---------- HTTP endpoint ----------
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+    routes = {}  # extra path -> fn(query) -> (status, json-able dict)
+    server_version = "BohemiaMetrics/1"
+
+    def log_message(self, fmt, *args):
+        logger.debug("metrics %s - %s", self.client_address[0], fmt % args)
+
+    def _send(self, status, body, content_type):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        path = path.rstrip("/")
+        if path in ("", "/metrics"):
+            self._send(200, self.registry.render().encode("utf-8"), CONTENT_TYPE)
+            return
+        route = self.routes.get(path)
+        if route is None:
+            self.send_error(404)
+            return
+        try:
+            status, obj = route(query)
+        except Exception as e:
+            logger.error("Metrics server route %s failed: %s", path, e)
+            status, obj = 500, {"error": "internal error"}
+        self._send(status, json.dumps(obj).encode("utf-8"), "application/json")
+
+
+def start_metrics_server(host, port, registry=REGISTRY, routes=None):
+    """Serve GET /metrics (plus optional JSON `routes`, e.g. /debug/profile) in
+    a background thread. Returns the server, or None if the port could not be
+    bound (logged, the service keeps running)."""
+    handler = type("BoundMetricsHandler", (MetricsHandler,), {"registry": registry, "routes": dict(routes or {})})
+    try:
+        srv = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.error("Metrics endpoint could not bind %s:%s: %s", host, port, e)
+        return None
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Metrics listening on http://%s:%s/metrics", host, port)
+    return srv
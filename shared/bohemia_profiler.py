@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_profiler.py - v1
+
+On-demand profiling for the long-running Python services (integrated-game-monitor
+and voting), without a restart (a restart drops the telnet session and all
+in-memory state, i.e. exactly the conditions we want to look at):
+
+- stacks  per-thread stack dump (thread names, daemon flag, CPU seconds)
+- cpu     sampling profile: every thread's stack is sampled SAMPLE_INTERVAL
+          apart for N seconds; written as a per-thread summary (CPU seconds
+          from /proc/self/task, top functions by own / total samples) plus a
+          collapsed-stack file for flamegraph.pl / speedscope
+- mem     tracemalloc snapshot diff over the same N seconds (tracemalloc is
+          only switched on for the duration, it is not free)
+
+Triggers (install_signal_handlers() must run on the main thread):
+    kill -USR1 <pid>    stacks + cpu + mem over the default duration
+    kill -USR2 <pid>    stacks only (instant)
+    GET /debug/profile?kind=all|cpu|mem|stacks&seconds=N   (local HTTP, see
+                        the services' read API / metrics endpoint)
+    python shared/bohemia_profiler.py <pid> [--stacks]     sends the signal
+
+With kind=all the tracemalloc window overlaps the CPU samples, so its overhead
+shows up in the CPU numbers; use kind=cpu for a clean CPU profile.
+
+Output goes to <out_dir>/<prefix>-<YYYYmmdd-HHMMSS>-{stacks,cpu,mem}.txt and
+-cpu.collapsed. Only one profile runs at a time; a second trigger while one is
+running is logged and ignored.
+"""
+
+import argparse
+import linecache
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter, defaultdict
+from urllib.parse import parse_qs
+
+logger = logging.getLogger("bohemia_profiler")
+
+DEFAULT_SECONDS = 30
+MAX_SECONDS = 300
+SAMPLE_INTERVAL = 0.01  # 100 Hz
+TOP_FUNCTIONS = 40
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 50
+KINDS = ("all", "cpu", "mem", "stacks")
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def thread_cpu_seconds():
+    """native thread id -> user + system CPU seconds (Linux /proc, else {})"""
+    out = {}
+    try:
+        tids = os.listdir("/proc/self/task")
+    except OSError:
+        return out
+    for tid in tids:
+        try:
+            with open("/proc/self/task/%s/stat" % tid, "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            out[int(tid)] = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+        except (OSError, IndexError, ValueError):
+            continue
+    return out
+
+
+def _threads_by_ident():
+    return {t.ident: t for t in threading.enumerate()}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return "%s (%s:%s)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def format_stacks():
+    """All threads' current stacks as text."""
+    threads = _threads_by_ident()
+    cpu = thread_cpu_seconds()
+    lines = ["Thread dump of pid %s at %s" % (os.getpid(), time.strftime("%Y-%m-%d %H:%M:%S")), ""]
+    for ident, frame in sorted(sys._current_frames().items(), key=lambda kv: getattr(threads.get(kv[0]), "name", "")):
+        t = threads.get(ident)
+        name = t.name if t else "?"
+        native = getattr(t, "native_id", None)
+        cpu_s = cpu.get(native)
+        lines.append(
+            "--- %s (ident=%s native=%s daemon=%s cpu=%s) ---"
+            % (name, ident, native, getattr(t, "daemon", "?"), "%.2fs" % cpu_s if cpu_s is not None else "?")
+        )
+        lines.extend(l.rstrip("\n") for l in traceback.format_stack(frame))
+        lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def sample_cpu(seconds, interval=SAMPLE_INTERVAL, stop_event=None):
+    """Sample every other thread's stack for `seconds`. Returns (collapsed,
+    per_thread) where collapsed is Counter("thread;outer;...;leaf" -> samples)
+    and per_thread maps thread name -> {"samples", "cpu_seconds"}."""
+    me = threading.get_ident()
+    collapsed = Counter()
+    samples = Counter()
+    names = {}
+    cpu_before = thread_cpu_seconds()
+    deadline = time.monotonic() + seconds
+    next_tick = time.monotonic()
+    while time.monotonic() < deadline:
+        if stop_event is not None and stop_event.is_set():
+            break
+        threads = _threads_by_ident()
+        for ident, frame in sys._current_frames().items():
+            t = threads.get(ident)
+            name = t.name if t else "thread-%s" % ident
+            if ident == me or name.startswith("profiler"):
+                continue
+            names[name] = getattr(t, "native_id", None)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(name)
+            collapsed[";".join(reversed(stack))] += 1
+            samples[name] += 1
+        next_tick += interval
+        delay = next_tick - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick = time.monotonic()  # fell behind, don't burst
+    cpu_after = thread_cpu_seconds()
+    per_thread = {}
+    for name, native in names.items():
+        cpu = None
+        if native in cpu_after:
+            cpu = cpu_after[native] - cpu_before.get(native, 0.0)
+        per_thread[name] = {"samples": samples[name], "cpu_seconds": cpu}
+    return collapsed, per_thread
+
+
+def format_cpu_report(collapsed, per_thread, seconds):
+    own = defaultdict(Counter)  # thread -> function -> samples as leaf
+    total = defaultdict(Counter)  # thread -> function -> samples on stack
+    for stack, n in collapsed.items():
+        parts = stack.split(";")
+        thread, frames = parts[0], parts[1:]
+        if frames:
+            own[thread][frames[-1]] += n
+        for fn in set(frames):
+            total[thread][fn] += n
+
+    lines = ["CPU sampling profile of pid %s, %.1fs at %.0f Hz" % (os.getpid(), seconds, 1.0 / SAMPLE_INTERVAL), ""]
+    lines.append("Threads by CPU seconds used in the window (samples are wall-clock):")
+    order = sorted(per_thread.items(), key=lambda kv: -(kv[1]["cpu_seconds"] or 0.0))
+    for name, st in order:
+        cpu = st["cpu_seconds"]
+        lines.append("  %-40s cpu=%-8s samples=%s" % (name, "%.3fs" % cpu if cpu is not None else "?", st["samples"]))
+    for name, _st in order:
+        if not own[name]:
+            continue
+        lines.append("")
+        lines.append("=== %s ===" % name)
+        lines.append("  own    total  function")
+        for fn, n in total[name].most_common(TOP_FUNCTIONS):
+            lines.append("  %5d  %5d  %s" % (own[name][fn], n, fn))
+    return "\n".join(lines) + "\n"
+
+
+def memory_diff(seconds, stop_event=None):
+    """tracemalloc diff over `seconds` (tracing is switched on just for the
+    window unless it was already running). Returns the report text."""
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        before = tracemalloc.take_snapshot()
+        if stop_event is not None:
+            stop_event.wait(seconds)
+        else:
+            time.sleep(seconds)
+        after = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, __file__),
+    ]
+    before = before.filter_traces(filters)
+    after = after.filter_traces(filters)
+    lines = [
+        "tracemalloc diff of pid %s over %.1fs (traced now %.1f KiB, peak %.1f KiB%s)"
+        % (os.getpid(), seconds, current / 1024.0, peak / 1024.0, ", tracing started for this window" if started else ""),
+        "",
+        "Top allocation growth by line:",
+    ]
+    for stat in after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]:
+        lines.append("  %s" % stat)
+    lines.append("")
+    lines.append("Top growth by call stack:")
+    for stat in after.compare_to(before, "traceback")[:10]:
+        lines.append("  %+.1f KiB in %+d blocks" % (stat.size_diff / 1024.0, stat.count_diff))
+        lines.extend("      %s" % l for l in stat.traceback.format())
+    lines.append("")
+    lines.append("Largest live allocations at the end of the window:")
+    for stat in after.statistics("lineno")[:20]:
+        lines.append("  %s" % stat)
+    return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """Runs stack dumps / CPU samples / tracemalloc diffs on request and writes
+    them to out_dir. trigger() never blocks the caller (signal handlers, HTTP
+    handlers); the work runs on a background thread."""
+
+    def __init__(self, out_dir, prefix, default_seconds=DEFAULT_SECONDS):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.default_seconds = default_seconds
+        self.lock = threading.Lock()
+        self.running = None  # (kind, started ts) while a profile runs
+        self.last_paths = []
+
+    def _path(self, stamp, suffix):
+        return os.path.join(self.out_dir, "%s-%s-%s" % (self.prefix, stamp, suffix))
+
+    @staticmethod
+    def _write(path, text):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def trigger(self, kind="all", seconds=None):
+        """Start a profile. Returns (started, paths): paths that will be
+        written, or the running profile's description when busy."""
+        if kind not in KINDS:
+            raise ValueError("kind must be one of %s" % ", ".join(KINDS))
+        seconds = float(seconds if seconds is not None else self.default_seconds)
+        seconds = max(1.0, min(seconds, MAX_SECONDS))
+        with self.lock:
+            if self.running:
+                return False, {"running": self.running[0], "since": self.running[1]}
+            self.running = (kind, time.time())
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        paths = []
+        if kind in ("all", "stacks"):
+            paths.append(self._path(stamp, "stacks.txt"))
+        if kind in ("all", "cpu"):
+            paths += [self._path(stamp, "cpu.txt"), self._path(stamp, "cpu.collapsed")]
+        if kind in ("all", "mem"):
+            paths.append(self._path(stamp, "mem.txt"))
+        threading.Thread(
+            target=self._run, args=(kind, seconds, stamp), name="profiler", daemon=True
+        ).start()
+        return True, paths
+
+    def _run(self, kind, seconds, stamp):
+        written = []
+        try:
+            os.makedirs(self.out_dir, exist_ok=True)
+            if kind in ("all", "stacks"):
+                path = self._path(stamp, "stacks.txt")
+                self._write(path, format_stacks())
+                written.append(path)
+            if kind != "stacks":
+                logger.info("Profiling (%s) for %.0fs, output in %s", kind, seconds, self.out_dir)
+
+            mem_result = {}
+            mem_thread = None
+            if kind in ("all", "mem"):
+                # runs alongside the CPU sampler so both cover the same window
+                def run_mem():
+                    mem_result["text"] = memory_diff(seconds)
+
+                mem_thread = threading.Thread(target=run_mem, name="profiler-mem", daemon=True)
+                mem_thread.start()
+
+            if kind in ("all", "cpu"):
+                collapsed, per_thread = sample_cpu(seconds)
+                path = self._path(stamp, "cpu.txt")
+                self._write(path, format_cpu_report(collapsed, per_thread, seconds))
+                written.append(path)
+                path = self._path(stamp, "cpu.collapsed")
+                self._write(path, "".join("%s %d\n" % (s, n) for s, n in collapsed.most_common()))
+                written.append(path)
+
+            if mem_thread is not None:
+                mem_thread.join()
+                path = self._path(stamp, "mem.txt")
+                self._write(path, mem_result.get("text", "memory diff failed\n"))
+                written.append(path)
+            logger.info("Profile written: %s", ", ".join(written))
+        except Exception as e:
+            logger.error("Profiling (%s) failed: %s", kind, e)
+        finally:
+            with self.lock:
+                self.running = None
+                self.last_paths = written
+
+    def install_signal_handlers(self):
+        """SIGUSR1: stacks + cpu + mem, SIGUSR2: stacks only. Main thread only."""
+        if not hasattr(signal, "SIGUSR1"):
+            return False
+
+        def on_signal(kind):
+            def handler(_sig, _frm):
+                started, info = self.trigger(kind)
+                if not started:
+                    logger.warning("Profile already running (%s), signal ignored", info)
+
+            return handler
+
+        try:
+            signal.signal(signal.SIGUSR1, on_signal("all"))
+            signal.signal(signal.SIGUSR2, on_signal("stacks"))
+        except ValueError:
+            logger.warning("Profiler signal handlers not installed (not on the main thread)")
+            return False
+        logger.info("Profiler ready: kill -USR1 %s (cpu+mem+stacks), kill -USR2 %s (stacks)", os.getpid(), os.getpid())
+        return True
+
+    def handle_http(self, query):
+        """/debug/profile?kind=...&seconds=... -> (status, json-able dict)"""
+        qs = parse_qs(query or "")
+        kind = (qs.get("kind") or ["all"])[0]
+        seconds = (qs.get("seconds") or [None])[0]
+        try:
+            started, info = self.trigger(kind, float(seconds) if seconds else None)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        if not started:
+            return 409, {"error": "profile already running", "running": info, "last": self.last_paths}
+        return 202, {"started": kind, "files": info}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Trigger profiling of a running monitor/voting process")
+    ap.add_argument("pid", type=int)
+    ap.add_argument("--stacks", action="store_true", help="stack dump only (SIGUSR2) instead of cpu+mem+stacks")
+    args = ap.parse_args()
+    sig = signal.SIGUSR2 if args.stacks else signal.SIGUSR1
+    os.kill(args.pid, sig)
+    print("Sent %s to %s; see the service log for the output files" % (sig.name, args.pid))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_reconnect.py - v1
+
+Reconnect pacing for the telnet services (integrated-game-monitor and voting).
+
+The old loops doubled a sleep from 30s up to 480s after every failed connect,
+so a routine 30s game-server restart could cost several minutes of dead
+monitoring. ReconnectManager instead:
+
+- probes the telnet port with a plain TCP connect (no login, closed at once)
+  at short jittered intervals while the server is down; the game server
+  refuses connections until it is up again, so a probe costs milliseconds
+- hands control back as soon as the port accepts, so the caller logs in
+  right away
+- backs off (decorrelated jitter, capped at max_delay) only while the port
+  stays closed or the login itself fails, and resets on a successful login
+
+Usage:
+
+    reconnect = ReconnectManager("monitor", host, port)
+    while True:
+        reconnect.wait_until_reachable()
+        if not connect():
+            reconnect.connect_failed()
+            continue
+        reconnect.connected()
+        read_until_disconnected()
+"""
+
+import logging
+import random
+import socket
+import time
+
+logger = logging.getLogger("bohemia_reconnect")
+
+BASE_DELAY_SECONDS = 1.0
+MAX_DELAY_SECONDS = 30.0
+PROBE_TIMEOUT_SECONDS = 2.0
+# log a "still down" line at most this often while probing
+LOG_INTERVAL_SECONDS = 60.0
+
+
+def port_open(host, port, timeout=PROBE_TIMEOUT_SECONDS):
+    """True if a TCP connection to host:port can be opened (and closed again)."""
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class ReconnectManager:
+    """Jittered port probing between telnet sessions. Not thread-safe: one
+    reconnect loop per instance."""
+
+    def __init__(
+        self,
+        name,
+        host,
+        port,
+        base_delay=BASE_DELAY_SECONDS,
+        max_delay=MAX_DELAY_SECONDS,
+        probe_timeout=PROBE_TIMEOUT_SECONDS,
+        sleep=time.sleep,
+    ):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.probe_timeout = probe_timeout
+        self.sleep = sleep
+        self.delay = base_delay
+        self.down_since = None
+        self.probes = 0
+        self.failed_logins = 0
+        self.sessions = 0
+        self.last_downtime = None
+
+    def next_delay(self):
+        """Decorrelated jitter: uniform(base, 3 * previous), capped."""
+        self.delay = min(self.max_delay, random.uniform(self.base_delay, self.delay * 3))
+        return self.delay
+
+    def _mark_down(self):
+        if self.down_since is None:
+            self.down_since = time.monotonic()
+
+    def wait_until_reachable(self):
+        """Block until the telnet port accepts TCP connections. Returns the
+        seconds spent waiting (0.0 if it was reachable at once)."""
+        self._mark_down()
+        start = time.monotonic()
+        last_log = None
+        while True:
+            self.probes += 1
+            if port_open(self.host, self.port, self.probe_timeout):
+                return time.monotonic() - start
+            delay = self.next_delay()
+            now = time.monotonic()
+            if last_log is None or now - last_log >= LOG_INTERVAL_SECONDS:
+                logger.info(
+                    "%s: %s:%s not reachable (down %.0fs), probing again in %.1fs",
+                    self.name, self.host, self.port, now - self.down_since, delay,
+                )
+                last_log = now
+            self.sleep(delay)
+
+    def connect_failed(self):
+        """The port is open but the login did not succeed (server still
+        starting, password prompt timed out): back off before the next try."""
+        self._mark_down()
+        self.failed_logins += 1
+        delay = self.next_delay()
+        logger.info("%s: login failed, retrying in %.1fs", self.name, delay)
+        self.sleep(delay)
+
+    def connected(self):
+        """Login succeeded. Resets the backoff; returns the downtime in seconds
+        since the previous session ended (None on the first connect)."""
+        downtime = None
+        if self.sessions and self.down_since is not None:
+            downtime = time.monotonic() - self.down_since
+        self.sessions += 1
+        self.down_since = None
+        self.delay = self.base_delay
+        self.last_downtime = downtime
+        return downtime
+
+    def disconnected(self):
+        """Session ended; downtime is counted from here."""
+        self._mark_down()
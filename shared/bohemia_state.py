@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_state.py - v1
+
+Shared SQLite state store for the Python services (integrated-game-monitor and
+voting). One database file in WAL mode replaces the JSON files in
+runtime-state-backups/ that were rewritten in full on every change:
+
+- players          name -> entity id, platform identity, last seen
+                   (was players_mapping.json + in-memory identity dicts)
+- levels           name -> last known level (was players_levels.json)
+- retry_queue      quest updates waiting for the quest server
+                   (was quest_retry_queue.json)
+- pending_rewards  players that typed /vote and still wait for their reward
+                   (was pending_rewards.json)
+- vote_state       per steam id: last vote time and the reset day on which the
+                   player was thanked / rewarded / checked (was in-memory only)
+
+Usage (both services put this directory on sys.path):
+
+    from bohemia_state import StateStore
+    state = StateStore()          # opens, creates the schema, migrates JSON once
+    state.set_levels({"Bob": 12})
+
+Notes:
+- Each process holds one connection guarded by a lock; WAL lets the other
+  process read while one writes (busy_timeout covers short write overlaps).
+- All SQL lives in the module-level constants below and is always executed with
+  parameters, so sqlite3's statement cache reuses the prepared statements.
+- JSON migration runs once per source file: the import and its meta record
+  are one transaction; the JSON files are left in place untouched.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("bohemia_state")
+
+STATE_DIR = "/home/steam/7D2DBohemia/runtime-state-backups"
+STATE_DB_FILE = os.path.join(STATE_DIR, "bohemia_state.db")
+
+# JSON files imported on first open
+LEGACY_LEVELS_FILE = os.path.join(STATE_DIR, "players_levels.json")
+LEGACY_RETRY_QUEUE_FILE = os.path.join(STATE_DIR, "quest_retry_queue.json")
+LEGACY_PENDING_REWARDS_FILE = os.path.join(STATE_DIR, "pending_rewards.json")
+LEGACY_PLAYERS_MAPPING_FILE = os.path.join(STATE_DIR, "players_mapping.json")
+
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT_MS = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS players (
+    name          TEXT PRIMARY KEY,
+    entity_id     TEXT,
+    platform_kind TEXT,
+    platform_id   TEXT,
+    last_seen     REAL,
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS players_platform_idx ON players (platform_kind, platform_id);
+CREATE TABLE IF NOT EXISTS levels (
+    name    TEXT PRIMARY KEY,
+    level   INTEGER NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS retry_queue (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    payload TEXT NOT NULL,
+    ts      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS retry_queue_ts_idx ON retry_queue (ts);
+CREATE TABLE IF NOT EXISTS pending_rewards (
+    steam_id    TEXT PRIMARY KEY,
+    player_name TEXT NOT NULL,
+    ts          REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vote_state (
+    steam_id     TEXT PRIMARY KEY,
+    player_name  TEXT,
+    last_vote_ts REAL,
+    thanked_day  TEXT,
+    rewarded_day TEXT,
+    checked_day  TEXT,
+    updated      REAL NOT NULL
+);
+"""
+
+# ---- statements ----
+
+SQL_META_GET = "SELECT value FROM meta WHERE key = ?"
+SQL_META_SET = "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value"
+
+SQL_PLAYER_UPSERT_IDENTITY = (
+    "INSERT INTO players (name, platform_kind, platform_id, updated) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET platform_kind = excluded.platform_kind, "
+    "platform_id = excluded.platform_id, updated = excluded.updated"
+)
+SQL_PLAYER_SEEN = (
+    "INSERT INTO players (name, entity_id, last_seen, updated) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET entity_id = COALESCE(excluded.entity_id, players.entity_id), "
+    "last_seen = excluded.last_seen, updated = excluded.updated"
+)
+SQL_PLAYER_IDENTITIES = "SELECT name, platform_kind, platform_id FROM players WHERE platform_id IS NOT NULL"
+SQL_PLAYER_BY_PLATFORM = "SELECT name, entity_id, last_seen FROM players WHERE platform_kind = ? AND platform_id = ?"
+SQL_PLAYER_GET = "SELECT name, entity_id, platform_kind, platform_id, last_seen FROM players WHERE name = ?"
+
+SQL_LEVEL_GET = "SELECT level FROM levels WHERE name = ?"
+SQL_LEVEL_ALL = "SELECT name, level FROM levels"
+SQL_LEVEL_SET = (
+    "INSERT INTO levels (name, level, updated) VALUES (?, ?, ?) "
+    "ON CONFLICT(name) DO UPDATE SET level = excluded.level, updated = excluded.updated"
+)
+
+SQL_RETRY_PUSH = "INSERT INTO retry_queue (payload, ts) VALUES (?, ?)"
+SQL_RETRY_ALL = "SELECT id, payload, ts FROM retry_queue ORDER BY id"
+SQL_RETRY_DELETE = "DELETE FROM retry_queue WHERE id = ?"
+SQL_RETRY_UPDATE = "UPDATE retry_queue SET payload = ? WHERE id = ?"
+SQL_RETRY_EXPIRE = "DELETE FROM retry_queue WHERE ts < ?"
+SQL_RETRY_TRIM = "DELETE FROM retry_queue WHERE id NOT IN (SELECT id FROM retry_queue ORDER BY id DESC LIMIT ?)"
+
+SQL_PENDING_PUT = (
+    "INSERT INTO pending_rewards (steam_id, player_name, ts) VALUES (?, ?, ?) "
+    "ON CONFLICT(steam_id) DO UPDATE SET player_name = excluded.player_name, ts = excluded.ts"
+)
+SQL_PENDING_ALL = "SELECT steam_id, player_name, ts FROM pending_rewards"
+SQL_PENDING_DELETE = "DELETE FROM pending_rewards WHERE steam_id = ?"
+
+SQL_VOTE_GET = (
+    "SELECT steam_id, player_name, last_vote_ts, thanked_day, rewarded_day, checked_day "
+    "FROM vote_state WHERE steam_id = ?"
+)
+SQL_VOTE_ALL = "SELECT steam_id, player_name, last_vote_ts, thanked_day, rewarded_day, checked_day FROM vote_state"
+SQL_VOTE_ENSURE = "INSERT OR IGNORE INTO vote_state (steam_id, updated) VALUES (?, ?)"
+# column names are checked against VOTE_COLUMNS before they are formatted in
+VOTE_COLUMNS = ("player_name", "last_vote_ts", "thanked_day", "rewarded_day", "checked_day")
+SQL_VOTE_SET = "UPDATE vote_state SET {column} = ?, updated = ? WHERE steam_id = ?"
+
+
+class StateStore:
+    def __init__(self, path=STATE_DB_FILE, migrate=True):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT_MS / 1000.0,
+            isolation_level=None,  # autocommit; transactions are explicit
+            check_same_thread=False,
+            cached_statements=64,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        with self.lock:
+            self.conn.executescript(SCHEMA)
+            self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        if migrate:
+            self.migrate_json()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    # ---------- plumbing ----------
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params)
+
+    def _write_many(self, statements):
+        """Run [(sql, params), ...] in one transaction."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self.conn.execute(sql, params)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def meta_get(self, key):
+        rows = self._query(SQL_META_GET, (key,))
+        return rows[0][0] if rows else None
+
+    def meta_set(self, key, value):
+        self._write(SQL_META_SET, (key, str(value)))
+
+    # ---------- players / identities ----------
+
+    def set_identity(self, name, kind, platform_id):
+        self._write(SQL_PLAYER_UPSERT_IDENTITY, (name, kind, str(platform_id), time.time()))
+
+    def mark_seen(self, names, entity_ids=None, ts=None):
+        """Record last_seen for the given names (entity_ids: optional name -> id)."""
+        now = time.time()
+        ts = ts or now
+        entity_ids = entity_ids or {}
+        self._write_many([(SQL_PLAYER_SEEN, (n, entity_ids.get(n), ts, now)) for n in names])
+
+    def identities(self):
+        """name -> {"kind": ..., "value": ...}"""
+        return {name: {"kind": kind, "value": pid} for name, kind, pid in self._query(SQL_PLAYER_IDENTITIES)}
+
+    def player(self, name):
+        rows = self._query(SQL_PLAYER_GET, (name,))
+        if not rows:
+            return None
+        name, entity_id, kind, pid, last_seen = rows[0]
+        return {"name": name, "entity_id": entity_id, "kind": kind, "value": pid, "last_seen": last_seen}
+
+    def find_by_platform(self, kind, platform_id):
+        rows = self._query(SQL_PLAYER_BY_PLATFORM, (kind, str(platform_id)))
+        return rows[0][0] if rows else None
+
+    # ---------- levels ----------
+
+    def get_level(self, name):
+        rows = self._query(SQL_LEVEL_GET, (name,))
+        return rows[0][0] if rows else None
+
+    def all_levels(self):
+        return dict(self._query(SQL_LEVEL_ALL))
+
+    def set_levels(self, levels):
+        """Write only the given name -> level pairs (one transaction)."""
+        if not levels:
+            return
+        now = time.time()
+        self._write_many([(SQL_LEVEL_SET, (n, int(lvl), now)) for n, lvl in levels.items()])
+
+    # ---------- retry queue ----------
+
+    def retry_push(self, payload, ts=None):
+        cur = self._write(SQL_RETRY_PUSH, (json.dumps(payload, ensure_ascii=False), ts or time.time()))
+        return cur.lastrowid
+
+    def retry_items(self):
+        """[(id, payload dict, ts)] oldest first."""
+        out = []
+        for rid, payload, ts in self._query(SQL_RETRY_ALL):
+            try:
+                out.append((rid, json.loads(payload), ts))
+            except ValueError:
+                logger.error("Dropping unreadable retry item %s", rid)
+                self._write(SQL_RETRY_DELETE, (rid,))
+        return out
+
+    def retry_update(self, rid, payload):
+        """Replace the payload of a queued item (merged increments); keeps its ts."""
+        self._write(SQL_RETRY_UPDATE, (json.dumps(payload, ensure_ascii=False), rid))
+
+    def retry_delete(self, ids):
+        if ids:
+            self._write_many([(SQL_RETRY_DELETE, (rid,)) for rid in ids])
+
+    def retry_prune(self, max_items, max_age_seconds):
+        self._write_many([(SQL_RETRY_EXPIRE, (time.time() - max_age_seconds,)), (SQL_RETRY_TRIM, (int(max_items),))])
+
+    # ---------- pending rewards ----------
+
+    def pending_put(self, steam_id, player_name, ts=None):
+        self._write(SQL_PENDING_PUT, (str(steam_id), player_name, ts or time.time()))
+
+    def pending_all(self):
+        """steam_id -> (player_name, ts)"""
+        return {sid: (name, ts) for sid, name, ts in self._query(SQL_PENDING_ALL)}
+
+    def pending_delete(self, steam_id):
+        self._write(SQL_PENDING_DELETE, (str(steam_id),))
+
+    # ---------- vote state ----------
+
+    @staticmethod
+    def _vote_row(row):
+        keys = ("steam_id",) + VOTE_COLUMNS
+        return dict(zip(keys, row))
+
+    def vote_get(self, steam_id):
+        rows = self._query(SQL_VOTE_GET, (str(steam_id),))
+        return self._vote_row(rows[0]) if rows else None
+
+    def vote_all(self):
+        return [self._vote_row(r) for r in self._query(SQL_VOTE_ALL)]
+
+    def vote_update(self, steam_id, **fields):
+        now = time.time()
+        statements = [(SQL_VOTE_ENSURE, (str(steam_id), now))]
+        for column, value in fields.items():
+            if column not in VOTE_COLUMNS:
+                raise ValueError(f"unknown vote_state column: {column}")
+            statements.append((SQL_VOTE_SET.format(column=column), (value, now, str(steam_id))))
+        self._write_many(statements)
+
+    # ---------- JSON migration ----------
+
+    def _load_legacy(self, path):
+        key = "migrated:" + os.path.basename(path)
+        if self.meta_get(key) or not os.path.exists(path):
+            return key, None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return key, json.load(f)
+        except Exception as e:
+            logger.error("Cannot migrate %s: %s", path, e)
+            return key, None
+
+    def _migrate(self, key, statements):
+        """Run one file's import and its meta record in one transaction. The
+        meta check is repeated inside it, so when both services start at once
+        (or a crash interrupted an import) a file is imported exactly once.
+        Returns False if another process got there first."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self.conn.execute(SQL_META_GET, (key,)).fetchall():
+                    self.conn.execute("ROLLBACK")
+                    return False
+                for sql, params in statements:
+                    self.conn.execute(sql, params)
+                self.conn.execute(SQL_META_SET, (key, str(time.time())))
+                self.conn.execute("COMMIT")
+                return True
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def migrate_json(self):
+        now = time.time()
+
+        key, data = self._load_legacy(LEGACY_LEVELS_FILE)
+        if data is not None:
+            statements = []
+            if isinstance(data, dict):
+                statements = [(SQL_LEVEL_SET, (str(n), int(v or 0), now)) for n, v in data.items()]
+            if self._migrate(key, statements) and statements:
+                logger.info("Migrated %s levels from %s", len(statements), LEGACY_LEVELS_FILE)
+
+        key, data = self._load_legacy(LEGACY_RETRY_QUEUE_FILE)
+        if data is not None:
+            statements = []
+            if isinstance(data, list):
+                for item in data:
+                    if isinstance(item, dict):
+                        payload = json.dumps(item, ensure_ascii=False)
+                        statements.append((SQL_RETRY_PUSH, (payload, float(item.get("ts", now) or now))))
+            if self._migrate(key, statements) and statements:
+                logger.info("Migrated %s retry items from %s", len(statements), LEGACY_RETRY_QUEUE_FILE)
+
+        key, data = self._load_legacy(LEGACY_PENDING_REWARDS_FILE)
+        if data is not None:
+            statements = []
+            if isinstance(data, dict):
+                for steam_id, v in data.items():
+                    name = v.get("player_name") if isinstance(v, dict) else v
+                    if name:
+                        statements.append((SQL_PENDING_PUT, (str(steam_id), str(name), now)))
+            if self._migrate(key, statements) and statements:
+                logger.info("Migrated %s pending rewards from %s", len(statements), LEGACY_PENDING_REWARDS_FILE)
+
+        key, data = self._load_legacy(LEGACY_PLAYERS_MAPPING_FILE)
+        if data is not None:
+            statements = []
+            if isinstance(data, dict):
+                for steam_id, v in data.items():
+                    name = (v or {}).get("player_name") if isinstance(v, dict) else v
+                    if name and str(steam_id).isdigit():
+                        statements.append((SQL_PLAYER_UPSERT_IDENTITY, (str(name), "steam", str(steam_id), now)))
+            if self._migrate(key, statements) and statements:
+                logger.info("Migrated %s player mappings from %s", len(statements), LEGACY_PLAYERS_MAPPING_FILE)
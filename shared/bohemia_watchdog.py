@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+bohemia_watchdog.py - v1
+
+Dead telnet session detection for the Python services (integrated-game-monitor
+and voting).
+
+A half-open TCP connection (game server restarted, NAT entry expired) does not
+raise anything on our side: reads just time out and writes keep landing in
+the kernel send buffer. Two layers catch it:
+
+- enable_keepalive(sock): SO_KEEPALIVE with short probe timings, plus
+  TCP_USER_TIMEOUT so unacknowledged writes fail after a bounded time (Linux).
+- StallWatchdog: tracks the time since the last byte received and since the
+  last command written without a reply. When the session has been quiet for
+  quiet_seconds it sends a cheap probe command; when a written command (probe
+  or real) gets no byte back within response_timeout, or a write fails, it
+  calls on_stall(reason) once. The service then stops its reader through a
+  flag and reconnects.
+
+Worst-case detection time: quiet_seconds + response_timeout + check_interval.
+
+Usage:
+
+    wd = StallWatchdog("monitor", probe=send_version, on_stall=force_reconnect)
+    wd.start()              # after login, once per session
+    wd.data_received()      # reader got bytes
+    wd.command_sent()       # a command was written to the socket
+    wd.stop()               # session over
+"""
+
+import logging
+import socket
+import threading
+import time
+
+logger = logging.getLogger("bohemia_watchdog")
+
+QUIET_SECONDS = 45
+RESPONSE_TIMEOUT_SECONDS = 15
+CHECK_INTERVAL_SECONDS = 1.0
+
+KEEPALIVE_IDLE_SECONDS = 30
+KEEPALIVE_INTERVAL_SECONDS = 10
+KEEPALIVE_COUNT = 3
+USER_TIMEOUT_MS = 30000
+
+
+def enable_keepalive(
+    sock,
+    idle=KEEPALIVE_IDLE_SECONDS,
+    interval=KEEPALIVE_INTERVAL_SECONDS,
+    count=KEEPALIVE_COUNT,
+    user_timeout_ms=USER_TIMEOUT_MS,
+):
+    """Turn on TCP keepalive (and TCP_USER_TIMEOUT where available). Options
+    the platform does not know are skipped. Returns True if keepalive is on."""
+    if sock is None:
+        return False
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    except OSError as e:
+        logger.warning("Cannot enable TCP keepalive: %s", e)
+        return False
+    for opt, value in (
+        ("TCP_KEEPIDLE", idle),
+        ("TCP_KEEPINTVL", interval),
+        ("TCP_KEEPCNT", count),
+        ("TCP_USER_TIMEOUT", user_timeout_ms),
+    ):
+        if hasattr(socket, opt) and value:
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, opt), int(value))
+            except OSError as e:
+                logger.debug("Cannot set %s: %s", opt, e)
+    return True
+
+
+class StallWatchdog:
+    """One checker thread per session (start() .. stop()). on_stall(reason) is
+    called at most once per session, from the watchdog thread; reason is
+    "no_response" or "write_failed"."""
+
+    def __init__(
+        self,
+        name,
+        probe,
+        on_stall,
+        quiet_seconds=QUIET_SECONDS,
+        response_timeout=RESPONSE_TIMEOUT_SECONDS,
+        check_interval=CHECK_INTERVAL_SECONDS,
+    ):
+        self.name = name
+        self.probe = probe
+        self.on_stall = on_stall
+        self.quiet_seconds = quiet_seconds
+        self.response_timeout = response_timeout
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.last_byte = time.monotonic()
+        self.unanswered_since = None  # first write not followed by any byte
+        self.last_probe = 0.0
+        self.probes = 0
+        self.stalls = 0
+        self._stop = None
+        self._fired = False
+
+    # ---------- session ----------
+
+    def start(self):
+        self.stop()
+        now = time.monotonic()
+        with self.lock:
+            self.last_byte = now
+            self.last_probe = 0.0
+            self.unanswered_since = None
+            self._fired = False
+            self._stop = stop = threading.Event()
+        threading.Thread(target=self._run, args=(stop,), name=f"{self.name}-watchdog", daemon=True).start()
+
+    def stop(self):
+        with self.lock:
+            stop, self._stop = self._stop, None
+        if stop is not None:
+            stop.set()
+
+    # ---------- events from the service ----------
+
+    def data_received(self):
+        now = time.monotonic()
+        # plain assignments: cheap enough for the per-line reader path
+        self.last_byte = now
+        self.unanswered_since = None
+
+    def command_sent(self):
+        if self.unanswered_since is None:
+            self.unanswered_since = time.monotonic()
+
+    def write_failed(self, error=None):
+        self._fire("write_failed", "command write failed: %s" % (error,))
+
+    def idle_seconds(self):
+        return time.monotonic() - self.last_byte
+
+    # ---------- checker ----------
+
+    def _fire(self, reason, detail):
+        with self.lock:
+            if self._fired or self._stop is None:
+                return
+            self._fired = True
+            self.stalls += 1
+        logger.warning("%s telnet session looks dead (%s) - forcing reconnect", self.name, detail)
+        try:
+            self.on_stall(reason)
+        except Exception as e:
+            logger.error("%s watchdog: on_stall failed: %s", self.name, e)
+        self.stop()
+
+    def _run(self, stop):
+        while not stop.wait(self.check_interval):
+            now = time.monotonic()
+            unanswered = self.unanswered_since
+            if unanswered is not None and (now - unanswered) > self.response_timeout:
+                self._fire(
+                    "no_response",
+                    "no reply %.0fs after a command, last byte %.0fs ago" % (now - unanswered, now - self.last_byte),
+                )
+                return
+            if unanswered is None and (now - max(self.last_byte, self.last_probe)) > self.quiet_seconds:
+                # quiet is normal on an empty server; make the server talk.
+                # The probe's write starts the response timer.
+                self.probes += 1
+                self.last_probe = now
+                logger.debug("%s watchdog: quiet for %.0fs, probing", self.name, now - self.last_byte)
+                try:
+                    self.probe()
+                except Exception as e:
+                    self._fire("write_failed", "probe failed: %s" % e)
+                    return
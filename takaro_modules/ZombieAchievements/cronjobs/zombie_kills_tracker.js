@@ -1,6 +1,19 @@
+// While the game monitor pushes zombiekills (quest-system heartbeat
+// questTracker_external_kills_at is fresh), lifetime kills are taken from the
+// per-player questTracker_external_zombiekills_total kept by the quest server
+// (working_server.js v15.13) instead of paging entity-killed events. With a
+// stale heartbeat it falls back to the event scan.
 import { data, takaro } from '@takaro/helpers';
 
 const VARIABLE_KEY = 'lastAchievementCheck';
+const SEEN_TOTALS_KEY = 'externalKillsSeen';
+
+// written by the quest-system module / quest server, hence no moduleId filter
+const EXTERNAL_KILLS_HEARTBEAT_KEY = 'questTracker_external_kills_at';
+const EXTERNAL_KILLS_TOTAL_KEY = 'questTracker_external_zombiekills_total';
+// same window as quest-system/cronjobs/questTrackerKills.js
+const EXTERNAL_KILLS_FRESH_MS = 10 * 60 * 1000;
+
 const ACHIEVEMENTS = [
     { kills: 100, name: 'Zombie Slayer', reward: 50 },
     { kills: 1000, name: 'Zombie Hunter', reward: 500 },
@@ -8,19 +21,136 @@ const ACHIEVEMENTS = [
     { kills: 10000, name: 'Apocalypse Survivor', reward: 5000 }
 ];
 
-async function main() {
-    const { gameServerId, module: mod } = data;
+async function creditKills(gameServerId, mod, playerId, newKills) {
+    // Get or create lifetime kill counter
+    const killCountVar = await takaro.variable.variableControllerSearch({
+        filters: {
+            key: ['lifetime_zombie_kills'],
+            gameServerId: [gameServerId],
+            playerId: [playerId],
+            moduleId: [mod.moduleId]
+        }
+    });
+
+    // Ensure newKills is a number
+    const newKillsNum = Number(newKills) || 0;
+    let totalKills = newKillsNum;
+
+    if (killCountVar.data.data.length > 0) {
+        const currentKills = parseInt(killCountVar.data.data[0].value) || 0;
+        totalKills = currentKills + newKillsNum;
+        await takaro.variable.variableControllerUpdate(killCountVar.data.data[0].id, {
+            value: totalKills.toString()
+        });
+    } else {
+        await takaro.variable.variableControllerCreate({
+            key: 'lifetime_zombie_kills',
+            value: totalKills.toString(),
+            gameServerId,
+            moduleId: mod.moduleId,
+            playerId: playerId
+        });
+    }
 
-    const lastRunRes = (await takaro.variable.variableControllerSearch({
+    // Check achievements
+    for (const achievement of ACHIEVEMENTS) {
+        const prevKills = totalKills - newKillsNum;
+
+        // Check if player just crossed this milestone
+        if (prevKills < achievement.kills && totalKills >= achievement.kills) {
+            const achievementKey = 'achievement_' + achievement.kills;
+
+            // Check if already granted
+            const achievementVar = await takaro.variable.variableControllerSearch({
+                filters: {
+                    key: [achievementKey],
+                    gameServerId: [gameServerId],
+                    playerId: [playerId],
+                    moduleId: [mod.moduleId]
+                }
+            });
+
+            if (achievementVar.data.data.length === 0) {
+                // Grant achievement
+                await takaro.variable.variableControllerCreate({
+                    key: achievementKey,
+                    value: 'true',
+                    gameServerId,
+                    moduleId: mod.moduleId,
+                    playerId: playerId
+                });
+
+                // Award currency
+                await takaro.playerOnGameserver.playerOnGameServerControllerAddCurrency(
+                    gameServerId,
+                    playerId,
+                    { currency: achievement.reward }
+                );
+
+                // Send notification
+                const pog = (await takaro.playerOnGameserver.playerOnGameServerControllerGetOne(gameServerId, playerId)).data.data;
+                const player = await takaro.player.playerControllerGetOne(pog.playerId);
+                const playerName = player.data.data.name;
+
+                await takaro.gameserver.gameServerControllerSendMessage(gameServerId, {
+                    message: '🏆 ' + playerName + ' Finished: ' + achievement.name + ' (' + achievement.kills + ' kills)!   Reward: ' + achievement.reward + ' Beers!'
+                });
+            }
+        }
+    }
+
+    return true;
+}
+
+async function getModuleVar(gameServerId, mod, key) {
+    const res = (await takaro.variable.variableControllerSearch({
         filters: {
-            key: [VARIABLE_KEY],
+            key: [key],
             gameServerId: [gameServerId],
             moduleId: [mod.moduleId],
         },
     })).data.data;
+    return res.length ? res[0] : null;
+}
+
+async function setModuleVar(gameServerId, mod, existing, key, value) {
+    if (existing) {
+        await takaro.variable.variableControllerUpdate(existing.id, { value });
+    } else {
+        await takaro.variable.variableControllerCreate({
+            key,
+            value,
+            moduleId: mod.moduleId,
+            gameServerId,
+        });
+    }
+}
 
-    const lastRun = lastRunRes.length ? new Date(JSON.parse(lastRunRes[0].value)) : new Date(Date.now() - 5 * 60 * 1000);
+async function externalKillsActive(gameServerId) {
+    try {
+        const res = (await takaro.variable.variableControllerSearch({
+            filters: { key: [EXTERNAL_KILLS_HEARTBEAT_KEY], gameServerId: [gameServerId] },
+        })).data.data;
+        if (!res.length) return false;
+        let ts; try { ts = JSON.parse(res[0].value)?.ts; } catch { ts = res[0].value; }
+        const t = new Date(ts).getTime();
+        return Number.isFinite(t) && (Date.now() - t) < EXTERNAL_KILLS_FRESH_MS;
+    } catch { return false; }
+}
+
+async function externalKillTotals(gameServerId) {
+    const res = (await takaro.variable.variableControllerSearch({
+        filters: { key: [EXTERNAL_KILLS_TOTAL_KEY], gameServerId: [gameServerId] },
+        limit: 1000,
+    })).data.data;
+    const totals = {};
+    for (const v of res) {
+        if (v.playerId) totals[v.playerId] = Number(v.value) || 0;
+    }
+    return totals;
+}
 
+async function playerKillsFromEvents(gameServerId, lastRun) {
     // Fetch all kill events since last check
     const killEvents = (await takaro.event.eventControllerSearch({
         filters: { eventName: ['entity-killed'], gameserverId: [gameServerId] },
@@ -36,102 +166,50 @@ async function main() {
         }
         playerKills[killEvent.playerId] = playerKills[killEvent.playerId] + 1;
     }
+    return playerKills;
+}
 
-    // Process each player's kills
-    const results = await Promise.allSettled(Object.entries(playerKills).map(async ([playerId, newKills]) => {
-        // Get or create lifetime kill counter
-        const killCountVar = await takaro.variable.variableControllerSearch({
-            filters: {
-                key: ['lifetime_zombie_kills'],
-                gameServerId: [gameServerId],
-                playerId: [playerId],
-                moduleId: [mod.moduleId]
-            }
-        });
-
-        // Ensure newKills is a number
-        const newKillsNum = Number(newKills) || 0;
-        let totalKills = newKillsNum;
-
-        if (killCountVar.data.data.length > 0) {
-            const currentKills = parseInt(killCountVar.data.data[0].value) || 0;
-            totalKills = currentKills + newKillsNum;
-            await takaro.variable.variableControllerUpdate(killCountVar.data.data[0].id, {
-                value: totalKills.toString()
-            });
-        } else {
-            await takaro.variable.variableControllerCreate({
-                key: 'lifetime_zombie_kills',
-                value: totalKills.toString(),
-                gameServerId,
-                moduleId: mod.moduleId,
-                playerId: playerId
-            });
-        }
+async function main() {
+    const { gameServerId, module: mod } = data;
 
-        // Check achievements
-        for (const achievement of ACHIEVEMENTS) {
-            const prevKills = totalKills - newKillsNum;
-
-            // Check if player just crossed this milestone
-            if (prevKills < achievement.kills && totalKills >= achievement.kills) {
-                const achievementKey = 'achievement_' + achievement.kills;
-
-                // Check if already granted
-                const achievementVar = await takaro.variable.variableControllerSearch({
-                    filters: {
-                        key: [achievementKey],
-                        gameServerId: [gameServerId],
-                        playerId: [playerId],
-                        moduleId: [mod.moduleId]
-                    }
-                });
+    const lastRunVar = await getModuleVar(gameServerId, mod, VARIABLE_KEY);
+    const lastRun = lastRunVar ? new Date(JSON.parse(lastRunVar.value)) : new Date(Date.now() - 5 * 60 * 1000);
 
-                if (achievementVar.data.data.length === 0) {
-                    // Grant achievement
-                    await takaro.variable.variableControllerCreate({
-                        key: achievementKey,
-                        value: 'true',
-                        gameServerId,
-                        moduleId: mod.moduleId,
-                        playerId: playerId
-                    });
-
-                    // Award currency
-                    await takaro.playerOnGameserver.playerOnGameServerControllerAddCurrency(
-                        gameServerId,
-                        playerId,
-                        { currency: achievement.reward }
-                    );
-
-                    // Send notification
-                    const pog = (await takaro.playerOnGameserver.playerOnGameServerControllerGetOne(gameServerId, playerId)).data.data;
-                    const player = await takaro.player.playerControllerGetOne(pog.playerId);
-                    const playerName = player.data.data.name;
-
-                    await takaro.gameserver.gameServerControllerSendMessage(gameServerId, {
-                        message: '🏆 ' + playerName + ' Finished: ' + achievement.name + ' (' + achievement.kills + ' kills)!   Reward: ' + achievement.reward + ' Beers!'
-                    });
-                }
-            }
+    // Totals already accounted for. Refreshed on every run, so kills that the
+    // event scan counted are not credited again once the monitor takes over.
+    const seenVar = await getModuleVar(gameServerId, mod, SEEN_TOTALS_KEY);
+    let seen = null;
+    if (seenVar) {
+        try { seen = JSON.parse(seenVar.value) || {}; } catch { seen = {}; }
+    }
+    const totals = await externalKillTotals(gameServerId);
+
+    const external = !!seen && await externalKillsActive(gameServerId);
+    let playerKills = {};
+    if (external) {
+        for (const [playerId, total] of Object.entries(totals)) {
+            const newKills = total - (seen[playerId] || 0);
+            if (newKills > 0) playerKills[playerId] = newKills;
         }
+    } else {
+        playerKills = await playerKillsFromEvents(gameServerId, lastRun);
+    }
 
-        return true;
-    }));
+    // Process each player's kills
+    const players = Object.keys(playerKills);
+    const results = await Promise.allSettled(players.map((playerId) =>
+        creditKills(gameServerId, mod, playerId, playerKills[playerId])
+    ));
+
+    // a player whose credit failed keeps the old seen total and is retried next run
+    const nextSeen = { ...(seen || {}), ...totals };
+    results.forEach((r, i) => {
+        if (external && r.status === 'rejected') nextSeen[players[i]] = seen[players[i]] || 0;
+    });
+    await setModuleVar(gameServerId, mod, seenVar, SEEN_TOTALS_KEY, JSON.stringify(nextSeen));
 
     // Update last run time
-    if (lastRunRes.length) {
-        await takaro.variable.variableControllerUpdate(lastRunRes[0].id, {
-            value: JSON.stringify(new Date()),
-        });
-    } else {
-        await takaro.variable.variableControllerCreate({
-            key: VARIABLE_KEY,
-            value: JSON.stringify(new Date()),
-            moduleId: mod.moduleId,
-            gameServerId,
-        });
-    }
+    await setModuleVar(gameServerId, mod, lastRunVar, VARIABLE_KEY, JSON.stringify(new Date()));
 }
 
 await main();
@@ -1,4 +1,11 @@
-// FILE: questTrackerKills.js (v0.4.1)
+// FILE: questTrackerKills.js (v0.4.3)
+// - v0.4.3: the heartbeat is the game monitor's liveness (refreshed every 2 min while its
+//           telnet session is up, working_server.js v15.12), not "a batch with kills
+//           arrived": a quiet stretch without kills no longer triggers the fallback.
+// - v0.4.2: zombiekills are pushed by the game monitor (listplayers zombies= deltas).
+//           While its heartbeat is fresh this cron skips zombiekills and only scans
+//           entity-killed events for players with an open feral/vulture quest.
+//           With a stale heartbeat it falls back to the full event scan.
 // - v0.4.1: Updated pm() to pm2 syntax + quoteIfNeeded; fixed mojibake (? -> ✔) in notify message
 // - Dedicated lightweight cron for entity-killed processing only
 // - zombiekills / feralkills / vulturekills
@@ -13,6 +20,12 @@ const KILL_CURSOR_PREFIX = 'questTracker_last_kill_ts_';
 const KILL_DEDUPE_PREFIX = 'questTracker_seen_kill_ids_';
 const KILL_CURSOR_OVERLAP_MS = 30_000;
 
+// refreshed by the game monitor while it is connected (QUEST_HEARTBEAT_INTERVAL_SECONDS)
+const EXTERNAL_KILLS_HEARTBEAT_KEY = 'questTracker_external_kills_at';
+// keep in sync with QUEST_KILLS_HEARTBEAT_FRESH_SECONDS in integrated_game_monitor.py:
+// the monitor does not credit kill deltas over gaps this cron may have scanned
+const EXTERNAL_KILLS_FRESH_MS = 10 * 60 * 1000;
+
 const BUDGET_MS = 10_000;
 const EVENT_LIMIT = 1000;
 
@@ -129,6 +142,22 @@ async function saveQuestVar(id, payload) {
     try { await takaro.variable.variableControllerUpdate(id, { value: JSON.stringify(payload) }); } catch { }
 }
 
+async function externalKillsActive(gsId, moduleId) {
+    try {
+        const v = await getVar(gsId, moduleId, EXTERNAL_KILLS_HEARTBEAT_KEY, null);
+        if (!v) return false;
+        let ts; try { ts = JSON.parse(v.value)?.ts; } catch { ts = v.value; }
+        const t = new Date(ts).getTime();
+        return Number.isFinite(t) && (Date.now() - t) < EXTERNAL_KILLS_FRESH_MS;
+    } catch { return false; }
+}
+async function hasOpenQuest(gsId, moduleId, pid, date, type) {
+    const v = await getQuestVar(gsId, moduleId, pid, date, type);
+    if (!v) return false;
+    let q; try { q = JSON.parse(v.value); } catch { q = null; }
+    return !!(q && !q.completed);
+}
+
 function classifyKill(e) {
     const entity = String(e?.meta?.entity || '').toLowerCase();
     const isZombie = entity.length > 0 && entity !== 'player' && entity !== 'animal';
@@ -152,6 +181,10 @@ async function main() {
         limit: 500
     });
 
+    // zombiekills come from the game monitor while it is alive (heartbeat fresh);
+    // only a stale heartbeat (monitor down / disconnected) falls back to the event scan
+    const external = await externalKillsActive(gsId, moduleId);
+
     for (const p of (players?.data?.data || [])) {
         if (!within()) break;
 
@@ -159,6 +192,16 @@ async function main() {
         if (!pid) continue;
 
         const cursorKey = `${KILL_CURSOR_PREFIX}${pid}`;
+
+        if (external
+            && !(await hasOpenQuest(gsId, moduleId, pid, date, 'feralkills'))
+            && !(await hasOpenQuest(gsId, moduleId, pid, date, 'vulturekills'))) {
+            // nothing left to count from events; keep the cursor current so a
+            // fallback scan does not replay kills the monitor already pushed
+            await upsertRaw(gsId, moduleId, cursorKey, new Date().toISOString(), expISO, null);
+            continue;
+        }
+
         const last = await getVar(gsId, moduleId, cursorKey, null);
         const lastISO = (last && String(last.value || '').trim()) ? String(last.value).trim() : new Date(Date.now() - 5 * 60 * 1000).toISOString();
 
@@ -180,7 +223,7 @@ async function main() {
 
             const { isZombie, isFeral, isVulture } = classifyKill(e);
 
-            if (isZombie) {
+            if (isZombie && !external) {
                 const v = await getQuestVar(gsId, moduleId, pid, date, 'zombiekills');
                 if (v) {
                     let q; try { q = JSON.parse(v.value); } catch { q = null; }
@@ -1,4 +1,7 @@
-// FILE: questTrackerTime.js (v0.4.4)
+// FILE: questTrackerTime.js (v0.4.5)
+// - v0.4.5: timespent is measured by the game monitor and pushed in batches. While
+//   its heartbeat (questTracker_external_time_at) is fresh this cron skips the
+//   session/timespent block and only ticks UNKILLABLE.
 // - v0.4.4: Clamp progress to target once a quest is completed, so a large tick
 //   (e.g. after a server/cron restart where a lot of real time elapsed since the
 //   last run) can no longer leave progress permanently overshooting the target
@@ -13,6 +16,9 @@ const TIME_ZONE = 'Europe/Prague';
 const RETENTION_DEFAULT_DAYS = 7;
 const BUDGET_MS = 8000;
 
+const EXTERNAL_TIME_HEARTBEAT_KEY = 'questTracker_external_time_at';
+const EXTERNAL_TIME_FRESH_MS = 5 * 60 * 1000;
+
 function nowPrague() { return new Date(new Date().toLocaleString('en-US', { timeZone: TIME_ZONE })); }
 function ymd(d = nowPrague()) {
     const y = d.getFullYear(), m = String(d.getMonth() + 1).padStart(2, '0'), dd = String(d.getDate()).padStart(2, '0');
@@ -83,6 +89,16 @@ async function getVar(gsId, moduleId, key, playerId) {
     return s.data.data.length ? s.data.data[0] : null;
 }
 
+async function externalTimeActive(gsId, moduleId) {
+    try {
+        const v = await getVar(gsId, moduleId, EXTERNAL_TIME_HEARTBEAT_KEY, null);
+        if (!v) return false;
+        let ts; try { ts = JSON.parse(v.value)?.ts; } catch { ts = v.value; }
+        const t = new Date(ts).getTime();
+        return Number.isFinite(t) && (Date.now() - t) < EXTERNAL_TIME_FRESH_MS;
+    } catch { return false; }
+}
+
 async function getQuestVar(gsId, moduleId, playerId, date, type) {
     const key = `dailyquest_${playerId}_${date}_${type}`;
     return await getVar(gsId, moduleId, key, playerId);
@@ -115,6 +131,8 @@ async function main() {
         limit: 500
     });
 
+    const external = await externalTimeActive(gsId, moduleId);
+
     for (const p of (players?.data?.data || [])) {
         if (!within()) break;
 
@@ -123,53 +141,55 @@ async function main() {
 
         const now = Date.now();
 
-        // ---- TIME SURVIVOR session + quest ----
-        const sessionKey = `session_${pid}_${date}`;
-        const sVar = await getVar(gsId, moduleId, sessionKey, pid);
+        // ---- TIME SURVIVOR session + quest (game monitor owns it while fresh) ----
+        if (!external) {
+            const sessionKey = `session_${pid}_${date}`;
+            const sVar = await getVar(gsId, moduleId, sessionKey, pid);
 
-        let sess = null;
-        if (sVar) { try { sess = JSON.parse(sVar.value); } catch { sess = null; } }
-        if (!sess || typeof sess !== 'object') sess = { startTime: now, totalTime: 0, lastUpdate: now };
+            let sess = null;
+            if (sVar) { try { sess = JSON.parse(sVar.value); } catch { sess = null; } }
+            if (!sess || typeof sess !== 'object') sess = { startTime: now, totalTime: 0, lastUpdate: now };
 
-        if (sess.startTime) {
-            const last = Number(sess.lastUpdate || sess.startTime || now);
-            sess.totalTime = Number(sess.totalTime || 0) + Math.max(0, now - last);
-            sess.lastUpdate = now;
-        }
+            if (sess.startTime) {
+                const last = Number(sess.lastUpdate || sess.startTime || now);
+                sess.totalTime = Number(sess.totalTime || 0) + Math.max(0, now - last);
+                sess.lastUpdate = now;
+            }
 
-        if (sVar && sess.startTime) {
-            try { await takaro.variable.variableControllerUpdate(sVar.id, { value: JSON.stringify(sess), expiresAt: expISO }); } catch { }
-        } else if (sVar) {
-            // Paused sessions stay paused until playerConnect resumes them.
-        } else {
-            try {
-                await takaro.variable.variableControllerCreate({
-                    key: sessionKey,
-                    value: JSON.stringify(sess),
-                    gameServerId: gsId,
-                    moduleId,
-                    playerId: String(pid),
-                    expiresAt: expISO
-                });
-            } catch { }
-        }
+            if (sVar && sess.startTime) {
+                try { await takaro.variable.variableControllerUpdate(sVar.id, { value: JSON.stringify(sess), expiresAt: expISO }); } catch { }
+            } else if (sVar) {
+                // Paused sessions stay paused until playerConnect resumes them.
+            } else {
+                try {
+                    await takaro.variable.variableControllerCreate({
+                        key: sessionKey,
+                        value: JSON.stringify(sess),
+                        gameServerId: gsId,
+                        moduleId,
+                        playerId: String(pid),
+                        expiresAt: expISO
+                    });
+                } catch { }
+            }
 
-        const tQuest = await ensureQuestVar(gsId, moduleId, pid, date, 'timespent');
-        if (tQuest) {
-            let q; try { q = JSON.parse(tQuest.value); } catch { q = null; }
-            if (q && !q.completed) {
-                const tgt = targetMs('timespent'); q.target ||= tgt;
-                const rawProgress = Number(sess.totalTime || 0);
-                if (rawProgress >= tgt) {
-                    // Clamp to target so a big jump (e.g. after downtime) doesn't
-                    // permanently overshoot the displayed/stored progress value.
-                    q.progress = tgt;
-                    q.completed = true;
-                    await notifyComplete(gsId, pid, 'timespent');
-                } else {
-                    q.progress = rawProgress;
+            const tQuest = await ensureQuestVar(gsId, moduleId, pid, date, 'timespent');
+            if (tQuest) {
+                let q; try { q = JSON.parse(tQuest.value); } catch { q = null; }
+                if (q && !q.completed) {
+                    const tgt = targetMs('timespent'); q.target ||= tgt;
+                    const rawProgress = Number(sess.totalTime || 0);
+                    if (rawProgress >= tgt) {
+                        // Clamp to target so a big jump (e.g. after downtime) doesn't
+                        // permanently overshoot the displayed/stored progress value.
+                        q.progress = tgt;
+                        q.completed = true;
+                        await notifyComplete(gsId, pid, 'timespent');
+                    } else {
+                        q.progress = rawProgress;
+                    }
+                    try { await takaro.variable.variableControllerUpdate(tQuest.id, { value: JSON.stringify(q) }); } catch { }
                 }
-                try { await takaro.variable.variableControllerUpdate(tQuest.id, { value: JSON.stringify(q) }); } catch { }
             }
         }
 
@@ -1,4 +1,6 @@
-// FILE: playerDisconnect.js (v0.3.1) - minutes-aware targets (backward compatible)
+// FILE: playerDisconnect.js (v0.3.2) - minutes-aware targets (backward compatible)
+// - v0.3.2: leave timespent progress alone while the game monitor heartbeat
+//   (questTracker_external_time_at) is fresh; it pushes playtime increments itself
 import { takaro, data } from '@takaro/helpers';
 
 const TIME_ZONE = 'Europe/Prague';
@@ -34,6 +36,22 @@ function minutesOrMs(minKey, msKey, defaultMs) {
     return defaultMs;
 }
 
+const EXTERNAL_TIME_HEARTBEAT_KEY = 'questTracker_external_time_at';
+const EXTERNAL_TIME_FRESH_MS = 5 * 60 * 1000;
+async function externalTimeActive(gameServerId, moduleId) {
+    try {
+        const r = await takaro.variable.variableControllerSearch({
+            filters: { key: [EXTERNAL_TIME_HEARTBEAT_KEY], gameServerId: [gameServerId], moduleId: [moduleId] },
+            limit: 1
+        });
+        const v = r.data.data[0];
+        if (!v) return false;
+        let ts; try { ts = JSON.parse(v.value)?.ts; } catch { ts = v.value; }
+        const t = new Date(ts).getTime();
+        return Number.isFinite(t) && (Date.now() - t) < EXTERNAL_TIME_FRESH_MS;
+    } catch { return false; }
+}
+
 async function main() {
     const { player, gameServerId, module: mod } = data;
     if (!player) return;
@@ -58,11 +76,12 @@ async function main() {
                 sess.startTime = null;
                 sess.lastUpdate = now;
                 await takaro.variable.variableControllerUpdate(sv.id, { value: JSON.stringify(sess) });
+                const external = await externalTimeActive(gameServerId, mod.moduleId);
                 const qk = `dailyquest_${playerId}_${date}_timespent`;
-                const qres = await takaro.variable.variableControllerSearch({
+                const qres = external ? null : await takaro.variable.variableControllerSearch({
                     filters: { key: [qk], gameServerId: [gameServerId], playerId: [playerId], moduleId: [mod.moduleId] }
                 });
-                if (qres.data.data.length) {
+                if (qres?.data?.data?.length) {
                     const qv = qres.data.data[0];
                     const q = JSON.parse(qv.value);
                     q.progress = sess.totalTime;
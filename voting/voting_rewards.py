@@ -1,6 +1,151 @@
 #!/usr/bin/env python3
 """
 7D2D Voting Rewards Production Script with Automatic Detection
+Version 54 - giveplus and pm2 address the player by entity id (from the
+/vote and spawn lines), else Steam_<id>, else the quoted name
+(../shared/bohemia_addressing.py), and the console output is checked after
+each command: a rejected command ("... not found") is sent again with the
+next way to address the player. The first grant of a reward picks the
+address, the rest use it. A player whose name the /vote regex can't read is
+still rewarded through the entity id. If no grant goes through the vote is
+left unclaimed, so a later /vote delivers it. Outcomes:
+bohemia_command_outcomes_total{verb,result}. With LOG_TAIL_ENABLED and
+LOG_TAIL_MUTE_TELNET_LOGS the echo never comes over telnet: nothing is
+checked or waited for and every grant counts as "sent".
+
+Version 53 - Vote status cache (VoteStatusCache). /vote and the vote
+checker share one vote-site lookup per player while it is in flight, and
+reuse its answer: "not voted yet" for VOTE_STATUS_NOT_VOTED_TTL_SECONDS,
+"claimed today" for VOTE_STATUS_CLAIMED_TTL_SECONDS; failed lookups and
+"voted, not claimed" are not cached. set_vote_claimed and the 6 AM reset
+invalidate it. process_reward runs once per player at a time and not again
+after the reward was delivered that day, since both callers can now get the
+same status 1. Hits/misses: bohemia_vote_status_lookups_total{result}.
+
+Version 52 - Per-player /vote admission (../shared/bohemia_admission.py):
+a token bucket per Steam id (VOTE_ADMISSION_BURST, then one per
+VOTE_ADMISSION_REFILL_SECONDS). A rejected /vote does not query the vote site
+or write commands beyond one PM per rejection streak: the reply the last
+admitted /vote got (or VOTE_RATE_LIMITED). Counted in
+bohemia_chat_commands_shed_total{command,reply}; GET /admission on the
+metrics endpoint.
+
+Version 51 - A player spawn no longer sleeps 2s on the handler thread before
+its warm-up "help": the help runs as a delayed "spawn-warmup" session job, so
+a /vote right behind a spawn is handled at once (several spawns in 2s share
+one help).
+
+Version 50 - The vote quest update carries an eventId (vote:<steamId>:<vote
+day>) and is retried on network errors and 5xx with the same id; the quest
+server (working_server.js v15.11) counts each id once, so a retry after a
+lost response does not add a second vote.
+
+Version 49 - Bounded, prioritized event queue between the telnet reader and
+handle_line() (../shared/bohemia_events.py). monitor_chat only splits and
+classifies lines; a handler thread takes /vote commands and spawns first, and
+under a log storm low-value lines are sampled or shed (never /vote or spawns).
+Shed lines: bohemia_events_shed_total{category,reason}; queue depth and wait:
+bohemia_event_queue_depth, bohemia_event_queue_wait_seconds; GET /events on
+the metrics endpoint. The /vote handler no longer drains the socket before
+handling the command: it ran on the reader thread then and threw away
+whatever lines had arrived.
+
+Version 48 - main() no longer shells out to "pip3 install --user pytz" at
+start-up. The check could never run (pytz is imported at module level, so a
+missing pytz fails the import first) and a package install does not belong in
+a pm2-restarted service; pytz is a deployment dependency.
+
+Version 47 - The vote checker, the hourly vote message and the daily reset
+run as named jobs on one JobScheduler (../shared/bohemia_jobs.py: a timer
+heap on one thread plus a small worker pool) instead of sleeping daemon
+threads. The 6 AM reset is scheduled at the exact wall-clock time in
+Europe/Prague; before, it only ran if the hourly message happened to fire
+between 6:00 and 6:01. The vote message and the post-login warm-up are
+session jobs, cancelled when telnet drops. Run time per job:
+bohemia_job_seconds / bohemia_job_runs_total, and GET /jobs on the metrics
+endpoint.
+
+Version 46 - Fast reconnect (../shared/bohemia_reconnect.py). main() keeps
+ONE VotingRewards instance and run() reconnects by itself, so the command
+scheduler, vote state, caches and the checker / periodic / log tail threads
+survive a telnet drop (before, every reconnect built a new instance and
+started another set of threads). monitor_chat no longer sleeps before giving
+up a session; instead of doubling a delay up to 480s, the telnet port is
+probed with a plain TCP connect at short jittered intervals
+(RECONNECT_BASE_DELAY_SECONDS .. RECONNECT_MAX_DELAY_SECONDS) and the login
+starts as soon as it accepts. connect() returns right after "Logon
+successful"; the help / loglevel warm-up is queued in the background.
+Downtime per reconnect: bohemia_telnet_downtime_seconds.
+
+Version 45 - Dead telnet sessions are detected within a bounded time
+(../shared/bohemia_watchdog.py): TCP keepalive + TCP_USER_TIMEOUT on the
+socket, and a StallWatchdog that tracks the time since the last byte and
+since the last unanswered command. After WATCHDOG_QUIET_SECONDS without a byte
+it sends a "version" probe; a command without any reply for
+WATCHDOG_RESPONSE_TIMEOUT_SECONDS, or a failed write, shuts the socket down
+and stops monitor_chat via session_stop, so main() reconnects without the
+backoff sleep. Before, a half-open connection (server restart, NAT timeout)
+kept monitor_chat reading nothing while /vote lines were lost.
+
+Version 44 - On-demand profiling without a restart (../shared/bohemia_profiler.py):
+kill -USR1 <pid> writes a thread stack dump, a sampling CPU profile
+(per-thread CPU seconds, top functions, collapsed stacks for flamegraphs) and
+a tracemalloc diff over PROFILE_SECONDS into PROFILE_DIR; kill -USR2 writes the
+stack dump only. GET /debug/profile?kind=all|cpu|mem|stacks&seconds=N on the
+metrics endpoint does the same.
+
+Version 43 - Prometheus-style metrics (../shared/bohemia_metrics.py) on
+http://METRICS_HOST:METRICS_PORT/metrics: lines read and handle_line() time,
+console commands by verb/priority/result with queue wait and write time,
+tn_lock wait time, vote-site and quest-server request latency and status
+codes, /vote commands by vote status, claimed / failed rewards, telnet
+connects and disconnects, checker / pending / command / log queue sizes and
+process CPU / RSS / threads. Metrics are module level, so they keep counting
+across the reconnect loop in main().
+
+Version 42 - All vote-site requests are built from self.api_base (constructor
+argument api_base, default VOTE_API_BASE / env VOTING_API_BASE) instead of
+three hardcoded URLs, so the service can be pointed at a local stub API
+(see bench/).
+
+Version 41 - Vote state survives restarts. Last vote times, the reset day on
+which a player was thanked / rewarded / checked, and players waiting for
+their reward after typing /vote are kept in the shared SQLite store
+(../shared/bohemia_state.py, WAL mode, STATE_DB_FILE) and reloaded on start;
+players_mapping.json and pending_rewards.json are imported once. Pending
+entries are cleared after a successful reward and expire after
+PENDING_REWARD_MAX_AGE_SECONDS. USE_STATE_DB = False keeps the old in-memory
+behaviour.
+
+Version 40 - Logging moved off the hot threads: records go through a
+bounded, non-blocking queue (NonBlockingQueueHandler) and a QueueListener
+thread formats them and writes a size-rotated log file (LOG_MAX_BYTES x
+LOG_BACKUP_COUNT) plus stderr. Every telnet line is now logged lazily on the
+"voting.telnet" logger (the old f-string was formatted even with DEBUG off)
+and that category is rate-limited by SamplingFilter. Levels can be changed at
+runtime via LOG_LEVELS_FILE (polled, or at once on SIGHUP). Logging is set up
+in main() instead of at import time.
+
+Version 39 - Optional log-file ingestion (LOG_TAIL_ENABLED). A LogTailer
+follows the dedicated server log (/home/steam/logs/server_*.log) with inotify
+and a byte-offset checkpoint (path + inode + offset), survives rotation to a
+new server log and truncation, and feeds the same handle_line() the telnet
+reader uses. /vote and spawn lines are therefore not lost while telnet is
+reconnecting, and after a restart the tailer resumes from the checkpoint.
+In this mode telnet output is only drained, and "loglevel ALL false" stops
+the server streaming its log over the session (LOG_TAIL_MUTE_TELNET_LOGS).
+Per-line processing moved from monitor_chat() into handle_line().
+
+Version 38 - Console commands (PMs, giveplus, say, help warm-ups) are no
+longer written directly by whichever thread calls send_command. They go
+through one CommandScheduler that serves them by priority class
+(interactive > reward > poll > broadcast) with a token-bucket limit on
+commands per second, so a reward burst cannot flood the console or starve
+/vote replies. The "version" flush is written together with its command
+(and costs two tokens). The read_very_eager() calls around each write were
+dropped: they raced with monitor_chat and threw away chat lines. Telnet
+reads and writes are now serialized with tn_lock.
+
 Version 37 - Fix: the v36 duplicate-/vote fix used line.startswith("Chat
 handled by mod") to skip PrismaCore's echoed chat line, but real telnet
 output lines from the 7D2D server always have a timestamp + tick counter +
@@ -49,22 +194,342 @@ import time
 import threading
 import re
 import os
+import sys
 import logging
 import requests
 import random
+import socket
 from datetime import datetime, timedelta, timezone
 import pytz
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/home/steam/7D2DBohemia/voting/voting_rewards.log'),
-        logging.StreamHandler()
-    ]
+# Shared SQLite state store lives in <repo>/shared
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'shared'))
+try:
+    from bohemia_state import StateStore
+except ImportError:
+    StateStore = None
+import bohemia_logging
+import bohemia_metrics as metrics
+from bohemia_addressing import CommandOutcomes, player_targets, send_to_player
+from bohemia_admission import CommandAdmission
+from bohemia_commands import (
+    CMD_PRIORITY_BROADCAST,
+    CMD_PRIORITY_INTERACTIVE,
+    CMD_PRIORITY_POLL,
+    CMD_PRIORITY_REWARD,
+    CommandScheduler,
+)
+from bohemia_events import HIGH, LOW, NORMAL, EventQueue
+from bohemia_jobs import JobScheduler
+from bohemia_logtail import LogTailer
+from bohemia_profiler import Profiler
+from bohemia_reconnect import ReconnectManager
+from bohemia_watchdog import StallWatchdog, enable_keepalive
+
+# Logging (configured by setup_logging() in main)
+LOG_FILE = '/home/steam/7D2DBohemia/voting/voting_rewards.log'
+LOG_LEVEL = os.environ.get("VOTING_LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = 20 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+LOG_QUEUE_SIZE = 10000
+
+# Runtime level overrides, e.g. {"voting": "DEBUG", "voting.telnet": "WARNING"}
+LOG_LEVELS_FILE = '/home/steam/7D2DBohemia/voting/log_levels.json'
+LOG_LEVELS_POLL_SECONDS = 30
+
+# High-volume categories: logger name -> (max records, per seconds)
+LOG_SAMPLE_LIMITS = {
+    "voting.telnet": (30, 60),
+    "voting.commands": (30, 60),
+}
+
+logger = logging.getLogger("voting")
+telnet_log = logging.getLogger("voting.telnet")
+commands_log = logging.getLogger("voting.commands")
+
+
+_log_listener = None
+
+
+def setup_logging():
+    """Queue-based logging (../shared/bohemia_logging.py) with this service's
+    file, sampling and level settings."""
+    global _log_listener
+    if _log_listener is not None:
+        return
+    queue_handler, _log_listener = bohemia_logging.setup_logging(
+        LOG_FILE,
+        LOG_LEVEL,
+        LOG_MAX_BYTES,
+        LOG_BACKUP_COUNT,
+        LOG_QUEUE_SIZE,
+        LOG_SAMPLE_LIMITS,
+        LOG_LEVELS_FILE,
+        LOG_LEVELS_POLL_SECONDS,
+    )
+    M_LOG_DROPPED.set_function(lambda: queue_handler.dropped)
+    M_LOG_QUEUE_DEPTH.set_function(queue_handler.queue.qsize)
+
+
+
+# Vote site API (override for local testing, e.g. bench/stubs.py)
+VOTE_API_BASE = os.environ.get("VOTING_API_BASE", "https://7daystodie-servers.com/api/")
+
+# Vote quest update: network errors and 5xx are retried with the same eventId
+# (working_server.js v15.11 applies each eventId once)
+VOTE_QUEST_ATTEMPTS = 3
+VOTE_QUEST_RETRY_DELAY_SECONDS = 1.0
+
+# Prometheus-style metrics endpoint (GET /metrics), local only
+METRICS_ENABLED = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 8096
+
+# Dead session detection: probe ("version") after this long without a byte,
+# reconnect when a written command gets no reply within the response timeout
+WATCHDOG_QUIET_SECONDS = 45
+WATCHDOG_RESPONSE_TIMEOUT_SECONDS = 15
+
+# Reconnect: probe the telnet port every RECONNECT_BASE_DELAY..RECONNECT_MAX_DELAY
+# seconds (jittered) while the server is down, log in as soon as it accepts
+RECONNECT_BASE_DELAY_SECONDS = 1.0
+RECONNECT_MAX_DELAY_SECONDS = 15.0
+# Wait this long for "Logon successful" after sending the password
+LOGIN_TIMEOUT_SECONDS = 5
+
+# Scheduled jobs (one JobScheduler per process, ../shared/bohemia_jobs.py)
+VOTE_CHECK_INTERVAL_SECONDS = 30
+PERIODIC_MESSAGE_INTERVAL_SECONDS = 3600
+# a spawn is followed by a "help" this much later (keeps the session warm)
+SPAWN_WARMUP_DELAY_SECONDS = 2.0
+# daily vote reset, wall-clock time in Europe/Prague
+DAILY_RESET_HOUR = 6
+DAILY_RESET_MINUTE = 0
+# interval jobs are spread by +/- this fraction of their interval
+JOB_JITTER = 0.1
+# /vote runs on a worker too (vote-site lookup + reward grant, seconds each)
+JOB_WORKERS = 6
+
+# Reader -> handler event queue (../shared/bohemia_events.py): lines waiting
+# for handle_line(); /vote and spawns are never shed, and above half the
+# capacity only every Nth low-value line is handled
+EVENT_QUEUE_CAPACITY = 2000
+EVENT_QUEUE_SAMPLE_EVERY = 10
+
+# Vote-site claim status cache (VoteStatusCache): how long a status is reused.
+# "Not voted yet" only briefly - it changes as soon as the player votes;
+# "claimed today" until the 6 AM reset clears the cache (capped). "Voted, not
+# claimed" is never cached: the claim follows and invalidates the entry.
+VOTE_STATUS_NOT_VOTED_TTL_SECONDS = 20
+VOTE_STATUS_CLAIMED_TTL_SECONDS = 3600
+# a lookup waiting for an identical one in flight gives up after this long
+VOTE_STATUS_FLIGHT_TIMEOUT_SECONDS = 15
+
+# Per-player /vote admission (../shared/bohemia_admission.py): a burst of
+# VOTE_ADMISSION_BURST, then one /vote per VOTE_ADMISSION_REFILL_SECONDS per
+# Steam id. Over the limit the player gets the last reply again (once per
+# streak) and the vote site is not asked.
+VOTE_ADMISSION_BURST = 3
+VOTE_ADMISSION_REFILL_SECONDS = 20.0
+
+# On-demand profiling: kill -USR1 <pid> (cpu + mem + stacks), kill -USR2 (stacks),
+# or GET /debug/profile?kind=all|cpu|mem|stacks&seconds=N on the metrics endpoint
+PROFILE_DIR = '/home/steam/7D2DBohemia/voting/profiles'
+PROFILE_SECONDS = 30
+
+# Vote state persisted in the shared SQLite store
+USE_STATE_DB = True
+STATE_DB_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/bohemia_state.db"
+PENDING_REWARD_MAX_AGE_SECONDS = 24 * 60 * 60
+
+# Optional: read events from the server log file instead of telnet
+LOG_TAIL_ENABLED = False
+SERVER_LOG_DIR = "/home/steam/logs"
+SERVER_LOG_PATTERN = "server_*.log"
+LOG_TAIL_CHECKPOINT_FILE = "/home/steam/7D2DBohemia/runtime-state-backups/voting_log_tail_checkpoint.json"
+LOG_TAIL_CHECKPOINT_SECONDS = 5
+LOG_TAIL_POLL_SECONDS = 1.0
+# ask the server to stop streaming its log over our telnet session
+LOG_TAIL_MUTE_TELNET_LOGS = True
+
+# Console command scheduler (token bucket shared by every write of this process)
+COMMAND_RATE_PER_SECOND = 3.0
+COMMAND_BURST = 5
+COMMAND_WAIT_TIMEOUT_SECONDS = 30
+COMMAND_STATS_LOG_INTERVAL_SECONDS = 300
+
+# ===================== METRICS =====================
+# Module level: registered once per process, shared by whatever VotingRewards
+# instance is running (main() keeps one for the whole process).
+
+M_LINES_READ = metrics.counter("bohemia_lines_read_total", "Console lines read, by source", ("source",))
+M_HANDLE_LINE = metrics.histogram(
+    "bohemia_handle_line_seconds", "Time spent handling one line (incl. /vote handling)",
+    buckets=metrics.FAST_BUCKETS + (5.0, 10.0, 30.0)
+)
+M_COMMANDS = metrics.counter(
+    "bohemia_console_commands_total", "Console commands by verb, priority and result", ("verb", "priority", "result")
+)
+M_COMMANDS_COALESCED = metrics.counter(
+    "bohemia_console_commands_coalesced_total", "Commands merged into a pending duplicate", ("priority",)
+)
+M_COMMAND_WAIT = metrics.histogram(
+    "bohemia_command_queue_wait_seconds", "Time from submit to write, incl. rate limit", ("priority",)
+)
+M_COMMAND_WRITE = metrics.histogram(
+    "bohemia_command_write_seconds", "Socket write time incl. tn_lock wait", ("verb",), buckets=metrics.FAST_BUCKETS
+)
+M_COMMAND_QUEUE_DEPTH = metrics.gauge("bohemia_command_queue_depth", "Commands waiting in the scheduler", ("scheduler",))
+M_LOCK_WAIT = metrics.histogram(
+    "bohemia_lock_wait_seconds", "Time spent waiting for a lock", ("lock",), buckets=metrics.FAST_BUCKETS
+)
+M_HTTP = metrics.histogram("bohemia_http_request_seconds", "Outgoing HTTP request latency", ("target", "endpoint"))
+M_HTTP_RESULTS = metrics.counter(
+    "bohemia_http_requests_total", "Outgoing HTTP requests by status code (or error)", ("target", "endpoint", "result")
+)
+M_CONNECTS = metrics.counter("bohemia_telnet_connects_total", "Telnet connect attempts", ("result",))
+M_DISCONNECTS = metrics.counter("bohemia_telnet_disconnects_total", "Telnet sessions lost")
+M_CONNECTED = metrics.gauge("bohemia_telnet_connected", "1 while a telnet session is open")
+M_STALLS = metrics.counter("bohemia_telnet_stalls_total", "Dead sessions detected by the watchdog", ("reason",))
+M_DOWNTIME = metrics.histogram(
+    "bohemia_telnet_downtime_seconds",
+    "Time from losing a telnet session to the next successful login",
+    buckets=(1, 2, 5, 10, 20, 30, 45, 60, 90, 120, 180, 300, 600),
+)
+M_TELNET_IDLE = metrics.gauge("bohemia_telnet_idle_seconds", "Seconds since the last byte from the console")
+M_VOTE_COMMANDS = metrics.counter("bohemia_vote_commands_total", "/vote commands by vote-site status", ("status",))
+M_REWARDS = metrics.counter("bohemia_vote_rewards_total", "Reward deliveries by claim result", ("result",))
+M_PLAYERS_TO_CHECK = metrics.gauge("bohemia_vote_players_to_check", "Players polled by the automatic vote checker")
+M_PENDING_REWARDS = metrics.gauge("bohemia_vote_pending_rewards", "Players who typed /vote and wait for a reward")
+M_VOTE_STATUS_LOOKUPS = metrics.counter(
+    "bohemia_vote_status_lookups_total", "Vote status lookups by cache result (hit, coalesced, miss)", ("result",)
+)
+M_EVENT_QUEUE_DEPTH = metrics.gauge("bohemia_event_queue_depth", "Console lines waiting for the handler", ("priority",))
+M_EVENT_WAIT = metrics.histogram(
+    "bohemia_event_queue_wait_seconds", "Time a console line waited between reader and handler", ("category",)
+)
+M_EVENTS_SHED = metrics.counter(
+    "bohemia_events_shed_total", "Console lines dropped under load, by category", ("category", "reason")
+)
+M_COMMAND_OUTCOMES = metrics.counter(
+    "bohemia_command_outcomes_total",
+    "Player-addressed console commands by outcome seen in the console output",
+    ("verb", "result"),
+)
+M_COMMANDS_SHED = metrics.counter(
+    "bohemia_chat_commands_shed_total", "Chat commands rejected by per-player admission", ("command", "reply")
 )
-logger = logging.getLogger(__name__)
+M_JOB_SECONDS = metrics.histogram("bohemia_job_seconds", "Run time of scheduled jobs", ("job",))
+M_JOB_RUNS = metrics.counter("bohemia_job_runs_total", "Scheduled job runs by result", ("job", "result"))
+M_LOG_DROPPED = metrics.counter("bohemia_log_records_dropped_total", "Log records dropped (log queue full)")
+M_LOG_QUEUE_DEPTH = metrics.gauge("bohemia_log_queue_depth", "Log records waiting for the listener thread")
+
+VOTE_STATUS_NAMES = {0: "not_voted", 1: "unclaimed", 2: "claimed"}
+
+
+def _observe_http(target, endpoint, start, result):
+    M_HTTP.labels(target, endpoint).observe(time.perf_counter() - start)
+    M_HTTP_RESULTS.labels(target, endpoint, result).inc()
+
+
+def _observe_job(name, seconds, ok):
+    M_JOB_SECONDS.labels(name).observe(seconds)
+    M_JOB_RUNS.labels(name, "ok" if ok else "failed").inc()
+
+
+def _observe_command_write(verb, priority, result, seconds):
+    M_COMMANDS.labels(verb, priority, result).inc()
+    M_COMMAND_WRITE.labels(verb).observe(seconds)
+
+
+def classify_line(line):
+    """(category, priority) of a console line for the event queue. Substring
+    checks only: the reader runs this for every line."""
+    if "Chat handled by mod" in line:
+        return "echo", LOW  # PrismaCore's re-log of a chat line, ignored
+    if "/vote" in line.lower():
+        return "command", HIGH
+    if "PlayerSpawnedInWorld" in line:
+        return "spawn", HIGH
+    if "Player disconnected" in line:
+        return "disconnect", HIGH
+    if "Chat" in line or "[CHAT]" in line:
+        return "chat", NORMAL
+    return "other", LOW
+
+
+class _Flight:
+    """One vote-site lookup in progress; identical lookups wait for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class VoteStatusCache:
+    """
+    Claim status per Steam id, shared by /vote and the vote checker.
+
+    - single flight: while a lookup for an id runs, identical lookups wait
+      for its answer instead of asking the vote site again
+    - TTL per status ({status: seconds}; statuses without a TTL are not cached)
+    - invalidate(steam_id) after a claim, clear() at the daily reset; a lookup
+      that started before either is not cached
+    """
+
+    def __init__(self, ttls, flight_timeout=VOTE_STATUS_FLIGHT_TIMEOUT_SECONDS):
+        self.ttls = dict(ttls)
+        self.flight_timeout = flight_timeout
+        self.lock = threading.Lock()
+        self.entries = {}  # steam_id -> (status, expires monotonic)
+        self.inflight = {}  # steam_id -> _Flight
+        self.generations = {}  # steam_id -> bumped by invalidate()
+        self.epoch = 0  # bumped by clear()
+
+    def get(self, steam_id, fetch):
+        """Cached status, or fetch() (None = lookup failed, not cached)."""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(steam_id)
+            if entry is not None and entry[1] > now:
+                M_VOTE_STATUS_LOOKUPS.labels("hit").inc()
+                return entry[0]
+            flight = self.inflight.get(steam_id)
+            leader = flight is None
+            if leader:
+                flight = self.inflight[steam_id] = _Flight()
+                stamp = (self.epoch, self.generations.get(steam_id, 0))
+        if not leader:
+            M_VOTE_STATUS_LOOKUPS.labels("coalesced").inc()
+            if flight.done.wait(self.flight_timeout):
+                return flight.result
+            return fetch()
+
+        M_VOTE_STATUS_LOOKUPS.labels("miss").inc()
+        result = None
+        try:
+            result = fetch()
+            return result
+        finally:
+            with self.lock:
+                self.inflight.pop(steam_id, None)
+                ttl = self.ttls.get(result)
+                if ttl and stamp == (self.epoch, self.generations.get(steam_id, 0)):
+                    self.entries[steam_id] = (result, time.monotonic() + ttl)
+            flight.result = result
+            flight.done.set()
+
+    def invalidate(self, steam_id):
+        with self.lock:
+            self.entries.pop(steam_id, None)
+            self.generations[steam_id] = self.generations.get(steam_id, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generations.clear()
+            self.epoch += 1
+
 
 class VoteQuestIntegration:
     """Handles vote quest updates for the Takaro quest server."""
@@ -73,19 +538,41 @@ class VoteQuestIntegration:
         self.quest_server_url = quest_server_url
         self.session = requests.Session()
 
-    def notify_vote(self, player_name):
+    def notify_vote(self, player_name, event_id=None):
+        """Count a vote for the Takaro vote quest. event_id identifies the vote,
+        so a retry after a lost response is not counted twice."""
         payload = {
             "playerName": player_name,
             "questType": "vote",
             "increment": 1,
         }
+        if event_id:
+            payload["eventId"] = event_id
+
+        for attempt in range(1, VOTE_QUEST_ATTEMPTS + 1):
+            ok, retryable = self._post_vote(player_name, payload)
+            if ok or not retryable or attempt == VOTE_QUEST_ATTEMPTS:
+                return ok
+            logger.info(
+                "Retrying vote quest update for %s (attempt %s/%s)",
+                player_name,
+                attempt + 1,
+                VOTE_QUEST_ATTEMPTS,
+            )
+            time.sleep(VOTE_QUEST_RETRY_DELAY_SECONDS * attempt)
+        return False
 
+    def _post_vote(self, player_name, payload):
+        """One POST /update-quest. Returns (ok, retryable)."""
+        start = time.perf_counter()
+        result = "error"
         try:
             response = self.session.post(
                 f"{self.quest_server_url}/update-quest",
                 json=payload,
                 timeout=12,
             )
+            result = str(response.status_code)
 
             if response.status_code == 200:
                 try:
@@ -96,16 +583,19 @@ class VoteQuestIntegration:
                         player_name,
                         e,
                     )
-                    return False
+                    return False, False
                 if data.get("success"):
-                    logger.info("Vote quest updated for %s", player_name)
-                    return True
+                    if data.get("duplicate"):
+                        logger.info("Vote quest for %s already counted (%s)", player_name, payload.get("eventId"))
+                    else:
+                        logger.info("Vote quest updated for %s", player_name)
+                    return True, False
                 logger.error(
                     "Vote quest update failed for %s: %s",
                     player_name,
                     data.get("error", "Unknown error"),
                 )
-                return False
+                return False, False
 
             try:
                 data = response.json()
@@ -121,23 +611,79 @@ class VoteQuestIntegration:
                     response.status_code,
                     player_name,
                 )
-            return False
+            return False, response.status_code >= 500
         except requests.exceptions.RequestException as e:
             logger.error("Network error updating vote quest for %s: %s", player_name, e)
-            return False
+            return False, True
+        finally:
+            _observe_http("quest", "/update-quest", start, result)
 
 class VotingRewards:
-    def __init__(self, host='localhost', port=8081, password='', api_key='', quest_server_url='http://localhost:3000'):
+    def __init__(self, host='localhost', port=8081, password='', api_key='', quest_server_url='http://localhost:3000',
+                 api_base=None, jobs=None):
         # Server connection settings
         self.host = host
         self.port = port
         self.password = password
         self.api_key = api_key
         self.tn = None
+        self.tn_lock = metrics.TimedLock(M_LOCK_WAIT.labels("tn_lock"))
+        # Dead-session detection; monitor_chat stops on session_stop
+        self.session_stop = threading.Event()
+        self.watchdog = StallWatchdog(
+            "voting",
+            self._watchdog_probe,
+            self._on_stall,
+            quiet_seconds=WATCHDOG_QUIET_SECONDS,
+            response_timeout=WATCHDOG_RESPONSE_TIMEOUT_SECONDS,
+        )
+        self.commands = CommandScheduler(
+            self._write_command,
+            rate=COMMAND_RATE_PER_SECOND,
+            burst=COMMAND_BURST,
+            wait_timeout=COMMAND_WAIT_TIMEOUT_SECONDS,
+            stats_interval=COMMAND_STATS_LOG_INTERVAL_SECONDS,
+            on_wait=lambda priority, wait: M_COMMAND_WAIT.labels(priority).observe(wait),
+            on_write=_observe_command_write,
+            on_coalesced=lambda priority: M_COMMANDS_COALESCED.labels(priority).inc(),
+        )
+        M_COMMAND_QUEUE_DEPTH.labels(self.commands.name).set_function(self.commands.queue_depth)
+        self.commands.start()
+        # Periodic work (vote checker, announcements, daily reset) runs as
+        # named jobs; "session" jobs are cancelled when telnet drops
+        if jobs is None:
+            jobs = JobScheduler("voting", workers=JOB_WORKERS, on_run=_observe_job)
+            jobs.start()
+        self.jobs = jobs
+
+        # The reader (or the LogTailer) only queues lines; handle_line() runs
+        # on the queue's thread, /vote and spawns first
+        self.events = EventQueue(
+            "voting",
+            self.handle_line,
+            classify_line,
+            capacity=EVENT_QUEUE_CAPACITY,
+            sample_every=EVENT_QUEUE_SAMPLE_EVERY,
+            on_shed=lambda category, reason: M_EVENTS_SHED.labels(category, reason).inc(),
+            on_handled=lambda category, wait: M_EVENT_WAIT.labels(category).observe(wait),
+        )
+        self.events.start()
+
+        # Optional log-file event source (telnet is then only used for commands)
+        self.log_tailer = None
+        if LOG_TAIL_ENABLED:
+            self.log_tailer = LogTailer(
+                SERVER_LOG_DIR,
+                SERVER_LOG_PATTERN,
+                LOG_TAIL_CHECKPOINT_FILE,
+                self.events.put,
+                poll_seconds=LOG_TAIL_POLL_SECONDS,
+                checkpoint_seconds=LOG_TAIL_CHECKPOINT_SECONDS,
+            )
         self.vote_quest_integration = VoteQuestIntegration(quest_server_url=quest_server_url)
 
         # API endpoints
-        self.api_base = 'https://7daystodie-servers.com/api/'
+        self.api_base = api_base or VOTE_API_BASE
 
         # Private message channel name required by pm2 syntax: pm2 <channel> <player> <text>
         self.pm_channel = 'Brewer'
@@ -148,9 +694,33 @@ class VotingRewards:
             'ALREADY_VOTED_MESSAGE': 'You already voted today and claimed your reward! You can vote again in approximately {hours}h {minutes}m.',
             'GLOBAL_REWARD_MESSAGE': '{player_name} just received his well deserved reward!',
             'VOTE_COMMAND_RESPONSE': 'Please vote on 7daystodie-servers.com (search Bohemia) or go to: https://7daystodie-servers.com/server/157783 - Your rewards will be dropped in front of you when done!',
-            'GLOBAL_VOTE_MESSAGE': 'Vote for our server and get great rewards! Type /vote in chat!'
+            'GLOBAL_VOTE_MESSAGE': 'Vote for our server and get great rewards! Type /vote in chat!',
+            'VOTE_RATE_LIMITED': 'Please wait a moment before typing /vote again.'
         }
 
+        # How to address players in commands: playerName -> {"steamId", "entityId"}
+        # (from /vote and spawn lines; entity ids are dropped on disconnect and
+        # when the telnet session ends - the server hands them out again)
+        self.player_addresses = {}
+        # console echo / error lines of player-addressed commands (fed by the
+        # reader); a muted telnet session carries no echoes, see bohemia_addressing
+        self.outcomes = CommandOutcomes(
+            "voting",
+            on_outcome=lambda verb, result: M_COMMAND_OUTCOMES.labels(verb, result).inc(),
+            check=not (LOG_TAIL_ENABLED and LOG_TAIL_MUTE_TELNET_LOGS),
+        )
+
+        # Per-player /vote limit; rejected commands get a cached reply
+        self.admission = CommandAdmission(
+            "voting",
+            {"vote": (VOTE_ADMISSION_BURST, VOTE_ADMISSION_REFILL_SECONDS)},
+            fallback_replies={"vote": self.messages['VOTE_RATE_LIMITED']},
+            on_shed=lambda command, reply: M_COMMANDS_SHED.labels(command, reply).inc(),
+        )
+        # steam ids whose /vote is being handled on a job worker
+        self.votes_in_flight = set()
+        self.votes_in_flight_lock = threading.Lock()
+
         # Fixed rewards
         self.fixed_rewards = [
             ('drinkJarBoiledWater', 5),
@@ -191,13 +761,118 @@ class VotingRewards:
         self.players_checked_today = set()  # Prevent spam for already claimed players
         self.last_vote_times = {}  # {steam_id: timestamp} - Track when players last voted
         self.players_pending_check = {}  # {steam_id: player_name} - Players who typed /vote before
+        # /vote and the vote checker share one lookup per player
+        self.vote_status_cache = VoteStatusCache({
+            0: VOTE_STATUS_NOT_VOTED_TTL_SECONDS,
+            2: VOTE_STATUS_CLAIMED_TTL_SECONDS,
+        })
+        # both can see status 1 from one shared lookup; one of them rewards
+        self.reward_lock = threading.Lock()
+        self.rewards_in_progress = set()
 
         # Set timezone for daily reset
         self.cest_tz = pytz.timezone('Europe/Prague')  # CEST timezone
 
-        # Reconnection backoff - START WITH 30 SECONDS
-        self.reconnect_delay = 30  # Start with 30 seconds
-        self.max_reconnect_delay = 480  # Max 8 minutes
+        # Persisted vote state (restores the tracking above after a restart)
+        self.state = self._open_state_store()
+        self._load_vote_state()
+
+        # Reconnection pacing: jittered port probes while the server is down
+        self.reconnect = ReconnectManager(
+            "voting",
+            host,
+            port,
+            base_delay=RECONNECT_BASE_DELAY_SECONDS,
+            max_delay=RECONNECT_MAX_DELAY_SECONDS,
+        )
+
+        M_CONNECTED.set_function(lambda: 1 if self.tn else 0)
+        M_TELNET_IDLE.set_function(self.watchdog.idle_seconds)
+        M_PLAYERS_TO_CHECK.set_function(lambda: len(self.players_to_check))
+        M_PENDING_REWARDS.set_function(lambda: len(self.players_pending_check))
+        if self.log_tailer:
+            M_LINES_READ.labels("logtail").set_function(lambda: self.log_tailer.lines_read)
+        for prio, prio_name in ((HIGH, "high"), (NORMAL, "normal"), (LOW, "low")):
+            M_EVENT_QUEUE_DEPTH.labels(prio_name).set_function(lambda p=prio: self.events.depth(p))
+
+    def _vote_api(self, method, endpoint, url):
+        """Vote-site request with latency/result metrics (endpoint: metric label)"""
+        start = time.perf_counter()
+        result = "error"
+        try:
+            response = requests.request(method, url, timeout=5)
+            result = str(response.status_code)
+            return response
+        finally:
+            _observe_http("vote_api", endpoint, start, result)
+
+    def _open_state_store(self):
+        if not USE_STATE_DB:
+            return None
+        if StateStore is None:
+            logger.error("bohemia_state module not found, vote state will not be persisted")
+            return None
+        try:
+            store = StateStore(STATE_DB_FILE)
+            logger.info("Using state store %s", STATE_DB_FILE)
+            return store
+        except Exception as e:
+            logger.error("Cannot open state store %s: %s", STATE_DB_FILE, e)
+            return None
+
+    def _reset_day(self):
+        """Identifier of the current vote day (starts at the 6 AM reset)"""
+        return self.get_daily_reset_time().date().isoformat()
+
+    def _load_vote_state(self):
+        if not self.state:
+            return
+        try:
+            today = self._reset_day()
+            for row in self.state.vote_all():
+                steam_id = row['steam_id']
+                if row['last_vote_ts']:
+                    self.last_vote_times[steam_id] = datetime.fromtimestamp(row['last_vote_ts'], tz=self.cest_tz)
+                if row['thanked_day'] == today:
+                    self.players_thanked.add(steam_id)
+                if row['rewarded_day'] == today:
+                    self.players_rewarded.add(steam_id)
+                if row['checked_day'] == today:
+                    self.players_checked_today.add(steam_id)
+
+            now = time.time()
+            for steam_id, (player_name, ts) in self.state.pending_all().items():
+                if (now - ts) > PENDING_REWARD_MAX_AGE_SECONDS:
+                    self.state.pending_delete(steam_id)
+                    continue
+                self.players_pending_check[steam_id] = player_name
+            logger.info(
+                "Loaded vote state: %s vote times, %s pending rewards",
+                len(self.last_vote_times),
+                len(self.players_pending_check),
+            )
+        except Exception as e:
+            logger.error("Failed to load vote state: %s", e)
+
+    def _store_vote(self, steam_id, **fields):
+        if not self.state:
+            return
+        try:
+            self.state.vote_update(steam_id, **fields)
+        except Exception as e:
+            logger.error("Failed to store vote state for %s: %s", steam_id, e)
+
+    def _store_pending(self, steam_id, player_name=None):
+        """Remember (player_name given) or forget a player waiting for a reward"""
+        if not self.state:
+            return
+        try:
+            if player_name:
+                self.state.pending_put(steam_id, player_name)
+            else:
+                self.state.pending_delete(steam_id)
+        except Exception as e:
+            logger.error("Failed to store pending reward for %s: %s", steam_id, e)
 
     @staticmethod
     def _quote_if_needed(text):
@@ -213,80 +888,158 @@ class VotingRewards:
         return text
 
     def connect(self):
-        """Connect to the 7D2D telnet server"""
+        """Connect to the 7D2D telnet server.
+        Returns as soon as the login is confirmed; the warm-up commands are
+        queued in the background so monitor_chat starts reading at once.
+        """
         try:
+            self._close_session()
             logger.info(f"Connecting to {self.host}:{self.port}")
             self.tn = telnetlib.Telnet(self.host, self.port, timeout=10)
-
-            # Wait for initial response
-            time.sleep(0.5)
-            initial_response = self.tn.read_very_eager().decode('utf-8', errors='ignore')
-            logger.debug(f"Initial response: {initial_response}")
+            enable_keepalive(self.tn.sock)
+            self.session_stop.clear()
 
             # Send password if provided
             if self.password:
+                initial_response = self.tn.read_until(b"Please enter password:", timeout=5)
+                logger.debug("Initial response: %s", initial_response.decode('utf-8', errors='ignore'))
                 logger.info("Sending password")
                 self.tn.write(f"{self.password}\n".encode('utf-8'))
-                time.sleep(1)
-                auth_response = self.tn.read_very_eager().decode('utf-8', errors='ignore')
-                logger.debug(f"Auth response: {auth_response}")
+                auth_response = self.tn.read_until(b"Logon successful", timeout=LOGIN_TIMEOUT_SECONDS)
+                logger.debug("Auth response: %s", auth_response.decode('utf-8', errors='ignore'))
+                if b"incorrect" in auth_response.lower():
+                    raise ConnectionError("telnet password rejected")
+                if b"Logon successful" not in auth_response:
+                    logger.warning(f"No login confirmation within {LOGIN_TIMEOUT_SECONDS}s, continuing")
 
-            # Test connection with a simple command
-            self.tn.write(b"help\n")
-            time.sleep(0.5)
-            help_response = self.tn.read_very_eager().decode('utf-8', errors='ignore')
-            logger.debug(f"Help command response: {help_response[:200]}")
+            self.watchdog.start()
+            self.jobs.once("warmup", self._warm_up, group="session")
 
             logger.info(f"Successfully connected to {self.host}:{self.port}")
-            # Reset backoff on successful connection
-            self.reconnect_delay = 30
+            M_CONNECTS.labels("ok").inc()
             return True
 
         except Exception as e:
+            M_CONNECTS.labels("failed").inc()
+            self.watchdog.stop()
+            self._close_session()
             logger.error(f"Connection failed: {e}")
             return False
 
-    def send_command(self, command, flush=True):
-        """Send a command to the server"""
-        if self.tn:
+    def _warm_up(self):
+        """Post-login commands; the replies are read by monitor_chat"""
+        try:
+            # Test connection with a simple command
+            self.send_command("help", flush=False, priority=CMD_PRIORITY_POLL, wait=False)
+            if self.log_tailer and LOG_TAIL_MUTE_TELNET_LOGS:
+                self.send_command("loglevel ALL false", flush=False, priority=CMD_PRIORITY_POLL, wait=False)
+        except Exception as e:
+            logger.error(f"Warm-up error: {e}")
+
+    def _spawn_warm_up(self):
+        self.send_command("help", priority=CMD_PRIORITY_POLL, wait=False)
+        logger.info("Connection warmed up")
+
+    def _close_session(self):
+        """Close the telnet object when monitor_chat stops or a connect fails.
+        self.tn is None whenever there is no live session (connected gauge,
+        send_command and the periodic message check it)."""
+        for address in self.player_addresses.values():
+            address["entityId"] = None
+        with self.tn_lock:
+            tn, self.tn = self.tn, None
+        if tn is None:
+            return
+        try:
+            tn.close()
+        except Exception:
+            pass
+
+    def _watchdog_probe(self):
+        self.send_command("version", flush=False, priority=CMD_PRIORITY_POLL, wait=False)
+
+    def _on_stall(self, reason):
+        """Watchdog callback: stop monitor_chat and drop the dead socket"""
+        M_STALLS.labels(reason).inc()
+        self.session_stop.set()
+        sock = getattr(self.tn, "sock", None)
+        if sock:
             try:
-                # Clear any pending data before sending command
-                try:
-                    self.tn.read_very_eager()
-                except:
-                    pass
-
-                logger.debug(f"Sending command: {command}")
-                self.tn.write(f"{command}\n".encode('utf-8'))
-                time.sleep(0.5)  # Give server time to process
-
-                # Send a flush command to ensure the previous command is processed
-                if flush and not command.startswith("version"):
-                    logger.debug("Sending flush command")
-                    self.tn.write(b"version\n")
-                    time.sleep(0.2)
-                    # Clear the version output
-                    try:
-                        self.tn.read_very_eager()
-                    except:
-                        pass
-
-                return True
-            except Exception as e:
-                logger.error(f"Failed to send command: {e}")
-                return False
-        return False
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _write_command(self, command):
+        """Raw socket write; only ever called from the CommandScheduler thread"""
+        tn = self.tn
+        if not tn or self.session_stop.is_set():
+            raise ConnectionError("not connected")
+        try:
+            with self.tn_lock:
+                commands_log.debug("Sending command: %s", command)
+                tn.write(f"{command}\n".encode('utf-8'))
+        except (OSError, AttributeError) as e:
+            self.watchdog.write_failed(e)
+            raise
+        self.watchdog.command_sent()
+
+    def send_command(self, command, flush=True, priority=CMD_PRIORITY_INTERACTIVE, wait=True):
+        """Queue a command for the server.
+        With flush=True a "version" command is written right after it to make
+        sure the previous command is processed (counts as a second command).
+        With wait=True returns True/False, or None if the wait timed out while
+        the command was being written (it may still go through).
+        With wait=False the CommandTicket is returned instead.
+        """
+        if not self.tn:
+            return False
+        cost = 1
+        if flush and not command.startswith("version"):
+            command = f"{command}\nversion"
+            cost = 2
+        ticket = self.commands.submit(command, priority=priority, cost=cost)
+        if not wait:
+            return ticket
+        return self.commands.wait_or_cancel(ticket)
+
+    def _remember_address(self, player_name, steam_id=None, entity_id=None):
+        address = self.player_addresses.setdefault(player_name, {"steamId": None, "entityId": None})
+        if steam_id:
+            address["steamId"] = str(steam_id)
+        if entity_id:
+            address["entityId"] = str(entity_id)
+
+    def _player_targets(self, player_name):
+        """Entity id, Steam platform id, quoted name - see player_targets()"""
+        address = self.player_addresses.get(player_name) or {}
+        steam_id = address.get("steamId")
+        return player_targets(player_name, address.get("entityId"), f"Steam_{steam_id}" if steam_id else None)
+
+    def _send_addressed(self, player_name, build, verb, priority=CMD_PRIORITY_INTERACTIVE, targets=None):
+        """Send build(target) for each way to address the player until the
+        console output shows no error. Returns the target used, or None."""
+        target = send_to_player(
+            lambda command: self.send_command(command, priority=priority),
+            self.outcomes,
+            build,
+            self._player_targets(player_name) if targets is None else targets,
+            verb=verb,
+        )
+        if target is None:
+            logger.error(f"{verb} for {player_name} failed for every way to address the player")
+        return target
 
     def send_private_message(self, player_name, message):
         """Send a private message to a specific player using the pm2 syntax:
         pm2 <channel> <player_or_id> <text>
         Multi-word text must be quoted, e.g.:
         pm2 Brewer BohemianBrewer "delsi zprava s mezerami"
+        The player is addressed by entity id / platform id when known.
         """
         quoted_message = self._quote_if_needed(message)
-        command = f'pm2 {self.pm_channel} {player_name} {quoted_message}'
         logger.info(f"Sending PM to {player_name}: {message}")
-        return self.send_command(command, flush=True)
+        target = self._send_addressed(player_name, lambda t: f'pm2 {self.pm_channel} {t} {quoted_message}', "pm2")
+        return target is not None
 
     def send_global_message(self, message):
         """Send a global message to all players.
@@ -295,35 +1048,68 @@ class VotingRewards:
         quoted_message = self._quote_if_needed(message)
         command = f'say {quoted_message}'
         logger.info(f"Sending global message: {message}")
-        self.send_command(command, flush=True)
+        self.send_command(command, flush=True, priority=CMD_PRIORITY_BROADCAST)
 
     def give_rewards(self, player_name):
         """Give rewards to the player using the giveplus syntax:
         giveplus <name/entityId/steamId> <item name> <amount>
+        The first grant finds a way to address the player that the server
+        accepts (entity id, platform id, quoted name); the rest use it.
+        Returns False if no grant could be delivered.
         """
         logger.info(f"Giving rewards to {player_name}")
 
-        # Give fixed rewards
-        for item, amount in self.fixed_rewards:
-            command = f'giveplus {player_name} {item} {amount}'
-            self.send_command(command)
-            time.sleep(0.3)
-
-        # Give 3 random skill books (no duplicates)
         random_books = random.sample(self.skill_books, 3)
-        for book in random_books:
-            command = f'giveplus {player_name} {book} 1'
-            self.send_command(command)
-            time.sleep(0.3)
+        grants = list(self.fixed_rewards) + [(book, 1) for book in random_books]
+
+        targets = self._player_targets(player_name)
+        item, amount = grants[0]
+        target = self._send_addressed(
+            player_name, lambda t: f'giveplus {t} {item} {amount}', "giveplus", CMD_PRIORITY_REWARD, targets
+        )
+        if target is None:
+            return False
 
-        logger.info(f"Gave {player_name}: Fixed rewards + books: {', '.join(random_books)}")
+        # Queue the other grants at once; the scheduler paces them
+        queued = []
+        for item, amount in grants[1:]:
+            command = f'giveplus {target} {item} {amount}'
+            outcome = self.outcomes.expect(command)
+            queued.append((item, amount, outcome, self.send_command(command, priority=CMD_PRIORITY_REWARD, wait=False)))
+
+        # only a grant that was never written or that the server rejected is
+        # retried; a timed-out write may still arrive and is just verified
+        failed = []
+        for item, amount, outcome, ticket in queued:
+            written = self.commands.wait_or_cancel(ticket) if ticket else False
+            if written is False:
+                self.outcomes.forget(outcome)
+                failed.append((item, amount))
+            elif self.outcomes.verify(outcome, "giveplus") is False:
+                failed.append((item, amount))
+
+        # rejected after the first one went through (player relogged?): try
+        # the remaining ways to address them
+        fallback = targets[targets.index(target) + 1:]
+        for item, amount in failed:
+            if self._send_addressed(
+                player_name,
+                lambda t, item=item, amount=amount: f'giveplus {t} {item} {amount}',
+                "giveplus",
+                CMD_PRIORITY_REWARD,
+                fallback,
+            ) is None:
+                logger.error(f"Reward {item} x{amount} for {player_name} could not be delivered")
+
+        logger.info(f"Gave {player_name} (as {target}): Fixed rewards + books: {', '.join(random_books)}")
+        return True
 
     def get_last_vote_time(self, steam_id):
         """Get the last vote time for a player from API"""
         try:
             # Get vote history in JSON format
-            url = f"https://7daystodie-servers.com/api/?object=servers&element=votes&key={self.api_key}&format=json"
-            response = requests.get(url, timeout=5)
+            url = f"{self.api_base}?object=servers&element=votes&key={self.api_key}&format=json"
+            response = self._vote_api("GET", "votes", url)
 
             if response.status_code == 200:
                 data = response.json()
@@ -355,6 +1141,7 @@ class VotingRewards:
 
                 if latest_vote_time:
                     self.last_vote_times[steam_id] = latest_vote_time
+                    self._store_vote(steam_id, last_vote_ts=latest_vote_time.timestamp())
                     return latest_vote_time
                 else:
                     logger.warning(f"No valid vote time found for {steam_id}")
@@ -431,13 +1218,18 @@ class VotingRewards:
         return f"{hours}h {minutes}m"
 
     def check_vote_status(self, steam_id):
-        """Check vote status from API with daily reset handling
+        """Check vote status (cached, see VoteStatusCache) with daily reset handling
         Returns: 0 (not found), 1 (voted not claimed), 2 (voted and claimed)
         """
+        result = self.vote_status_cache.get(steam_id, lambda: self._fetch_vote_status(steam_id))
+        return 0 if result is None else result
+
+    def _fetch_vote_status(self, steam_id):
+        """check_vote_status from the vote site; None if the lookup failed"""
         try:
             # API endpoint to check vote status
-            url = f"https://7daystodie-servers.com/api/?object=votes&element=claim&key={self.api_key}&steamid={steam_id}"
-            response = requests.get(url, timeout=5)
+            url = f"{self.api_base}?object=votes&element=claim&key={self.api_key}&steamid={steam_id}"
+            response = self._vote_api("GET", "status", url)
 
             if response.status_code == 200:
                 result = int(response.text.strip())
@@ -452,19 +1244,19 @@ class VotingRewards:
                 return result
             else:
                 logger.error(f"API error checking vote: {response.status_code}")
-                return 0
+                return None
         except Exception as e:
             logger.error(f"Error in check_vote_status: {e}")
             import traceback
             logger.error(traceback.format_exc())
-            return 0
+            return None
 
     def set_vote_claimed(self, steam_id):
         """Set vote as claimed via API"""
         try:
             # API endpoint to set vote as claimed
-            url = f"https://7daystodie-servers.com/api/?action=post&object=votes&element=claim&key={self.api_key}&steamid={steam_id}"
-            response = requests.post(url, timeout=5)
+            url = f"{self.api_base}?action=post&object=votes&element=claim&key={self.api_key}&steamid={steam_id}"
+            response = self._vote_api("POST", "claim", url)
 
             if response.status_code == 200:
                 result = int(response.text.strip())
@@ -480,9 +1272,13 @@ class VotingRewards:
         except Exception as e:
             logger.error(f"API request failed: {e}")
             return False
+        finally:
+            # whatever the outcome, the cached status is stale now
+            self.vote_status_cache.invalidate(steam_id)
 
     def handle_vote_command(self, player_name, steam_id):
-        """Handle when a player types /vote"""
+        """Handle when a player types /vote. Returns the status reply sent to
+        the player (None when the reward was delivered)."""
         logger.info(f"Handling /vote command from {player_name} (Steam ID: {steam_id})")
 
         # Add a small delay to ensure server is ready
@@ -490,16 +1286,20 @@ class VotingRewards:
 
         # FIRST check vote status
         vote_status = self.check_vote_status(steam_id)
+        M_VOTE_COMMANDS.labels(VOTE_STATUS_NAMES.get(vote_status, str(vote_status))).inc()
 
         if vote_status == 0:
             # Not voted yet - send vote command response and add to check list
             logger.info(f"{player_name} has not voted yet")
-            self.send_private_message(player_name, self.messages['VOTE_COMMAND_RESPONSE'])
+            reply = self.messages['VOTE_COMMAND_RESPONSE']
+            self.send_private_message(player_name, reply)
 
             # Add to automatic check list
             self.players_to_check[steam_id] = (player_name, datetime.now())
             self.players_pending_check[steam_id] = player_name  # Remember they typed /vote
+            self._store_pending(steam_id, player_name)
             logger.info(f"Added {player_name} to automatic check list")
+            return reply
 
         elif vote_status == 1:
             # Voted but not claimed - give rewards immediately
@@ -519,18 +1319,42 @@ class VotingRewards:
 
             message = self.messages['ALREADY_VOTED_MESSAGE'].format(hours=hours, minutes=minutes)
             self.send_private_message(player_name, message)
+            return message
+        return None
 
     def process_reward(self, player_name, steam_id):
         """Process reward for a player who has voted"""
-        self.give_rewards(player_name)
+        with self.reward_lock:
+            if steam_id in self.rewards_in_progress or steam_id in self.players_checked_today:
+                logger.info(f"Reward for {player_name} already being processed or delivered today")
+                return
+            self.rewards_in_progress.add(steam_id)
+        try:
+            self._process_reward(player_name, steam_id)
+        finally:
+            with self.reward_lock:
+                self.rewards_in_progress.discard(steam_id)
+
+    def _process_reward(self, player_name, steam_id):
+        if not self.give_rewards(player_name):
+            # not claimed: the vote stays claimable, a later /vote retries
+            M_REWARDS.labels("delivery_failed").inc()
+            logger.error(f"Rewards for {player_name} could not be delivered, vote left unclaimed")
+            return
 
         # Claim the vote
         if self.set_vote_claimed(steam_id):
+            M_REWARDS.labels("claimed").inc()
             # Update last vote time to NOW since they just voted
             self.last_vote_times[steam_id] = datetime.now(self.cest_tz)
             logger.info(f"Updated vote time for {steam_id} to current time")
+            today = self._reset_day()
+            self._store_vote(steam_id, player_name=player_name, last_vote_ts=time.time(), checked_day=today)
+            # Reward delivered - no need to re-check on the next spawn
+            self.players_pending_check.pop(steam_id, None)
+            self._store_pending(steam_id)
 
-            if not self.vote_quest_integration.notify_vote(player_name):
+            if not self.vote_quest_integration.notify_vote(player_name, event_id=f"vote:{steam_id}:{today}"):
                 logger.warning(
                     "Vote rewards for %s were processed, but the Takaro vote quest update failed",
                     player_name,
@@ -543,72 +1367,199 @@ class VotingRewards:
             if steam_id not in self.players_thanked:
                 self.send_private_message(player_name, self.messages['THANK_YOU_MESSAGE'].format(player_name=player_name))
                 self.players_thanked.add(steam_id)
+                self._store_vote(steam_id, thanked_day=today)
                 time.sleep(0.5)  # Delay before global message
 
             # Send global reward message (only once)
             if steam_id not in self.players_rewarded:
                 self.send_global_message(self.messages['GLOBAL_REWARD_MESSAGE'].format(player_name=player_name))
                 self.players_rewarded.add(steam_id)
+                self._store_vote(steam_id, rewarded_day=today)
 
             # Add to checked today to prevent spam
             self.players_checked_today.add(steam_id)
         else:
+            M_REWARDS.labels("claim_failed").inc()
             logger.error(f"Failed to claim vote for {player_name}")
 
-    def automatic_vote_checker(self):
-        """Check players who typed /vote for completed votes"""
-        logger.info("Starting automatic vote checker thread")
+    def check_pending_votes(self):
+        """Check players who typed /vote for completed votes (job "vote-checker")"""
+        # Clean up old entries (older than 10 minutes)
+        current_time = datetime.now()
+        to_remove = []
+
+        for steam_id, (player_name, timestamp) in self.players_to_check.items():
+            if current_time - timestamp > timedelta(minutes=10):
+                to_remove.append(steam_id)
+                logger.info(f"Removing {player_name} from check list (timeout)")
+
+        for steam_id in to_remove:
+            del self.players_to_check[steam_id]
+
+        # Check remaining players
+        for steam_id, (player_name, timestamp) in list(self.players_to_check.items()):
+            vote_status = self.check_vote_status(steam_id)
+
+            if vote_status == 1:
+                # Player has voted! Give rewards
+                logger.info(f"Automatic check: {player_name} has voted! Delivering rewards...")
+                self.process_reward(player_name, steam_id)
+                # Remove from check list
+                del self.players_to_check[steam_id]
+            elif vote_status == 2:
+                # Already claimed (maybe through another method)
+                logger.info(f"Automatic check: {player_name} already claimed")
+                del self.players_to_check[steam_id]
+                self.players_checked_today.add(steam_id)
+                self._store_vote(steam_id, checked_day=self._reset_day())
+
+    def handle_line(self, line):
+        """Process one console/log line. Runs on the event queue's thread; the
+        lines come from monitor_chat or, in log-tail mode, the LogTailer
+        (never both)."""
+        start = time.perf_counter()
+        try:
+            self._handle_line(line)
+        finally:
+            M_HANDLE_LINE.observe(time.perf_counter() - start)
+
+    def _handle_line(self, line):
+        telnet_log.debug("Telnet output: %s", line)
+
+        # Track player joins to warm up connection
+        if "PlayerSpawnedInWorld" in line:
+            player_match = re.search(r"PlayerName='([^']+)'", line)
+            steam_match = re.search(r"PltfmId='Steam_(\d+)'", line)
+
+            if player_match and steam_match:
+                player_name = player_match.group(1)
+                steam_id = steam_match.group(1)
+                entity_match = re.search(r"EntityID=(\d+)", line)
+                self._remember_address(player_name, steam_id, entity_match.group(1) if entity_match else None)
+
+                logger.info(f"Player {player_name} spawned, warming up connection")
+                # one delayed "help" per spawn burst, off the handler thread
+                self.jobs.once("spawn-warmup", self._spawn_warm_up, delay=SPAWN_WARMUP_DELAY_SECONDS, group="session")
+
+                # Check if this player had typed /vote before
+                if steam_id in self.players_pending_check:
+                    logger.info(f"Re-adding {player_name} to vote check list (returning player)")
+                    self.players_to_check[steam_id] = (player_name, datetime.now())
+                    # Don't remove from pending - they might disconnect again
+
+        # Entity ids are only valid while the player is online
+        if "Player disconnected" in line:
+            disconnect_match = re.search(r"Player disconnected: EntityID=\d+.*?PlayerName='([^']+)'", line)
+            if disconnect_match and disconnect_match.group(1) in self.player_addresses:
+                self.player_addresses[disconnect_match.group(1)]["entityId"] = None
+
+        # Skip PrismaCore's wrapper/echo line - it re-logs the exact
+        # same "Chat (from ...)" event as a second line, which would
+        # otherwise match the same chat pattern below and cause
+        # /vote (and other commands) to be handled twice.
+        # NOTE: real telnet lines always have a timestamp + tick +
+        # log level prefix before the message (e.g. "2026-08-12T17:39:43
+        # 1291.173 INF Chat handled by mod 'PrismaCore': ..."), so this
+        # text never appears at the very start of the line - it must be
+        # matched as a substring anywhere in the line, not via startswith.
+        if "Chat handled by mod" in line:
+            return
+
+        # Look for chat messages with /vote command
+        patterns = [
+            r"Chat \(from '([^']+)', entity id '(\d+)', to '[^']+'\): ([^\n]+)",
+            r"Chat: '([^']+)': ([^\n]+)",
+            r"\[CHAT\] ([^:]+): ([^\n]+)",
+            r"(\w+): (/vote)",
+        ]
 
-        while True:
+        for pattern in patterns:
+            match = re.search(pattern, line)
+            if match:
+                if len(match.groups()) >= 3:
+                    platform_id = match.group(1)
+                    entity_id = match.group(2)
+                    message = match.group(3).strip()
+                else:
+                    platform_id = match.group(1)
+                    message = match.group(2) if len(match.groups()) > 1 else match.group(1)
+                    entity_id = None
+
+                telnet_log.debug("Chat match: platform_id=%s, message=%s", platform_id, message)
+
+                if '/vote' in message.lower():
+                    # Extract steam ID
+                    steam_id = None
+                    if 'Steam_' in platform_id:
+                        steam_id = platform_id.replace('Steam_', '')
+
+                    if steam_id:
+                        # Try to get player name from the line.
+                        # NOTE: 7D2D chat lines are inconsistent about the
+                        # space after the colon - some are "'Name': /vote"
+                        # and others are "'Name':/vote" with no space.
+                        # The old regex required exactly one space, so it
+                        # silently missed the no-space case and fell back
+                        # to a fake "Player_<entityId>" name. That fake name
+                        # then broke BOTH the in-game giveplus reward AND
+                        # the Takaro quest update, with no visible error.
+                        name_match = re.search(r"'([^']+)':\s*/vote", line)
+                        player_name = name_match.group(1) if name_match else f"Player_{entity_id}"
+
+                        if not name_match:
+                            logger.warning(
+                                "Could not extract player name for /vote from line, "
+                                "falling back to fake name 'Player_%s': %s",
+                                entity_id, line
+                            )
+
+                        logger.info(f"Vote command detected from {player_name} (Steam ID: {steam_id})")
+                        # even a fallback name is addressed by entity / Steam id
+                        self._remember_address(player_name, steam_id, entity_id)
+                        admitted, reply = self.admission.admit("vote", steam_id)
+                        if admitted:
+                            self._dispatch_vote_command(player_name, steam_id)
+                        else:
+                            logger.info("Too many /vote from %s, %s", player_name, "cached reply" if reply else "ignored")
+                            if reply:
+                                self.send_private_message(player_name, reply)
+                    break
+
+    def _dispatch_vote_command(self, player_name, steam_id):
+        """Hand /vote to a job worker: it waits on the vote site and the reward
+        grant, which would hold up every line behind it on the handler thread.
+        One /vote per player at a time."""
+        with self.votes_in_flight_lock:
+            if steam_id in self.votes_in_flight:
+                logger.info(f"/vote from {player_name} is already being handled")
+                return
+            self.votes_in_flight.add(steam_id)
+
+        def run():
             try:
-                # Clean up old entries (older than 10 minutes)
-                current_time = datetime.now()
-                to_remove = []
-
-                for steam_id, (player_name, timestamp) in self.players_to_check.items():
-                    if current_time - timestamp > timedelta(minutes=10):
-                        to_remove.append(steam_id)
-                        logger.info(f"Removing {player_name} from check list (timeout)")
-
-                for steam_id in to_remove:
-                    del self.players_to_check[steam_id]
-
-                # Check remaining players
-                for steam_id, (player_name, timestamp) in list(self.players_to_check.items()):
-                    vote_status = self.check_vote_status(steam_id)
-
-                    if vote_status == 1:
-                        # Player has voted! Give rewards
-                        logger.info(f"Automatic check: {player_name} has voted! Delivering rewards...")
-                        self.process_reward(player_name, steam_id)
-                        # Remove from check list
-                        del self.players_to_check[steam_id]
-                    elif vote_status == 2:
-                        # Already claimed (maybe through another method)
-                        logger.info(f"Automatic check: {player_name} already claimed")
-                        del self.players_to_check[steam_id]
-                        self.players_checked_today.add(steam_id)
-
-                # Wait 30 seconds before next check
-                time.sleep(30)
+                self.admission.remember("vote", steam_id, self.handle_vote_command(player_name, steam_id))
+            finally:
+                with self.votes_in_flight_lock:
+                    self.votes_in_flight.discard(steam_id)
 
-            except Exception as e:
-                logger.error(f"Error in automatic checker: {e}")
-                time.sleep(30)
+        self.jobs.once(f"vote:{steam_id}", run)
 
     def monitor_chat(self):
         """Monitor telnet output for chat commands"""
         if not self.tn:
+            self.session_stop.set()
             return
 
         logger.info("Starting chat monitoring for /vote commands...")
         buffer = ""
 
-        while True:
+        while not self.session_stop.is_set():
             try:
                 # Read available data
-                data = self.tn.read_very_eager()
+                with self.tn_lock:
+                    data = self.tn.read_very_eager()
                 if data:
+                    self.watchdog.data_received()
                     text = data.decode('utf-8', errors='ignore')
                     buffer += text
 
@@ -618,177 +1569,108 @@ class VotingRewards:
                         line = line.strip()
 
                         if line:
-                            logger.debug(f"Telnet output: {line}")
-
-                            # Track player joins to warm up connection
-                            if "PlayerSpawnedInWorld" in line:
-                                player_match = re.search(r"PlayerName='([^']+)'", line)
-                                steam_match = re.search(r"PltfmId='Steam_(\d+)'", line)
-
-                                if player_match and steam_match:
-                                    player_name = player_match.group(1)
-                                    steam_id = steam_match.group(1)
-
-                                    logger.info(f"Player {player_name} spawned, warming up connection")
-                                    time.sleep(2)
-                                    self.send_command("help")
-                                    logger.info("Connection warmed up")
-
-                                    # Check if this player had typed /vote before
-                                    if steam_id in self.players_pending_check:
-                                        logger.info(f"Re-adding {player_name} to vote check list (returning player)")
-                                        self.players_to_check[steam_id] = (player_name, datetime.now())
-                                        # Don't remove from pending - they might disconnect again
-
-                            # Skip PrismaCore's wrapper/echo line - it re-logs the exact
-                            # same "Chat (from ...)" event as a second line, which would
-                            # otherwise match the same chat pattern below and cause
-                            # /vote (and other commands) to be handled twice.
-                            # NOTE: real telnet lines always have a timestamp + tick +
-                            # log level prefix before the message (e.g. "2026-08-12T17:39:43
-                            # 1291.173 INF Chat handled by mod 'PrismaCore': ..."), so this
-                            # text never appears at the very start of the line - it must be
-                            # matched as a substring anywhere in the line, not via startswith.
-                            if "Chat handled by mod" in line:
+                            M_LINES_READ.labels("telnet").inc()
+                            self.outcomes.feed(line)
+                            if self.log_tailer:
+                                # events come from the server log file; telnet
+                                # output is only drained here
                                 continue
-
-                            # Look for chat messages with /vote command
-                            patterns = [
-                                r"Chat \(from '([^']+)', entity id '(\d+)', to '[^']+'\): ([^\n]+)",
-                                r"Chat: '([^']+)': ([^\n]+)",
-                                r"\[CHAT\] ([^:]+): ([^\n]+)",
-                                r"(\w+): (/vote)",
-                            ]
-
-                            for pattern in patterns:
-                                match = re.search(pattern, line)
-                                if match:
-                                    if len(match.groups()) >= 3:
-                                        platform_id = match.group(1)
-                                        entity_id = match.group(2)
-                                        message = match.group(3).strip()
-                                    else:
-                                        platform_id = match.group(1)
-                                        message = match.group(2) if len(match.groups()) > 1 else match.group(1)
-                                        entity_id = None
-
-                                    logger.debug(f"Chat match: platform_id={platform_id}, message={message}")
-
-                                    if '/vote' in message.lower():
-                                        # Extract steam ID
-                                        steam_id = None
-                                        if 'Steam_' in platform_id:
-                                            steam_id = platform_id.replace('Steam_', '')
-
-                                        if steam_id:
-                                            # Try to get player name from the line.
-                                            # NOTE: 7D2D chat lines are inconsistent about the
-                                            # space after the colon - some are "'Name': /vote"
-                                            # and others are "'Name':/vote" with no space.
-                                            # The old regex required exactly one space, so it
-                                            # silently missed the no-space case and fell back
-                                            # to a fake "Player_<entityId>" name. That fake name
-                                            # then broke BOTH the in-game giveplus reward AND
-                                            # the Takaro quest update, with no visible error.
-                                            name_match = re.search(r"'([^']+)':\s*/vote", line)
-                                            player_name = name_match.group(1) if name_match else f"Player_{entity_id}"
-
-                                            if not name_match:
-                                                logger.warning(
-                                                    "Could not extract player name for /vote from line, "
-                                                    "falling back to fake name 'Player_%s': %s",
-                                                    entity_id, line
-                                                )
-
-                                            logger.info(f"Vote command detected from {player_name} (Steam ID: {steam_id})")
-
-                                            # Clear buffer before handling command
-                                            try:
-                                                self.tn.read_very_eager()
-                                            except:
-                                                pass
-
-                                            self.handle_vote_command(player_name, steam_id)
-                                        break
+                            self.events.put(line)
 
                 # Small delay to prevent CPU spinning
                 time.sleep(0.1)
 
             except (EOFError, ConnectionError, AttributeError) as e:
-                # Connection lost - this is THE FIX for the log spam
-                logger.error(f"Monitor error: {e}")
-                # CRITICAL: Wait before breaking out
-                logger.info(f"Waiting {self.reconnect_delay} seconds before reconnection attempt...")
-                time.sleep(self.reconnect_delay)
-                # Double the delay for next time
-                self.reconnect_delay = min(self.reconnect_delay * 2, self.max_reconnect_delay)
+                M_DISCONNECTS.inc()
+                if self.session_stop.is_set():
+                    # dead session found by the watchdog
+                    logger.warning(f"Telnet session closed by watchdog: {e}")
+                else:
+                    logger.error(f"Monitor error: {e}")
+                # run() paces the reconnect (port probes), no sleep here
                 break
             except Exception as e:
                 logger.error(f"Monitor error: {e}")
                 break
 
-    def send_periodic_message(self):
-        """Send global vote message every 60 minutes"""
-        logger.info("Starting periodic message thread (60 minute interval)")
-        while True:
-            time.sleep(3600)  # 60 minutes
+        # every exit (EOF, error, watchdog) ends the session: the writer and
+        # the session jobs check session_stop
+        self.session_stop.set()
+        self.watchdog.stop()
+        self._close_session()
 
-            # Check if connected before sending
-            if self.tn:
-                try:
-                    self.send_global_message(self.messages['GLOBAL_VOTE_MESSAGE'])
-                    logger.info("Sent periodic vote message")
-                except Exception as e:
-                    logger.warning(f"Failed to send periodic message: {e}")
-            else:
-                logger.debug("Skipping periodic message - not connected")
+    def send_periodic_message(self):
+        """Global vote message (job "vote-message", every 60 minutes while connected)"""
+        if not self.tn:
+            logger.debug("Skipping periodic message - not connected")
+            return
+        try:
+            self.send_global_message(self.messages['GLOBAL_VOTE_MESSAGE'])
+            logger.info("Sent periodic vote message")
+        except Exception as e:
+            logger.warning(f"Failed to send periodic message: {e}")
 
-            # Clear tracking lists at daily reset (6 AM CEST)
-            now = datetime.now(self.cest_tz)
-            if now.hour == 6 and now.minute < 1:
-                self.players_checked_today.clear()
-                self.players_thanked.clear()
-                self.players_rewarded.clear()
-                logger.info("Daily reset at 6 AM CEST - cleared tracking lists")
+    def daily_reset(self):
+        """Clear tracking lists at the daily reset (job "daily-reset", 6 AM CEST)"""
+        self.players_checked_today.clear()
+        self.players_thanked.clear()
+        self.players_rewarded.clear()
+        self.vote_status_cache.clear()
+        logger.info("Daily reset at 6 AM CEST - cleared tracking lists")
 
     def run(self):
-        """Main run method - returns True if should retry, False if shutting down"""
-        if not self.connect():
-            return True  # Connection failed, should retry
-
-        # Start periodic message thread
-        periodic_thread = threading.Thread(target=self.send_periodic_message, daemon=True)
-        periodic_thread.start()
+        """Main run method: connect, monitor chat, reconnect - until interrupted.
+        Threads, caches, vote state and the command scheduler are kept across
+        telnet sessions; only the socket is replaced.
+        """
+        # Process-lifetime jobs; the reset runs at the exact wall-clock time
+        logger.info("Starting automatic vote checker")
+        self.jobs.every("vote-checker", VOTE_CHECK_INTERVAL_SECONDS, self.check_pending_votes, jitter=JOB_JITTER,
+                        first_delay=0)
+        self.jobs.daily("daily-reset", DAILY_RESET_HOUR, DAILY_RESET_MINUTE, self.daily_reset, tz=self.cest_tz)
 
-        # Start automatic vote checker thread
-        checker_thread = threading.Thread(target=self.automatic_vote_checker, daemon=True)
-        checker_thread.start()
+        # Log-file event source, if enabled (resumes from its checkpoint and
+        # keeps reading while telnet reconnects)
+        if self.log_tailer:
+            self.log_tailer.start()
 
-        # Start monitoring chat
         try:
-            self.monitor_chat()
-            return True  # Monitor exited, should retry
+            while True:
+                try:
+                    self.reconnect.wait_until_reachable()
+                    if not self.connect():
+                        self.reconnect.connect_failed()
+                        continue
+                    downtime = self.reconnect.connected()
+                    if downtime is not None:
+                        M_DOWNTIME.observe(downtime)
+                        logger.info(f"Reconnected after {downtime:.1f}s")
+
+                    self.jobs.every("vote-message", PERIODIC_MESSAGE_INTERVAL_SECONDS, self.send_periodic_message,
+                                    group="session")
+                    self.monitor_chat()
+                    self.jobs.cancel_group("session")
+                    self.reconnect.disconnected()
+                except KeyboardInterrupt:
+                    raise
+                except Exception as e:
+                    logger.error(f"Unexpected error: {e}")
+                    self.jobs.cancel_group("session")
+                    self.reconnect.disconnected()
+                    time.sleep(self.reconnect.next_delay())
         except KeyboardInterrupt:
             logger.info("Shutting down...")
-            return False  # User requested shutdown
         finally:
-            if self.tn:
-                self.tn.close()
+            if self.log_tailer:
+                self.log_tailer.stop()
+            self._close_session()
 
 def main():
     """Main function with automatic setup"""
+    setup_logging()
     logger.info("7D2D Voting Rewards System with Auto-Detection Starting")
     logger.info("=================================================")
 
-    # Check if pytz is installed
-    try:
-        import pytz
-    except ImportError:
-        logger.error("pytz module not found. Installing...")
-        os.system("pip3 install --user pytz")
-        logger.info("Please restart the script after pytz installation")
-        return
-
     # Configuration
     host = '91.99.236.133'
     port = 8081
@@ -801,44 +1683,27 @@ def main():
     logger.info("Auto-detection enabled: Players will receive rewards automatically after voting")
     logger.info("Daily reset time: 6:00 AM CEST")
 
-    # Track reconnection delay globally
-    global_reconnect_delay = 30
-    max_reconnect_delay = 480
-
-    # Run with automatic reconnection
-    while True:
-        try:
-            voting_system = VotingRewards(host, port, password, api_key, quest_server_url)
-            # Copy the global delay to the instance
-            voting_system.reconnect_delay = global_reconnect_delay
-
-            should_retry = voting_system.run()
-
-            if not should_retry:
-                # User requested shutdown
-                break
+    profiler = Profiler(PROFILE_DIR, 'voting', PROFILE_SECONDS)
+    profiler.install_signal_handlers()
 
-            # If run() exits normally, we need to wait before reconnecting
-            # Copy the delay back from the instance
-            global_reconnect_delay = voting_system.reconnect_delay
+    jobs = JobScheduler("voting", workers=JOB_WORKERS, on_run=_observe_job)
+    jobs.start()
 
-            # The monitor already waited, but if connection still fails, wait again
-            if not voting_system.tn:
-                logger.info(f"Connection still down, waiting {global_reconnect_delay} seconds before retry...")
-                time.sleep(global_reconnect_delay)
-                global_reconnect_delay = min(global_reconnect_delay * 2, max_reconnect_delay)
-            else:
-                # Reset delay if we had a successful connection
-                global_reconnect_delay = 30
+    # One instance for the whole process: run() reconnects by itself and keeps
+    # the scheduler, caches and vote state across telnet sessions
+    voting_system = VotingRewards(host, port, password, api_key, quest_server_url, jobs=jobs)
 
-        except KeyboardInterrupt:
-            logger.info("Shutdown requested")
-            break
-        except Exception as e:
-            logger.error(f"Unexpected error: {e}")
-            logger.info(f"Waiting {global_reconnect_delay} seconds before retry...")
-            time.sleep(global_reconnect_delay)
-            global_reconnect_delay = min(global_reconnect_delay * 2, max_reconnect_delay)
+    if METRICS_ENABLED:
+        metrics.start_metrics_server(METRICS_HOST, METRICS_PORT, routes={
+            '/debug/profile': profiler.handle_http,
+            '/jobs': lambda _query: (200, {'jobs': jobs.stats()}),
+            '/events': lambda _query: (200, voting_system.events.stats()),
+            '/admission': lambda _query: (200, voting_system.admission.stats()),
+        })
+    try:
+        voting_system.run()
+    except KeyboardInterrupt:
+        logger.info("Shutdown requested")
 
 if __name__ == "__main__":
     main()